@@ -0,0 +1,50 @@
+"""
+Gunicorn configuration for SQL-GPT
+
+Run with:
+    gunicorn -c gunicorn.conf.py 'src.wsgi:create_app()'
+
+Send HUP to the master to reload the code and configuration with new
+workers; old workers finish their requests first. Every setting can be
+overridden with the WEB_* environment variables.
+"""
+
+import os
+import tempfile
+
+bind = os.getenv('WEB_BIND', '0.0.0.0:9876')
+workers = int(os.getenv('WEB_WORKERS', str(min(8, (os.cpu_count() or 1) * 2 + 1))))
+
+# Requests mostly wait on OpenAI and PostgreSQL, so each worker serves
+# several at once on threads
+worker_class = 'gthread'
+threads = int(os.getenv('WEB_THREADS', '4'))
+
+# Recycle workers after a number of requests to bound memory growth;
+# the jitter keeps them from restarting all at once
+max_requests = int(os.getenv('WEB_MAX_REQUESTS', '1000'))
+max_requests_jitter = int(os.getenv('WEB_MAX_REQUESTS_JITTER', '100'))
+
+# Query generation can wait on the LLM for a while
+timeout = int(os.getenv('WEB_TIMEOUT', '120'))
+graceful_timeout = int(os.getenv('WEB_GRACEFUL_TIMEOUT', '30'))
+keepalive = 5
+
+# Each worker builds its own application: psycopg2 connections, the schema
+# cache LISTEN connection and pool threads must not be shared across fork()
+preload_app = False
+
+# Workers share LLM responses, schema metadata and jobs through this file;
+# its directory must belong to the service user and is created with mode 0700
+os.environ.setdefault('SHARED_CACHE_PATH', os.path.join(tempfile.gettempdir(), f'sql_gpt-{os.getuid()}',
+                                                        'shared_cache.sqlite3'))
+
+accesslog = '-'
+errorlog = '-'
+
+
+def on_starting(server):
+    """Refuse to start when another user could write to the shared cache"""
+    if os.environ.get('SHARED_CACHE_PATH'):
+        from src.shared_cache import SharedCache
+        SharedCache(os.environ['SHARED_CACHE_PATH'])
@@ -17,24 +17,22 @@ from src.sql_generator import SQLGenerator
 from src.deployment_manager import DeploymentManager
 from src.db_connector import DBConnector
 from src.web_interface import WebInterface
-
-# Set up logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger(__name__)
+from src.logging_config import configure_logging
 
 # Load environment variables
 load_dotenv()
 
+# Set up logging
+configure_logging()
+logger = logging.getLogger(__name__)
+
 def main():
     """Main entry point"""
     # Initialize components
     db_connector = DBConnector()
     nlp_processor = NLPProcessor()
-    sql_generator = SQLGenerator()
-    deployment_manager = DeploymentManager()
+    sql_generator = SQLGenerator(db_connector)
+    deployment_manager = DeploymentManager(db_connector)
     
     # Initialize web interface
     web_interface = WebInterface(
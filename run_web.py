@@ -8,14 +8,10 @@ import os
 import sys
 import logging
 
+from src.logging_config import configure_logging
+
 # Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s [%(levelname)s] %(name)s: %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+configure_logging()
 
 from src.nlp_processor import NLPProcessor
 from src.sql_generator import SQLGenerator
@@ -29,9 +25,9 @@ def main():
     
     # Initialize components
     nlp_processor = NLPProcessor()
-    sql_generator = SQLGenerator()
-    deployment_manager = DeploymentManager()
     db_connector = DBConnector()
+    sql_generator = SQLGenerator(db_connector)
+    deployment_manager = DeploymentManager(db_connector)
     
     # Create web interface
     web = WebInterface(nlp_processor, sql_generator, deployment_manager, db_connector)
@@ -0,0 +1,359 @@
+"""
+Bulk Loader Module
+Streams CSV and JSON Lines data into PostgreSQL tables with COPY FROM STDIN
+"""
+
+import io
+import csv
+import json
+import time
+import codecs
+import logging
+import queue
+import operator
+import itertools
+import threading
+from typing import Dict, Any, List, Optional, Callable, Iterator, IO, Tuple
+import psycopg2
+from psycopg2 import sql
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from .db_connector import DBConnector
+from .db_browser import DBBrowser
+
+logger = logging.getLogger(__name__)
+
+LOAD_FORMATS = ('csv', 'jsonl')
+DEFAULT_BATCH_SIZE = 50000
+
+# NULL marker used in the COPY stream for JSON null values
+JSONL_NULL = '\\N'
+
+
+class BulkLoadError(Exception):
+    """Raised when a bulk load request is invalid or the load fails"""
+
+
+class BulkLoader:
+    """
+    Loads large CSV/JSONL inputs into a table in COPY batches.
+
+    Input is parsed as a stream, mapped onto the table's columns and sent to
+    the server as CSV through COPY FROM STDIN, one batch at a time, on a
+    dedicated connection so the shared connection stays free.
+    """
+
+    def __init__(self, db_connector: DBConnector, db_browser: Optional[DBBrowser] = None,
+                 batch_size: int = DEFAULT_BATCH_SIZE):
+        """
+        Initialize the bulk loader
+
+        Args:
+            db_connector: Database connector whose connection parameters are used
+            db_browser: Database browser used to read the target table structure
+            batch_size: Default number of rows sent per COPY batch
+        """
+        self.db_connector = db_connector
+        self.db_browser = db_browser or DBBrowser(db_connector)
+        self.batch_size = batch_size
+        logger.debug("Bulk loader initialized")
+
+    def load(self, source: IO, table_name: str, schema_name: str = 'public', fmt: str = 'csv',
+             column_map: Optional[Dict[str, str]] = None, batch_size: Optional[int] = None,
+             delimiter: str = ',', single_transaction: bool = False,
+             progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """
+        Load a CSV or JSON Lines stream into a table
+
+        Args:
+            source: Binary or text file-like object with the input data
+            table_name: Name of the target table
+            schema_name: Schema of the target table (default: 'public')
+            fmt: Input format ('csv' with a header row, or 'jsonl')
+            column_map: Optional mapping of input field names to table columns.
+                        Unmapped fields are matched to columns case-insensitively.
+            batch_size: Rows per COPY batch (default: loader batch size)
+            delimiter: Field delimiter for CSV input
+            single_transaction: Commit once at the end instead of after each batch
+            progress_callback: Optional callable receiving a progress dictionary
+                               after each batch
+
+        Returns:
+            Dictionary with load statistics
+        """
+        fmt = (fmt or 'csv').lower()
+        if fmt not in LOAD_FORMATS:
+            raise BulkLoadError(f"Unsupported load format: {fmt}")
+        batch_size = batch_size or self.batch_size
+
+        structure = self.db_browser.get_table_structure(table_name, schema_name)
+        if not structure:
+            raise BulkLoadError(f"Table '{schema_name}.{table_name}' does not exist or has no columns")
+
+        text = self._text_stream(source)
+        if fmt == 'csv':
+            reader = csv.reader(text, delimiter=delimiter)
+            try:
+                fields = next(reader)
+            except StopIteration:
+                raise BulkLoadError("Input is empty")
+            rows = reader
+        else:
+            records = self._read_jsonl(text)
+            try:
+                first = next(records)
+            except StopIteration:
+                raise BulkLoadError("Input is empty")
+            fields = list(first.keys())
+            rows = self._records_to_rows(first, records, fields)
+
+        indexes, columns, ignored = self.map_columns(fields, structure, column_map)
+        logger.info(f"Loading {fmt} into {schema_name}.{table_name} ({len(columns)} columns, "
+                    f"batch size {batch_size})")
+
+        # CSV input follows COPY semantics (unquoted empty field is NULL); JSON
+        # null is sent as \N so that empty strings survive the round trip
+        null_marker = JSONL_NULL if fmt == 'jsonl' else ''
+        copy = sql.SQL("COPY {}.{} ({}) FROM STDIN WITH (FORMAT csv, NULL {})").format(
+            sql.Identifier(schema_name),
+            sql.Identifier(table_name),
+            sql.SQL(', ').join(sql.Identifier(column) for column in columns),
+            sql.Literal(null_marker)
+        )
+
+        stats = {
+            'table': f"{schema_name}.{table_name}",
+            'columns': columns,
+            'ignored_fields': ignored,
+            'rows': 0,
+            'rows_committed': 0,
+            'batches': 0,
+            'elapsed_seconds': 0.0,
+            'rows_per_second': 0.0
+        }
+        started = time.monotonic()
+        try:
+            conn = psycopg2.connect(**self.db_connector.connection_params)
+        except psycopg2.Error as e:
+            message = str(e).split('\n')[0]
+            raise BulkLoadError(f"Could not connect to the database: {message}")
+        try:
+            with conn.cursor() as cursor:
+                copy_sql = copy.as_string(conn)
+                for buffer, count in self._prefetch(self._batches(rows, indexes, batch_size)):
+                    cursor.copy_expert(copy_sql, buffer)
+                    stats['rows'] += count
+                    stats['batches'] += 1
+                    if not single_transaction:
+                        conn.commit()
+                        stats['rows_committed'] = stats['rows']
+                    self._update_rate(stats, started)
+                    if progress_callback:
+                        progress_callback(dict(stats))
+            conn.commit()
+            stats['rows_committed'] = stats['rows']
+        except (psycopg2.Error, csv.Error, ValueError, BulkLoadError) as e:
+            conn.rollback()
+            message = str(e).split('\n')[0]
+            logger.error(f"Bulk load failed after {stats['rows_committed']} committed rows: {message}")
+            raise BulkLoadError(
+                f"Load failed in batch {stats['batches'] + 1}: {message} "
+                f"({stats['rows_committed']} rows committed)"
+            )
+        finally:
+            conn.close()
+
+        self._update_rate(stats, started)
+        logger.info(f"Loaded {stats['rows']} rows into {stats['table']} in "
+                    f"{stats['elapsed_seconds']:.2f}s ({stats['rows_per_second']:.0f} rows/s)")
+        return stats
+
+    @staticmethod
+    def map_columns(fields: List[str], structure: List[Dict[str, Any]],
+                    column_map: Optional[Dict[str, str]] = None) -> Tuple[List[int], List[str], List[str]]:
+        """
+        Map input fields onto table columns
+
+        Args:
+            fields: Input field names in input order
+            structure: Table structure as returned by DBBrowser.get_table_structure
+            column_map: Optional explicit mapping of input field names to columns
+
+        Returns:
+            A tuple containing (field_indexes, column_names, ignored_fields)
+        """
+        column_map = column_map or {}
+        columns_by_name = {column['column_name']: column for column in structure}
+        columns_by_lower = {name.lower(): name for name in columns_by_name}
+        # Generated columns cannot be written; fields matching them by name are ignored
+        generated = {name for name, column in columns_by_name.items() if column.get('is_generated') == 'ALWAYS'}
+
+        indexes, columns, ignored = [], [], []
+        for index, field in enumerate(fields):
+            target = column_map.get(field)
+            if target is None:
+                target = columns_by_lower.get(field.strip().lower())
+                if target in generated:
+                    target = None
+            elif target not in columns_by_name:
+                raise BulkLoadError(f"Mapped column '{target}' does not exist in the table")
+            elif target in generated:
+                raise BulkLoadError(f"Mapped column '{target}' is a generated column")
+            if target is None:
+                ignored.append(field)
+                continue
+            if target in columns:
+                raise BulkLoadError(f"Column '{target}' is mapped more than once")
+            indexes.append(index)
+            columns.append(target)
+
+        if not columns:
+            raise BulkLoadError("None of the input fields match a table column")
+
+        # Identity columns have no column_default but are filled in by the server
+        missing = [
+            name for name, column in columns_by_name.items()
+            if name not in columns and column.get('is_nullable') == 'NO' and column.get('column_default') is None
+            and column.get('is_identity') != 'YES' and name not in generated
+        ]
+        if missing:
+            raise BulkLoadError(f"Required columns missing from input: {', '.join(missing)}")
+
+        return indexes, columns, ignored
+
+    @staticmethod
+    def _batches(rows: Iterator[list], indexes: List[int],
+                 batch_size: int) -> Iterator[Tuple[io.StringIO, int]]:
+        """Project rows onto the mapped columns and yield CSV buffers of batch_size rows"""
+        getter = operator.itemgetter(*indexes)
+        single = len(indexes) == 1
+
+        def project(row):
+            try:
+                values = getter(row)
+            except IndexError:
+                # Short rows are padded with NULLs
+                return [row[index] if index < len(row) else None for index in indexes]
+            return (values,) if single else values
+
+        while True:
+            batch = list(itertools.islice(rows, batch_size))
+            if not batch:
+                return
+            buffer = io.StringIO()
+            csv.writer(buffer, lineterminator='\n').writerows(map(project, batch))
+            buffer.seek(0)
+            yield buffer, len(batch)
+
+    @staticmethod
+    def _prefetch(batches: Iterator[Tuple[io.StringIO, int]],
+                  depth: int = 2) -> Iterator[Tuple[io.StringIO, int]]:
+        """
+        Build batches in a background thread so parsing overlaps with the
+        server processing the previous COPY
+        """
+        pending: "queue.Queue" = queue.Queue(maxsize=depth)
+        stop = threading.Event()
+
+        def put(item) -> bool:
+            """Queue an item unless the consumer stopped; False if it did"""
+            while not stop.is_set():
+                try:
+                    pending.put(item, timeout=1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def produce():
+            try:
+                for batch in batches:
+                    if not put(batch):
+                        return
+                put(None)
+            except Exception as e:
+                put(e)
+
+        thread = threading.Thread(target=produce, name='bulk-load-parser', daemon=True)
+        thread.start()
+        try:
+            while True:
+                item = pending.get()
+                if item is None:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+
+    @staticmethod
+    def _text_stream(source: IO) -> IO:
+        """Wrap binary input in a UTF-8 text reader"""
+        if isinstance(source, io.TextIOBase):
+            return source
+        try:
+            return io.TextIOWrapper(source, encoding='utf-8-sig', newline='')
+        except AttributeError:
+            # Not a buffered binary stream; fall back to the slower codec reader
+            return codecs.getreader('utf-8-sig')(source)
+
+    @staticmethod
+    def _read_jsonl(text: IO) -> Iterator[Dict[str, Any]]:
+        """Parse JSON Lines input, skipping blank lines"""
+        for number, line in enumerate(text, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = _json_loads(line)
+            except ValueError as e:
+                raise BulkLoadError(f"Invalid JSON on line {number}: {e}")
+            if not isinstance(record, dict):
+                raise BulkLoadError(f"Line {number} is not a JSON object")
+            yield record
+
+    @staticmethod
+    def _records_to_rows(first: Dict[str, Any], records: Iterator[Dict[str, Any]],
+                         fields: List[str]) -> Iterator[list]:
+        """Turn JSON records into rows ordered like the first record's keys"""
+        def convert(value):
+            kind = type(value)
+            if kind is str or kind is int or kind is float:
+                return value
+            if value is None:
+                return JSONL_NULL
+            if kind is bool:
+                return 'true' if value else 'false'
+            if kind is dict or kind is list:
+                return _json_dumps(value)
+            return value
+
+        yield [convert(first.get(field)) for field in fields]
+        for record in records:
+            yield [convert(record.get(field)) for field in fields]
+
+    @staticmethod
+    def _update_rate(stats: Dict[str, Any], started: float):
+        """Refresh elapsed time and throughput in the statistics"""
+        elapsed = time.monotonic() - started
+        stats['elapsed_seconds'] = round(elapsed, 3)
+        stats['rows_per_second'] = round(stats['rows'] / elapsed, 1) if elapsed > 0 else 0.0
+
+
+def _json_loads(text: str) -> Any:
+    """Parse JSON, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+def _json_dumps(value: Any) -> str:
+    """Serialize JSON, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(value).decode('utf-8')
+    return json.dumps(value)
@@ -0,0 +1,153 @@
+"""
+Candidate Selector Module
+Picks the cheapest of several equivalent SQL formulations by plan cost
+"""
+
+import logging
+from decimal import Decimal
+from typing import Dict, Any, List, Optional, Tuple
+
+from .db_connector import DBConnector
+from .query_router import is_read_only
+from .table_sampler import TableSampler, new_seed
+
+logger = logging.getLogger(__name__)
+
+
+def result_fingerprint(result: Any) -> Tuple:
+    """
+    Order-insensitive fingerprint of a query result
+
+    Column names are ignored, since formulations may alias differently;
+    numbers are normalized so 1.50 and 1.5 compare equal.
+
+    Args:
+        result: Rows as a list of dictionaries
+
+    Returns:
+        Sorted tuple of normalized rows
+    """
+    def normalize(value):
+        if isinstance(value, Decimal):
+            return ('n', float(value.normalize()))
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return ('n', round(float(value), 9))
+        return (type(value).__name__, repr(value))
+
+    rows = [tuple(normalize(value) for value in row.values()) for row in result]
+    return tuple(sorted(rows, key=repr))
+
+
+class CandidateSelector:
+    """
+    Chooses among alternative formulations of a generated query.
+
+    Every candidate is planned with EXPLAIN. Read-only candidates are then
+    run against the same sampled copies of their tables (same seed), and
+    only the candidates agreeing with the largest group of identical
+    results are kept; the one with the lowest estimated cost wins. Write
+    statements cannot be compared without running them, so for those the
+    first candidate that plans is kept and the costs are only reported.
+    """
+
+    def __init__(self, db_connector: DBConnector, table_sampler: Optional[TableSampler] = None):
+        """
+        Initialize the candidate selector
+
+        Args:
+            db_connector: Connector used for EXPLAIN
+            table_sampler: Sampler used for the equivalence check
+                           (default: a TableSampler on the same database)
+        """
+        self.db_connector = db_connector
+        self.table_sampler = table_sampler or TableSampler(db_connector)
+        logger.debug("Candidate selector initialized")
+
+    def select(self, candidates: List[str], seed: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Pick the cheapest results-equivalent candidate
+
+        Args:
+            candidates: Candidate queries, the preferred one first
+            seed: Sample seed for the equivalence check (default: random)
+
+        Returns:
+            Dictionary with the chosen 'sql', its 'index', the 'equivalence'
+            check outcome ('checked', 'inconclusive' when every sampled result
+            was empty, or 'skipped' for writes), the sample 'seed' and a
+            'candidates' table with cost, rows, equivalence and errors
+        """
+        seed = new_seed() if seed is None else seed
+        table = [{
+            'index': index,
+            'sql': candidate,
+            'cost': None,
+            'rows': None,
+            'equivalent': None,
+            'sample_rows': None,
+            'error': None,
+            'selected': False
+        } for index, candidate in enumerate(candidates)]
+
+        for entry in table:
+            entry['cost'], entry['rows'], entry['error'] = self._estimate(entry['sql'])
+        planned = [entry for entry in table if entry['error'] is None]
+
+        equivalence = 'skipped'
+        if planned and all(is_read_only(entry['sql']) for entry in table):
+            equivalence = self._compare(planned, seed)
+            chosen = min((entry for entry in planned if entry['equivalent']),
+                         key=lambda entry: (entry['cost'], entry['index']), default=None)
+        else:
+            chosen = planned[0] if planned else None
+        if chosen is None:
+            chosen = table[0]
+        chosen['selected'] = True
+
+        logger.info(f"Selected candidate {chosen['index'] + 1} of {len(table)} "
+                    f"(cost {chosen['cost']}, equivalence {equivalence})")
+        return {
+            'sql': chosen['sql'],
+            'index': chosen['index'],
+            'equivalence': equivalence,
+            'seed': seed,
+            'candidates': table
+        }
+
+    def _estimate(self, query: str) -> Tuple[Optional[float], Optional[float], Optional[str]]:
+        """EXPLAIN a candidate and read its root cost and row estimate"""
+        if not self.db_connector.conn:
+            if not self.db_connector.connect():
+                return None, None, "Not connected to database"
+        try:
+            with self.db_connector.conn.cursor() as cursor:
+                cursor.execute("EXPLAIN (FORMAT JSON) " + query.strip().rstrip(';'))
+                plan = cursor.fetchone()[0][0]['Plan']
+            return plan['Total Cost'], plan['Plan Rows'], None
+        except Exception as e:
+            return None, None, f"Could not plan: {str(e).strip().splitlines()[0]}"
+        finally:
+            self.db_connector.conn.rollback()
+
+    def _compare(self, planned: List[Dict[str, Any]], seed: int) -> str:
+        """Run planned candidates on the same sample and mark the agreeing majority"""
+        groups: Dict[Tuple, List[Dict[str, Any]]] = {}
+        for entry in planned:
+            success, result, _ = self.table_sampler.execute(entry['sql'], seed=seed)
+            if not success:
+                entry['error'] = f"Sample run failed: {result}"
+                entry['equivalent'] = False
+                continue
+            entry['sample_rows'] = len(result)
+            groups.setdefault(result_fingerprint(result), []).append(entry)
+        if not groups:
+            return 'inconclusive'
+
+        # Largest group wins; ties go to the group holding the preferred candidate
+        majority = max(groups.values(), key=lambda group: (len(group), -group[0]['index']))
+        for entry in planned:
+            if entry['error'] is None:
+                entry['equivalent'] = entry in majority
+        if all(entry['sample_rows'] == 0 for group in groups.values() for entry in group):
+            return 'inconclusive'
+        return 'checked'
@@ -0,0 +1,464 @@
+"""
+Connection Registry Module
+Named database targets, each served by a lazily created, idle-evicted pool
+"""
+
+import os
+import re
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional, Tuple
+import psycopg2
+from psycopg2.extensions import parse_dsn
+
+from .db_connector import DBConnector
+from .schema_cache import drop_schema_cache
+
+logger = logging.getLogger(__name__)
+
+TARGET_NAME_PATTERN = re.compile(r'^[A-Za-z0-9_.-]{1,64}$')
+
+# Name of the target served by the application's own connector
+DEFAULT_TARGET = 'default'
+
+
+class ConnectionRegistryError(Exception):
+    """Raised for unknown targets or when no connection can be handed out"""
+
+
+def load_targets(spec: Optional[str] = None, path: Optional[str] = None) -> Dict[str, str]:
+    """
+    Read connection targets from the environment
+
+    Args:
+        spec: Comma-separated name=dsn pairs (default: POSTGRES_TARGETS)
+        path: JSON file mapping names to DSNs (default: POSTGRES_TARGETS_FILE)
+
+    Returns:
+        Dictionary of target name to DSN
+
+    Raises:
+        ConnectionRegistryError: If an entry is malformed
+    """
+    spec = spec if spec is not None else os.getenv('POSTGRES_TARGETS', '')
+    path = path if path is not None else os.getenv('POSTGRES_TARGETS_FILE', '')
+
+    targets = {}
+    if path:
+        try:
+            with open(path) as f:
+                targets.update(json.load(f))
+        except (OSError, ValueError) as e:
+            raise ConnectionRegistryError(f"Could not read targets file {path}: {e}")
+    for entry in spec.split(','):
+        if not entry.strip():
+            continue
+        name, separator, dsn = entry.partition('=')
+        if not separator or not dsn.strip():
+            raise ConnectionRegistryError(f"Invalid target '{entry.strip()}', expected name=dsn")
+        targets[name.strip()] = dsn.strip()
+
+    for name, dsn in targets.items():
+        if not TARGET_NAME_PATTERN.match(name) or name == DEFAULT_TARGET:
+            raise ConnectionRegistryError(f"Invalid target name '{name}'")
+        if not isinstance(dsn, str):
+            raise ConnectionRegistryError(f"DSN of target '{name}' must be a string")
+    return targets
+
+
+class ConnectionPool:
+    """
+    Bounded pool of connectors for one database.
+
+    Connectors are created on demand up to max_size; callers wait up to
+    acquire_timeout for one to be released beyond that. Connectors that sat
+    idle longer than the idle timeout are closed by evict_idle.
+    """
+
+    def __init__(self, name: str, connection_params: Dict[str, Any], max_size: int, acquire_timeout: float):
+        """
+        Initialize the pool
+
+        Args:
+            name: Target name, for logging
+            connection_params: psycopg2 connection parameters
+            max_size: Maximum number of open connectors
+            acquire_timeout: Seconds to wait for a free connector
+        """
+        self.name = name
+        self.connection_params = connection_params
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self.last_used = time.monotonic()
+        self._idle: List[Tuple[DBConnector, float]] = []
+        self._in_use: List[DBConnector] = []
+        self._condition = threading.Condition()
+
+    @property
+    def in_use(self) -> int:
+        """Number of checked-out connectors"""
+        with self._condition:
+            return len(self._in_use)
+
+    def acquire(self) -> DBConnector:
+        """
+        Check out a connected connector
+
+        Returns:
+            A connector for the caller's exclusive use until release()
+
+        Raises:
+            ConnectionRegistryError: If the pool stays exhausted or the database is unreachable
+        """
+        deadline = time.monotonic() + self.acquire_timeout
+        with self._condition:
+            while True:
+                self.last_used = time.monotonic()
+                while self._idle:
+                    connector, _ = self._idle.pop()
+                    if connector.conn is not None and not connector.conn.closed:
+                        self._in_use.append(connector)
+                        return connector
+                    connector.disconnect()
+                if len(self._in_use) < self.max_size:
+                    connector = DBConnector(self.connection_params)
+                    self._in_use.append(connector)
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._condition.wait(remaining):
+                    raise ConnectionRegistryError(
+                        f"All {self.max_size} connections of target '{self.name}' are busy"
+                    )
+
+        if not connector.connect():
+            self._discard(connector)
+            raise ConnectionRegistryError(f"Could not connect to target '{self.name}'")
+        return connector
+
+    def release(self, connector: DBConnector):
+        """
+        Return a connector to the pool
+
+        Args:
+            connector: Connector obtained from acquire()
+        """
+        try:
+            if connector.conn is not None and not connector.conn.closed:
+                # Never hand out a connection with an open transaction
+                if connector.conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    connector.conn.rollback()
+        except psycopg2.Error:
+            connector.disconnect()
+
+        with self._condition:
+            owned = connector in self._in_use
+            if owned:
+                self._in_use.remove(connector)
+                if connector.conn is not None and not connector.conn.closed:
+                    self._idle.append((connector, time.monotonic()))
+            self.last_used = time.monotonic()
+            self._condition.notify()
+        if not owned:
+            # Checked out from a pool that has since been closed
+            connector.disconnect()
+
+    def evict_idle(self, idle_seconds: float) -> int:
+        """
+        Close connectors that have been idle too long
+
+        Args:
+            idle_seconds: Idle time after which a connector is closed
+
+        Returns:
+            Number of connectors closed
+        """
+        cutoff = time.monotonic() - idle_seconds
+        with self._condition:
+            expired = [connector for connector, released in self._idle if released < cutoff]
+            self._idle = [(connector, released) for connector, released in self._idle if released >= cutoff]
+        for connector in expired:
+            connector.disconnect()
+        return len(expired)
+
+    def close(self):
+        """Close all idle connectors; checked-out ones are closed when they are released"""
+        with self._condition:
+            idle, self._idle = self._idle, []
+        for connector, _ in idle:
+            connector.disconnect()
+
+    def cancel_query(self, query_id: str) -> bool:
+        """Cancel a query running on one of the checked-out connectors"""
+        with self._condition:
+            connectors = list(self._in_use)
+        return any(connector.cancel_query(query_id)[0] for connector in connectors
+                   if connector.is_running(query_id))
+
+    def stats(self) -> Dict[str, Any]:
+        """Pool size and usage"""
+        with self._condition:
+            return {
+                'in_use': len(self._in_use),
+                'idle': len(self._idle),
+                'max_size': self.max_size,
+                'idle_for_seconds': round(time.monotonic() - self.last_used, 1)
+            }
+
+    def _discard(self, connector: DBConnector):
+        """Forget a connector that could not connect"""
+        with self._condition:
+            if connector in self._in_use:
+                self._in_use.remove(connector)
+            self._condition.notify()
+
+
+class ConnectionRegistry:
+    """
+    Registry of named connection targets.
+
+    The application's own connector serves the 'default' target. Every other
+    target gets a ConnectionPool when it is first used. Idle connections are
+    closed after POSTGRES_POOL_IDLE_SECONDS and idle pools are dropped, so
+    the number of pools stays bounded (POSTGRES_MAX_POOLS) even when clients
+    cycle through many targets; when the limit is reached the least recently
+    used pool without checked-out connections is evicted.
+    """
+
+    def __init__(self, default: DBConnector, targets: Optional[Dict[str, str]] = None,
+                 pool_size: Optional[int] = None, max_pools: Optional[int] = None,
+                 idle_seconds: Optional[float] = None, acquire_timeout: Optional[float] = None):
+        """
+        Initialize the connection registry
+
+        Args:
+            default: Connector of the default target
+            targets: Target name to DSN (default: POSTGRES_TARGETS and POSTGRES_TARGETS_FILE)
+            pool_size: Connections per target (default: POSTGRES_POOL_SIZE, or 5)
+            max_pools: Most pools open at once (default: POSTGRES_MAX_POOLS, or 32)
+            idle_seconds: Idle time before connections and pools are closed
+                          (default: POSTGRES_POOL_IDLE_SECONDS, or 300)
+            acquire_timeout: Seconds to wait for a free connection
+                             (default: POSTGRES_POOL_ACQUIRE_TIMEOUT, or 10)
+        """
+        self.default = default
+        self.targets = dict(targets) if targets is not None else load_targets()
+        self.pool_size = pool_size if pool_size is not None else int(os.getenv('POSTGRES_POOL_SIZE', '5'))
+        self.max_pools = max_pools if max_pools is not None else int(os.getenv('POSTGRES_MAX_POOLS', '32'))
+        self.idle_seconds = idle_seconds if idle_seconds is not None else float(os.getenv('POSTGRES_POOL_IDLE_SECONDS', '300'))
+        self.acquire_timeout = acquire_timeout if acquire_timeout is not None else float(os.getenv('POSTGRES_POOL_ACQUIRE_TIMEOUT', '10'))
+        self._pools: Dict[str, ConnectionPool] = {}
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+        logger.debug(f"Connection registry initialized with {len(self.targets)} target(s)")
+
+    def names(self) -> List[str]:
+        """Names of all targets, the default first"""
+        return [DEFAULT_TARGET] + sorted(self.targets)
+
+    def add_target(self, name: str, dsn: str):
+        """
+        Register or replace a target
+
+        Args:
+            name: Target name
+            dsn: Connection string
+        """
+        if not TARGET_NAME_PATTERN.match(name) or name == DEFAULT_TARGET:
+            raise ConnectionRegistryError(f"Invalid target name '{name}'")
+        parse_dsn(dsn)
+        with self._lock:
+            self.targets[name] = dsn
+            pool = self._pools.pop(name, None)
+        if pool is not None:
+            self._close_pool(pool)
+
+    def remove_target(self, name: str):
+        """
+        Unregister a target and close its idle connections
+
+        Args:
+            name: Target name
+        """
+        with self._lock:
+            if self.targets.pop(name, None) is None:
+                raise ConnectionRegistryError(f"Unknown target '{name}'")
+            pool = self._pools.pop(name, None)
+        if pool is not None:
+            self._close_pool(pool)
+
+    def acquire(self, name: str) -> DBConnector:
+        """
+        Check out a connector for a target
+
+        Args:
+            name: Target name; pass the result to release() when done
+
+        Returns:
+            A connected connector (the shared default connector for 'default')
+
+        Raises:
+            ConnectionRegistryError: For unknown targets or exhausted pools
+        """
+        if name == DEFAULT_TARGET:
+            return self.default
+        return self._pool(name).acquire()
+
+    def release(self, name: str, connector: DBConnector):
+        """
+        Return a connector obtained from acquire()
+
+        Args:
+            name: Target name
+            connector: The connector
+        """
+        if name == DEFAULT_TARGET:
+            return
+        with self._lock:
+            pool = self._pools.get(name)
+        if pool is not None:
+            pool.release(connector)
+        else:
+            # The pool was evicted or the target removed while the connector was out
+            connector.disconnect()
+        self._sweep()
+
+    @contextmanager
+    def connection(self, name: str):
+        """
+        Context manager around acquire() and release()
+
+        Args:
+            name: Target name
+
+        Yields:
+            A connector for the target
+        """
+        connector = self.acquire(name)
+        try:
+            yield connector
+        finally:
+            self.release(name, connector)
+
+    def resolve(self, name_or_dsn: str) -> Dict[str, Any]:
+        """
+        Connection parameters of a target name or a connection string
+
+        Args:
+            name_or_dsn: Registered target name, or a DSN / URI
+
+        Returns:
+            psycopg2 connection parameters
+        """
+        if name_or_dsn in self.targets:
+            return parse_dsn(self.targets[name_or_dsn])
+        if name_or_dsn == DEFAULT_TARGET:
+            return dict(self.default.connection_params)
+        try:
+            return parse_dsn(name_or_dsn)
+        except psycopg2.ProgrammingError:
+            raise ConnectionRegistryError(f"'{name_or_dsn}' is neither a target nor a valid connection string")
+
+    def cancel_query(self, name: str, query_id: str) -> Tuple[bool, str]:
+        """
+        Cancel a query running on a target
+
+        Args:
+            name: Target name
+            query_id: ID the query was started with
+
+        Returns:
+            A tuple containing (success, message)
+        """
+        if name == DEFAULT_TARGET:
+            return self.default.cancel_query(query_id)
+        with self._lock:
+            pool = self._pools.get(name)
+        if pool is not None and pool.cancel_query(query_id):
+            return True, f"Cancellation requested for query {query_id}"
+        return False, f"No running query with ID {query_id} on target '{name}'"
+
+    def status(self) -> List[Dict[str, Any]]:
+        """
+        Describe the targets and their pools; passwords are not included
+
+        Returns:
+            One entry per target
+        """
+        with self._lock:
+            pools = dict(self._pools)
+        result = []
+        for name in self.names():
+            params = self.default.connection_params if name == DEFAULT_TARGET else parse_dsn(self.targets[name])
+            result.append({
+                'name': name,
+                'host': params.get('host', 'localhost'),
+                'port': str(params.get('port', '5432')),
+                'database': params.get('database') or params.get('dbname'),
+                'pool': pools[name].stats() if name in pools else None
+            })
+        return result
+
+    def close(self):
+        """Close every pool"""
+        with self._lock:
+            pools, self._pools = list(self._pools.values()), {}
+        for pool in pools:
+            self._close_pool(pool)
+
+    def _pool(self, name: str) -> ConnectionPool:
+        """Get or lazily create the pool of a target, evicting pools to stay within max_pools"""
+        self._sweep()
+        evicted = []
+        with self._lock:
+            if name not in self.targets:
+                raise ConnectionRegistryError(f"Unknown target '{name}'")
+            pool = self._pools.get(name)
+            if pool is None:
+                while len(self._pools) >= self.max_pools:
+                    idle = [p for p in self._pools.values() if p.in_use == 0]
+                    if not idle:
+                        raise ConnectionRegistryError(
+                            f"All {self.max_pools} connection pools are busy; try again later"
+                        )
+                    victim = min(idle, key=lambda p: p.last_used)
+                    evicted.append(self._pools.pop(victim.name))
+                pool = ConnectionPool(name, parse_dsn(self.targets[name]), self.pool_size, self.acquire_timeout)
+                self._pools[name] = pool
+                logger.info(f"Created connection pool for target '{name}'")
+        for victim in evicted:
+            logger.info(f"Evicted connection pool of target '{victim.name}'")
+            self._close_pool(victim)
+        return pool
+
+    def _sweep(self):
+        """Close idle connections and drop idle pools, at most every few seconds"""
+        now = time.monotonic()
+        interval = min(self.idle_seconds / 2, 30.0)
+        with self._lock:
+            if now - self._last_sweep < interval:
+                return
+            self._last_sweep = now
+            pools = list(self._pools.values())
+
+        for pool in pools:
+            pool.evict_idle(self.idle_seconds)
+        with self._lock:
+            expired = [
+                self._pools.pop(pool.name) for pool in pools
+                if self._pools.get(pool.name) is pool and pool.in_use == 0
+                and now - pool.last_used >= self.idle_seconds
+            ]
+        for pool in expired:
+            logger.info(f"Dropped idle connection pool of target '{pool.name}'")
+            self._close_pool(pool)
+
+    def _close_pool(self, pool: ConnectionPool):
+        """Close a pool and the schema cache of its database, unless another pool still uses it"""
+        pool.close()
+        with self._lock:
+            shared = [p.connection_params for p in self._pools.values()]
+        if pool.connection_params not in shared + [self.default.connection_params]:
+            drop_schema_cache(pool.connection_params)
@@ -0,0 +1,344 @@
+"""
+Data Exporter Module
+Streams table and query results out of PostgreSQL as CSV or Parquet
+"""
+
+import json
+import zlib
+import queue
+import logging
+import threading
+from decimal import Decimal
+from typing import Dict, Any, Iterator, Optional, Tuple
+import psycopg2
+import sqlparse
+from psycopg2 import sql
+from sqlparse import tokens as T
+
+from .db_connector import DBConnector
+from .query_router import is_read_only
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = ('csv', 'parquet')
+CSV_COMPRESSIONS = (None, 'gzip')
+PARQUET_COMPRESSIONS = (None, 'snappy', 'gzip', 'zstd')
+
+# Rows fetched per round trip and written per Parquet row group
+PARQUET_BATCH_ROWS = 50000
+
+# Size of the chunks handed to the HTTP response, and how many are buffered
+CHUNK_SIZE = 256 * 1024
+QUEUE_DEPTH = 16
+
+_DONE = object()
+
+
+class ExportError(Exception):
+    """Raised when an export request is invalid or the export fails"""
+
+
+def normalize_options(fmt: Optional[str], compression: Optional[str]) -> Tuple[str, Optional[str]]:
+    """
+    Normalize and validate export options
+
+    Args:
+        fmt: Output format, any case (default: 'csv')
+        compression: Compression, any case; empty or 'none' for none
+
+    Returns:
+        A tuple containing (format, compression) in the form the exporter uses
+
+    Raises:
+        ExportError: If the format or compression is not supported
+    """
+    fmt = (fmt or 'csv').lower()
+    compression = (compression or '').lower() or None
+    if compression == 'none':
+        compression = None
+    if fmt not in EXPORT_FORMATS:
+        raise ExportError(f"Unsupported export format: {fmt}")
+    if fmt == 'csv' and compression not in CSV_COMPRESSIONS:
+        raise ExportError(f"Unsupported CSV compression: {compression}")
+    if fmt == 'parquet' and compression not in PARQUET_COMPRESSIONS:
+        raise ExportError(f"Unsupported Parquet compression: {compression}")
+    return fmt, compression
+
+
+def _parentheses_balanced(statement: sqlparse.sql.Statement) -> bool:
+    """Check that no closing parenthesis ends the COPY (...) the statement is wrapped in"""
+    depth = 0
+    for token in statement.flatten():
+        if token.ttype in T.Punctuation:
+            depth += {'(': 1, ')': -1}.get(token.value, 0)
+            if depth < 0:
+                return False
+    return depth == 0
+
+
+class _ChunkQueueWriter:
+    """
+    File-like object that hands written data to a bounded queue.
+
+    Small writes (COPY emits one per row) are coalesced into CHUNK_SIZE
+    chunks, and the bounded queue applies back-pressure on the database
+    side, so an export never holds more than QUEUE_DEPTH chunks in memory.
+    """
+
+    def __init__(self, chunks: "queue.Queue", cancelled: threading.Event):
+        self.chunks = chunks
+        self.cancelled = cancelled
+        self.closed = False
+        self.position = 0
+        self.buffer = bytearray()
+
+    def write(self, data) -> int:
+        if self.cancelled.is_set():
+            raise ExportError("Export cancelled by client")
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        self.buffer += data
+        self.position += len(data)
+        if len(self.buffer) >= CHUNK_SIZE:
+            self.flush()
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        if not self.buffer:
+            return
+        chunk = bytes(self.buffer)
+        self.buffer.clear()
+        while True:
+            try:
+                self.chunks.put(chunk, timeout=1)
+                return
+            except queue.Full:
+                if self.cancelled.is_set():
+                    raise ExportError("Export cancelled by client")
+
+    def close(self):
+        self.flush()
+        self.closed = True
+
+
+class DataExporter:
+    """
+    Streams query and table results with constant memory.
+
+    Each export runs on its own read-only connection in a background thread,
+    so the shared connection stays free and the HTTP response is fed as fast
+    as the client consumes it.
+    """
+
+    def __init__(self, db_connector: DBConnector):
+        """
+        Initialize the data exporter
+
+        Args:
+            db_connector: Database connector whose connection parameters are used
+        """
+        self.db_connector = db_connector
+        logger.debug("Data exporter initialized")
+
+    def export_query(self, query: str, fmt: str = 'csv',
+                     compression: Optional[str] = None) -> Iterator[bytes]:
+        """
+        Export the result of a single SELECT statement
+
+        Args:
+            query: SELECT statement to export
+            fmt: Output format ('csv' or 'parquet')
+            compression: 'gzip' for CSV; 'snappy', 'gzip' or 'zstd' for Parquet
+
+        Returns:
+            Iterator of encoded chunks. The first chunk is produced before this
+            method returns, so query errors raise ExportError immediately.
+        """
+        statements = [s for s in sqlparse.parse(query) if s.token_first(skip_cm=True)]
+        # The statement is placed inside COPY (...), so it must not be able to close it
+        if (len(statements) != 1 or not is_read_only(str(statements[0]))
+                or not _parentheses_balanced(statements[0])):
+            raise ExportError("Only a single read-only SELECT statement can be exported")
+        select_sql = str(statements[0]).strip().rstrip(';')
+        return self._start(fmt, compression, select_sql, None)
+
+    def export_table(self, table_name: str, schema_name: str = 'public', fmt: str = 'csv',
+                     compression: Optional[str] = None) -> Iterator[bytes]:
+        """
+        Export a whole table
+
+        Args:
+            table_name: Name of the table
+            schema_name: Schema of the table (default: 'public')
+            fmt: Output format ('csv' or 'parquet')
+            compression: 'gzip' for CSV; 'snappy', 'gzip' or 'zstd' for Parquet
+
+        Returns:
+            Iterator of encoded chunks
+        """
+        table = sql.SQL("{}.{}").format(sql.Identifier(schema_name), sql.Identifier(table_name))
+        return self._start(fmt, compression, None, table)
+
+    def _start(self, fmt: str, compression: Optional[str], select_sql: Optional[str],
+               table: Optional[sql.Composable]) -> Iterator[bytes]:
+        """Validate options, start the producer thread and prime the stream"""
+        fmt, compression = normalize_options(fmt, compression)
+        if fmt == 'parquet':
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                raise ExportError("Parquet export requires the pyarrow package")
+
+        chunks: "queue.Queue" = queue.Queue(maxsize=QUEUE_DEPTH)
+        cancelled = threading.Event()
+        writer = _ChunkQueueWriter(chunks, cancelled)
+
+        if fmt == 'csv':
+            target = self._produce_csv
+        else:
+            target = self._produce_parquet
+        thread = threading.Thread(
+            target=self._run_producer,
+            args=(target, writer, chunks, select_sql, table, compression),
+            name='data-export',
+            daemon=True
+        )
+        thread.start()
+
+        stream = self._consume(chunks, cancelled, fmt == 'csv' and compression == 'gzip')
+        try:
+            first = next(stream)
+        except StopIteration:
+            first = b''
+        return self._chain(first, stream)
+
+    @staticmethod
+    def _chain(first: bytes, stream: Iterator[bytes]) -> Iterator[bytes]:
+        """Yield the primed first chunk followed by the rest of the stream"""
+        try:
+            if first:
+                yield first
+            yield from stream
+        finally:
+            stream.close()
+
+    def _run_producer(self, target, writer: _ChunkQueueWriter, chunks: "queue.Queue",
+                      select_sql: Optional[str], table: Optional[sql.Composable],
+                      compression: Optional[str]):
+        """Run an export on a dedicated read-only connection"""
+        conn = None
+        try:
+            conn = psycopg2.connect(**self.db_connector.connection_params)
+            conn.set_session(readonly=True)
+            target(conn, writer, select_sql, table, compression)
+            writer.flush()
+            conn.rollback()
+            result = _DONE
+        except Exception as e:
+            if not writer.cancelled.is_set():
+                logger.error(f"Error exporting data: {e}")
+            result = e
+        finally:
+            if conn is not None:
+                conn.close()
+        try:
+            chunks.put(result, timeout=5)
+        except queue.Full:
+            pass
+
+    @staticmethod
+    def _consume(chunks: "queue.Queue", cancelled: threading.Event,
+                 gzip_output: bool) -> Iterator[bytes]:
+        """Yield chunks from the producer, compressing them on the fly"""
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if gzip_output else None
+        try:
+            while True:
+                item = chunks.get()
+                if item is _DONE:
+                    break
+                if isinstance(item, Exception):
+                    raise ExportError(str(item).split('\n')[0])
+                if compressor:
+                    item = compressor.compress(item)
+                    if not item:
+                        continue
+                yield item
+            if compressor:
+                yield compressor.flush()
+        finally:
+            cancelled.set()
+
+    @staticmethod
+    def _produce_csv(conn, writer: _ChunkQueueWriter, select_sql: Optional[str],
+                     table: Optional[sql.Composable], compression: Optional[str]):
+        """Stream COPY ... TO STDOUT output into the writer"""
+        # Newlines keep a trailing line comment from swallowing the closing parenthesis
+        source = sql.SQL("(\n{}\n)").format(sql.SQL(select_sql)) if select_sql else table
+        copy = sql.SQL("COPY {} TO STDOUT WITH (FORMAT csv, HEADER true)").format(source)
+        with conn.cursor() as cursor:
+            cursor.copy_expert(copy.as_string(conn), writer)
+
+    def _produce_parquet(self, conn, writer: _ChunkQueueWriter, select_sql: Optional[str],
+                         table: Optional[sql.Composable], compression: Optional[str]):
+        """Fetch rows through a server-side cursor and write Parquet row groups"""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        query = sql.SQL(select_sql) if select_sql else sql.SQL("SELECT * FROM {}").format(table)
+        with conn.cursor(name='sql_gpt_export') as cursor:
+            cursor.itersize = PARQUET_BATCH_ROWS
+            cursor.execute(query)
+            rows = cursor.fetchmany(PARQUET_BATCH_ROWS)
+            schema = pa.schema([
+                (column.name, _arrow_type(pa, column.type_code)) for column in cursor.description
+            ])
+            parquet_writer = pq.ParquetWriter(writer, schema, compression=compression or 'none')
+            try:
+                while rows:
+                    columns = list(zip(*rows))
+                    arrays = [
+                        pa.array(_to_arrow_values(values, field.type, pa), type=field.type)
+                        for values, field in zip(columns, schema)
+                    ]
+                    parquet_writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+                    rows = cursor.fetchmany(PARQUET_BATCH_ROWS)
+            finally:
+                parquet_writer.close()
+
+
+def _arrow_type(pa, type_code: int):
+    """Map a PostgreSQL type OID to an Arrow type; unknown types become strings"""
+    mapping = {
+        16: pa.bool_(),
+        17: pa.binary(),
+        20: pa.int64(),
+        21: pa.int16(),
+        23: pa.int32(),
+        26: pa.int64(),
+        700: pa.float32(),
+        701: pa.float64(),
+        1082: pa.date32(),
+        1114: pa.timestamp('us'),
+        1184: pa.timestamp('us', tz='UTC'),
+    }
+    return mapping.get(type_code, pa.string())
+
+
+def _to_arrow_values(values, arrow_type, pa) -> list:
+    """Convert Python values that Arrow cannot infer into strings"""
+    if arrow_type != pa.string():
+        return list(values)
+    converted = []
+    for value in values:
+        if value is None or isinstance(value, str):
+            converted.append(value)
+        elif isinstance(value, (dict, list)):
+            converted.append(json.dumps(value, default=str))
+        elif isinstance(value, Decimal):
+            converted.append(format(value, 'f'))
+        else:
+            converted.append(str(value))
+    return converted
@@ -3,27 +3,73 @@ Database Browser Module
 Provides functionality for browsing PostgreSQL database contents
 """
 
+import re
 import logging
 from typing import Dict, Any, List, Optional, Tuple, Union
+from psycopg2.extras import RealDictCursor
 from .db_connector import DBConnector
+from .query_router import QueryRouter
+from .table_sampler import tablesample_clause
 
 logger = logging.getLogger(__name__)
 
+# Ordinary and partitioned tables outside the system schemas
+USER_TABLES_FILTER = """c.relkind IN ('r', 'p')
+                    AND n.nspname NOT IN ('pg_catalog', 'information_schema')
+                    AND n.nspname NOT LIKE 'pg\\_toast%%'
+                    AND n.nspname NOT LIKE 'pg\\_temp\\_%%'"""
+
+COLUMN_COUNT_SQL = """(SELECT count(*) FROM pg_catalog.pg_attribute a
+                        WHERE a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped)"""
+
+# Partitioned tables hold no data themselves; report the size of their partitions
+TABLE_SIZE_SQL = """CASE WHEN c.relkind = 'p'
+                        THEN (SELECT coalesce(sum(pg_catalog.pg_total_relation_size(p.relid)), 0)::bigint
+                              FROM pg_catalog.pg_partition_tree(c.oid) p)
+                        ELSE pg_catalog.pg_total_relation_size(c.oid) END"""
+
 class DBBrowser:
     """
     Provides functionality for browsing PostgreSQL database contents
     """
     
-    def __init__(self, db_connector: DBConnector):
+    def __init__(self, db_connector: DBConnector, query_router: Optional[QueryRouter] = None):
         """
         Initialize the database browser
         
         Args:
             db_connector: Database connector instance
+            query_router: Optional router that sends browser reads to a read replica
         """
         self.db_connector = db_connector
+        self.query_router = query_router
         logger.debug("Database browser initialized")
     
+    @property
+    def schema_version(self) -> int:
+        """Version of the cached schema metadata, usable as a cache key"""
+        return self.db_connector.schema_cache.version
+    
+    def _connector(self) -> DBConnector:
+        """Connector to read from: a read replica when routing is enabled, else the primary"""
+        if self.query_router is not None:
+            return self.query_router.read_connector()
+        return self.db_connector
+    
+    def _cached(self, connector: DBConnector, key: Tuple, loader):
+        """
+        Serve catalog metadata from the process-wide schema cache
+        
+        Args:
+            connector: Connector the metadata is read through
+            key: Cache key for the metadata
+            loader: Callable reading the metadata from the database
+            
+        Returns:
+            The cached or freshly loaded metadata
+        """
+        return connector.schema_cache.get(key, loader, connector.conn)
+    
     def get_schemas(self) -> List[str]:
         """
         Get all schemas in the database
@@ -31,28 +77,34 @@ class DBBrowser:
         Returns:
             List of schema names
         """
-        if not self.db_connector.conn:
-            if not self.db_connector.connect():
+        connector = self._connector()
+        if not connector.conn:
+            if not connector.connect():
                 return []
         
         try:
-            with self.db_connector.conn.cursor() as cursor:
-                cursor.execute("""
-                    SELECT 
-                        schema_name
-                    FROM 
-                        information_schema.schemata
-                    WHERE 
-                        schema_name NOT IN ('pg_catalog', 'information_schema')
-                    ORDER BY 
-                        schema_name;
-                """)
-                schemas = cursor.fetchall()
-                return [schema[0] for schema in schemas]
+            return self._cached(connector, ('schemas',), lambda: self._fetch_schemas(connector))
         except Exception as e:
+            connector.conn.rollback()
             logger.error(f"Error getting schemas: {e}")
             return []
     
+    def _fetch_schemas(self, connector: DBConnector) -> List[str]:
+        """Read schema names from the catalog"""
+        with connector.conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT 
+                    schema_name
+                FROM 
+                    information_schema.schemata
+                WHERE 
+                    schema_name NOT IN ('pg_catalog', 'information_schema')
+                ORDER BY 
+                    schema_name;
+            """)
+            schemas = cursor.fetchall()
+            return [schema[0] for schema in schemas]
+    
     def get_tables(self) -> List[Dict[str, Any]]:
         """
         Get all tables in the database
@@ -60,44 +112,175 @@ class DBBrowser:
         Returns:
             List of tables with schema and description
         """
-        if not self.db_connector.conn:
-            if not self.db_connector.connect():
+        connector = self._connector()
+        if not connector.conn:
+            if not connector.connect():
                 return []
         
         try:
-            with self.db_connector.conn.cursor() as cursor:
-                cursor.execute("""
+            return self._cached(connector, ('tables',), lambda: self._fetch_tables(connector))
+        except Exception as e:
+            connector.conn.rollback()
+            logger.error(f"Error getting tables: {e}")
+            return []
+    
+    def _fetch_tables(self, connector: DBConnector) -> List[Dict[str, Any]]:
+        """Read the table list from the catalog"""
+        with connector.conn.cursor() as cursor:
+            cursor.execute(f"""
+                SELECT 
+                    c.relname,
+                    n.nspname,
+                    pg_catalog.obj_description(c.oid, 'pg_class') as table_description,
+                    {COLUMN_COUNT_SQL} as column_count,
+                    {TABLE_SIZE_SQL} as table_size
+                FROM 
+                    pg_catalog.pg_class c
+                JOIN 
+                    pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+                WHERE 
+                    {USER_TABLES_FILTER}
+                ORDER BY 
+                    n.nspname, c.relname;
+            """)
+            tables = cursor.fetchall()
+            result = []
+            for table in tables:
+                result.append({
+                    'table_name': table[0],
+                    'table_schema': table[1],
+                    'table_description': table[2],
+                    'column_count': table[3],
+                    'table_size': table[4]
+                })
+            return result
+    
+    def list_tables(self, search: Optional[str] = None, schema_name: Optional[str] = None,
+                    limit: int = 100, offset: int = 0, include_partitions: bool = False) -> Dict[str, Any]:
+        """
+        Get one page of the table list, filtered on the server
+        
+        Only pg_class is read, so the page is cheap on databases with tens of
+        thousands of tables. Column counts, sizes and row estimates are left
+        out; fetch them for the visible page with get_table_stats. The page
+        only changes with the catalog, so it can be cached by schema version,
+        while row estimates change with every ANALYZE.
+        
+        Args:
+            search: Case-insensitive substring of the table name
+            schema_name: Only list tables in this schema
+            limit: Maximum number of tables to return
+            offset: Number of tables to skip
+            include_partitions: Also list the partitions of partitioned tables
+            
+        Returns:
+            Dictionary with the page of tables, the total number of matching
+            tables, and the limit and offset used
+        """
+        page = {'tables': [], 'total': 0, 'limit': limit, 'offset': offset}
+        connector = self._connector()
+        if not connector.conn:
+            if not connector.connect():
+                return page
+        
+        pattern = None
+        if search:
+            pattern = '%' + re.sub(r'([\\%_])', r'\\\1', search) + '%'
+        params = (schema_name, schema_name, pattern, pattern, include_partitions)
+        filters = f"""
+                    {USER_TABLES_FILTER}
+                    AND (%s::text IS NULL OR n.nspname = %s::text)
+                    AND (%s::text IS NULL OR c.relname ILIKE %s::text)
+                    AND (%s::boolean OR NOT c.relispartition)
+        """
+        try:
+            with connector.conn.cursor() as cursor:
+                connector.execute_prepared(cursor, f"""
+                    SELECT count(*)
+                    FROM pg_catalog.pg_class c
+                    JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+                    WHERE {filters};
+                """, params)
+                page['total'] = cursor.fetchone()[0]
+                
+                connector.execute_prepared(cursor, f"""
                     SELECT 
-                        t.table_name, 
-                        t.table_schema,
-                        pg_catalog.obj_description(pgc.oid, 'pg_class') as table_description,
-                        (SELECT COUNT(*) FROM information_schema.columns c WHERE c.table_name = t.table_name AND c.table_schema = t.table_schema) as column_count,
-                        (SELECT pg_total_relation_size(quote_ident(t.table_schema) || '.' || quote_ident(t.table_name))) as table_size
+                        c.relname,
+                        n.nspname,
+                        pg_catalog.obj_description(c.oid, 'pg_class'),
+                        c.relkind = 'p',
+                        c.relispartition
                     FROM 
-                        information_schema.tables t
-                    JOIN 
-                        pg_catalog.pg_class pgc ON pgc.relname = t.table_name
+                        pg_catalog.pg_class c
                     JOIN 
-                        pg_catalog.pg_namespace pgn ON pgn.oid = pgc.relnamespace AND pgn.nspname = t.table_schema
-                    WHERE 
-                        t.table_schema NOT IN ('pg_catalog', 'information_schema')
-                        AND t.table_type = 'BASE TABLE'
+                        pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+                    WHERE {filters}
                     ORDER BY 
-                        t.table_schema, t.table_name;
-                """)
-                tables = cursor.fetchall()
-                result = []
-                for table in tables:
-                    result.append({
+                        n.nspname, c.relname
+                    LIMIT %s OFFSET %s;
+                """, params + (limit, offset))
+                for table in cursor.fetchall():
+                    page['tables'].append({
                         'table_name': table[0],
                         'table_schema': table[1],
                         'table_description': table[2],
-                        'column_count': table[3],
-                        'table_size': table[4]
+                        'is_partitioned': table[3],
+                        'is_partition': table[4]
                     })
-                return result
+            connector.conn.commit()
+            return page
         except Exception as e:
-            logger.error(f"Error getting tables: {e}")
+            connector.conn.rollback()
+            logger.error(f"Error listing tables: {e}")
+            return page
+    
+    def get_table_stats(self, tables: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+        """
+        Get column counts and sizes for a set of tables, e.g. the visible page
+        
+        Args:
+            tables: (schema_name, table_name) pairs
+            
+        Returns:
+            List of table statistics; tables that do not exist are left out
+        """
+        connector = self._connector()
+        if not tables:
+            return []
+        if not connector.conn:
+            if not connector.connect():
+                return []
+        
+        try:
+            with connector.conn.cursor() as cursor:
+                connector.execute_prepared(cursor, f"""
+                    SELECT 
+                        n.nspname,
+                        c.relname,
+                        {COLUMN_COUNT_SQL},
+                        {TABLE_SIZE_SQL},
+                        CASE WHEN c.reltuples < 0 THEN NULL ELSE c.reltuples::bigint END
+                    FROM 
+                        unnest(%s::text[], %s::text[]) AS t(schema_name, table_name)
+                    JOIN 
+                        pg_catalog.pg_namespace n ON n.nspname = t.schema_name
+                    JOIN 
+                        pg_catalog.pg_class c ON c.relnamespace = n.oid AND c.relname = t.table_name
+                    WHERE 
+                        c.relkind IN ('r', 'p');
+                """, ([schema for schema, _ in tables], [table for _, table in tables]))
+                rows = cursor.fetchall()
+            connector.conn.commit()
+            return [{
+                'table_schema': row[0],
+                'table_name': row[1],
+                'column_count': row[2],
+                'table_size': row[3],
+                'estimated_rows': row[4]
+            } for row in rows]
+        except Exception as e:
+            connector.conn.rollback()
+            logger.error(f"Error getting table stats: {e}")
             return []
     
     def get_table_structure(self, table_name: str, schema_name: str = 'public') -> List[Dict[str, Any]]:
@@ -111,52 +294,65 @@ class DBBrowser:
         Returns:
             List of columns with their properties
         """
-        if not self.db_connector.conn:
-            if not self.db_connector.connect():
+        connector = self._connector()
+        if not connector.conn:
+            if not connector.connect():
                 return []
         
         try:
-            with self.db_connector.conn.cursor(cursor_factory=self.db_connector.conn.cursor_factory) as cursor:
-                cursor.execute("""
-                    SELECT 
-                        column_name, 
-                        data_type, 
-                        is_nullable,
-                        column_default,
-                        character_maximum_length,
-                        numeric_precision,
-                        numeric_scale,
-                        pg_catalog.col_description(format('%s.%s', table_schema, table_name)::regclass::oid, ordinal_position) as column_description,
-                        CASE 
-                            WHEN pk.column_name IS NOT NULL THEN true 
-                            ELSE false 
-                        END as is_primary_key
-                    FROM 
-                        information_schema.columns c
-                    LEFT JOIN (
-                        SELECT 
-                            kcu.column_name, 
-                            kcu.table_name,
-                            kcu.table_schema
-                        FROM 
-                            information_schema.table_constraints tc
-                        JOIN 
-                            information_schema.key_column_usage kcu ON kcu.constraint_name = tc.constraint_name
-                        WHERE 
-                            tc.constraint_type = 'PRIMARY KEY'
-                    ) pk ON pk.column_name = c.column_name AND pk.table_name = c.table_name AND pk.table_schema = c.table_schema
-                    WHERE 
-                        c.table_name = %s AND c.table_schema = %s
-                    ORDER BY 
-                        ordinal_position;
-                """, (table_name, schema_name))
-                columns = cursor.fetchall()
-                return [dict(column) for column in columns]
+            return self._cached(
+                connector,
+                ('table_structure', schema_name, table_name),
+                lambda: self._fetch_table_structure(connector, table_name, schema_name)
+            )
         except Exception as e:
+            connector.conn.rollback()
             logger.error(f"Error getting table structure: {e}")
             return []
     
-    def get_table_data(self, table_name: str, schema_name: str = 'public', limit: int = 100, offset: int = 0, order_by: str = None, order_dir: str = 'ASC') -> List[Dict[str, Any]]:
+    def _fetch_table_structure(self, connector: DBConnector, table_name: str, schema_name: str) -> List[Dict[str, Any]]:
+        """Read the column definitions of a table from the catalog"""
+        with connector.conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            connector.execute_prepared(cursor, """
+                SELECT 
+                    c.column_name, 
+                    c.data_type, 
+                    c.is_nullable,
+                    c.column_default,
+                    c.character_maximum_length,
+                    c.numeric_precision,
+                    c.numeric_scale,
+                    c.is_identity,
+                    c.is_generated,
+                    pg_catalog.col_description(format('%%I.%%I', c.table_schema, c.table_name)::regclass::oid, c.ordinal_position) as column_description,
+                    CASE 
+                        WHEN pk.column_name IS NOT NULL THEN true 
+                        ELSE false 
+                    END as is_primary_key
+                FROM 
+                    information_schema.columns c
+                LEFT JOIN (
+                    SELECT 
+                        kcu.column_name, 
+                        kcu.table_name,
+                        kcu.table_schema
+                    FROM 
+                        information_schema.table_constraints tc
+                    JOIN 
+                        information_schema.key_column_usage kcu ON kcu.constraint_name = tc.constraint_name
+                    WHERE 
+                        tc.constraint_type = 'PRIMARY KEY'
+                ) pk ON pk.column_name = c.column_name AND pk.table_name = c.table_name AND pk.table_schema = c.table_schema
+                WHERE 
+                    c.table_name = %s AND c.table_schema = %s
+                ORDER BY 
+                    c.ordinal_position;
+            """, (table_name, schema_name))
+            columns = cursor.fetchall()
+            return [dict(column) for column in columns]
+    
+    def get_table_data(self, table_name: str, schema_name: str = 'public', limit: int = 100, offset: int = 0, order_by: str = None, order_dir: str = 'ASC', row_format: str = 'dict',
+                       sample_percent: Optional[float] = None, sample_method: str = 'SYSTEM', sample_seed: Optional[int] = None) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
         """
         Get data from a specific table
         
@@ -167,12 +363,17 @@ class DBBrowser:
             offset: Number of rows to skip
             order_by: Column to order by
             order_dir: Direction to order (ASC or DESC)
+            row_format: 'dict' for a list of row dictionaries, or 'columnar'
+            sample_percent: Read only a TABLESAMPLE of this percentage of the table
+            sample_method: 'SYSTEM' (sampled pages) or 'BERNOULLI' (sampled rows)
+            sample_seed: REPEATABLE seed, so paging through a sample stays consistent
             
         Returns:
-            List of rows from the table
+            Rows from the table in the requested format
         """
-        if not self.db_connector.conn:
-            if not self.db_connector.connect():
+        connector = self._connector()
+        if not connector.conn:
+            if not connector.connect():
                 return []
         
         try:
@@ -183,6 +384,8 @@ class DBBrowser:
             table_identifier = sql.Identifier(table_name)
             
             query = sql.SQL("SELECT * FROM {}.{}").format(schema_identifier, table_identifier)
+            if sample_percent is not None:
+                query = sql.SQL("{} {}").format(query, tablesample_clause(sample_percent, sample_method, sample_seed))
             
             # Add ORDER BY clause if specified
             if order_by:
@@ -198,27 +401,35 @@ class DBBrowser:
             # Add LIMIT and OFFSET
             query = sql.SQL("{} LIMIT %s OFFSET %s").format(query)
             
-            with self.db_connector.conn.cursor(cursor_factory=self.db_connector.conn.cursor_factory) as cursor:
-                cursor.execute(query, (limit, offset))
+            with connector.conn.cursor() as cursor:
+                connector.execute_prepared(cursor, query, (limit, offset))
                 rows = cursor.fetchall()
-                return [dict(row) for row in rows]
+                result = connector.shape_rows(cursor.description, rows, row_format)
+            connector.conn.commit()
+            return result
         except Exception as e:
+            connector.conn.rollback()
             logger.error(f"Error getting table data: {e}")
             return []
     
-    def get_table_count(self, table_name: str, schema_name: str = 'public') -> int:
+    def get_table_count(self, table_name: str, schema_name: str = 'public', sample_percent: Optional[float] = None,
+                        sample_method: str = 'SYSTEM', sample_seed: Optional[int] = None) -> int:
         """
         Get the total number of rows in a table
         
         Args:
             table_name: Name of the table
             schema_name: Schema of the table (default: 'public')
+            sample_percent: Count the rows of this TABLESAMPLE instead of the whole table
+            sample_method: 'SYSTEM' or 'BERNOULLI'
+            sample_seed: REPEATABLE seed of the sample
             
         Returns:
             Total number of rows
         """
-        if not self.db_connector.conn:
-            if not self.db_connector.connect():
+        connector = self._connector()
+        if not connector.conn:
+            if not connector.connect():
                 return 0
         
         try:
@@ -229,11 +440,15 @@ class DBBrowser:
             table_identifier = sql.Identifier(table_name)
             
             query = sql.SQL("SELECT COUNT(*) as count FROM {}.{}").format(schema_identifier, table_identifier)
+            if sample_percent is not None:
+                query = sql.SQL("{} {}").format(query, tablesample_clause(sample_percent, sample_method, sample_seed))
             
-            with self.db_connector.conn.cursor(cursor_factory=self.db_connector.conn.cursor_factory) as cursor:
-                cursor.execute(query)
+            with connector.conn.cursor() as cursor:
+                connector.execute_prepared(cursor, query)
                 result = cursor.fetchone()
-                return result[0] if result else 0
+            connector.conn.commit()
+            return result[0] if result else 0
         except Exception as e:
+            connector.conn.rollback()
             logger.error(f"Error getting table count: {e}")
             return 0
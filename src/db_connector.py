@@ -4,26 +4,76 @@ Handles connections to PostgreSQL databases and query execution
 """
 
 import os
+import re
+import time
 import logging
-from typing import Dict, Any, List, Optional, Tuple, Union
+import threading
+from typing import Dict, Any, List, Optional, Sequence, Tuple, Union
 import psycopg2
+import sqlparse
 from psycopg2 import sql
 from psycopg2.extras import RealDictCursor
 
+from .schema_cache import SchemaCache, get_schema_cache
+from .result_encoding import to_columnar
+from .statement_cache import StatementCache
+
 logger = logging.getLogger(__name__)
 
+# Statement types (as reported by sqlparse) that change the schema
+DDL_STATEMENT_TYPES = {'CREATE', 'CREATE OR REPLACE', 'ALTER', 'DROP'}
+
+# Query IDs are chosen by the client and tagged onto the SQL text, so they are
+# restricted to characters that are safe inside a comment
+QUERY_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+QUERY_TAG = "/* sql_gpt query_id={} */ "
+
+# Script execution modes
+SCRIPT_MODES = ('transaction', 'autocommit')
+
+# Transaction control statements, which a script run in one transaction skips
+TRANSACTION_CONTROL = {'BEGIN', 'START', 'COMMIT', 'END', 'ROLLBACK', 'ABORT'}
+
+def split_sql_statements(script: str) -> List[str]:
+    """
+    Split a SQL script into its statements
+
+    Comment-only fragments are dropped; quoted strings, dollar-quoted
+    function bodies and comments inside statements are kept intact.
+
+    Args:
+        script: One or more SQL statements
+
+    Returns:
+        List of statements without trailing semicolons
+    """
+    statements = []
+    for statement in sqlparse.parse(script):
+        if statement.token_first(skip_cm=True) is None:
+            continue
+        text = str(statement).strip()
+        if text.endswith(';'):
+            text = text[:-1].rstrip()
+        statements.append(text)
+    return statements
+
 class DBConnector:
     """
     Handles connections to PostgreSQL databases and query execution
     """
     
-    def __init__(self, connection_params: Optional[Dict[str, Any]] = None):
+    def __init__(self, connection_params: Optional[Dict[str, Any]] = None,
+                 schema_cache: Optional[SchemaCache] = None, readonly: bool = False):
         """
         Initialize the database connector
         
         Args:
             connection_params: Optional connection parameters. If not provided,
                               environment variables will be used.
+            schema_cache: Optional schema cache to share, e.g. a replica using
+                          the primary's cache (default: process-wide cache for
+                          this database)
+            readonly: Open the connection as a read-only session
         """
         self.connection_params = connection_params or {
             'host': os.getenv('POSTGRES_HOST', 'localhost'),
@@ -32,7 +82,16 @@ class DBConnector:
             'password': os.getenv('POSTGRES_PASSWORD', 'postgres'),
             'database': os.getenv('POSTGRES_DB', 'sql_gpt')
         }
+        self.readonly = readonly
         self.conn = None
+        self.schema_cache: SchemaCache = schema_cache or get_schema_cache(self.connection_params)
+        self._type_names: Dict[int, str] = {}
+        self.statement_cache = StatementCache()
+        # Default per-query limits in milliseconds (0 leaves the server setting)
+        self.statement_timeout_ms = int(os.getenv('POSTGRES_STATEMENT_TIMEOUT_MS', '0'))
+        self.lock_timeout_ms = int(os.getenv('POSTGRES_LOCK_TIMEOUT_MS', '0'))
+        self._active_queries: Dict[str, Dict[str, Any]] = {}
+        self._active_lock = threading.Lock()
         logger.debug("Database connector initialized")
     
     def connect(self) -> bool:
@@ -44,12 +103,21 @@ class DBConnector:
         """
         try:
             self.conn = psycopg2.connect(**self.connection_params)
-            logger.info(f"Connected to PostgreSQL database at {self.connection_params['host']}:{self.connection_params['port']}")
+            if self.readonly:
+                self.conn.set_session(readonly=True)
+            logger.info(f"Connected to PostgreSQL database at {self.address}")
             return True
         except Exception as e:
             logger.error(f"Error connecting to database: {e}")
             return False
     
+    @property
+    def address(self) -> str:
+        """Host and port of the database, for logging"""
+        host = self.connection_params.get('host', 'localhost')
+        port = self.connection_params.get('port', '5432')
+        return f"{host}:{port}"
+    
     def disconnect(self):
         """Disconnect from the PostgreSQL database"""
         if self.conn:
@@ -57,35 +125,65 @@ class DBConnector:
             self.conn = None
             logger.info("Disconnected from PostgreSQL database")
     
-    def execute_query(self, query: str, params: Optional[Dict[str, Any]] = None) -> Tuple[bool, Union[List[Dict[str, Any]], str]]:
+    def execute_query(self, query: str, params: Optional[Dict[str, Any]] = None,
+                      row_format: str = 'dict', statement_timeout_ms: Optional[int] = None,
+                      lock_timeout_ms: Optional[int] = None,
+                      query_id: Optional[str] = None) -> Tuple[bool, Union[List[Dict[str, Any]], Dict[str, Any], str]]:
         """
         Execute a SQL query
         
         Args:
             query: SQL query to execute
             params: Optional parameters for the query
+            row_format: 'dict' for a list of row dictionaries, or 'columnar' for
+                        column descriptions plus one value array per column
+            statement_timeout_ms: Abort the query after this many milliseconds
+                                  (default: POSTGRES_STATEMENT_TIMEOUT_MS, 0 for none)
+            lock_timeout_ms: Abort the query if a lock cannot be acquired within
+                             this many milliseconds (default: POSTGRES_LOCK_TIMEOUT_MS)
+            query_id: Optional ID under which the running query can be cancelled
+                      with cancel_query
             
         Returns:
             A tuple containing (success, result)
             - success: True if query executed successfully, False otherwise
-            - result: List of dictionaries for SELECT queries, or message for other queries
+            - result: Rows for SELECT queries (see row_format), or message for other queries
         """
         if not self.conn:
             if not self.connect():
                 return False, "Not connected to database"
         
+        if statement_timeout_ms is None:
+            statement_timeout_ms = self.statement_timeout_ms
+        if lock_timeout_ms is None:
+            lock_timeout_ms = self.lock_timeout_ms
+        
+        statement = query
+        if query_id is not None:
+            if not QUERY_ID_PATTERN.match(query_id):
+                return False, "Error: Invalid query ID"
+            with self._active_lock:
+                if query_id in self._active_queries:
+                    return False, f"Error: Query ID '{query_id}' is already running"
+                self._active_queries[query_id] = {'cancelled': False}
+            statement = QUERY_TAG.format(query_id) + query
+        
         try:
-            with self.conn.cursor(cursor_factory=RealDictCursor) as cursor:
-                cursor.execute(query, params or {})
+            with self.conn.cursor() as cursor:
+                self._apply_timeouts(cursor, statement_timeout_ms, lock_timeout_ms)
+                cursor.execute(statement, params)
                 
                 # Check if the query returns results
                 if cursor.description:
-                    results = cursor.fetchall()
+                    rows = cursor.fetchall()
+                    result = self.shape_rows(cursor.description, rows, row_format)
                     self.conn.commit()
-                    return True, [dict(row) for row in results]
+                    self._invalidate_schema_on_ddl(query)
+                    return True, result
                 else:
                     rowcount = cursor.rowcount
                     self.conn.commit()
+                    self._invalidate_schema_on_ddl(query)
                     return True, f"Query executed successfully. Rows affected: {rowcount}"
                     
         except psycopg2.errors.DuplicateTable as e:
@@ -120,10 +218,272 @@ class DBConnector:
             error_message = str(e).split('\n')[0] if '\n' in str(e) else str(e)
             return False, f"SQL syntax error: {error_message}"
             
+        except psycopg2.errors.QueryCanceled as e:
+            self.conn.rollback()
+            if query_id is not None and self._active_queries.get(query_id, {}).get('cancelled'):
+                logger.info(f"Query {query_id} was cancelled")
+                return False, "Query was cancelled."
+            logger.warning(f"Query cancelled: {e}")
+            if 'statement timeout' in str(e):
+                return False, f"Query cancelled: exceeded the statement timeout of {statement_timeout_ms} ms."
+            return False, "Query was cancelled."
+            
+        except psycopg2.errors.LockNotAvailable as e:
+            self.conn.rollback()
+            logger.warning(f"Lock not available: {e}")
+            if 'lock timeout' in str(e):
+                return False, f"Query cancelled: could not acquire a lock within {lock_timeout_ms} ms."
+            error_message = str(e).split('\n')[0]
+            return False, f"Error: {error_message}"
+            
         except Exception as e:
             self.conn.rollback()
             logger.error(f"Error executing query: {e}")
             return False, f"Error: {e}"
+        
+        finally:
+            if query_id is not None:
+                with self._active_lock:
+                    self._active_queries.pop(query_id, None)
+    
+    def execute_script(self, script: str, mode: str = 'transaction', row_format: str = 'dict',
+                       statement_timeout_ms: Optional[int] = None,
+                       lock_timeout_ms: Optional[int] = None,
+                       query_id: Optional[str] = None,
+                       stop_on_error: bool = True) -> Tuple[bool, Union[Dict[str, Any], str]]:
+        """
+        Execute a multi-statement script one statement at a time
+        
+        In 'transaction' mode all statements run in one transaction, which is
+        rolled back when any of them fails (explicit BEGIN/COMMIT statements
+        in the script are skipped). In 'autocommit' mode every statement
+        commits on its own, so statements such as CREATE INDEX CONCURRENTLY
+        can run, and a failure leaves the earlier statements applied.
+        
+        Args:
+            script: SQL statements separated by semicolons
+            mode: 'transaction' or 'autocommit'
+            row_format: Result format of statements that return rows (see execute_query)
+            statement_timeout_ms: Per-statement timeout in milliseconds
+                                  (default: POSTGRES_STATEMENT_TIMEOUT_MS, 0 for none)
+            lock_timeout_ms: Lock wait timeout in milliseconds
+                             (default: POSTGRES_LOCK_TIMEOUT_MS)
+            query_id: Optional ID under which the running script can be cancelled
+            stop_on_error: In autocommit mode, stop at the first failing statement
+            
+        Returns:
+            A tuple containing (success, result)
+            - success: True if every statement succeeded
+            - result: Dictionary with per-statement results, row counts and
+                      durations, or an error message
+        """
+        if mode not in SCRIPT_MODES:
+            return False, f"Error: Unknown script mode '{mode}'"
+        
+        statements = split_sql_statements(script)
+        if not statements:
+            return False, "Error: The script contains no statements"
+        
+        if not self.conn:
+            if not self.connect():
+                return False, "Not connected to database"
+        
+        if statement_timeout_ms is None:
+            statement_timeout_ms = self.statement_timeout_ms
+        if lock_timeout_ms is None:
+            lock_timeout_ms = self.lock_timeout_ms
+        
+        tag = ''
+        if query_id is not None:
+            if not QUERY_ID_PATTERN.match(query_id):
+                return False, "Error: Invalid query ID"
+            with self._active_lock:
+                if query_id in self._active_queries:
+                    return False, f"Error: Query ID '{query_id}' is already running"
+                self._active_queries[query_id] = {'cancelled': False}
+            tag = QUERY_TAG.format(query_id)
+        
+        autocommit = mode == 'autocommit'
+        results = [
+            {'index': index, 'sql': statement, 'type': sqlparse.parse(statement)[0].get_type(),
+             'status': 'pending', 'rowcount': None, 'duration_ms': None}
+            for index, statement in enumerate(statements)
+        ]
+        failed = None
+        started = time.perf_counter()
+        try:
+            self.conn.rollback()
+            self.conn.autocommit = autocommit
+            with self.conn.cursor() as cursor:
+                # Session settings in autocommit mode, transaction-local otherwise
+                self._apply_timeouts(cursor, statement_timeout_ms, lock_timeout_ms, is_local=not autocommit)
+                for entry in results:
+                    if not autocommit and self._first_keyword(entry['sql']) in TRANSACTION_CONTROL:
+                        entry['status'] = 'skipped'
+                        continue
+                    
+                    statement_started = time.perf_counter()
+                    try:
+                        cursor.execute(tag + entry['sql'])
+                        if cursor.description:
+                            entry['result'] = self.shape_rows(cursor.description, cursor.fetchall(), row_format)
+                        entry['rowcount'] = cursor.rowcount
+                        entry['status'] = 'succeeded'
+                    except psycopg2.Error as e:
+                        entry['status'] = 'failed'
+                        entry['error'] = self._script_error(e, query_id, statement_timeout_ms, lock_timeout_ms)
+                        if failed is None:
+                            failed = entry['index']
+                        if not autocommit or stop_on_error:
+                            break
+                    finally:
+                        entry['duration_ms'] = round((time.perf_counter() - statement_started) * 1000, 3)
+            
+            if autocommit:
+                committed = any(entry['status'] == 'succeeded' for entry in results)
+            elif failed is None:
+                self.conn.commit()
+                committed = True
+            else:
+                self.conn.rollback()
+                committed = False
+                for entry in results:
+                    if entry['status'] == 'succeeded':
+                        entry['status'] = 'rolled_back'
+            
+            if committed:
+                self._invalidate_schema_on_ddl(script)
+        except Exception as e:
+            if not self.conn.closed:
+                self.conn.rollback()
+            logger.error(f"Error executing script: {e}")
+            return False, f"Error: {e}"
+        finally:
+            if not self.conn.closed:
+                if autocommit:
+                    # Session timeouts must not outlive the script on the shared connection
+                    try:
+                        with self.conn.cursor() as cursor:
+                            cursor.execute("RESET statement_timeout; RESET lock_timeout;")
+                    except psycopg2.Error as e:
+                        logger.warning(f"Could not reset session timeouts: {e}")
+                self.conn.autocommit = False
+            if query_id is not None:
+                with self._active_lock:
+                    self._active_queries.pop(query_id, None)
+        
+        for entry in results:
+            if entry['status'] == 'pending':
+                entry['status'] = 'not_run'
+        
+        total_ms = round((time.perf_counter() - started) * 1000, 3)
+        slowest = max((entry for entry in results if entry['duration_ms'] is not None),
+                      key=lambda entry: entry['duration_ms'], default=None)
+        logger.info(f"Script of {len(statements)} statement(s) finished in {total_ms} ms "
+                    f"({'failed at statement ' + str(failed) if failed is not None else 'all succeeded'})")
+        return failed is None, {
+            'mode': mode,
+            'statements': results,
+            'statement_count': len(statements),
+            'failed_statement': failed,
+            'committed': committed,
+            'total_ms': total_ms,
+            'slowest_statement': slowest['index'] if slowest else None
+        }
+    
+    @staticmethod
+    def _first_keyword(statement: str) -> str:
+        """First keyword of a statement, skipping leading comments"""
+        token = sqlparse.parse(statement)[0].token_first(skip_cm=True)
+        return token.normalized if token is not None else ''
+    
+    def _script_error(self, error: psycopg2.Error, query_id: Optional[str],
+                      statement_timeout_ms: int, lock_timeout_ms: int) -> str:
+        """Describe why a script statement failed"""
+        if isinstance(error, psycopg2.errors.QueryCanceled):
+            if query_id is not None and self._active_queries.get(query_id, {}).get('cancelled'):
+                return "Query was cancelled."
+            if 'statement timeout' in str(error):
+                return f"Query cancelled: exceeded the statement timeout of {statement_timeout_ms} ms."
+        if isinstance(error, psycopg2.errors.LockNotAvailable) and 'lock timeout' in str(error):
+            return f"Query cancelled: could not acquire a lock within {lock_timeout_ms} ms."
+        error_message = str(error).split('\n')[0]
+        return f"Error: {error_message}"
+    
+    def is_running(self, query_id: str) -> bool:
+        """Check whether a query with the given ID is running on this connector"""
+        with self._active_lock:
+            return query_id in self._active_queries
+    
+    def cancel_query(self, query_id: str) -> Tuple[bool, str]:
+        """
+        Cancel a running query started with execute_query(query_id=...)
+        
+        Queries running on this connector are cancelled through the connection;
+        otherwise the backend running the tagged query (for example in another
+        worker process) is cancelled with pg_cancel_backend.
+        
+        Args:
+            query_id: ID the query was started with
+            
+        Returns:
+            A tuple containing (success, message)
+        """
+        if not QUERY_ID_PATTERN.match(query_id or ''):
+            return False, "Error: Invalid query ID"
+        
+        with self._active_lock:
+            entry = self._active_queries.get(query_id)
+            if entry is not None and self.conn is not None:
+                entry['cancelled'] = True
+                try:
+                    self.conn.cancel()
+                    logger.info(f"Cancellation requested for query {query_id}")
+                    return True, f"Cancellation requested for query {query_id}"
+                except Exception as e:
+                    logger.error(f"Error cancelling query {query_id}: {e}")
+                    return False, f"Error: {e}"
+        
+        tag = QUERY_TAG.format(query_id)
+        conn = None
+        try:
+            conn = psycopg2.connect(**self.connection_params)
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    """
+                    SELECT pg_cancel_backend(pid)
+                    FROM pg_stat_activity
+                    WHERE datname = current_database()
+                    AND pid <> pg_backend_pid()
+                    AND state = 'active'
+                    AND left(query, %s) = %s;
+                    """,
+                    (len(tag), tag)
+                )
+                cancelled = [row[0] for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"Error cancelling query {query_id}: {e}")
+            return False, f"Error: {e}"
+        finally:
+            if conn is not None:
+                conn.close()
+        
+        if not any(cancelled):
+            return False, f"No running query with ID {query_id}"
+        logger.info(f"Cancelled backend running query {query_id}")
+        return True, f"Cancellation requested for query {query_id}"
+    
+    @staticmethod
+    def _apply_timeouts(cursor, statement_timeout_ms: int, lock_timeout_ms: int, is_local: bool = True):
+        """Set statement and lock timeouts, transaction-local by default (0 keeps the server setting)"""
+        settings = []
+        if statement_timeout_ms:
+            settings.append(('statement_timeout', f"{int(statement_timeout_ms)}ms"))
+        if lock_timeout_ms:
+            settings.append(('lock_timeout', f"{int(lock_timeout_ms)}ms"))
+        for name, value in settings:
+            cursor.execute(f"SELECT set_config(%s, %s, {'true' if is_local else 'false'});", (name, value))
     
     def test_connection(self) -> Tuple[bool, str]:
         """
@@ -145,9 +505,79 @@ class DBConnector:
             logger.error(f"Error testing connection: {e}")
             return False, f"Error: {e}"
     
+    def execute_prepared(self, cursor, query: Union[str, sql.Composable], params: Sequence = ()):
+        """
+        Execute a fixed-shape query through the prepared statement cache
+        
+        The results are read from the cursor as after cursor.execute.
+        
+        Args:
+            cursor: Cursor on this connector's connection
+            query: Query with %s placeholders
+            params: Query parameters
+        """
+        if isinstance(query, sql.Composable):
+            query = query.as_string(cursor.connection)
+        self.statement_cache.execute(cursor, query, params, self.schema_cache.version)
+    
+    def shape_rows(self, description, rows: List[tuple], row_format: str = 'dict') -> Union[List[Dict[str, Any]], Dict[str, Any]]:
+        """
+        Shape plain tuple rows for the caller
+        
+        Args:
+            description: Cursor description of the result
+            rows: Result rows as tuples
+            row_format: 'dict' or 'columnar'
+            
+        Returns:
+            List of row dictionaries, or a columnar result dictionary
+        """
+        if row_format == 'columnar':
+            return to_columnar(self.describe_columns(description), rows)
+        names = [column.name for column in description]
+        return [dict(zip(names, row)) for row in rows]
+    
+    def describe_columns(self, description) -> List[Dict[str, str]]:
+        """
+        Describe result columns with their PostgreSQL type names
+        
+        Args:
+            description: Cursor description of the result
+            
+        Returns:
+            List of {'name', 'type'} dictionaries
+        """
+        unknown = [column.type_code for column in description if column.type_code not in self._type_names]
+        if unknown:
+            with self.conn.cursor() as cursor:
+                cursor.execute(
+                    "SELECT oid, format_type(oid, NULL) FROM pg_catalog.pg_type WHERE oid = ANY(%s);",
+                    (list(set(unknown)),)
+                )
+                self._type_names.update(dict(cursor.fetchall()))
+        return [
+            {'name': column.name, 'type': self._type_names.get(column.type_code, 'unknown')}
+            for column in description
+        ]
+    
+    def _invalidate_schema_on_ddl(self, query: str):
+        """
+        Invalidate the schema cache right away when a committed query contained DDL
+
+        Args:
+            query: The query that was executed
+        """
+        try:
+            statement_types = {statement.get_type() for statement in sqlparse.parse(query)}
+        except Exception:
+            statement_types = {'UNKNOWN'}
+        if statement_types & DDL_STATEMENT_TYPES:
+            self.schema_cache.invalidate("DDL executed through connector")
+    
     def get_schema_info(self) -> Tuple[bool, Union[Dict[str, Any], str]]:
         """
-        Get information about the database schema
+        Get information about the database schema.
+        Results are served from the schema cache until the schema changes.
         
         Returns:
             A tuple containing (success, schema_info)
@@ -157,90 +587,102 @@ class DBConnector:
                 return False, "Not connected to database"
         
         try:
-            schema_info = {
-                'tables': [],
-                'views': [],
-                'functions': []
-            }
-            
-            # Get tables
-            with self.conn.cursor(cursor_factory=RealDictCursor) as cursor:
-                cursor.execute("""
-                    SELECT 
-                        table_name, 
-                        table_schema
-                    FROM 
-                        information_schema.tables
-                    WHERE 
-                        table_schema NOT IN ('pg_catalog', 'information_schema')
-                        AND table_type = 'BASE TABLE'
-                    ORDER BY 
-                        table_schema, table_name;
-                """)
-                tables = cursor.fetchall()
-                
-                # Get columns for each table
-                for table in tables:
-                    table_name = table['table_name']
-                    schema_name = table['table_schema']
-                    
-                    cursor.execute("""
-                        SELECT 
-                            column_name, 
-                            data_type, 
-                            is_nullable,
-                            column_default
-                        FROM 
-                            information_schema.columns
-                        WHERE 
-                            table_schema = %s AND table_name = %s
-                        ORDER BY 
-                            ordinal_position;
-                    """, (schema_name, table_name))
-                    
-                    columns = cursor.fetchall()
-                    
-                    schema_info['tables'].append({
-                        'name': table_name,
-                        'schema': schema_name,
-                        'columns': [dict(col) for col in columns]
-                    })
-            
-            # Get views
-            with self.conn.cursor(cursor_factory=RealDictCursor) as cursor:
-                cursor.execute("""
-                    SELECT 
-                        table_name as view_name, 
-                        table_schema as view_schema
-                    FROM 
-                        information_schema.views
-                    WHERE 
-                        table_schema NOT IN ('pg_catalog', 'information_schema')
-                    ORDER BY 
-                        table_schema, table_name;
-                """)
-                views = cursor.fetchall()
-                schema_info['views'] = [dict(view) for view in views]
+            schema_info = self.schema_cache.get(('schema_info',), self._fetch_schema_info, self.conn)
+            return True, schema_info
             
-            # Get functions
-            with self.conn.cursor(cursor_factory=RealDictCursor) as cursor:
+        except Exception as e:
+            self.conn.rollback()
+            logger.error(f"Error getting schema info: {e}")
+            return False, f"Error: {e}"
+    
+    def _fetch_schema_info(self) -> Dict[str, Any]:
+        """
+        Read the database schema from the catalogs
+        
+        Returns:
+            Dictionary with tables, views and functions
+        """
+        schema_info = {
+            'tables': [],
+            'views': [],
+            'functions': []
+        }
+        
+        # Get tables
+        with self.conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            cursor.execute("""
+                SELECT 
+                    table_name, 
+                    table_schema
+                FROM 
+                    information_schema.tables
+                WHERE 
+                    table_schema NOT IN ('pg_catalog', 'information_schema')
+                    AND table_type = 'BASE TABLE'
+                ORDER BY 
+                    table_schema, table_name;
+            """)
+            tables = cursor.fetchall()
+            
+            # Get columns for each table
+            for table in tables:
+                table_name = table['table_name']
+                schema_name = table['table_schema']
+                
                 cursor.execute("""
                     SELECT 
-                        routine_name as function_name, 
-                        routine_schema as function_schema
+                        column_name, 
+                        data_type, 
+                        is_nullable,
+                        column_default
                     FROM 
-                        information_schema.routines
+                        information_schema.columns
                     WHERE 
-                        routine_schema NOT IN ('pg_catalog', 'information_schema')
-                        AND routine_type = 'FUNCTION'
+                        table_schema = %s AND table_name = %s
                     ORDER BY 
-                        routine_schema, routine_name;
-                """)
-                functions = cursor.fetchall()
-                schema_info['functions'] = [dict(func) for func in functions]
-            
-            return True, schema_info
-            
-        except Exception as e:
-            logger.error(f"Error getting schema info: {e}")
-            return False, f"Error: {e}"
+                        ordinal_position;
+                """, (schema_name, table_name))
+                
+                columns = cursor.fetchall()
+                
+                schema_info['tables'].append({
+                    'name': table_name,
+                    'schema': schema_name,
+                    'columns': [dict(col) for col in columns]
+                })
+        
+        # Get views
+        with self.conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            cursor.execute("""
+                SELECT 
+                    table_name as view_name, 
+                    table_schema as view_schema
+                FROM 
+                    information_schema.views
+                WHERE 
+                    table_schema NOT IN ('pg_catalog', 'information_schema')
+                ORDER BY 
+                    table_schema, table_name;
+            """)
+            views = cursor.fetchall()
+            schema_info['views'] = [dict(view) for view in views]
+        
+        # Get functions
+        with self.conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            cursor.execute("""
+                SELECT 
+                    routine_name as function_name, 
+                    routine_schema as function_schema
+                FROM 
+                    information_schema.routines
+                WHERE 
+                    routine_schema NOT IN ('pg_catalog', 'information_schema')
+                    AND routine_type = 'FUNCTION'
+                ORDER BY 
+                    routine_schema, routine_name;
+            """)
+            functions = cursor.fetchall()
+            schema_info['functions'] = [dict(func) for func in functions]
+        
+        self.conn.commit()
+        return schema_info
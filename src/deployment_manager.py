@@ -11,6 +11,10 @@ import openai
 from datetime import datetime
 import jinja2
 
+from .db_connector import DBConnector
+from .dml_batcher import DMLBatcher
+from .shared_cache import LLMCache
+
 logger = logging.getLogger(__name__)
 
 class DeploymentManager:
@@ -18,9 +22,18 @@ class DeploymentManager:
     Manages the generation of deployment scripts for database migrations
     """
     
-    def __init__(self):
-        """Initialize the deployment manager with OpenAI client"""
+    def __init__(self, db_connector: Optional[DBConnector] = None):
+        """
+        Initialize the deployment manager with OpenAI client
+        
+        Args:
+            db_connector: Optional database connector; when given, UPDATE and
+                          DELETE statements on large tables are emitted in
+                          batched form
+        """
         self.client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.llm_cache = LLMCache()
+        self.dml_batcher = DMLBatcher(db_connector) if db_connector is not None else None
         self.template_env = jinja2.Environment(
             loader=jinja2.FileSystemLoader(
                 os.path.join(os.path.dirname(__file__), 'templates')
@@ -58,6 +71,14 @@ class DeploymentManager:
         if is_reversible:
             rollback_sql = self._generate_rollback(sql_query, intent)
         
+        # Large UPDATE/DELETE statements are deployed in committed batches
+        batch_plan = self.dml_batcher.should_batch(sql_query) if self.dml_batcher else None
+        if batch_plan:
+            logger.info(f"Emitting batched form for {batch_plan['table']} "
+                        f"(~{int(batch_plan['estimated_rows'])} rows)")
+            batched_sql = self.dml_batcher.to_script(sql_query, batch_plan)
+            return self._create_batched_script(batched_sql, rollback_sql, timestamp, migration_name)
+        
         # Create the deployment script
         if self._should_use_alembic(intent):
             return self._create_alembic_script(sql_query, rollback_sql, timestamp, migration_name, intent)
@@ -111,7 +132,8 @@ class DeploymentManager:
         
         try:
             # Call the OpenAI API to generate the rollback SQL
-            response = self.client.chat.completions.create(
+            content = self.llm_cache.complete(
+                self.client,
                 model="gpt-4-turbo",  # Use an appropriate model
                 messages=[
                     {"role": "system", "content": system_message},
@@ -120,7 +142,7 @@ class DeploymentManager:
             )
             
             # Extract the rollback SQL from the response
-            rollback_sql = response.choices[0].message.content.strip()
+            rollback_sql = content.strip()
             
             logger.debug(f"Generated rollback SQL: {rollback_sql}")
             return rollback_sql
@@ -235,5 +257,39 @@ BEGIN;
 */
 
 COMMIT;
+"""
+        return script
+    
+    def _create_batched_script(self, batched_sql: str, rollback_sql: str, timestamp: str,
+                               migration_name: str) -> str:
+        """
+        Create a plain SQL migration script for a batched UPDATE or DELETE
+        
+        The batches commit on their own, so the script is not wrapped in a
+        transaction.
+        
+        Args:
+            batched_sql: The batched statement from DMLBatcher.to_script
+            rollback_sql: The rollback SQL
+            timestamp: The migration timestamp
+            migration_name: The migration name
+            
+        Returns:
+            A string containing the plain SQL migration script
+        """
+        script = f"""-- Migration: {migration_name}
+-- Created: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+-- Migration ID: {timestamp}
+
+-- The target table is large: the statement runs in batches that commit
+-- independently. Do not wrap this script in a transaction.
+
+-- Forward migration
+{batched_sql}
+-- To roll back this migration, run the following SQL:
+/*
+-- Rollback migration
+{rollback_sql}
+*/
 """
         return script
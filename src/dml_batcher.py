@@ -0,0 +1,450 @@
+"""
+DML Batcher Module
+Rewrites large UPDATE and DELETE statements into resumable, throttled batches
+"""
+
+import os
+import time
+import hashlib
+import logging
+from typing import Dict, Any, List, Optional, Callable
+import psycopg2
+import sqlparse
+from psycopg2 import sql
+from sqlparse.sql import Identifier, Where
+
+from .db_connector import DBConnector
+
+logger = logging.getLogger(__name__)
+
+# Progress of batch jobs; a job resumes from next_start after an interruption
+BATCH_PROGRESS_DDL = """
+    CREATE TABLE IF NOT EXISTS sql_gpt_batch_progress (
+        job_id text PRIMARY KEY,
+        statement text NOT NULL,
+        strategy text NOT NULL,
+        next_start bigint NOT NULL,
+        upper_bound bigint NOT NULL,
+        rows_affected bigint NOT NULL DEFAULT 0,
+        batches integer NOT NULL DEFAULT 0,
+        status text NOT NULL DEFAULT 'running',
+        error text,
+        updated_at timestamptz NOT NULL DEFAULT now()
+    );
+"""
+
+TABLE_STATS_SQL = """
+    SELECT
+        c.oid,
+        c.reltuples,
+        c.relpages,
+        pg_relation_size(c.oid) / current_setting('block_size')::bigint AS pages,
+        (
+            SELECT a.attname
+            FROM pg_catalog.pg_index i
+            JOIN pg_catalog.pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0]
+            WHERE i.indrelid = c.oid AND i.indisprimary AND i.indnatts = 1
+            AND a.atttypid IN ('int2'::regtype, 'int4'::regtype, 'int8'::regtype)
+        ) AS integer_key
+    FROM pg_catalog.pg_class c
+    WHERE c.oid = to_regclass(%s) AND c.relkind IN ('r', 'm');
+"""
+
+# Registers a job; its bounds are read from the table when the row is first inserted.
+# An unfinished job keeps its row and resumes; a finished one starts over with new bounds.
+REGISTER_JOB_SQL = """
+    INSERT INTO sql_gpt_batch_progress (job_id, statement, strategy, next_start, upper_bound)
+    SELECT {job_id}, {statement}, {strategy}, ({lower}), ({upper})
+    ON CONFLICT (job_id) DO UPDATE
+    SET next_start = EXCLUDED.next_start, upper_bound = EXCLUDED.upper_bound, rows_affected = 0,
+        batches = 0, status = 'running', error = NULL, updated_at = now()
+    WHERE sql_gpt_batch_progress.status = 'done';
+"""
+
+# PL/pgSQL variable holding the start of the current batch in generated scripts
+BATCH_START_VARIABLE = 'sql_gpt_batch_start'
+
+
+class DMLBatchError(Exception):
+    """Raised when a statement cannot be batched"""
+
+
+def parse_target(query: str) -> Dict[str, Any]:
+    """
+    Find the target table and WHERE clause of an UPDATE or DELETE
+
+    Args:
+        query: A single UPDATE or DELETE statement
+
+    Returns:
+        Dictionary with 'kind', 'table' (as written), 'qualifier' (alias or
+        table name for column references) and the parsed 'statement'
+
+    Raises:
+        DMLBatchError: If the query is not a single plain UPDATE or DELETE
+    """
+    statements = [s for s in sqlparse.parse(query) if s.token_first(skip_cm=True)]
+    if len(statements) != 1:
+        raise DMLBatchError("Batching needs exactly one statement")
+    statement = statements[0]
+    kind = statement.get_type()
+    if kind not in ('UPDATE', 'DELETE'):
+        raise DMLBatchError(f"Only UPDATE and DELETE statements can be batched, not {kind}")
+
+    first = statement.token_first(skip_cm=True)
+    if first.normalized != kind:
+        # WITH ... UPDATE and similar forms are left alone
+        raise DMLBatchError("Statements with a WITH clause cannot be batched")
+
+    _, target = statement.token_next(statement.token_index(first), skip_cm=True)
+    if target is not None and target.normalized == 'FROM':
+        _, target = statement.token_next(statement.token_index(target), skip_cm=True)
+    if target is not None and target.normalized == 'ONLY':
+        _, target = statement.token_next(statement.token_index(target), skip_cm=True)
+    if not isinstance(target, Identifier):
+        raise DMLBatchError("Could not find the target table")
+
+    table_parts = []
+    for token in target.tokens:
+        if token.is_whitespace or token.normalized == 'AS' or isinstance(token, Identifier):
+            break
+        table_parts.append(token.value)
+    table = ''.join(table_parts)
+    alias = target.get_alias()
+    qualifier = alias if alias else table.rsplit('.', 1)[-1]
+
+    return {'kind': kind, 'table': table, 'qualifier': qualifier, 'statement': statement}
+
+
+def chunk_statement(target: Dict[str, Any], predicate: str) -> str:
+    """
+    Add a range predicate to the WHERE clause of a parsed statement
+
+    Args:
+        target: Result of parse_target
+        predicate: SQL condition restricting the statement to one batch
+
+    Returns:
+        Statement text limited to the batch
+    """
+    parts = []
+    placed = False
+    for token in target['statement'].tokens:
+        if isinstance(token, Where):
+            condition = str(token).strip()[len('WHERE'):].strip()
+            parts.append(f"WHERE ({condition}) AND {predicate} ")
+            placed = True
+        elif not placed and token.normalized == 'RETURNING':
+            parts.append(f"WHERE {predicate} ")
+            parts.append(token.value)
+            placed = True
+        else:
+            parts.append(token.value)
+    text = ''.join(parts).strip().rstrip(';').rstrip()
+    if not placed:
+        text = f"{text} WHERE {predicate}"
+    return text
+
+
+class DMLBatcher:
+    """
+    Runs large UPDATE and DELETE statements in small committed batches.
+
+    Tables with a single-column integer primary key are walked in key
+    ranges; other tables in ctid (page) ranges, for DELETE only, since an
+    updated row moves to a new location that a later batch would update
+    again. Each batch commits together
+    with its progress row in sql_gpt_batch_progress, so a job that is
+    interrupted resumes at the first unfinished batch, while running a
+    finished job again (e.g. a recurring purge) starts it over. The bounds are read
+    from the table when a job is first registered, also in generated
+    scripts; rows inserted beyond them afterwards are not touched.
+    """
+
+    def __init__(self, db_connector: DBConnector, batch_size: Optional[int] = None,
+                 sleep_ms: Optional[int] = None, large_table_rows: Optional[int] = None):
+        """
+        Initialize the DML batcher
+
+        Args:
+            db_connector: Connector whose connection parameters are used
+            batch_size: Rows per batch (default: DML_BATCH_SIZE, or 10000)
+            sleep_ms: Pause between batches (default: DML_BATCH_SLEEP_MS, or 100)
+            large_table_rows: Estimated row count from which statements are
+                              batched (default: DML_BATCH_TABLE_ROWS, or 1000000)
+        """
+        self.db_connector = db_connector
+        self.batch_size = batch_size if batch_size is not None else int(os.getenv('DML_BATCH_SIZE', '10000'))
+        self.sleep_ms = sleep_ms if sleep_ms is not None else int(os.getenv('DML_BATCH_SLEEP_MS', '100'))
+        self.large_table_rows = large_table_rows if large_table_rows is not None else \
+            int(os.getenv('DML_BATCH_TABLE_ROWS', '1000000'))
+        self.sleep = time.sleep
+        logger.debug("DML batcher initialized")
+
+    def plan(self, query: str) -> Dict[str, Any]:
+        """
+        Decide how a statement would be batched
+
+        Args:
+            query: A single UPDATE or DELETE statement
+
+        Returns:
+            Batch plan with the strategy, key, current bounds and the SQL
+            reading them, step and whether the table is large enough to need
+            batching
+
+        Raises:
+            DMLBatchError: If the statement or its table cannot be batched,
+                           including an UPDATE on a table without an integer key
+        """
+        target = parse_target(query)
+        conn = self._connect()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(TABLE_STATS_SQL, (target['table'],))
+                row = cursor.fetchone()
+                if row is None:
+                    raise DMLBatchError(f"Table {target['table']} does not exist or is not a plain table")
+                oid, reltuples, relpages, pages, integer_key = row
+
+                qualifier = target['qualifier']
+                if integer_key:
+                    key = sql.Identifier(integer_key).as_string(conn)
+                    lower_sql = f"SELECT coalesce(min({key}), 0) FROM {target['table']}"
+                    upper_sql = f"SELECT coalesce(max({key}), -1) FROM {target['table']}"
+                    cursor.execute(f"SELECT ({lower_sql}), ({upper_sql});")
+                    lower, upper = cursor.fetchone()
+                    plan = {
+                        'strategy': 'pk',
+                        'key': integer_key,
+                        'lower': lower,
+                        'upper': upper,
+                        'lower_sql': lower_sql,
+                        'upper_sql': upper_sql,
+                        'step': self.batch_size,
+                        'column': f"{qualifier}.{key}"
+                    }
+                elif target['kind'] == 'UPDATE':
+                    raise DMLBatchError(f"UPDATE on {target['table']} cannot be batched: batching by row "
+                                        f"location needs a single-column integer primary key")
+                else:
+                    rows_per_page = reltuples / relpages if relpages > 0 and reltuples > 0 else 100
+                    plan = {
+                        'strategy': 'ctid',
+                        'key': 'ctid',
+                        'lower': 0,
+                        'upper': pages - 1,
+                        'lower_sql': '0',
+                        'upper_sql': f"pg_relation_size({self._literal(target['table'])}::regclass) "
+                                     f"/ current_setting('block_size')::bigint - 1",
+                        'step': max(1, int(self.batch_size / rows_per_page)),
+                        'column': f"{qualifier}.ctid"
+                    }
+        finally:
+            conn.rollback()
+            conn.close()
+
+        plan.update({
+            'job_id': self.job_id(query, plan['strategy']),
+            'kind': target['kind'],
+            'table': target['table'],
+            'estimated_rows': max(reltuples, 0),
+            'large': reltuples >= self.large_table_rows,
+            'batches': max(0, (plan['upper'] - plan['lower']) // plan['step'] + 1),
+            'target': target
+        })
+        return plan
+
+    def should_batch(self, query: str) -> Optional[Dict[str, Any]]:
+        """
+        Plan a statement if it targets a large table
+
+        Args:
+            query: SQL statement
+
+        Returns:
+            The batch plan, or None if the statement is not a batchable
+            UPDATE/DELETE on a large table
+        """
+        try:
+            plan = self.plan(query)
+        except (DMLBatchError, psycopg2.Error) as e:
+            logger.debug(f"Statement not batched: {e}")
+            return None
+        return plan if plan['large'] else None
+
+    def run(self, query: str, progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+            plan: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Execute a statement in batches, resuming an unfinished run of the same job
+
+        Args:
+            query: A single UPDATE or DELETE statement
+            progress_callback: Called with the job state after each batch
+            plan: Plan from plan() (computed when not given)
+
+        Returns:
+            Job state with rows affected, batches and status
+        """
+        plan = plan or self.plan(query)
+        conn = self._connect()
+        state = None
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(BATCH_PROGRESS_DDL)
+                cursor.execute(
+                    REGISTER_JOB_SQL.format(job_id='%s', statement='%s', strategy='%s',
+                                            lower=plan['lower_sql'].replace('%', '%%'),
+                                            upper=plan['upper_sql'].replace('%', '%%')),
+                    (plan['job_id'], query, plan['strategy'])
+                )
+                conn.commit()
+                state = self._state(cursor, plan['job_id'])
+                if state['batches'] > 0:
+                    logger.info(f"Resuming batch job {plan['job_id']} at {state['next_start']}")
+
+                while state['next_start'] <= state['upper_bound']:
+                    start = state['next_start']
+                    statement = chunk_statement(plan['target'], self._predicate(plan, str(start),
+                                                                                str(start + plan['step'])))
+                    cursor.execute(statement)
+                    affected = max(cursor.rowcount, 0)
+                    cursor.execute(
+                        """
+                        UPDATE sql_gpt_batch_progress
+                        SET next_start = %s, rows_affected = rows_affected + %s, batches = batches + 1,
+                            updated_at = now()
+                        WHERE job_id = %s;
+                        """,
+                        (start + plan['step'], affected, plan['job_id'])
+                    )
+                    conn.commit()
+                    state = self._state(cursor, plan['job_id'])
+                    if progress_callback:
+                        progress_callback(state)
+                    if self.sleep_ms and state['next_start'] <= state['upper_bound']:
+                        self.sleep(self.sleep_ms / 1000)
+
+                cursor.execute(
+                    "UPDATE sql_gpt_batch_progress SET status = 'done', error = NULL, updated_at = now() "
+                    "WHERE job_id = %s;",
+                    (plan['job_id'],)
+                )
+                conn.commit()
+                state = self._state(cursor, plan['job_id'])
+        except psycopg2.Error as e:
+            conn.rollback()
+            error = str(e).split('\n')[0]
+            logger.error(f"Batch job {plan['job_id']} failed: {error}")
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "UPDATE sql_gpt_batch_progress SET status = 'failed', error = %s, updated_at = now() "
+                    "WHERE job_id = %s;",
+                    (error, plan['job_id'])
+                )
+                conn.commit()
+                state = self._state(cursor, plan['job_id']) if state is not None else {
+                    'job_id': plan['job_id'], 'status': 'failed', 'error': error
+                }
+        finally:
+            conn.close()
+        return state
+
+    def to_script(self, query: str, plan: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Render the batched form of a statement as a SQL script
+
+        The script's DO block registers the job in sql_gpt_batch_progress,
+        reading the bounds from the table when the script runs, and loops
+        committing after every batch, so it must run outside an explicit
+        transaction. Re-running it resumes an interrupted job and runs a
+        finished one again.
+
+        Args:
+            query: A single UPDATE or DELETE statement
+            plan: Plan from plan() (computed when not given)
+
+        Returns:
+            SQL script
+        """
+        plan = plan or self.plan(query)
+        job = plan['job_id']
+        start = BATCH_START_VARIABLE
+        statement = chunk_statement(plan['target'], self._predicate(plan, start, f"{start} + {plan['step']}"))
+        unit = f"{plan['step']} {'pages' if plan['strategy'] == 'ctid' else 'key values'}"
+        register = REGISTER_JOB_SQL.format(
+            job_id=self._literal(job), statement=self._literal(query.strip()),
+            strategy=self._literal(plan['strategy']), lower=plan['lower_sql'], upper=plan['upper_sql']
+        ).strip()
+        return f"""-- Batched {plan['kind']} on {plan['table']} (~{int(plan['estimated_rows'])} rows)
+-- About {plan['batches']} batch(es) of {unit} by {plan['key']}, committing after each batch.
+-- Run outside a transaction block; re-running resumes an interrupted job
+-- and runs a finished one again.
+{BATCH_PROGRESS_DDL.strip()}
+
+DO $sql_gpt_batch$
+DECLARE
+    {start} bigint;
+    sql_gpt_upper_bound bigint;
+    sql_gpt_affected bigint;
+BEGIN
+    {register}
+    SELECT next_start, upper_bound INTO {start}, sql_gpt_upper_bound
+    FROM sql_gpt_batch_progress WHERE job_id = {self._literal(job)};
+
+    WHILE {start} <= sql_gpt_upper_bound LOOP
+        {statement};
+        GET DIAGNOSTICS sql_gpt_affected = ROW_COUNT;
+        {start} := {start} + {plan['step']};
+        UPDATE sql_gpt_batch_progress
+        SET next_start = {start}, rows_affected = rows_affected + sql_gpt_affected,
+            batches = batches + 1, updated_at = now()
+        WHERE job_id = {self._literal(job)};
+        COMMIT;
+        PERFORM pg_sleep({self.sleep_ms / 1000});
+    END LOOP;
+
+    UPDATE sql_gpt_batch_progress SET status = 'done', updated_at = now()
+    WHERE job_id = {self._literal(job)};
+END
+$sql_gpt_batch$;
+"""
+
+    @staticmethod
+    def job_id(query: str, strategy: str) -> str:
+        """Stable ID of a batch job, shared by run() and generated scripts"""
+        digest = hashlib.sha256(f"{strategy}:{query.strip()}".encode('utf-8')).hexdigest()
+        return f"dml_{digest[:16]}"
+
+    @staticmethod
+    def _predicate(plan: Dict[str, Any], start: str, end: str) -> str:
+        """Condition restricting the statement to the batch [start, end)"""
+        column = plan['column']
+        if plan['strategy'] == 'ctid':
+            if start.isdigit():
+                return f"{column} >= '({start},0)'::tid AND {column} < '({end},0)'::tid"
+            return f"{column} >= format('(%s,0)', {start})::tid AND {column} < format('(%s,0)', {end})::tid"
+        return f"{column} >= {start} AND {column} < {end}"
+
+    @staticmethod
+    def _literal(value: str) -> str:
+        """Quote a string as a SQL literal"""
+        return "'" + value.replace("'", "''") + "'"
+
+    @staticmethod
+    def _state(cursor, job_id: str) -> Dict[str, Any]:
+        """Read the progress row of a job"""
+        cursor.execute(
+            "SELECT job_id, strategy, next_start, upper_bound, rows_affected, batches, status, error "
+            "FROM sql_gpt_batch_progress WHERE job_id = %s;",
+            (job_id,)
+        )
+        columns = [column.name for column in cursor.description]
+        return dict(zip(columns, cursor.fetchone()))
+
+    def _connect(self):
+        """Open a dedicated connection for planning or running a job"""
+        try:
+            return psycopg2.connect(**self.db_connector.connection_params)
+        except psycopg2.Error as e:
+            raise DMLBatchError(f"Could not connect to database: {e}")
@@ -0,0 +1,258 @@
+"""
+Execution Guard Module
+Pre-flight cost check that refuses, limits or defers expensive ad-hoc queries
+"""
+
+import os
+import logging
+from typing import Dict, Any, List, Optional
+import sqlparse
+
+from .db_connector import DBConnector
+from .job_manager import JobManager
+
+logger = logging.getLogger(__name__)
+
+GUARD_ACTIONS = ('refuse', 'limit', 'async')
+
+# Statement types PostgreSQL can EXPLAIN without executing them
+EXPLAINABLE_TYPES = ('SELECT', 'INSERT', 'UPDATE', 'DELETE')
+
+
+class ExecutionGuard:
+    """
+    Estimates the cost of a query with EXPLAIN before it runs.
+
+    A query whose estimated total cost or row count exceeds a threshold is
+    handled according to the guard action: 'refuse' rejects it, 'limit'
+    wraps a SELECT in an outer LIMIT (and refuses when the limited plan is
+    still too expensive, or the statement is not a SELECT), and 'async'
+    hands it to the background runner. A threshold of 0 disables that
+    check; with both disabled the guard allows everything without planning.
+    """
+
+    def __init__(self, max_cost: Optional[float] = None, max_rows: Optional[float] = None,
+                 action: Optional[str] = None, limit_rows: Optional[int] = None):
+        """
+        Initialize the execution guard
+
+        Args:
+            max_cost: Largest allowed estimated plan cost
+                      (default: EXECUTION_GUARD_MAX_COST environment variable, or 0 = off)
+            max_rows: Largest allowed estimated row count
+                      (default: EXECUTION_GUARD_MAX_ROWS environment variable, or 0 = off)
+            action: What to do with a query over a threshold: 'refuse', 'limit' or 'async'
+                    (default: EXECUTION_GUARD_ACTION environment variable, or 'limit')
+            limit_rows: Row limit applied by the 'limit' action
+                        (default: EXECUTION_GUARD_LIMIT_ROWS environment variable, or 1000)
+        """
+        self.max_cost = max_cost if max_cost is not None else float(os.getenv('EXECUTION_GUARD_MAX_COST', '0'))
+        self.max_rows = max_rows if max_rows is not None else float(os.getenv('EXECUTION_GUARD_MAX_ROWS', '0'))
+        self.action = action or os.getenv('EXECUTION_GUARD_ACTION', 'limit')
+        if self.action not in GUARD_ACTIONS:
+            raise ValueError(f"Unknown execution guard action: {self.action}")
+        self.limit_rows = limit_rows if limit_rows is not None else \
+            int(os.getenv('EXECUTION_GUARD_LIMIT_ROWS', '1000'))
+        logger.debug(f"Execution guard initialized (max cost {self.max_cost}, max rows {self.max_rows}, "
+                     f"action {self.action})")
+
+    @property
+    def enabled(self) -> bool:
+        """Whether any threshold is configured"""
+        return self.max_cost > 0 or self.max_rows > 0
+
+    def check(self, connector: DBConnector, query: str, action: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Decide how a query may run
+
+        Args:
+            connector: Connector the query would run on (used for EXPLAIN)
+            query: SQL query
+            action: Override of the configured action for this query
+
+        Returns:
+            Decision with 'action' ('allow', 'refuse', 'limit' or 'async'), the
+            estimates, a human readable 'reason' and the 'query' to run
+        """
+        action = action or self.action
+        if action not in GUARD_ACTIONS:
+            raise ValueError(f"Unknown execution guard action: {action}")
+
+        decision = {
+            'action': 'allow',
+            'estimated_cost': None,
+            'estimated_rows': None,
+            'max_cost': self.max_cost or None,
+            'max_rows': self.max_rows or None,
+            'reason': None,
+            'query': query
+        }
+        if not self.enabled:
+            return decision
+
+        statements = [s for s in sqlparse.parse(query) if s.token_first(skip_cm=True)]
+        estimates = self._estimate(connector, [str(s).strip().rstrip(';') for s in statements
+                                               if s.get_type() in EXPLAINABLE_TYPES])
+        if estimates is None:
+            decision['reason'] = 'Cost could not be estimated'
+            return decision
+
+        decision['estimated_cost'] = sum(estimate['cost'] for estimate in estimates)
+        decision['estimated_rows'] = sum(estimate['rows'] for estimate in estimates)
+        exceeded = self._exceeded(decision['estimated_cost'], decision['estimated_rows'])
+        if not exceeded:
+            return decision
+
+        decision['reason'] = f"Estimated {exceeded}"
+        if action == 'limit':
+            if len(statements) != 1 or statements[0].get_type() != 'SELECT':
+                decision['action'] = 'refuse'
+                decision['reason'] += '; only a single SELECT can be limited'
+                return decision
+
+            limited = f"SELECT * FROM ({str(statements[0]).strip().rstrip(';')}\n) AS guarded_query " \
+                      f"LIMIT {self.limit_rows}"
+            estimate = self._estimate(connector, [limited])
+            # A LIMIT does not help when the plan must finish an expensive
+            # step (sort, hash, aggregate) before returning the first row
+            if estimate is None or (self.max_cost and estimate[0]['cost'] > self.max_cost):
+                decision['action'] = 'refuse'
+                decision['reason'] += f'; still too expensive with LIMIT {self.limit_rows}'
+                return decision
+
+            decision.update({
+                'action': 'limit',
+                'query': limited,
+                'limited_cost': estimate[0]['cost'],
+                'limit_rows': self.limit_rows
+            })
+            decision['reason'] += f'; result limited to {self.limit_rows} rows'
+            return decision
+
+        decision['action'] = action
+        if action == 'async':
+            decision['reason'] += '; running in the background'
+        return decision
+
+    def _exceeded(self, cost: float, rows: float) -> Optional[str]:
+        """Describe which threshold an estimate exceeds, if any"""
+        if self.max_cost and cost > self.max_cost:
+            return f"cost {cost:.0f} exceeds the limit of {self.max_cost:.0f}"
+        if self.max_rows and rows > self.max_rows:
+            return f"{rows:.0f} rows exceeds the limit of {self.max_rows:.0f}"
+        return None
+
+    @staticmethod
+    def _estimate(connector: DBConnector, statements: List[str]) -> Optional[List[Dict[str, float]]]:
+        """
+        EXPLAIN each statement and read the root cost and row estimate
+
+        Returns None when a statement cannot be planned (for example because
+        it depends on an earlier statement of the same script); the query
+        then runs unguarded and reports its own errors.
+        """
+        if not statements:
+            return None
+        if not connector.conn:
+            if not connector.connect():
+                return None
+
+        estimates = []
+        try:
+            with connector.conn.cursor() as cursor:
+                for statement in statements:
+                    cursor.execute("EXPLAIN (FORMAT JSON) " + statement)
+                    plan = cursor.fetchone()[0][0]['Plan']
+                    estimates.append({'cost': plan['Total Cost'], 'rows': plan['Plan Rows']})
+        except Exception as e:
+            logger.debug(f"Execution guard could not plan the query: {e}")
+            estimates = None
+        finally:
+            connector.conn.rollback()
+        return estimates
+
+
+class AsyncQueryRunner:
+    """
+    Runs deferred queries as background jobs.
+
+    Each job gets its own connection so it does not interleave with the
+    shared request connection. Jobs run on a JobManager, so finished jobs
+    are kept for its retention period and clients can poll for the result
+    or follow it through the job API.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, retention_seconds: Optional[float] = None,
+                 job_manager: Optional[JobManager] = None):
+        """
+        Initialize the background runner
+
+        Args:
+            max_workers: Concurrent background queries
+                         (default: EXECUTION_GUARD_ASYNC_WORKERS environment variable, or 2)
+            retention_seconds: How long finished jobs are kept
+                               (default: EXECUTION_GUARD_JOB_TTL environment variable, or 600)
+            job_manager: Job manager to run on, shared with other kinds of jobs;
+                         max_workers and retention_seconds are then ignored
+        """
+        if job_manager is None:
+            if max_workers is None:
+                max_workers = int(os.getenv('EXECUTION_GUARD_ASYNC_WORKERS', '2'))
+            if retention_seconds is None:
+                retention_seconds = float(os.getenv('EXECUTION_GUARD_JOB_TTL', '600'))
+            job_manager = JobManager(max_workers=max_workers, retention_seconds=retention_seconds)
+        self.job_manager = job_manager
+
+    def submit(self, connector: DBConnector, query: str, **kwargs) -> str:
+        """
+        Queue a query for background execution
+
+        Args:
+            connector: Connector whose connection parameters the job uses
+            query: SQL query
+            **kwargs: Passed to DBConnector.execute_query
+
+        Returns:
+            Job ID
+
+        Raises:
+            JobError: If too many jobs are waiting
+        """
+        job, _ = self.job_manager.submit('execute', self.task(connector, query, kwargs),
+                                         request={'query': query, **kwargs})
+        return job['job_id']
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the state of a job
+
+        Args:
+            job_id: Job ID returned by submit
+
+        Returns:
+            Copy of the job state, or None if the job is unknown or expired
+        """
+        return self.job_manager.get(job_id)
+
+    def task(self, connector: DBConnector, query: str, kwargs: Dict[str, Any]):
+        """
+        Build the job function running a query on its own connection
+
+        Args:
+            connector: Connector whose connection parameters the job uses
+            query: SQL query
+            kwargs: Passed to DBConnector.execute_query
+
+        Returns:
+            Function for JobManager.submit
+        """
+        params, schema_cache, readonly = connector.connection_params, connector.schema_cache, connector.readonly
+
+        def run(progress):
+            worker = DBConnector(params, schema_cache=schema_cache, readonly=readonly)
+            try:
+                progress('executing', query_id=kwargs.get('query_id'))
+                return worker.execute_query(query, **kwargs)
+            finally:
+                worker.disconnect()
+        return run
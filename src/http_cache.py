@@ -0,0 +1,246 @@
+"""
+HTTP Cache Module
+Response compression, conditional requests and versioned static assets
+"""
+
+import os
+import gzip
+import hashlib
+import logging
+import mimetypes
+import threading
+from typing import Dict, Any, Optional, Tuple
+
+from flask import Response
+from werkzeug.datastructures import Accept
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Mimetypes worth compressing; images, archives and already-compressed exports are not
+COMPRESSIBLE_MIMETYPES = (
+    'application/json', 'application/javascript', 'text/javascript', 'text/html', 'text/css',
+    'text/plain', 'text/csv', 'image/svg+xml'
+)
+
+
+def choose_encoding(accept_encodings: Accept) -> Optional[str]:
+    """
+    Pick the content encoding for a request
+
+    Args:
+        accept_encodings: The request's parsed Accept-Encoding header
+
+    Returns:
+        'br' (when the brotli package is installed), 'gzip', or None
+    """
+    encoding, best = None, 0
+    # On equal quality the first one wins; brotli output is smaller
+    for name in (['br'] if brotli is not None else []) + ['gzip']:
+        quality = accept_encodings.quality(name)
+        if quality > best:
+            encoding, best = name, quality
+    return encoding
+
+
+def schema_etag(state_token: str, *parts: Any) -> str:
+    """
+    ETag of a metadata response
+
+    Args:
+        state_token: SchemaCache.state_token() of the database the metadata comes from
+        *parts: Everything else the response depends on (path, query string, target)
+
+    Returns:
+        Opaque tag, used as a weak ETag
+    """
+    return hashlib.sha256(repr((state_token,) + parts).encode('utf-8')).hexdigest()[:32]
+
+
+class ResponseCompressor:
+    """
+    Compresses buffered text responses after they are built.
+
+    Streamed responses (exports, file downloads) and responses that already
+    carry a Content-Encoding or negotiated their own encoding are left alone.
+    Strong ETags are weakened, since the compressed body is a different
+    byte sequence with the same meaning.
+    """
+
+    def __init__(self, min_bytes: Optional[int] = None, gzip_level: Optional[int] = None,
+                 brotli_quality: Optional[int] = None):
+        """
+        Initialize the compressor
+
+        Args:
+            min_bytes: Smaller responses are sent as they are (default: COMPRESS_MIN_BYTES, or 1024)
+            gzip_level: gzip level 1-9 (default: COMPRESS_GZIP_LEVEL, or 6)
+            brotli_quality: brotli quality 0-11 (default: COMPRESS_BROTLI_QUALITY, or 4)
+        """
+        self.min_bytes = min_bytes if min_bytes is not None else int(os.getenv('COMPRESS_MIN_BYTES', '1024'))
+        self.gzip_level = gzip_level if gzip_level is not None else int(os.getenv('COMPRESS_GZIP_LEVEL', '6'))
+        self.brotli_quality = brotli_quality if brotli_quality is not None else int(
+            os.getenv('COMPRESS_BROTLI_QUALITY', '4'))
+
+    def encode(self, data: bytes, encoding: str, best: bool = False) -> bytes:
+        """
+        Compress a body
+
+        Args:
+            data: Body
+            encoding: 'br' or 'gzip'
+            best: Use the strongest setting, for bodies compressed once and reused
+
+        Returns:
+            The compressed body
+        """
+        if encoding == 'br':
+            return brotli.compress(data, quality=11 if best else self.brotli_quality)
+        # mtime=0 keeps the output identical for identical input
+        return gzip.compress(data, compresslevel=9 if best else self.gzip_level, mtime=0)
+
+    def compress(self, response: Response, accept_encodings: Accept) -> Response:
+        """
+        Compress a response in place if it is worth it
+
+        Args:
+            response: Finished response
+            accept_encodings: The request's parsed Accept-Encoding header
+
+        Returns:
+            The same response
+        """
+        if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+                or 'Content-Encoding' in response.headers or 'Accept-Encoding' in response.vary
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = choose_encoding(accept_encodings)
+        if encoding is None or (response.content_length or 0) < self.min_bytes:
+            return response
+
+        response.set_data(self.encode(response.get_data(), encoding))
+        response.headers['Content-Encoding'] = encoding
+        tag, weak = response.get_etag()
+        if tag and not weak:
+            response.set_etag(tag, weak=True)
+        return response
+
+
+class StaticAssets:
+    """
+    Serves files from the static folder with content-hashed URLs.
+
+    url() appends a hash of the file's content (?v=...), and requests
+    carrying the current hash are cached by browsers for a year, since a
+    changed file gets a new URL. Files are read once and kept in memory
+    with their compressed variants until they change on disk.
+    """
+
+    def __init__(self, folder: str, compressor: Optional[ResponseCompressor] = None,
+                 max_age: Optional[int] = None):
+        """
+        Initialize the static asset server
+
+        Args:
+            folder: Static folder
+            compressor: Compressor for text assets (default: ResponseCompressor())
+            max_age: Cache lifetime in seconds of versioned URLs
+                     (default: STATIC_MAX_AGE, or 31536000)
+        """
+        self.folder = folder
+        self.compressor = compressor or ResponseCompressor()
+        self.max_age = max_age if max_age is not None else int(os.getenv('STATIC_MAX_AGE', '31536000'))
+        self._lock = threading.Lock()
+        self._assets: Dict[str, Dict[str, Any]] = {}
+
+    def url(self, path: str) -> str:
+        """
+        Versioned URL of a static file
+
+        Args:
+            path: Path inside the static folder, e.g. 'js/main.js'
+
+        Returns:
+            /static/<path>?v=<content hash>, or the plain URL if the file is missing
+        """
+        asset = self._load(path)
+        return f"/static/{path}?v={asset['hash']}" if asset else f"/static/{path}"
+
+    def response(self, path: str, version: Optional[str], accept_encodings: Accept) -> Optional[Response]:
+        """
+        Build the response for a static file
+
+        Args:
+            path: Path inside the static folder
+            version: The request's ?v= value
+            accept_encodings: The request's parsed Accept-Encoding header
+
+        Returns:
+            The response, or None if there is no such file
+        """
+        asset = self._load(path)
+        if asset is None:
+            return None
+
+        encoding = choose_encoding(accept_encodings) if asset['compressible'] else None
+        body = asset['data']
+        if encoding is not None and len(body) >= self.compressor.min_bytes:
+            with self._lock:
+                if encoding not in asset['encoded']:
+                    asset['encoded'][encoding] = self.compressor.encode(body, encoding, best=True)
+                body = asset['encoded'][encoding]
+        else:
+            encoding = None
+
+        response = Response(body, mimetype=asset['mimetype'])
+        response.set_etag(f"{asset['hash']}-{encoding}" if encoding else asset['hash'])
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        if asset['compressible']:
+            response.vary.add('Accept-Encoding')
+        if version == asset['hash']:
+            response.cache_control.public = True
+            response.cache_control.max_age = self.max_age
+            response.cache_control.immutable = True
+        else:
+            response.cache_control.no_cache = True
+        return response
+
+    def _load(self, path: str) -> Optional[Dict[str, Any]]:
+        """Read a file, reusing the cached copy while its size and mtime are unchanged"""
+        filename = safe_join(self.folder, path)
+        if filename is None:
+            return None
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            return None
+        if not os.path.isfile(filename):
+            return None
+
+        signature: Tuple[int, int] = (stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            asset = self._assets.get(path)
+            if asset is not None and asset['signature'] == signature:
+                return asset
+
+        with open(filename, 'rb') as f:
+            data = f.read()
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        asset = {
+            'signature': signature,
+            'data': data,
+            'hash': hashlib.sha256(data).hexdigest()[:16],
+            'mimetype': mimetype,
+            'compressible': mimetype in COMPRESSIBLE_MIMETYPES,
+            'encoded': {}
+        }
+        with self._lock:
+            self._assets[path] = asset
+        return asset
@@ -13,9 +13,9 @@ from rich.syntax import Syntax
 from rich.panel import Panel
 from rich.prompt import Prompt, Confirm
 
-from nlp_processor import NLPProcessor
-from sql_generator import SQLGenerator
-from deployment_manager import DeploymentManager
+from .nlp_processor import NLPProcessor
+from .sql_generator import SQLGenerator
+from .deployment_manager import DeploymentManager
 
 logger = logging.getLogger(__name__)
 
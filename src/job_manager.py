@@ -0,0 +1,404 @@
+"""
+Job Manager Module
+Runs long requests in the background with progress events and idempotent submission
+"""
+
+import os
+import json
+import time
+import uuid
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Callable, Tuple
+
+from .shared_cache import SharedCache, get_shared_cache
+
+logger = logging.getLogger(__name__)
+
+JOB_STATES = ('queued', 'running', 'succeeded', 'failed')
+FINISHED_STATES = ('succeeded', 'failed')
+
+
+class JobError(Exception):
+    """Raised when a job cannot be submitted"""
+
+
+class JobManager:
+    """
+    Runs submitted work on a bounded thread pool.
+
+    A job is a callable taking a progress function and returning a
+    (success, result) tuple. Each call of progress(stage, **details) is
+    recorded as an event that clients can poll for or wait on. Finished jobs
+    and their results are kept for a retention period, then forgotten.
+
+    Submissions may carry an idempotency key: a retried submission with the
+    same key and the same request gets the existing job instead of starting
+    the work again, and the same key with a different request is refused.
+
+    With a shared cache, jobs are also written to it, and idempotency keys
+    are claimed there, so any worker process can report on, stream or
+    attach to a job running in another one. Jobs of other processes are
+    followed by polling the shared cache. New and finished jobs are written
+    at once; progress is written at most once per poll interval, with a
+    background thread writing the last changes. Writes happen outside the
+    lock, so status requests never wait for the disk.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, retention_seconds: Optional[float] = None,
+                 max_pending: Optional[int] = None, shared_cache: Optional[SharedCache] = None,
+                 poll_interval: Optional[float] = None):
+        """
+        Initialize the job manager
+
+        Args:
+            max_workers: Jobs run at once (default: JOB_WORKERS, or 4)
+            retention_seconds: How long finished jobs and their results are kept
+                               (default: JOB_TTL, or 600)
+            max_pending: Jobs that may wait for a worker before submissions are
+                         refused (default: JOB_MAX_PENDING, or 100)
+            shared_cache: Store shared with the other worker processes (default:
+                          the process's shared cache, if SHARED_CACHE_PATH is set)
+            poll_interval: Seconds between reads of a job running in another
+                           process, and between writes of a job's progress
+                           (default: JOB_POLL_INTERVAL, or 0.25)
+        """
+        self.max_workers = max(max_workers if max_workers is not None else int(os.getenv('JOB_WORKERS', '4')), 1)
+        self.retention_seconds = retention_seconds if retention_seconds is not None else float(
+            os.getenv('JOB_TTL', '600'))
+        self.max_pending = max_pending if max_pending is not None else int(os.getenv('JOB_MAX_PENDING', '100'))
+        self.shared_cache = shared_cache if shared_cache is not None else get_shared_cache()
+        self.poll_interval = poll_interval if poll_interval is not None else float(
+            os.getenv('JOB_POLL_INTERVAL', '0.25'))
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='sql_gpt_job')
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._keys: Dict[Tuple[str, str], str] = {}
+        self._changed = threading.Condition()
+        # Shared writes are made one at a time, each with the state when it starts,
+        # so an older state never overwrites a newer one
+        self._sharing = threading.Lock()
+        self._unshared: set = set()
+        self._shared_at: Dict[str, float] = {}
+        self._flusher: Optional[threading.Thread] = None
+        logger.debug("Job manager initialized")
+
+    def submit(self, kind: str, func: Callable[[Callable[..., None]], Tuple[bool, Any]],
+               request: Optional[Dict[str, Any]] = None,
+               idempotency_key: Optional[str] = None) -> Tuple[Dict[str, Any], bool]:
+        """
+        Queue a job
+
+        Args:
+            kind: Kind of work, e.g. 'process' or 'execute'
+            func: The work; called with a progress function, returns (success, result)
+            request: Parameters of the work, compared when an idempotency key is reused
+            idempotency_key: Client-chosen key that makes retried submissions return the same job
+
+        Returns:
+            A tuple containing (job state, whether a new job was created)
+
+        Raises:
+            JobError: If the key was used for a different request, or too many jobs are waiting
+        """
+        self._prune()
+        fingerprint = hashlib.sha256(json.dumps(request, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+        key = (kind, idempotency_key) if idempotency_key else None
+
+        if key and self.shared_cache is not None:
+            return self._submit_shared(kind, func, key, fingerprint)
+
+        with self._changed:
+            if key in self._keys:
+                job = self._jobs[self._keys[key]]
+                if job['fingerprint'] != fingerprint:
+                    raise JobError(f"Idempotency key '{idempotency_key}' was already used for a different request")
+                logger.info(f"Reusing job {job['job_id']} for idempotency key {idempotency_key}")
+                return self._snapshot(job), False
+            job = self._create(kind, idempotency_key, fingerprint)
+            snapshot = self._snapshot(job)
+
+        self._publish(job['job_id'])
+        self._executor.submit(self._run, job['job_id'], func)
+        return snapshot, True
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the state of a job
+
+        Args:
+            job_id: Job ID returned by submit
+
+        Returns:
+            Copy of the job state, or None if the job is unknown or expired
+        """
+        self._prune()
+        job = self._load(job_id)
+        return self._snapshot(job) if job else None
+
+    def wait(self, job_id: str, after: int = 0,
+             timeout: Optional[float] = None) -> Optional[Tuple[Dict[str, Any], List[Dict[str, Any]]]]:
+        """
+        Wait for new events of a job
+
+        Args:
+            job_id: Job ID
+            after: Sequence number of the last event already seen
+            timeout: Longest wait in seconds (default: no limit)
+
+        Returns:
+            A tuple containing (job state, events after the given one), as
+            soon as there are new events or the job has finished, or when the
+            timeout passes; None if the job is unknown or expired
+        """
+        job = self._watch(job_id, lambda job: job['status'] in FINISHED_STATES or (
+            bool(job['events']) and job['events'][-1]['seq'] > after), timeout)
+        if job is None:
+            return None
+        return job, [event for event in job['events'] if event['seq'] > after]
+
+    def join(self, job_id: str, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        Wait for a job to finish
+
+        Args:
+            job_id: Job ID
+            timeout: Longest wait in seconds (default: no limit)
+
+        Returns:
+            The job state, finished unless the timeout passed; None if the
+            job is unknown or expired
+        """
+        return self._watch(job_id, lambda job: job['status'] in FINISHED_STATES, timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        """Job counts per state, for the jobs run by this process"""
+        self._prune()
+        with self._changed:
+            counts = {state: 0 for state in JOB_STATES}
+            for job in self._jobs.values():
+                counts[job['status']] += 1
+        return {
+            'counts': counts,
+            'max_workers': self.max_workers,
+            'max_pending': self.max_pending,
+            'retention_seconds': self.retention_seconds,
+            'shared': self.shared_cache is not None
+        }
+
+    def _run(self, job_id: str, func: Callable[[Callable[..., None]], Tuple[bool, Any]]):
+        """Run a job and record its outcome"""
+        def progress(stage: str, **details):
+            with self._changed:
+                job = self._jobs.get(job_id)
+                if job is not None:
+                    job['stage'] = stage
+                    self._record(job, stage, **details)
+            self._publish(job_id, throttle=True)
+
+        with self._changed:
+            job = self._jobs[job_id]
+            job.update(status='running', started_at=time.time())
+            self._record(job, 'running')
+        self._publish(job_id)
+
+        try:
+            success, result = func(progress)
+        except Exception as e:
+            logger.error(f"Job {job_id} ({job['kind']}) failed: {e}")
+            success, result = False, str(e)
+
+        with self._changed:
+            finished_at = time.time()
+            status = 'succeeded' if success else 'failed'
+            job.update(status=status, stage=status, success=success, result=result, finished_at=finished_at,
+                       expires_at=finished_at + self.retention_seconds)
+            self._record(job, status, duration_ms=round((finished_at - job['started_at']) * 1000, 3))
+        self._publish(job_id)
+
+        if job['idempotency_key'] and self.shared_cache is not None:
+            # The key is released together with the job it points to
+            self._share('job_key', (job['kind'], job['idempotency_key']), job_id, self.retention_seconds)
+
+    def _submit_shared(self, kind: str, func: Callable[[Callable[..., None]], Tuple[bool, Any]],
+                       key: Tuple[str, str], fingerprint: str) -> Tuple[Dict[str, Any], bool]:
+        """Submit a job with an idempotency key claimed in the shared cache"""
+        created = []
+
+        def create():
+            with self._changed:
+                job = self._create(kind, key[1], fingerprint)
+                created.append(self._snapshot(job))
+            # The job is shared before the key that points to it
+            self._publish(job['job_id'])
+            return job['job_id']
+
+        job_id = self.shared_cache.get_or_set('job_key', key, create, self.shared_cache.default_ttl)
+        if not created:
+            job = self._load(job_id)
+            if job is None:
+                # The key outlived its job, e.g. after the worker running it died
+                job_id = create()
+                self._share('job_key', key, job_id, self.shared_cache.default_ttl)
+            else:
+                if job['fingerprint'] != fingerprint:
+                    raise JobError(f"Idempotency key '{key[1]}' was already used for a different request")
+                logger.info(f"Reusing job {job_id} for idempotency key {key[1]}")
+                return self._snapshot(job), False
+
+        self._executor.submit(self._run, job_id, func)
+        return created[-1], True
+
+    def _create(self, kind: str, idempotency_key: Optional[str], fingerprint: str) -> Dict[str, Any]:
+        """Add a queued job; the caller holds the lock"""
+        pending = sum(1 for job in self._jobs.values() if job['status'] not in FINISHED_STATES)
+        if pending >= self.max_workers + self.max_pending:
+            raise JobError(f"Too many jobs waiting ({pending}); try again later")
+
+        job_id = uuid.uuid4().hex
+        job = {
+            'job_id': job_id,
+            'kind': kind,
+            'status': 'queued',
+            'stage': 'queued',
+            'events': [],
+            'idempotency_key': idempotency_key,
+            'fingerprint': fingerprint,
+            'submitted_at': time.time(),
+            'started_at': None,
+            'finished_at': None,
+            'expires_at': None,
+            'success': None,
+            'result': None
+        }
+        self._jobs[job_id] = job
+        if idempotency_key:
+            self._keys[(kind, idempotency_key)] = job_id
+        self._record(job, 'queued')
+        return job
+
+    def _watch(self, job_id: str, done: Callable[[Dict[str, Any]], bool],
+               timeout: Optional[float]) -> Optional[Dict[str, Any]]:
+        """
+        Wait until done(job) holds for a job or the timeout passes
+
+        Jobs of this process are waited on through the lock's condition,
+        jobs of other processes by polling the shared cache.
+
+        Returns:
+            Copy of the job state, or None if the job is unknown or expired
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._changed:
+                job = self._jobs.get(job_id)
+                if job is not None:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if done(job) or (remaining is not None and remaining <= 0):
+                        return self._snapshot(job)
+                    self._changed.wait(remaining)
+                    continue
+
+            job = self._shared_record(job_id)
+            if job is None:
+                return None
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if done(job) or (remaining is not None and remaining <= 0):
+                return self._snapshot(job)
+            time.sleep(self.poll_interval if remaining is None else min(self.poll_interval, remaining))
+
+    def _record(self, job: Dict[str, Any], stage: str, **details):
+        """Append an event to a job and wake up waiters; the caller holds the lock and publishes afterwards"""
+        job['events'].append({'seq': len(job['events']) + 1, 'stage': stage, 'time': time.time(), **details})
+        if self.shared_cache is not None:
+            self._unshared.add(job['job_id'])
+        self._changed.notify_all()
+
+    def _publish(self, job_id: str, throttle: bool = False):
+        """
+        Write a job's current state to the shared cache, if it changed
+
+        Args:
+            job_id: Job ID
+            throttle: Skip the write if the job was written less than a poll
+                      interval ago; the flusher thread writes it later
+        """
+        if self.shared_cache is None:
+            return
+        with self._sharing:
+            with self._changed:
+                job = self._jobs.get(job_id)
+                if job is None or job_id not in self._unshared:
+                    return
+                if throttle and time.monotonic() - self._shared_at.get(job_id, 0.0) < self.poll_interval:
+                    if self._flusher is None:
+                        self._flusher = threading.Thread(target=self._flush, name='sql_gpt_job_share', daemon=True)
+                        self._flusher.start()
+                    return
+                self._unshared.discard(job_id)
+                self._shared_at[job_id] = time.monotonic()
+                record = self._copy(job)
+            # Running jobs are kept as long as any shared entry; finished ones for the retention period
+            ttl = self.shared_cache.default_ttl if record['expires_at'] is None else record['expires_at'] - time.time()
+            self._share('job', job_id, record, ttl)
+
+    def _flush(self):
+        """Write the progress the throttled writes skipped, once per poll interval"""
+        while True:
+            time.sleep(self.poll_interval)
+            with self._changed:
+                unshared = list(self._unshared)
+            for job_id in unshared:
+                self._publish(job_id)
+
+    def _share(self, namespace: str, key: Any, value: Any, ttl: float):
+        """Write to the shared cache; a failure leaves the job visible to this process only"""
+        try:
+            self.shared_cache.set(namespace, key, value, ttl)
+        except Exception as e:
+            logger.warning(f"Could not share {namespace} {key}: {e}")
+
+    def _load(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Copy of a job of this process, or else of the shared cache; None if unknown"""
+        with self._changed:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return self._copy(job)
+        return self._shared_record(job_id)
+
+    def _shared_record(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """A job as last written to the shared cache by any process, or None"""
+        if self.shared_cache is None:
+            return None
+        try:
+            found, job = self.shared_cache.lookup('job', job_id)
+        except Exception as e:
+            logger.warning(f"Could not read shared job {job_id}: {e}")
+            return None
+        return job if found else None
+
+    @staticmethod
+    def _copy(job: Dict[str, Any]) -> Dict[str, Any]:
+        """Copy of a job's full state, including its fingerprint"""
+        return {**job, 'events': [dict(event) for event in job['events']]}
+
+    @staticmethod
+    def _snapshot(job: Dict[str, Any]) -> Dict[str, Any]:
+        """Copy of a job's public state"""
+        snapshot = {name: value for name, value in job.items() if name != 'fingerprint'}
+        snapshot['events'] = [dict(event) for event in job['events']]
+        return snapshot
+
+    def _prune(self):
+        """Forget finished jobs past the retention period, with their idempotency keys"""
+        now = time.time()
+        with self._changed:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job['expires_at'] is not None and job['expires_at'] < now]
+            for job_id in expired:
+                job = self._jobs.pop(job_id)
+                if job['idempotency_key']:
+                    self._keys.pop((job['kind'], job['idempotency_key']), None)
+                self._unshared.discard(job_id)
+                self._shared_at.pop(job_id, None)
@@ -0,0 +1,321 @@
+"""
+Logging Config Module
+Queue-based logging setup, secret redaction and sampled request logging
+"""
+
+import os
+import re
+import sys
+import json
+import queue
+import atexit
+import random
+import logging
+import threading
+import logging.handlers
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+TEXT_FORMAT = '%(asctime)s [%(levelname)s] %(name)s: %(message)s'
+
+# (pattern, replacement) pairs applied to every formatted log line
+REDACTIONS = [
+    # OpenAI and similar API keys
+    (re.compile(r'\bsk-[A-Za-z0-9_\-]{8,}'), 'sk-***'),
+    # Credentials in connection URIs
+    (re.compile(r'(\b[a-z][a-z0-9+.\-]*://[^:/\s@]+:)[^@\s]+@', re.IGNORECASE), r'\1***@'),
+    # key=value, key: value and "key": "value" forms of secrets, including headers and
+    # JSON-escaped quotes
+    (re.compile(r'''(\b(?:password|passwd|pwd|secret|token|api[_-]?key|authorization|cookie)\\?["']?\s*[:=]\s*\\?["']?)'''
+                r'''(?:bearer\s+|basic\s+)?[^"'\s,&;}\\]+''', re.IGNORECASE), r'\1***')
+]
+
+# Attributes every LogRecord has; anything else was passed through extra=
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_listener_lock = threading.Lock()
+
+
+def redact(text: str) -> str:
+    """
+    Mask secrets in a piece of text
+
+    Args:
+        text: Log line or payload
+
+    Returns:
+        The text with API keys, passwords and tokens replaced by ***
+    """
+    for pattern, replacement in REDACTIONS:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+class RedactingFormatter(logging.Formatter):
+    """
+    Text formatter that masks secrets in the finished line.
+
+    Fields passed with extra= (e.g. the request fields of RequestLogger)
+    are appended to the message as name=value pairs, values in JSON.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        return redact(super().format(record))
+
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        line = super().formatMessage(record)
+        fields = ' '.join(f"{name}={json.dumps(value, default=str)}" for name, value in vars(record).items()
+                          if name not in _RECORD_ATTRIBUTES and not name.startswith('_') and value is not None)
+        return f"{line} {fields}" if fields else line
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats records as one JSON object per line.
+
+    Fields passed with extra= (e.g. the request fields of RequestLogger)
+    become top-level keys. Secrets are masked like in text output.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'process': record.process,
+            'message': record.getMessage()
+        }
+        for name, value in vars(record).items():
+            if name not in _RECORD_ATTRIBUTES and not name.startswith('_'):
+                entry[name] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        return redact(json.dumps(entry, default=str))
+
+
+def configure_logging(level: Optional[str] = None, log_format: Optional[str] = None) -> logging.handlers.QueueListener:
+    """
+    Route all logging through a queue drained by a background thread
+
+    Request threads only put records on the queue; formatting, redaction
+    and writing to stdout happen on the listener thread. Calling this again
+    replaces the output handler and level.
+
+    Args:
+        level: Root log level (default: LOG_LEVEL, or INFO)
+        log_format: 'text' or 'json' (default: LOG_FORMAT, or text)
+
+    Returns:
+        The running queue listener
+    """
+    global _listener
+    level = (level or os.getenv('LOG_LEVEL', 'INFO')).upper()
+    log_format = (log_format or os.getenv('LOG_FORMAT', 'text')).lower()
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter() if log_format == 'json' else RedactingFormatter(TEXT_FORMAT))
+
+    with _listener_lock:
+        if _listener is not None:
+            _listener.stop()
+        records = queue.SimpleQueue()
+        _listener = logging.handlers.QueueListener(records, output, respect_handler_level=True)
+        _listener.start()
+
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(logging.handlers.QueueHandler(records))
+        root.setLevel(level)
+    return _listener
+
+
+@atexit.register
+def _stop_listener():
+    """Flush queued records on exit"""
+    with _listener_lock:
+        if _listener is not None:
+            _listener.stop()
+
+
+class RequestLogger:
+    """
+    Writes one summary record per web request, sampled per endpoint.
+
+    Failed (status >= 400, or marked by the caller, e.g. for a response
+    reporting "success": false) and slow requests are always logged; other
+    requests are logged with their endpoint's sample rate. Request and
+    response bodies are attached only to logged records, cut to a fixed
+    number of bytes before they are decoded and redacted, so large result
+    sets cost nothing to log. Settings can be changed while running.
+    """
+
+    def __init__(self, sample_rates: Optional[Dict[str, float]] = None, default_rate: Optional[float] = None,
+                 max_payload_bytes: Optional[int] = None, slow_ms: Optional[float] = None):
+        """
+        Initialize the request logger
+
+        Args:
+            sample_rates: Fraction of requests logged per endpoint, e.g.
+                          {'/api/execute': 0.1} (default: LOG_SAMPLE_RATES,
+                          written as '/api/execute=0.1,/api/schema=0')
+            default_rate: Fraction logged for other endpoints (default: LOG_SAMPLE_DEFAULT, or 1)
+            max_payload_bytes: Bytes of each body kept; 0 logs no bodies
+                               (default: LOG_MAX_PAYLOAD_BYTES, or 1024)
+            slow_ms: Requests taking longer are always logged (default: LOG_SLOW_MS, or 1000)
+        """
+        self._lock = threading.Lock()
+        self.sample_rates = sample_rates if sample_rates is not None else self.parse_rates(
+            os.getenv('LOG_SAMPLE_RATES', ''))
+        self.default_rate = default_rate if default_rate is not None else float(os.getenv('LOG_SAMPLE_DEFAULT', '1'))
+        self.max_payload_bytes = max_payload_bytes if max_payload_bytes is not None else int(
+            os.getenv('LOG_MAX_PAYLOAD_BYTES', '1024'))
+        self.slow_ms = slow_ms if slow_ms is not None else float(os.getenv('LOG_SLOW_MS', '1000'))
+        self.log = logging.getLogger('sql_gpt.requests')
+
+    @staticmethod
+    def parse_rates(spec: str) -> Dict[str, float]:
+        """
+        Parse sample rates written as 'endpoint=rate,...'
+
+        Raises:
+            ValueError: If a rate is not a number between 0 and 1
+        """
+        rates = {}
+        for item in spec.split(','):
+            if not item.strip():
+                continue
+            endpoint, _, rate = item.strip().rpartition('=')
+            value = float(rate)
+            if not endpoint or not 0 <= value <= 1:
+                raise ValueError(f"Invalid sample rate '{item.strip()}'")
+            rates[endpoint] = value
+        return rates
+
+    def settings(self) -> Dict[str, Any]:
+        """Current settings"""
+        with self._lock:
+            return {
+                'sample_rates': dict(self.sample_rates),
+                'default_rate': self.default_rate,
+                'max_payload_bytes': self.max_payload_bytes,
+                'slow_ms': self.slow_ms
+            }
+
+    def configure(self, sample_rates: Optional[Dict[str, float]] = None, default_rate: Optional[float] = None,
+                  max_payload_bytes: Optional[int] = None, slow_ms: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Change settings; omitted ones are kept
+
+        Args:
+            sample_rates: Rates to set per endpoint; a rate of None removes the endpoint's own rate
+            default_rate: Rate for other endpoints
+            max_payload_bytes: Bytes of each body kept
+            slow_ms: Slow request threshold
+
+        Returns:
+            The new settings
+
+        Raises:
+            ValueError: If a rate is outside 0-1 or a size is negative
+        """
+        rates = dict(sample_rates or {})
+        for value in [default_rate] + list(rates.values()):
+            if value is not None and not 0 <= float(value) <= 1:
+                raise ValueError("Sample rates must be between 0 and 1")
+        if (max_payload_bytes is not None and int(max_payload_bytes) < 0) or (slow_ms is not None and float(slow_ms) < 0):
+            raise ValueError("max_payload_bytes and slow_ms must not be negative")
+
+        with self._lock:
+            for endpoint, value in rates.items():
+                if value is None:
+                    self.sample_rates.pop(endpoint, None)
+                else:
+                    self.sample_rates[endpoint] = float(value)
+            if default_rate is not None:
+                self.default_rate = float(default_rate)
+            if max_payload_bytes is not None:
+                self.max_payload_bytes = int(max_payload_bytes)
+            if slow_ms is not None:
+                self.slow_ms = float(slow_ms)
+        logger.info(f"Request logging settings changed: {self.settings()}")
+        return self.settings()
+
+    def should_log(self, endpoint: str, status: int, duration_ms: float, failed: bool = False) -> bool:
+        """
+        Decide whether a request is logged
+
+        Args:
+            endpoint: Route rule, e.g. '/api/execute'
+            status: HTTP status code
+            duration_ms: Time taken
+            failed: Whether the response reports a failure despite its status
+
+        Returns:
+            True for failed and slow requests, otherwise with the endpoint's sample rate
+        """
+        if status >= 400 or failed or duration_ms >= self.slow_ms:
+            return True
+        with self._lock:
+            rate = self.sample_rates.get(endpoint, self.default_rate)
+        return rate >= 1 or random.random() < rate
+
+    def payload(self, body: bytes) -> Optional[str]:
+        """
+        Cut a request or response body for logging
+
+        Args:
+            body: Raw body
+
+        Returns:
+            Redacted text of at most max_payload_bytes bytes, or None when
+            bodies are not logged or the body is empty
+        """
+        limit = self.max_payload_bytes
+        if not limit or not body:
+            return None
+        text = body[:limit].decode('utf-8', errors='replace')
+        if len(body) > limit:
+            text += f"... ({len(body)} bytes)"
+        return redact(text)
+
+    def log_request(self, method: str, endpoint: str, path: str, status: int, duration_ms: float,
+                    request_body: bytes = b'', response_body: Optional[bytes] = None,
+                    response_bytes: Optional[int] = None, failed: bool = False):
+        """
+        Log one request; callers check should_log() first so bodies of
+        unlogged requests are never read
+
+        Args:
+            method: HTTP method
+            endpoint: Route rule, e.g. '/api/execute'
+            path: Requested path
+            status: HTTP status code
+            duration_ms: Time taken
+            request_body: Raw request body
+            response_body: Raw response body, if it is in memory
+            response_bytes: Response size
+            failed: Whether the response reports a failure despite its status
+        """
+        fields = {
+            'event': 'request',
+            'method': method,
+            'endpoint': endpoint,
+            'path': path,
+            'status': status,
+            'failed': failed or status >= 400,
+            'duration_ms': round(duration_ms, 3),
+            'response_bytes': response_bytes
+        }
+        request_payload = self.payload(request_body)
+        if request_payload is not None:
+            fields['request_payload'] = request_payload
+        response_payload = self.payload(response_body) if response_body is not None else None
+        if response_payload is not None:
+            fields['response_payload'] = response_payload
+        level = logging.WARNING if fields['failed'] else logging.INFO
+        self.log.log(level, f"{method} {path} {status} {fields['duration_ms']}ms", extra=fields)
@@ -8,6 +8,7 @@ import os
 import sys
 import argparse
 import logging
+from typing import Dict, Any
 from dotenv import load_dotenv
 
 from .nlp_processor import NLPProcessor
@@ -16,17 +17,21 @@ from .deployment_manager import DeploymentManager
 from .interactive_mode import InteractiveSession
 from .web_interface import WebInterface
 from .db_connector import DBConnector
-
-# Set up logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger(__name__)
+from .bulk_loader import BulkLoader, BulkLoadError
+from .migration_executor import MigrationExecutor, MigrationError, plan_steps, extract_migration_sql
+from .partition_manager import PartitionManager, PartitionError
+from .candidate_selector import CandidateSelector
+from .connection_registry import ConnectionRegistry, ConnectionRegistryError
+from .rollout_engine import RolloutEngine, RolloutLedger, RolloutError
+from .logging_config import configure_logging
 
 # Load environment variables
 load_dotenv()
 
+# Set up logging
+configure_logging()
+logger = logging.getLogger(__name__)
+
 def parse_arguments():
     """Parse command line arguments"""
     parser = argparse.ArgumentParser(
@@ -59,6 +64,13 @@ def parse_arguments():
         default=5000,
         help='Port to run the web interface on'
     )
+    parser.add_argument(
+        '--candidates',
+        type=int,
+        default=int(os.getenv('SQL_CANDIDATES', '1')),
+        help='Generate this many alternative formulations and keep the cheapest equivalent one '
+             '(default: SQL_CANDIDATES, or 1)'
+    )
     parser.add_argument(
         '--deploy', 
         action='store_true', 
@@ -72,7 +84,112 @@ def parse_arguments():
     parser.add_argument(
         '--db-connection', 
         type=str, 
-        help='Database connection string'
+        help='Database connection string or name of a POSTGRES_TARGETS target (default: POSTGRES_* variables)'
+    )
+    parser.add_argument(
+        '--load',
+        type=str,
+        metavar='FILE',
+        help='Bulk load a CSV or JSON Lines file into --table using COPY'
+    )
+    parser.add_argument(
+        '--table',
+        type=str,
+        help='Target table for --load'
+    )
+    parser.add_argument(
+        '--schema',
+        type=str,
+        default='public',
+        help='Schema of the target table for --load'
+    )
+    parser.add_argument(
+        '--format',
+        type=str,
+        choices=['csv', 'jsonl'],
+        help='Input format for --load (default: inferred from the file extension)'
+    )
+    parser.add_argument(
+        '--batch-size',
+        type=int,
+        default=50000,
+        help='Rows per COPY batch for --load'
+    )
+    parser.add_argument(
+        '--apply',
+        type=str,
+        metavar='FILE',
+        help='Apply a deployment script step by step with lock timeouts and retries'
+    )
+    parser.add_argument(
+        '--dry-run',
+        action='store_true',
+        help='With --apply, --rollout or --partitions, print the planned steps without running them'
+    )
+    parser.add_argument(
+        '--rollout',
+        type=str,
+        metavar='FILE',
+        help='Apply a deployment script to every database in --targets in parallel'
+    )
+    parser.add_argument(
+        '--targets',
+        type=str,
+        help="Comma-separated POSTGRES_TARGETS names for --rollout, or 'all'"
+    )
+    parser.add_argument(
+        '--parallelism',
+        type=int,
+        help='Databases migrated at once by --rollout (default: ROLLOUT_PARALLELISM, or 4)'
+    )
+    parser.add_argument(
+        '--canary',
+        type=int,
+        help='Databases migrated first by --rollout before any other starts (default: ROLLOUT_CANARY, or 1)'
+    )
+    parser.add_argument(
+        '--continue-on-error',
+        action='store_true',
+        help='Keep starting databases after a --rollout failure (a failed canary still stops the rollout)'
+    )
+    parser.add_argument(
+        '--ledger',
+        type=str,
+        help='SQLite file recording --rollout progress (default: ROLLOUT_LEDGER_PATH, or rollout_ledger.sqlite3)'
+    )
+    parser.add_argument(
+        '--partitions',
+        type=str,
+        metavar='TABLE',
+        help='Create upcoming range partitions of TABLE and retire expired ones '
+             '(with --output, write the deployment script instead)'
+    )
+    parser.add_argument(
+        '--interval',
+        type=str,
+        help='Partition interval for --partitions: day, week, month, year or an integer step '
+             '(default: inferred from the newest partition)'
+    )
+    parser.add_argument(
+        '--premake',
+        type=int,
+        help='Intervals to create ahead for --partitions (default: PARTITION_PREMAKE, or 3)'
+    )
+    parser.add_argument(
+        '--retention',
+        type=str,
+        help="Age after which partitions expire for --partitions, e.g. '90 days' (default: PARTITION_RETENTION)"
+    )
+    parser.add_argument(
+        '--retention-action',
+        type=str,
+        choices=['detach', 'drop'],
+        help='What to do with expired partitions (default: PARTITION_RETENTION_ACTION, or detach)'
+    )
+    parser.add_argument(
+        '--install-ddl-trigger',
+        action='store_true',
+        help='Install the DDL event trigger that invalidates the schema cache (requires superuser)'
     )
     parser.add_argument(
         '--verbose', 
@@ -82,6 +199,185 @@ def parse_arguments():
     
     return parser.parse_args()
 
+def run_bulk_load(args, db_connector: DBConnector):
+    """
+    Load a CSV or JSON Lines file into a table
+    
+    Args:
+        args: Parsed command line arguments
+        db_connector: Database connector instance
+    """
+    if not args.table:
+        print("Error: --table is required with --load")
+        sys.exit(1)
+    
+    fmt = args.format
+    if not fmt:
+        fmt = 'jsonl' if args.load.lower().endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+    
+    def report(progress):
+        print(f"  batch {progress['batches']}: {progress['rows']} rows "
+              f"({progress['rows_per_second']:.0f} rows/s)")
+    
+    loader = BulkLoader(db_connector, batch_size=args.batch_size)
+    try:
+        with open(args.load, 'rb') as source:
+            stats = loader.load(source, args.table, args.schema, fmt, progress_callback=report)
+    except (BulkLoadError, OSError) as e:
+        logger.error(f"Bulk load failed: {e}")
+        print(f"Error: {e}")
+        sys.exit(1)
+    
+    print(f"Loaded {stats['rows']} rows into {stats['table']} in {stats['elapsed_seconds']:.2f}s "
+          f"({stats['rows_per_second']:.0f} rows/s)")
+    if stats['ignored_fields']:
+        print(f"Ignored fields: {', '.join(stats['ignored_fields'])}")
+
+def run_migration(args, db_connector: DBConnector):
+    """
+    Apply a deployment script with the lock-aware migration executor
+    
+    Args:
+        args: Parsed command line arguments
+        db_connector: Database connector instance
+    """
+    try:
+        with open(args.apply, 'r') as f:
+            script = f.read()
+    except OSError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    
+    if args.dry_run:
+        for step in plan_steps(extract_migration_sql(script)):
+            mode = 'transaction' if step['transactional'] else 'autocommit'
+            note = ' (rewritten)' if step['rewritten'] else ''
+            print(f"Step {step['index'] + 1} [{mode}]{note}: {step['sql']}")
+        return
+    
+    def report(step):
+        print(f"  step {step['index'] + 1}: {step['status']}"
+              + (f" ({step['attempts']} attempt(s), {step['duration_ms']:.0f} ms)" if step['attempts'] else '')
+              + (f" - {step['error']}" if step['error'] else ''))
+    
+    executor = MigrationExecutor(db_connector)
+    try:
+        result = executor.apply(script, progress_callback=report)
+    except MigrationError as e:
+        logger.error(f"Migration failed: {e}")
+        print(f"Error: {e}")
+        sys.exit(1)
+    
+    if not result['success']:
+        print(f"Migration {result['migration_id']} stopped at step {result['failed_step'] + 1}; "
+              f"re-run to resume after the completed steps")
+        sys.exit(1)
+    print(f"Migration {result['migration_id']} applied in {result['total_ms'] / 1000:.2f}s")
+
+def run_rollout(args, db_connector: DBConnector):
+    """
+    Apply a deployment script to many databases with the rollout engine
+    
+    Args:
+        args: Parsed command line arguments
+        db_connector: Database connector of the default target
+    """
+    if not args.targets:
+        print("Error: --rollout needs --targets")
+        sys.exit(1)
+    try:
+        with open(args.rollout, 'r') as f:
+            script = f.read()
+        engine = RolloutEngine(ConnectionRegistry(db_connector), RolloutLedger(args.ledger),
+                               parallelism=args.parallelism, canary=args.canary)
+        targets = [name.strip() for name in args.targets.split(',') if name.strip()]
+        plan = engine.plan(script, targets)
+    except (OSError, ConnectionRegistryError, RolloutError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    
+    if args.dry_run:
+        print(f"Migration {plan['migration_id']}:")
+        print(f"  canary: {', '.join(plan['canary']) or '-'}")
+        print(f"  then:   {', '.join(plan['to_run']) or '-'}")
+        print(f"  done:   {', '.join(plan['done']) or '-'}")
+        return
+    
+    def report(summary):
+        counts = summary['counts']
+        eta = f", ETA {summary['eta_seconds']:.0f}s" if summary['eta_seconds'] is not None else ''
+        print(f"[{summary['elapsed_seconds']:.0f}s] {counts['succeeded'] + counts['skipped']}/{summary['total']} done, "
+              f"{counts['failed']} failed, {counts['running']} running, {counts['pending']} pending{eta}"
+              + (f" - running: {', '.join(summary['running'])}" if summary['running'] else ''))
+    
+    result = engine.run(script, targets, halt_on_error=not args.continue_on_error, progress_callback=report)
+    for target in result['targets']:
+        if target['status'] in ('failed', 'halted'):
+            print(f"  {target['target']}: {target['status']}" + (f" - {target['error']}" if target['error'] else ''))
+    if not result['success']:
+        print(f"Rollout of {result['migration_id']} incomplete"
+              + (" (halted after a failure)" if result['halted'] else '')
+              + "; re-run to retry the remaining databases")
+        sys.exit(1)
+    print(f"Rollout of {result['migration_id']} finished on {result['summary']['total']} database(s)")
+
+def run_partition_maintenance(args, db_connector: DBConnector):
+    """
+    Create upcoming partitions and retire expired ones for a partitioned table
+    
+    Args:
+        args: Parsed command line arguments
+        db_connector: Database connector instance
+    """
+    try:
+        manager = PartitionManager(db_connector, premake=args.premake, retention=args.retention,
+                                   retention_action=args.retention_action)
+        plan = manager.plan(args.partitions, args.interval)
+    except PartitionError as e:
+        logger.error(f"Partition maintenance failed: {e}")
+        print(f"Error: {e}")
+        sys.exit(1)
+    
+    script = manager.to_script(plan)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(script)
+        print(f"Partition maintenance script written to {args.output}")
+        return
+    if args.dry_run:
+        print(script)
+        return
+    
+    for note in plan['notes']:
+        print(f"Note: {note}")
+    if not plan['create'] and not plan['retire']:
+        print(f"{plan['table']}: partitions are in place and none have expired")
+        return
+    
+    result = manager.apply(plan, progress_callback=lambda step: print(
+        f"  step {step['index'] + 1}: {step['status']}" + (f" - {step['error']}" if step['error'] else '')
+    ))
+    if not result['success']:
+        print(f"Partition maintenance stopped at step {result['failed_step'] + 1}")
+        sys.exit(1)
+    print(f"{plan['table']}: created {len(plan['create'])} partition(s), "
+          f"{'dropped' if manager.retention_action == 'drop' else 'detached'} {len(plan['retire'])}")
+
+def print_candidate_costs(selection: Dict[str, Any]):
+    """
+    Print the cost table of the generated candidates
+    
+    Args:
+        selection: Result of CandidateSelector.select
+    """
+    print(f"\n=== Candidates (equivalence {selection['equivalence']}, sample seed {selection['seed']}) ===")
+    for entry in selection['candidates']:
+        marker = '*' if entry['selected'] else ' '
+        cost = f"{entry['cost']:.2f}" if entry['cost'] is not None else '-'
+        status = entry['error'] or ('equivalent' if entry['equivalent'] else
+                                    'differs' if entry['equivalent'] is False else 'not compared')
+        print(f"{marker} {entry['index'] + 1}: cost {cost}, {status}")
+
 def main():
     """Main entry point for the application"""
     args = parse_arguments()
@@ -89,11 +385,43 @@ def main():
     if args.verbose:
         logging.getLogger().setLevel(logging.DEBUG)
     
-    # Initialize components
-    nlp_processor = NLPProcessor()
-    sql_generator = SQLGenerator()
-    deployment_manager = DeploymentManager()
+    # Database-only modes do not need the OpenAI components
     db_connector = DBConnector()
+    if args.db_connection:
+        try:
+            db_connector = DBConnector(ConnectionRegistry(db_connector).resolve(args.db_connection))
+        except ConnectionRegistryError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+    
+    # Install the schema change trigger
+    if args.install_ddl_trigger:
+        if not db_connector.connect():
+            print("Error: Could not connect to database")
+            sys.exit(1)
+        success, message = db_connector.schema_cache.install_ddl_trigger(db_connector.conn)
+        print(message)
+        sys.exit(0 if success else 1)
+    
+    # Migration mode
+    if args.apply:
+        run_migration(args, db_connector)
+        return
+    
+    # Multi-database rollout mode
+    if args.rollout:
+        run_rollout(args, db_connector)
+        return
+    
+    # Partition maintenance mode
+    if args.partitions:
+        run_partition_maintenance(args, db_connector)
+        return
+    
+    # Bulk load mode
+    if args.load:
+        run_bulk_load(args, db_connector)
+        return
     
     # Check for API key
     api_key = os.getenv("OPENAI_API_KEY")
@@ -102,6 +430,11 @@ def main():
         print("Error: OPENAI_API_KEY not found. Please set it in your environment or .env file.")
         sys.exit(1)
     
+    # Initialize components
+    nlp_processor = NLPProcessor()
+    sql_generator = SQLGenerator(db_connector)
+    deployment_manager = DeploymentManager(db_connector)
+    
     # Interactive mode
     if args.interactive:
         session = InteractiveSession(nlp_processor, sql_generator, deployment_manager)
@@ -122,7 +455,13 @@ def main():
             intent = nlp_processor.process(args.prompt)
             
             # Generate SQL from intent
-            sql_query = sql_generator.generate(intent)
+            if args.candidates > 1:
+                candidates = sql_generator.generate_candidates(intent, args.candidates)
+                selection = CandidateSelector(db_connector).select(candidates)
+                sql_query = selection['sql']
+                print_candidate_costs(selection)
+            else:
+                sql_query = sql_generator.generate(intent)
             
             # Handle deployment if requested
             if args.deploy:
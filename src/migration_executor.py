@@ -0,0 +1,362 @@
+"""
+Migration Executor Module
+Applies deployment scripts in small, lock-aware steps
+"""
+
+import os
+import re
+import time
+import random
+import hashlib
+import logging
+from typing import Dict, Any, List, Optional, Callable
+import psycopg2
+import sqlparse
+
+from .db_connector import DBConnector, split_sql_statements, TRANSACTION_CONTROL
+
+logger = logging.getLogger(__name__)
+
+# Progress of applied steps, used to resume a migration after a failure
+MIGRATION_LOG_DDL = """
+    CREATE TABLE IF NOT EXISTS sql_gpt_migration_log (
+        migration_id text NOT NULL,
+        step integer NOT NULL,
+        statement_hash text NOT NULL,
+        statement text NOT NULL,
+        status text NOT NULL,
+        attempts integer NOT NULL,
+        duration_ms double precision,
+        error text,
+        finished_at timestamptz NOT NULL DEFAULT now(),
+        PRIMARY KEY (migration_id, step)
+    );
+"""
+
+CREATE_INDEX_PATTERN = re.compile(
+    r'^(\s*CREATE\s+(?:UNIQUE\s+)?INDEX\s+)(?!CONCURRENTLY\b)', re.IGNORECASE
+)
+CONCURRENT_INDEX_NAME_PATTERN = re.compile(
+    r'^\s*CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+(?:IF\s+NOT\s+EXISTS\s+)?("(?:[^"]|"")+"|[\w$]+)\s+ON\s+'
+    r'(?:ONLY\s+)?(?:("(?:[^"]|"")+"|[\w$]+)\.)?',
+    re.IGNORECASE
+)
+DROP_INDEX_PATTERN = re.compile(r'^(\s*DROP\s+INDEX\s+)(?!CONCURRENTLY\b)', re.IGNORECASE)
+
+# Statements PostgreSQL refuses to run inside a transaction block
+NON_TRANSACTIONAL_PATTERN = re.compile(
+    r'^\s*(VACUUM|CREATE\s+DATABASE|DROP\s+DATABASE|ALTER\s+SYSTEM|REINDEX\s+.*\bCONCURRENTLY\b|'
+    r'CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY|DROP\s+INDEX\s+CONCURRENTLY|DO\b.*\bCOMMIT\b|'
+    r'ALTER\s+TABLE\s+.*\bDETACH\s+PARTITION\s+.*\bCONCURRENTLY\b)',
+    re.IGNORECASE | re.DOTALL
+)
+
+# Errors worth retrying: the step did not get its locks in time
+RETRYABLE_ERRORS = (psycopg2.errors.LockNotAvailable, psycopg2.errors.DeadlockDetected)
+
+
+class MigrationError(Exception):
+    """Raised when a migration step fails for good"""
+
+
+def extract_migration_sql(script: str) -> str:
+    """
+    Get the forward SQL of a deployment script
+
+    Alembic scripts contribute the op.execute() bodies of upgrade(); plain
+    SQL scripts are used as they are, without the commented-out rollback.
+
+    Args:
+        script: Deployment script created by DeploymentManager, or plain SQL
+
+    Returns:
+        Forward migration SQL
+    """
+    if re.search(r'^def upgrade\(\):', script, re.MULTILINE):
+        upgrade = re.split(r'^def upgrade\(\):', script, maxsplit=1, flags=re.MULTILINE)[1]
+        upgrade = re.split(r'^def ', upgrade, maxsplit=1, flags=re.MULTILINE)[0]
+        bodies = re.findall(r'op\.execute\(\s*(?:"""(.*?)"""|\'\'\'(.*?)\'\'\')\s*\)', upgrade, re.DOTALL)
+        return ';\n'.join(double or single for double, single in bodies).strip()
+    return re.sub(r'/\*\s*--\s*Rollback migration.*?\*/', '', script, flags=re.DOTALL | re.IGNORECASE).strip()
+
+
+def migration_id_of(script: str) -> str:
+    """
+    Find the migration ID of a deployment script
+
+    Args:
+        script: Deployment script
+
+    Returns:
+        The 'Migration ID' or Alembic revision, or a hash of the script
+    """
+    match = re.search(r"--\s*Migration ID:\s*(\S+)|^revision\s*=\s*'([^']+)'", script, re.MULTILINE)
+    if match:
+        return match.group(1) or match.group(2)
+    return hashlib.sha256(script.encode('utf-8')).hexdigest()[:16]
+
+
+def plan_steps(sql_text: str, concurrent_indexes: bool = True) -> List[Dict[str, Any]]:
+    """
+    Split migration SQL into independently committed steps
+
+    Every statement becomes its own step so locks are held only while it
+    runs. Explicit transaction control is dropped, and CREATE INDEX / DROP
+    INDEX are rewritten to their CONCURRENTLY forms, which run outside a
+    transaction and do not block writes.
+
+    Args:
+        sql_text: Migration SQL
+        concurrent_indexes: Rewrite index builds and drops to CONCURRENTLY
+
+    Returns:
+        List of steps with 'sql', 'transactional' and 'rewritten' keys
+    """
+    steps = []
+    for statement in split_sql_statements(sql_text):
+        first = sqlparse.parse(statement)[0].token_first(skip_cm=True)
+        if first is not None and first.normalized in TRANSACTION_CONTROL:
+            continue
+
+        body = sqlparse.format(statement, strip_comments=True).strip()
+        rewritten = body
+        if concurrent_indexes:
+            rewritten = CREATE_INDEX_PATTERN.sub(r'\1CONCURRENTLY ', rewritten, count=1)
+            # DROP INDEX CONCURRENTLY takes a single index and no CASCADE
+            if ',' not in rewritten and not re.search(r'\bCASCADE\b', rewritten, re.IGNORECASE):
+                rewritten = DROP_INDEX_PATTERN.sub(r'\1CONCURRENTLY ', rewritten, count=1)
+
+        steps.append({
+            'index': len(steps),
+            'sql': rewritten,
+            'transactional': not NON_TRANSACTIONAL_PATTERN.match(rewritten),
+            'rewritten': rewritten != body
+        })
+    return steps
+
+
+class MigrationExecutor:
+    """
+    Applies migrations without stalling production traffic.
+
+    Each step runs with a short lock_timeout on a dedicated connection and
+    commits on its own. A step that cannot get its locks in time is retried
+    with exponential backoff and jitter instead of queueing behind (and in
+    front of) other sessions. Finished steps are recorded in
+    sql_gpt_migration_log, so re-applying a failed migration resumes after
+    the last completed step.
+    """
+
+    def __init__(self, db_connector: DBConnector, lock_timeout_ms: Optional[int] = None,
+                 max_retries: Optional[int] = None, base_delay: Optional[float] = None,
+                 max_delay: Optional[float] = None, statement_timeout_ms: Optional[int] = None):
+        """
+        Initialize the migration executor
+
+        Args:
+            db_connector: Connector whose connection parameters are used
+            lock_timeout_ms: Lock wait per attempt (default: MIGRATION_LOCK_TIMEOUT_MS, or 2000)
+            max_retries: Retries per step after a lock timeout (default: MIGRATION_MAX_RETRIES, or 5)
+            base_delay: First backoff delay in seconds (default: MIGRATION_RETRY_BASE_DELAY, or 0.5)
+            max_delay: Longest backoff delay in seconds (default: MIGRATION_RETRY_MAX_DELAY, or 30)
+            statement_timeout_ms: Runtime limit of a transactional step
+                                  (default: MIGRATION_STATEMENT_TIMEOUT_MS, or 0 for none)
+        """
+        self.db_connector = db_connector
+        self.lock_timeout_ms = lock_timeout_ms if lock_timeout_ms is not None else \
+            int(os.getenv('MIGRATION_LOCK_TIMEOUT_MS', '2000'))
+        self.max_retries = max_retries if max_retries is not None else \
+            int(os.getenv('MIGRATION_MAX_RETRIES', '5'))
+        self.base_delay = base_delay if base_delay is not None else \
+            float(os.getenv('MIGRATION_RETRY_BASE_DELAY', '0.5'))
+        self.max_delay = max_delay if max_delay is not None else \
+            float(os.getenv('MIGRATION_RETRY_MAX_DELAY', '30'))
+        self.statement_timeout_ms = statement_timeout_ms if statement_timeout_ms is not None else \
+            int(os.getenv('MIGRATION_STATEMENT_TIMEOUT_MS', '0'))
+        self.sleep = time.sleep
+        logger.debug("Migration executor initialized")
+
+    def apply(self, script: str, migration_id: Optional[str] = None, concurrent_indexes: bool = True,
+              progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """
+        Apply a deployment script step by step
+
+        Args:
+            script: Deployment script (plain SQL or Alembic) or migration SQL
+            migration_id: ID to record progress under (default: taken from the script)
+            concurrent_indexes: Rewrite index builds and drops to CONCURRENTLY
+            progress_callback: Called with each step after it finishes or is skipped
+
+        Returns:
+            Report with the per-step status, attempts and durations
+
+        Raises:
+            MigrationError: If the database cannot be reached or the script has no steps
+        """
+        migration_id = migration_id or migration_id_of(script)
+        steps = plan_steps(extract_migration_sql(script), concurrent_indexes)
+        if not steps:
+            raise MigrationError("The migration contains no statements")
+
+        try:
+            conn = psycopg2.connect(**self.db_connector.connection_params)
+        except psycopg2.Error as e:
+            raise MigrationError(f"Could not connect to database: {e}")
+
+        started = time.perf_counter()
+        failed = None
+        try:
+            conn.autocommit = True
+            completed = self._completed_steps(conn, migration_id)
+            for step in steps:
+                step.update({'status': 'pending', 'attempts': 0, 'duration_ms': None, 'error': None})
+                if completed.get(step['index']) == self._hash(step['sql']):
+                    step['status'] = 'already_applied'
+                elif failed is None:
+                    self._run_step(conn, step)
+                    self._record(conn, migration_id, step)
+                    if step['status'] == 'failed':
+                        failed = step['index']
+                else:
+                    step['status'] = 'not_run'
+                logger.info(f"Migration {migration_id} step {step['index'] + 1}/{len(steps)}: {step['status']}"
+                            + (f" after {step['attempts']} attempt(s) in {step['duration_ms']} ms"
+                               if step['attempts'] else ''))
+                if progress_callback:
+                    progress_callback(step)
+        finally:
+            conn.close()
+
+        self.db_connector.schema_cache.invalidate(f"migration {migration_id} applied")
+        return {
+            'migration_id': migration_id,
+            'success': failed is None,
+            'failed_step': failed,
+            'steps': steps,
+            'total_ms': round((time.perf_counter() - started) * 1000, 3)
+        }
+
+    def _run_step(self, conn, step: Dict[str, Any]):
+        """Run one step, retrying while it cannot get its locks"""
+        step_started = time.perf_counter()
+        for attempt in range(self.max_retries + 1):
+            step['attempts'] = attempt + 1
+            try:
+                if step['transactional']:
+                    self._run_transactional(conn, step['sql'])
+                else:
+                    self._run_concurrent(conn, step['sql'])
+                step['status'] = 'succeeded'
+                step['error'] = None
+                break
+            except RETRYABLE_ERRORS as e:
+                step['error'] = str(e).split('\n')[0]
+                if attempt == self.max_retries:
+                    step['status'] = 'failed'
+                    break
+                delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+                delay = random.uniform(delay / 2, delay)
+                logger.warning(f"Step {step['index'] + 1} could not get its locks "
+                               f"(attempt {attempt + 1}), retrying in {delay:.2f}s")
+                self.sleep(delay)
+            except psycopg2.Error as e:
+                step['error'] = str(e).split('\n')[0]
+                step['status'] = 'failed'
+                break
+        step['duration_ms'] = round((time.perf_counter() - step_started) * 1000, 3)
+
+    def _run_transactional(self, conn, statement: str):
+        """Run a statement in its own short transaction with local timeouts"""
+        conn.autocommit = False
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT set_config('lock_timeout', %s, true);", (f"{self.lock_timeout_ms}ms",))
+                if self.statement_timeout_ms:
+                    cursor.execute("SELECT set_config('statement_timeout', %s, true);",
+                                   (f"{self.statement_timeout_ms}ms",))
+                cursor.execute(statement)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.autocommit = True
+
+    def _run_concurrent(self, conn, statement: str):
+        """Run a statement that must not be inside a transaction block"""
+        with conn.cursor() as cursor:
+            self._drop_invalid_index(cursor, statement)
+            cursor.execute("SELECT set_config('lock_timeout', %s, false);", (f"{self.lock_timeout_ms}ms",))
+            try:
+                cursor.execute(statement)
+            except psycopg2.Error:
+                # A failed concurrent build leaves an invalid index behind
+                self._drop_invalid_index(cursor, statement)
+                raise
+            finally:
+                cursor.execute("RESET lock_timeout;")
+
+    @staticmethod
+    def _drop_invalid_index(cursor, statement: str):
+        """Drop the invalid leftover of an interrupted CREATE INDEX CONCURRENTLY"""
+        match = CONCURRENT_INDEX_NAME_PATTERN.match(statement)
+        if not match:
+            return
+
+        def unquote(identifier):
+            if identifier and identifier.startswith('"'):
+                return identifier[1:-1].replace('""', '"')
+            return identifier.lower() if identifier else identifier
+
+        name, schema = unquote(match.group(1)), unquote(match.group(2))
+        cursor.execute(
+            """
+            SELECT quote_ident(n.nspname) || '.' || quote_ident(c.relname)
+            FROM pg_catalog.pg_index i
+            JOIN pg_catalog.pg_class c ON c.oid = i.indexrelid
+            JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+            WHERE c.relname = %s AND NOT i.indisvalid
+            AND (%s::text IS NULL AND n.nspname = ANY(current_schemas(false)) OR n.nspname = %s);
+            """,
+            (name, schema, schema)
+        )
+        for (qualified,) in cursor.fetchall():
+            logger.warning(f"Dropping invalid index {qualified} left by an interrupted build")
+            cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {qualified};")
+
+    @staticmethod
+    def _hash(statement: str) -> str:
+        """Fingerprint of a step, so a changed script does not skip changed steps"""
+        return hashlib.sha256(statement.encode('utf-8')).hexdigest()
+
+    def _completed_steps(self, conn, migration_id: str) -> Dict[int, str]:
+        """Read the steps of a migration that already succeeded"""
+        with conn.cursor() as cursor:
+            cursor.execute(MIGRATION_LOG_DDL)
+            cursor.execute(
+                "SELECT step, statement_hash FROM sql_gpt_migration_log "
+                "WHERE migration_id = %s AND status = 'succeeded';",
+                (migration_id,)
+            )
+            return dict(cursor.fetchall())
+
+    def _record(self, conn, migration_id: str, step: Dict[str, Any]):
+        """Write the outcome of a step to the progress log"""
+        with conn.cursor() as cursor:
+            cursor.execute(
+                """
+                INSERT INTO sql_gpt_migration_log
+                    (migration_id, step, statement_hash, statement, status, attempts, duration_ms, error)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                ON CONFLICT (migration_id, step) DO UPDATE SET
+                    statement_hash = EXCLUDED.statement_hash,
+                    statement = EXCLUDED.statement,
+                    status = EXCLUDED.status,
+                    attempts = EXCLUDED.attempts,
+                    duration_ms = EXCLUDED.duration_ms,
+                    error = EXCLUDED.error,
+                    finished_at = now();
+                """,
+                (migration_id, step['index'], self._hash(step['sql']), step['sql'], step['status'],
+                 step['attempts'], step['duration_ms'], step['error'])
+            )
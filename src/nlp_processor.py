@@ -9,6 +9,8 @@ import logging
 from typing import Dict, Any, List, Optional
 import openai
 
+from .shared_cache import LLMCache
+
 logger = logging.getLogger(__name__)
 
 class NLPProcessor:
@@ -19,6 +21,7 @@ class NLPProcessor:
     def __init__(self):
         """Initialize the NLP processor with OpenAI client"""
         self.client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.llm_cache = LLMCache()
         logger.debug("NLP Processor initialized")
         
     def process(self, prompt: str) -> Dict[str, Any]:
@@ -56,11 +59,10 @@ class NLPProcessor:
         """
         
         try:
-            logger.info(f"Using OpenAI API key: {os.getenv('OPENAI_API_KEY')[:10]}...")
-            
             # Call the OpenAI API to process the prompt
             try:
-                response = self.client.chat.completions.create(
+                content = self.llm_cache.complete(
+                    self.client,
                     model="gpt-4-turbo",  # Use an appropriate model
                     messages=[
                         {"role": "system", "content": system_message},
@@ -69,8 +71,7 @@ class NLPProcessor:
                     response_format={"type": "json_object"}
                 )
                 
-                # Extract and parse the JSON response
-                content = response.choices[0].message.content
+                # Parse the JSON response
                 logger.debug(f"Raw response content: {content}")
                 
                 intent = json.loads(content)
@@ -112,7 +113,8 @@ class NLPProcessor:
         
         try:
             # Call the OpenAI API to refine the intent
-            response = self.client.chat.completions.create(
+            content = self.llm_cache.complete(
+                self.client,
                 model="gpt-4-turbo",  # Use an appropriate model
                 messages=[
                     {"role": "system", "content": system_message},
@@ -121,8 +123,7 @@ class NLPProcessor:
                 response_format={"type": "json_object"}
             )
             
-            # Extract and parse the JSON response
-            content = response.choices[0].message.content
+            # Parse the JSON response
             refined_intent = json.loads(content)
             
             logger.debug(f"Refined intent: {json.dumps(refined_intent, indent=2)}")
@@ -0,0 +1,451 @@
+"""
+Partition Manager Module
+Creates future range partitions ahead of time and retires expired ones
+"""
+
+import os
+import re
+import logging
+from datetime import date, datetime, timedelta
+from typing import Dict, Any, Optional, Union
+import psycopg2
+from psycopg2 import sql
+
+from .db_connector import DBConnector
+from .migration_executor import MigrationExecutor
+
+logger = logging.getLogger(__name__)
+
+PARTITION_INTERVALS = ('day', 'week', 'month', 'year')
+RETENTION_ACTIONS = ('detach', 'drop')
+
+TIME_TYPES = ('date', 'timestamp without time zone', 'timestamp with time zone')
+INTEGER_TYPES = ('smallint', 'integer', 'bigint')
+
+PARTITIONED_TABLE_SQL = """
+    SELECT
+        p.partstrat,
+        p.partnatts,
+        a.attname,
+        format_type(a.atttypid, a.atttypmod),
+        p.partdefid,
+        current_setting('server_version_num')::int,
+        now()
+    FROM pg_catalog.pg_partitioned_table p
+    JOIN pg_catalog.pg_attribute a ON a.attrelid = p.partrelid AND a.attnum = p.partattrs[0]
+    WHERE p.partrelid = to_regclass(%s);
+"""
+
+PARTITIONS_SQL = """
+    SELECT
+        n.nspname,
+        c.relname,
+        pg_get_expr(c.relpartbound, c.oid),
+        c.reltuples
+    FROM pg_catalog.pg_inherits i
+    JOIN pg_catalog.pg_class c ON c.oid = i.inhrelid
+    JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+    WHERE i.inhparent = to_regclass(%s)
+    ORDER BY c.relname;
+"""
+
+RANGE_BOUND_PATTERN = re.compile(r"FOR VALUES FROM \((.+)\) TO \((.+)\)$")
+RETENTION_PATTERN = re.compile(r'^\s*(\d+)\s*(day|week|month|year)s?\s*$', re.IGNORECASE)
+
+
+class PartitionError(Exception):
+    """Raised when a table cannot be managed"""
+
+
+def quote_identifier(name: str) -> str:
+    """Quote an identifier for SQL text generated without a connection"""
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _parse_bound(value: str, key_type: str) -> Union[date, datetime, int, str]:
+    """Convert a partition bound literal into a Python value"""
+    value = value.strip()
+    if value.upper() in ('MINVALUE', 'MAXVALUE'):
+        return value.upper()
+    value = value.split('::')[0].strip("'")
+    if key_type == 'date':
+        return date.fromisoformat(value)
+    if key_type in TIME_TYPES:
+        # PostgreSQL prints offsets as +00 or +05:30
+        value = re.sub(r'([+-]\d{2})$', r'\1:00', value)
+        return datetime.fromisoformat(value)
+    return int(value)
+
+
+def add_interval(value: Union[date, datetime, int], interval: Union[str, int],
+                 count: int = 1) -> Union[date, datetime, int]:
+    """
+    Move a bound forward by a number of partition intervals
+
+    Args:
+        value: Bound value
+        interval: 'day', 'week', 'month', 'year', or an integer step for numeric keys
+        count: Number of intervals (may be negative)
+
+    Returns:
+        The shifted bound
+    """
+    if isinstance(interval, int):
+        return value + interval * count
+    if interval == 'day':
+        return value + timedelta(days=count)
+    if interval == 'week':
+        return value + timedelta(weeks=count)
+    months = count * (12 if interval == 'year' else 1)
+    month_index = value.year * 12 + value.month - 1 + months
+    year, month = month_index // 12, month_index % 12 + 1
+    # Clamp to the last day of shorter months (Jan 31 + 1 month = Feb 29)
+    next_month = date(year + month // 12, month % 12 + 1, 1)
+    return value.replace(year=year, month=month, day=min(value.day, (next_month - timedelta(days=1)).day))
+
+
+def truncate_to_interval(value: Union[date, datetime], interval: str) -> Union[date, datetime]:
+    """
+    Find the start of the interval containing a point in time
+
+    Args:
+        value: Date or timestamp
+        interval: 'day', 'week' (starting Monday), 'month' or 'year'
+
+    Returns:
+        Start of the interval
+    """
+    if isinstance(value, datetime):
+        value = value.replace(hour=0, minute=0, second=0, microsecond=0)
+    if interval == 'week':
+        return value - timedelta(days=value.weekday())
+    if interval == 'month':
+        return value.replace(day=1)
+    if interval == 'year':
+        return value.replace(month=1, day=1)
+    return value
+
+
+def infer_interval(lower, upper) -> Union[str, int, None]:
+    """
+    Infer the partition interval from the bounds of one partition
+
+    Args:
+        lower: Lower bound
+        upper: Upper bound
+
+    Returns:
+        Interval name, integer step, or None if it cannot be inferred
+    """
+    if isinstance(lower, int) and isinstance(upper, int):
+        return upper - lower
+    if not isinstance(lower, date) or not isinstance(upper, date):
+        return None
+    for interval in PARTITION_INTERVALS:
+        if add_interval(lower, interval) == upper:
+            return interval
+    return None
+
+
+class PartitionManager:
+    """
+    Keeps range-partitioned tables supplied with partitions.
+
+    Partitions are read from pg_inherits and pg_partitioned_table. Future
+    partitions are created a configurable number of intervals ahead; rows
+    that already spilled into the default partition for a new range are
+    moved into it in the same transaction. Partitions whose upper bound is
+    older than the retention period are detached (concurrently when
+    possible) or dropped. Changes are applied through the migration
+    executor, so they run with lock timeouts and retries.
+    """
+
+    def __init__(self, db_connector: DBConnector, premake: Optional[int] = None,
+                 retention: Optional[str] = None, retention_action: Optional[str] = None):
+        """
+        Initialize the partition manager
+
+        Args:
+            db_connector: Connector whose connection parameters are used
+            premake: Intervals to create ahead of the current one
+                     (default: PARTITION_PREMAKE environment variable, or 3)
+            retention: Age after which partitions expire, e.g. '90 days' or
+                       '12 months' (default: PARTITION_RETENTION, or keep all)
+            retention_action: 'detach' or 'drop'
+                              (default: PARTITION_RETENTION_ACTION, or 'detach')
+        """
+        self.db_connector = db_connector
+        self.premake = premake if premake is not None else int(os.getenv('PARTITION_PREMAKE', '3'))
+        self.retention = retention if retention is not None else (os.getenv('PARTITION_RETENTION') or None)
+        self.retention_action = retention_action or os.getenv('PARTITION_RETENTION_ACTION', 'detach')
+        if self.retention and not RETENTION_PATTERN.match(self.retention):
+            raise PartitionError(f"Invalid retention '{self.retention}', expected e.g. '90 days' or '12 months'")
+        if self.retention_action not in RETENTION_ACTIONS:
+            raise PartitionError(f"Retention action must be one of {', '.join(RETENTION_ACTIONS)}")
+        logger.debug("Partition manager initialized")
+
+    def inspect(self, table: str) -> Dict[str, Any]:
+        """
+        Read the partitioning of a table
+
+        Args:
+            table: Partitioned table name, optionally schema-qualified
+
+        Returns:
+            Dictionary with the key, key type, default partition and range
+            partitions ordered by lower bound
+
+        Raises:
+            PartitionError: If the table is not range-partitioned on one column
+        """
+        try:
+            conn = psycopg2.connect(**self.db_connector.connection_params)
+        except psycopg2.Error as e:
+            raise PartitionError(f"Could not connect to database: {e}")
+
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(PARTITIONED_TABLE_SQL, (table,))
+                row = cursor.fetchone()
+                if row is None:
+                    raise PartitionError(f"{table} is not a partitioned table")
+                strategy, key_count, key, key_type, default_oid, server_version, now = row
+                if strategy != 'r' or key_count != 1:
+                    raise PartitionError(f"{table} must be range-partitioned on a single column")
+                if key_type not in TIME_TYPES + INTEGER_TYPES:
+                    raise PartitionError(f"Unsupported partition key type {key_type}")
+
+                cursor.execute(
+                    "SELECT n.nspname, c.relname FROM pg_catalog.pg_class c "
+                    "JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace WHERE c.oid = to_regclass(%s);",
+                    (table,)
+                )
+                schema, name = cursor.fetchone()
+
+                max_key = None
+                if key_type in INTEGER_TYPES:
+                    cursor.execute(sql.SQL("SELECT max({}) FROM {}.{};").format(
+                        sql.Identifier(key), sql.Identifier(schema), sql.Identifier(name)
+                    ))
+                    max_key = cursor.fetchone()[0]
+
+                cursor.execute(PARTITIONS_SQL, (table,))
+                partitions, default = [], None
+                for part_schema, part_name, bound, rows in cursor.fetchall():
+                    qualified = f"{quote_identifier(part_schema)}.{quote_identifier(part_name)}"
+                    if bound == 'DEFAULT':
+                        default = qualified
+                        continue
+                    match = RANGE_BOUND_PATTERN.match(bound)
+                    if not match:
+                        continue
+                    partitions.append({
+                        'name': qualified,
+                        'lower': _parse_bound(match.group(1), key_type),
+                        'upper': _parse_bound(match.group(2), key_type),
+                        'estimated_rows': max(rows, 0)
+                    })
+        finally:
+            conn.rollback()
+            conn.close()
+
+        bounded = [p for p in partitions if not isinstance(p['lower'], str) and not isinstance(p['upper'], str)]
+        bounded.sort(key=lambda p: p['lower'])
+        return {
+            'table': f"{quote_identifier(schema)}.{quote_identifier(name)}",
+            'schema': schema,
+            'name': name,
+            'key': key,
+            'key_type': key_type,
+            'default_partition': default,
+            'partitions': bounded,
+            'max_key': max_key,
+            'server_version': server_version,
+            'now': now
+        }
+
+    def plan(self, table: str, interval: Union[str, int, None] = None) -> Dict[str, Any]:
+        """
+        Work out which partitions to create and which to retire
+
+        Args:
+            table: Partitioned table name
+            interval: Partition interval ('day', 'week', 'month', 'year' or an
+                      integer step); inferred from the newest partition if omitted
+
+        Returns:
+            The inspected table plus 'interval', 'create' and 'retire' lists
+        """
+        info = self.inspect(table)
+        partitions = info['partitions']
+        if interval is None and partitions:
+            interval = infer_interval(partitions[-1]['lower'], partitions[-1]['upper'])
+        if interval is None:
+            raise PartitionError(f"Cannot infer the partition interval of {table}; pass it explicitly")
+        if isinstance(interval, str) and interval.isdigit():
+            interval = int(interval)
+        time_key = info['key_type'] in TIME_TYPES
+        if time_key and interval not in PARTITION_INTERVALS:
+            raise PartitionError(f"Interval must be one of {', '.join(PARTITION_INTERVALS)} for {info['key_type']} keys")
+        if not time_key and not isinstance(interval, int):
+            raise PartitionError("Integer partition keys need an integer interval")
+
+        # Partitions must cover the current interval (time keys) or the one
+        # holding the largest key (integer keys), plus `premake` intervals
+        if time_key:
+            current = truncate_to_interval(self._now(info), interval)
+        else:
+            base = partitions[0]['lower'] if partitions else 0
+            newest = info['max_key'] if info['max_key'] is not None else base
+            current = base + (newest - base) // interval * interval
+        target = add_interval(current, interval, self.premake + 1)
+        # Continue after the newest partition, but do not back-fill intervals
+        # that are already in the past
+        notes = []
+        start = current
+        if partitions:
+            start = max(partitions[-1]['upper'], current)
+            if partitions[-1]['upper'] < current:
+                notes.append(f"No partitions cover [{partitions[-1]['upper']}, {current}); rows in that range "
+                             f"{'go to the default partition' if info['default_partition'] else 'are rejected'}")
+
+        create = []
+        lower = start
+        while lower < target:
+            upper = add_interval(lower, interval)
+            if not any(p['lower'] < upper and lower < p['upper'] for p in partitions):
+                create.append({
+                    'name': self._partition_name(info, lower, interval),
+                    'lower': lower,
+                    'upper': upper
+                })
+            lower = upper
+
+        retire = []
+        if self.retention and time_key:
+            count, unit = RETENTION_PATTERN.match(self.retention).groups()
+            cutoff = add_interval(self._now(info), unit.lower(), -int(count))
+            retire = [p for p in partitions if p['upper'] <= cutoff]
+
+        info.update({'interval': interval, 'create': create, 'retire': retire, 'notes': notes})
+        return info
+
+    def to_script(self, plan: Dict[str, Any]) -> str:
+        """
+        Render a partition plan as a deployment script
+
+        Args:
+            plan: Result of plan()
+
+        Returns:
+            SQL script; apply it with the migration executor (or psql outside
+            a transaction), since detaching concurrently cannot run in one
+        """
+        lines = [
+            f"-- Partition maintenance: {plan['table']}",
+            f"-- Created: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
+            f"-- Migration ID: partitions_{plan['name']}_{datetime.now().strftime('%Y%m%d%H%M%S')}",
+            f"-- Interval: {plan['interval']}, premake: {self.premake}, "
+            f"retention: {self.retention or 'none'} ({self.retention_action})",
+            "-- Each statement commits on its own; do not wrap this script in a transaction.",
+            *(f"-- Note: {note}" for note in plan['notes']),
+            ""
+        ]
+        for partition in plan['create']:
+            lines.append(f"-- New partition for [{partition['lower']}, {partition['upper']})")
+            lines.append(self._create_sql(plan, partition) + "\n")
+
+        # DETACH ... CONCURRENTLY needs PostgreSQL 14 and no default partition
+        concurrently = plan['server_version'] >= 140000 and plan['default_partition'] is None
+        for partition in plan['retire']:
+            lines.append(f"-- Expired partition [{partition['lower']}, {partition['upper']})")
+            lines.append(f"ALTER TABLE {plan['table']} DETACH PARTITION {partition['name']}"
+                         f"{' CONCURRENTLY' if concurrently else ''};")
+            if self.retention_action == 'drop':
+                lines.append(f"DROP TABLE IF EXISTS {partition['name']};")
+            lines.append("")
+
+        if not plan['create'] and not plan['retire']:
+            lines.append("-- Nothing to do: partitions are in place and none have expired")
+        return '\n'.join(lines).rstrip() + '\n'
+
+    def apply(self, plan: Dict[str, Any], progress_callback=None) -> Dict[str, Any]:
+        """
+        Apply a partition plan through the migration executor
+
+        Args:
+            plan: Result of plan()
+            progress_callback: Called with each step after it finishes
+
+        Returns:
+            Migration executor report
+        """
+        script = self.to_script(plan)
+        executor = MigrationExecutor(self.db_connector)
+        return executor.apply(script, concurrent_indexes=False, progress_callback=progress_callback)
+
+    def _create_sql(self, plan: Dict[str, Any], partition: Dict[str, Any]) -> str:
+        """
+        SQL creating one partition
+
+        When a default partition exists, rows of the new range that landed
+        there are moved into the new partition in the same transaction, as
+        PostgreSQL refuses to create a partition that the default partition
+        already holds rows for.
+        """
+        lower, upper = self._literal(partition['lower']), self._literal(partition['upper'])
+        if plan['default_partition'] is None:
+            return (f"CREATE TABLE IF NOT EXISTS {partition['name']} PARTITION OF {plan['table']}\n"
+                    f"    FOR VALUES FROM ({lower}) TO ({upper});")
+
+        key = quote_identifier(plan['key'])
+        default = plan['default_partition']
+        return f"""DO $sql_gpt_partition$
+BEGIN
+    IF to_regclass({self._text_literal(partition['name'])}) IS NULL THEN
+        CREATE TABLE {partition['name']} (LIKE {plan['table']} INCLUDING DEFAULTS INCLUDING CONSTRAINTS);
+        WITH moved AS (
+            DELETE FROM {default} WHERE {key} >= {lower} AND {key} < {upper} RETURNING *
+        )
+        INSERT INTO {partition['name']} SELECT * FROM moved;
+        ALTER TABLE {plan['table']} ATTACH PARTITION {partition['name']} FOR VALUES FROM ({lower}) TO ({upper});
+    END IF;
+END
+$sql_gpt_partition$;"""
+
+    @staticmethod
+    def _now(info: Dict[str, Any]) -> Union[date, datetime]:
+        """Current database time in the type of the partition key"""
+        if info['key_type'] == 'date':
+            return info['now'].date()
+        if info['key_type'] == 'timestamp without time zone':
+            return info['now'].replace(tzinfo=None)
+        return info['now']
+
+    @staticmethod
+    def _partition_name(info: Dict[str, Any], lower, interval) -> str:
+        """Schema-qualified name of a new partition, e.g. events_p2024_06"""
+        if isinstance(lower, int):
+            suffix = str(lower).replace('-', 'm')
+        elif interval == 'year':
+            suffix = lower.strftime('%Y')
+        elif interval == 'month':
+            suffix = lower.strftime('%Y_%m')
+        else:
+            suffix = lower.strftime('%Y%m%d')
+        name = f"{info['name']}_p{suffix}"[:63]
+        return f"{quote_identifier(info['schema'])}.{quote_identifier(name)}"
+
+    @staticmethod
+    def _literal(value) -> str:
+        """Format a bound as a SQL literal"""
+        if isinstance(value, int):
+            return str(value)
+        if isinstance(value, datetime):
+            return f"'{value.isoformat(sep=' ')}'"
+        return f"'{value.isoformat()}'"
+
+    @staticmethod
+    def _text_literal(value: str) -> str:
+        """Quote a string as a SQL literal"""
+        return "'" + value.replace("'", "''") + "'"
@@ -0,0 +1,399 @@
+"""
+Plan Analyzer Module
+Captures execution plans of generated queries, flags problems and proposes indexes
+"""
+
+import os
+import re
+import logging
+from typing import Dict, Any, List, Optional, Iterator, Tuple
+import psycopg2
+import sqlparse
+from psycopg2 import sql
+
+from .db_connector import DBConnector
+
+logger = logging.getLogger(__name__)
+
+ANALYZABLE_TYPES = ('SELECT', 'UPDATE', 'DELETE')
+
+# Candidate indexes tested per query
+MAX_INDEX_CANDIDATES = 6
+
+# Minimum plan cost reduction for an index to be suggested
+MIN_IMPROVEMENT_PCT = 10.0
+
+# Plan node keys that hold join and sort expressions
+JOIN_KEYS = ('Hash Cond', 'Merge Cond', 'Join Filter', 'Index Cond', 'Recheck Cond')
+
+
+class PlanAnalysisError(Exception):
+    """Raised when a query cannot be analyzed"""
+
+
+def walk_plan(plan: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """
+    Iterate over a plan node and all of its descendants
+
+    Args:
+        plan: Plan node from EXPLAIN (FORMAT JSON)
+
+    Returns:
+        Iterator of plan nodes
+    """
+    yield plan
+    for child in plan.get('Plans', []):
+        yield from walk_plan(child)
+
+
+def _column_pattern(alias: str, column: str) -> str:
+    """Regex matching a column reference, optionally qualified by the alias"""
+    quoted = re.escape(f'"{column}"')
+    bare = rf'\b{re.escape(column)}\b'
+    return rf'(?:\b{re.escape(alias)}\.)?(?:{quoted}|{bare})'
+
+
+class PlanAnalyzer:
+    """
+    Runs EXPLAIN on a query and interprets the plan.
+
+    Analysis runs on a dedicated connection, always inside a transaction that
+    is rolled back, so EXPLAIN ANALYZE of an UPDATE or DELETE leaves no
+    changes behind. Candidate indexes are tested with hypopg when the
+    extension is installed, otherwise by creating them for real inside a
+    throwaway transaction (only for tables below a size limit, because the
+    build locks the table against writes while it runs).
+    """
+
+    def __init__(self, db_connector: DBConnector, large_table_rows: Optional[int] = None,
+                 misestimate_factor: Optional[float] = None, max_index_test_rows: Optional[int] = None):
+        """
+        Initialize the plan analyzer
+
+        Args:
+            db_connector: Database connector whose connection parameters are used
+            large_table_rows: Row count from which a sequential scan is flagged
+                              (default: PLAN_LARGE_TABLE_ROWS, or 10000)
+            misestimate_factor: Ratio between estimated and actual rows that is
+                                flagged (default: PLAN_MISESTIMATE_FACTOR, or 10)
+            max_index_test_rows: Largest table on which candidate indexes are
+                                 built for real (default: INDEX_ADVISOR_MAX_TABLE_ROWS,
+                                 or 5000000)
+        """
+        self.db_connector = db_connector
+        self.large_table_rows = large_table_rows if large_table_rows is not None else \
+            int(os.getenv('PLAN_LARGE_TABLE_ROWS', '10000'))
+        self.misestimate_factor = misestimate_factor if misestimate_factor is not None else \
+            float(os.getenv('PLAN_MISESTIMATE_FACTOR', '10'))
+        self.max_index_test_rows = max_index_test_rows if max_index_test_rows is not None else \
+            int(os.getenv('INDEX_ADVISOR_MAX_TABLE_ROWS', '5000000'))
+        self.timeout_ms = int(os.getenv('PLAN_ANALYZE_TIMEOUT_MS', '30000'))
+        logger.debug("Plan analyzer initialized")
+
+    def analyze(self, query: str, analyze: bool = False, suggest_indexes: bool = True) -> Dict[str, Any]:
+        """
+        Capture and analyze the plan of a query
+
+        Args:
+            query: A single SELECT, UPDATE or DELETE statement
+            analyze: Run EXPLAIN ANALYZE (the statement executes, then is rolled back)
+            suggest_indexes: Test candidate indexes for sequential scans
+
+        Returns:
+            Dictionary with the plan, cost and timing summary, issues and index suggestions
+        """
+        statement = self._single_statement(query)
+
+        conn = None
+        try:
+            conn = psycopg2.connect(**self.db_connector.connection_params)
+            with conn.cursor() as cursor:
+                # Session-level, so every later transaction (baseline plan, test index builds) is bounded too
+                cursor.execute("SELECT set_config('statement_timeout', %s, false);", (f"{self.timeout_ms}ms",))
+            conn.commit()
+            with conn.cursor() as cursor:
+                result = self._explain(cursor, statement, analyze)
+            conn.rollback()
+
+            plan = result['Plan']
+            tables = self._table_info(conn, plan)
+            analysis = {
+                'analyzed': analyze,
+                'total_cost': plan.get('Total Cost'),
+                'estimated_rows': plan.get('Plan Rows'),
+                'planning_ms': result.get('Planning Time'),
+                'execution_ms': result.get('Execution Time'),
+                'plan': result,
+                'issues': self.find_issues(plan, tables, analyze),
+                'index_suggestions': [],
+                'advisor_notes': []
+            }
+            if suggest_indexes:
+                self._advise(conn, statement, plan, tables, analysis)
+            return analysis
+        except psycopg2.Error as e:
+            raise PlanAnalysisError(str(e).split('\n')[0])
+        finally:
+            if conn is not None:
+                conn.rollback()
+                conn.close()
+
+    def find_issues(self, plan: Dict[str, Any], tables: Dict[Tuple[str, str], Dict[str, Any]],
+                    analyzed: bool) -> List[Dict[str, Any]]:
+        """
+        Flag problems in a plan
+
+        Args:
+            plan: Root plan node
+            tables: Row counts and columns of the scanned tables
+            analyzed: Whether the plan carries actual row counts and timings
+
+        Returns:
+            List of issues with type, severity, node and message
+        """
+        issues = []
+        for node in walk_plan(plan):
+            node_type = node.get('Node Type')
+            relation = self._relation(node)
+
+            if node_type == 'Seq Scan' and relation in tables:
+                rows = tables[relation]['rows']
+                if rows >= self.large_table_rows:
+                    issues.append({
+                        'type': 'seq_scan',
+                        'severity': 'warning',
+                        'node': node_type,
+                        'relation': '.'.join(relation),
+                        'message': f"Sequential scan on {'.'.join(relation)} (~{int(rows)} rows)"
+                                   + (f" with filter {node['Filter']}" if node.get('Filter') else '')
+                    })
+
+            if analyzed and node.get('Actual Loops'):
+                estimated = node.get('Plan Rows', 0)
+                actual = node.get('Actual Rows', 0)
+                high, low = max(estimated, actual), max(min(estimated, actual), 1)
+                if high >= 100 and high / low >= self.misestimate_factor:
+                    issues.append({
+                        'type': 'misestimate',
+                        'severity': 'warning',
+                        'node': node_type,
+                        'relation': '.'.join(relation) if relation else None,
+                        'message': f"{node_type} estimated {estimated} rows but returned {actual} "
+                                   f"(off by {high / low:.0f}x); statistics may be stale"
+                    })
+
+            if node.get('Sort Space Type') == 'Disk':
+                issues.append({
+                    'type': 'disk_sort',
+                    'severity': 'warning',
+                    'node': node_type,
+                    'relation': None,
+                    'message': f"Sort spilled to disk ({node.get('Sort Method')}, "
+                               f"{node.get('Sort Space Used')} kB); consider more work_mem or an index "
+                               f"on {', '.join(node.get('Sort Key', []))}"
+                })
+
+            if node.get('Hash Batches', 1) > 1:
+                issues.append({
+                    'type': 'hash_spill',
+                    'severity': 'warning',
+                    'node': node_type,
+                    'relation': None,
+                    'message': f"Hash used {node['Hash Batches']} batches and spilled to disk "
+                               f"({node.get('Peak Memory Usage')} kB in memory)"
+                })
+        return issues
+
+    def candidate_indexes(self, plan: Dict[str, Any],
+                          tables: Dict[Tuple[str, str], Dict[str, Any]]) -> List[Tuple[Tuple[str, str], List[str]]]:
+        """
+        Derive candidate indexes from sequential scans on large tables
+
+        Filter columns compared with = come first in a composite candidate,
+        followed by one range column; join and sort columns of the scanned
+        table are proposed as single-column indexes.
+
+        Args:
+            plan: Root plan node
+            tables: Row counts and columns of the scanned tables
+
+        Returns:
+            List of (relation, columns) candidates
+        """
+        expressions = []
+        for node in walk_plan(plan):
+            expressions.extend(node[key] for key in JOIN_KEYS if node.get(key))
+            expressions.extend(node.get('Sort Key', []))
+            expressions.extend(node.get('Group Key', []))
+
+        candidates = []
+        for node in walk_plan(plan):
+            relation = self._relation(node)
+            if node.get('Node Type') != 'Seq Scan' or relation not in tables:
+                continue
+            if tables[relation]['rows'] < self.large_table_rows:
+                continue
+            alias = node.get('Alias', relation[1])
+            condition = node.get('Filter') or ''
+
+            equality, ranges = [], []
+            for column in tables[relation]['columns']:
+                pattern = _column_pattern(alias, column)
+                if re.search(pattern + r'\s*(=|= ANY)\s', condition):
+                    equality.append(column)
+                elif re.search(pattern + r'\s*(<|>|<=|>=|~~)\s', condition):
+                    ranges.append(column)
+            if equality or ranges:
+                candidates.append((relation, equality + ranges[:1]))
+                for column in equality + ranges:
+                    candidates.append((relation, [column]))
+
+            joined = ' '.join(expressions)
+            for column in tables[relation]['columns']:
+                if re.search(rf'\b{re.escape(alias)}\.(?:"{re.escape(column)}"|{re.escape(column)}\b)', joined):
+                    candidates.append((relation, [column]))
+
+        unique = []
+        for candidate in candidates:
+            if candidate not in unique and candidate[1]:
+                unique.append(candidate)
+        return unique[:MAX_INDEX_CANDIDATES]
+
+    def _advise(self, conn, statement: str, plan: Dict[str, Any],
+                tables: Dict[Tuple[str, str], Dict[str, Any]], analysis: Dict[str, Any]):
+        """Test candidate indexes and record the ones that make the plan cheaper"""
+        candidates = self.candidate_indexes(plan, tables)
+        if not candidates:
+            return
+
+        use_hypopg = self._has_hypopg(conn)
+        with conn.cursor() as cursor:
+            baseline = self._explain(cursor, statement, False)['Plan']['Total Cost']
+        conn.rollback()
+
+        for relation, columns in candidates:
+            if not use_hypopg and tables[relation]['rows'] > self.max_index_test_rows:
+                analysis['advisor_notes'].append(
+                    f"Skipped testing an index on {'.'.join(relation)} ({', '.join(columns)}): table too large "
+                    f"to build a test index; install the hypopg extension to test it hypothetically"
+                )
+                continue
+
+            name = f"idx_{relation[1]}_{'_'.join(columns)}"[:63]
+            definition = sql.SQL("{} ON {}.{} ({})").format(
+                sql.Identifier(name),
+                sql.Identifier(relation[0]),
+                sql.Identifier(relation[1]),
+                sql.SQL(', ').join(sql.Identifier(column) for column in columns)
+            ).as_string(conn)
+            try:
+                cost, used = self._test_index(conn, statement, name, definition, use_hypopg)
+            except psycopg2.Error as e:
+                conn.rollback()
+                analysis['advisor_notes'].append(
+                    f"Could not test an index on {'.'.join(relation)} ({', '.join(columns)}): "
+                    f"{str(e).splitlines()[0]}"
+                )
+                continue
+
+            improvement = (baseline - cost) / baseline * 100 if baseline else 0.0
+            if used and improvement >= MIN_IMPROVEMENT_PCT:
+                analysis['index_suggestions'].append({
+                    'table': '.'.join(relation),
+                    'columns': columns,
+                    'ddl': f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {definition};",
+                    'cost_before': baseline,
+                    'cost_after': cost,
+                    'improvement_pct': round(improvement, 1),
+                    'method': 'hypopg' if use_hypopg else 'transaction'
+                })
+
+        analysis['index_suggestions'].sort(key=lambda suggestion: -suggestion['improvement_pct'])
+
+    def _test_index(self, conn, statement: str, name: str, definition: str,
+                    use_hypopg: bool) -> Tuple[float, bool]:
+        """Plan the statement with a candidate index in place and undo the index"""
+        with conn.cursor() as cursor:
+            if use_hypopg:
+                cursor.execute("SELECT indexname FROM hypopg_create_index(%s);", (f"CREATE INDEX {definition}",))
+                index_name = cursor.fetchone()[0]
+            else:
+                cursor.execute("SELECT set_config('lock_timeout', '2s', true);")
+                cursor.execute(f"CREATE INDEX {definition}")
+                index_name = name
+            try:
+                plan = self._explain(cursor, statement, False)['Plan']
+            finally:
+                if use_hypopg:
+                    cursor.execute("SELECT hypopg_reset();")
+        conn.rollback()
+
+        used = any(node.get('Index Name') == index_name for node in walk_plan(plan))
+        return plan['Total Cost'], used
+
+    @staticmethod
+    def _explain(cursor, statement: str, analyze: bool) -> Dict[str, Any]:
+        """Run EXPLAIN and return the top-level result object"""
+        options = "ANALYZE true, BUFFERS true, " if analyze else ""
+        cursor.execute(f"EXPLAIN ({options}VERBOSE true, SUMMARY true, FORMAT JSON) {statement}")
+        return cursor.fetchone()[0][0]
+
+    @staticmethod
+    def _single_statement(query: str) -> str:
+        """Check that the query is a single analyzable statement"""
+        statements = [s for s in sqlparse.parse(query) if s.token_first(skip_cm=True)]
+        if len(statements) != 1:
+            raise PlanAnalysisError("Plan analysis needs exactly one statement")
+        statement_type = statements[0].get_type()
+        if statement_type not in ANALYZABLE_TYPES:
+            raise PlanAnalysisError(f"Plan analysis supports {', '.join(ANALYZABLE_TYPES)} statements, "
+                                    f"not {statement_type}")
+        return str(statements[0]).strip().rstrip(';')
+
+    @staticmethod
+    def _relation(node: Dict[str, Any]) -> Optional[Tuple[str, str]]:
+        """Schema-qualified relation scanned by a plan node, if any"""
+        if 'Relation Name' not in node:
+            return None
+        return (node.get('Schema', 'public'), node['Relation Name'])
+
+    def _table_info(self, conn, plan: Dict[str, Any]) -> Dict[Tuple[str, str], Dict[str, Any]]:
+        """Read row estimates and column names of the relations in a plan"""
+        scanned = {}
+        for node in walk_plan(plan):
+            relation = self._relation(node)
+            if relation:
+                scanned[relation] = max(scanned.get(relation, 0), node.get('Plan Rows', 0))
+        if not scanned:
+            return {}
+
+        tables = {}
+        with conn.cursor() as cursor:
+            for (schema, name), plan_rows in scanned.items():
+                cursor.execute(
+                    """
+                    SELECT c.reltuples, array_agg(a.attname ORDER BY a.attnum)
+                    FROM pg_catalog.pg_class c
+                    JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+                    JOIN pg_catalog.pg_attribute a ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+                    WHERE n.nspname = %s AND c.relname = %s
+                    GROUP BY c.reltuples;
+                    """,
+                    (schema, name)
+                )
+                row = cursor.fetchone()
+                if row:
+                    # reltuples is -1 for tables that were never analyzed
+                    rows = row[0] if row[0] >= 0 else plan_rows
+                    tables[(schema, name)] = {'rows': rows, 'columns': list(row[1])}
+        conn.rollback()
+        return tables
+
+    @staticmethod
+    def _has_hypopg(conn) -> bool:
+        """Check whether the hypopg extension is installed in the database"""
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_catalog.pg_extension WHERE extname = 'hypopg';")
+            installed = cursor.fetchone() is not None
+        conn.rollback()
+        return installed
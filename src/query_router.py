@@ -0,0 +1,328 @@
+"""
+Query Router Module
+Routes read-only work to PostgreSQL read replicas and everything else to the primary
+"""
+
+import os
+import time
+import logging
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+import psycopg2
+import sqlparse
+from psycopg2.extensions import parse_dsn
+from sqlparse import tokens as T
+
+from .db_connector import DBConnector
+
+logger = logging.getLogger(__name__)
+
+# Keywords that make an otherwise plain SELECT write or take row locks
+# (SELECT ... INTO, FOR SHARE / FOR KEY SHARE)
+WRITE_KEYWORDS = {'INTO', 'SHARE'}
+
+# Functions that cannot run on a hot standby
+WRITE_FUNCTIONS = {
+    'nextval', 'setval', 'txid_current', 'pg_current_xact_id',
+    'pg_advisory_lock', 'pg_advisory_xact_lock', 'pg_try_advisory_lock',
+    'pg_try_advisory_xact_lock'
+}
+
+REPLICA_LAG_SQL = """
+    SELECT
+        CASE
+            WHEN NOT pg_is_in_recovery() THEN 0
+            WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+            ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+        END AS lag_seconds;
+"""
+
+
+def _statements(query: str) -> List[sqlparse.sql.Statement]:
+    """Parse a query into its non-empty statements"""
+    return [statement for statement in sqlparse.parse(query) if statement.token_first(skip_cm=True)]
+
+
+def statement_kind(query: str) -> str:
+    """
+    Classify the first statement of a query
+
+    Args:
+        query: SQL query
+
+    Returns:
+        'SELECT', 'INSERT', 'UPDATE', 'DELETE', 'CREATE_TABLE', 'ALTER_TABLE',
+        'DROP' or 'OTHER'
+    """
+    statements = _statements(query)
+    if not statements:
+        return 'OTHER'
+
+    statement = statements[0]
+    kind = statement.get_type()
+    if kind in ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'DROP'):
+        return kind
+    if kind in ('CREATE', 'ALTER'):
+        # The object type is the keyword after CREATE/ALTER
+        first = statement.token_first(skip_cm=True)
+        _, target = statement.token_next(statement.token_index(first), skip_cm=True)
+        if target is not None and target.normalized == 'TABLE':
+            return f"{kind}_TABLE"
+    return 'OTHER'
+
+
+def is_read_only(query: str) -> bool:
+    """
+    Check whether a query only reads data and can run on a replica
+
+    Every statement must be a SELECT without data-modifying CTEs,
+    SELECT ... INTO, row locks or functions that write.
+
+    Args:
+        query: SQL query
+
+    Returns:
+        True if the query is safe to run on a read replica
+    """
+    statements = _statements(query)
+    if not statements:
+        return False
+
+    for statement in statements:
+        if statement.get_type() != 'SELECT':
+            return False
+        for token in statement.flatten():
+            if token.ttype in T.Keyword.DML and token.normalized != 'SELECT':
+                return False
+            if token.ttype in T.Keyword and token.normalized in WRITE_KEYWORDS:
+                return False
+            if token.ttype in T.Name and token.value.lower() in WRITE_FUNCTIONS:
+                return False
+    return True
+
+
+class QueryRouter:
+    """
+    Sends read-only work to a pool of read replicas and writes to the primary.
+
+    Replicas are checked at most every health interval; a replica that is
+    unreachable or lags more than the allowed number of seconds is skipped.
+    Reads fall back to the primary when no replica is healthy, and go to the
+    primary for the lag window after a write so the client sees its own
+    changes. Without replicas every call returns the primary.
+    """
+
+    def __init__(self, primary: DBConnector, replica_dsns: Optional[List[str]] = None,
+                 max_lag_seconds: Optional[float] = None, health_interval: Optional[float] = None):
+        """
+        Initialize the query router
+
+        Args:
+            primary: Connector for the primary database
+            replica_dsns: Replica connection strings (default: comma-separated
+                          POSTGRES_REPLICA_DSNS environment variable)
+            max_lag_seconds: Maximum replication lag of a usable replica
+                             (default: REPLICA_MAX_LAG_SECONDS, or 5)
+            health_interval: Seconds between replica health checks
+                             (default: REPLICA_HEALTH_INTERVAL, or 10)
+        """
+        if replica_dsns is None:
+            replica_dsns = [dsn.strip() for dsn in os.getenv('POSTGRES_REPLICA_DSNS', '').split(',') if dsn.strip()]
+        if max_lag_seconds is None:
+            max_lag_seconds = float(os.getenv('REPLICA_MAX_LAG_SECONDS', '5'))
+        if health_interval is None:
+            health_interval = float(os.getenv('REPLICA_HEALTH_INTERVAL', '10'))
+
+        self.primary = primary
+        self.max_lag_seconds = max_lag_seconds
+        self.health_interval = health_interval
+        self.replicas: List[DBConnector] = [
+            DBConnector(parse_dsn(dsn), schema_cache=primary.schema_cache, readonly=True)
+            for dsn in replica_dsns
+        ]
+        self._health: List[Dict[str, Any]] = [
+            {'healthy': False, 'lag_seconds': None, 'checked_at': None, 'error': None}
+            for _ in self.replicas
+        ]
+        self._next_replica = 0
+        self._last_write: Optional[float] = None
+        # Replicas whose health check is running; checks run outside the lock
+        self._checking: set = set()
+        self._lock = threading.Lock()
+        logger.debug(f"Query router initialized with {len(self.replicas)} replica(s)")
+
+    def read_connector(self) -> DBConnector:
+        """
+        Pick the connector for read-only work
+
+        Returns:
+            A healthy replica (round robin), or the primary
+        """
+        if not self.replicas:
+            return self.primary
+
+        with self._lock:
+            if self._last_write is not None and time.monotonic() - self._last_write < self.max_lag_seconds:
+                return self.primary
+            start = self._next_replica
+            self._next_replica = (start + 1) % len(self.replicas)
+
+        for offset in range(len(self.replicas)):
+            index = (start + offset) % len(self.replicas)
+            if self._is_healthy(index):
+                return self.replicas[index]
+
+        logger.warning("No healthy read replica, reading from the primary")
+        return self.primary
+
+    def connector_for(self, query: str) -> DBConnector:
+        """
+        Pick the connector for a query
+
+        Args:
+            query: SQL query
+
+        Returns:
+            A replica for read-only queries when one is available, otherwise the primary
+        """
+        if self.replicas and is_read_only(query):
+            return self.read_connector()
+        return self.primary
+
+    def execute_query(self, query: str, **kwargs) -> Tuple[bool, Any]:
+        """
+        Execute a query on the connector chosen for it
+
+        Reads that fail because the replica went away (or refused the
+        statement as read-only) are retried on the primary.
+
+        Args:
+            query: SQL query to execute
+            **kwargs: Passed to DBConnector.execute_query
+
+        Returns:
+            A tuple containing (success, result)
+        """
+        connector = self.connector_for(query)
+        if connector is not self.primary:
+            try:
+                success, result = connector.execute_query(query, **kwargs)
+                if success or not self._is_replica_failure(connector, result):
+                    return success, result
+                error = result
+            except psycopg2.Error as e:
+                error = str(e).split('\n')[0]
+            logger.warning(f"Read replica {connector.address} failed ({error}), retrying on the primary")
+            self._mark_unhealthy(connector, error)
+
+        if not is_read_only(query):
+            self.note_write()
+        return self.primary.execute_query(query, **kwargs)
+
+    def cancel_query(self, query_id: str) -> Tuple[bool, str]:
+        """
+        Cancel a running query on whichever database it runs on
+
+        Args:
+            query_id: ID the query was started with
+
+        Returns:
+            A tuple containing (success, message)
+        """
+        for connector in [self.primary] + self.replicas:
+            if connector.is_running(query_id):
+                return connector.cancel_query(query_id)
+        return self.primary.cancel_query(query_id)
+
+    def note_write(self):
+        """Send reads to the primary for the lag window after a write"""
+        if self.replicas:
+            with self._lock:
+                self._last_write = time.monotonic()
+
+    def status(self) -> List[Dict[str, Any]]:
+        """
+        Get the health of the replicas
+
+        Returns:
+            List of replica addresses with their last health check
+        """
+        with self._lock:
+            return [
+                {
+                    'address': replica.address,
+                    'healthy': health['healthy'],
+                    'lag_seconds': health['lag_seconds'],
+                    'error': health['error']
+                }
+                for replica, health in zip(self.replicas, self._health)
+            ]
+
+    def _is_healthy(self, index: int) -> bool:
+        """
+        Return the cached health of a replica, re-checking it when stale
+
+        The check connects over the network, so it runs without holding the
+        lock; other callers meanwhile see the previous result.
+        """
+        with self._lock:
+            health = self._health[index]
+            stale = health['checked_at'] is None or time.monotonic() - health['checked_at'] >= self.health_interval
+            if not stale or index in self._checking:
+                return health['healthy']
+            self._checking.add(index)
+
+        try:
+            result = self._check_replica(self.replicas[index])
+        finally:
+            with self._lock:
+                self._checking.discard(index)
+        with self._lock:
+            health.update(result)
+            health['checked_at'] = time.monotonic()
+            return health['healthy']
+
+    def _check_replica(self, replica: DBConnector) -> Dict[str, Any]:
+        """Measure the replication lag of a replica on a short-lived connection"""
+        conn = None
+        params = replica.connection_params
+        try:
+            conn = psycopg2.connect(**{**params, 'connect_timeout': params.get('connect_timeout', 3)})
+            with conn.cursor() as cursor:
+                cursor.execute(REPLICA_LAG_SQL)
+                lag = cursor.fetchone()[0]
+        except Exception as e:
+            logger.warning(f"Read replica {replica.address} is unreachable: {e}")
+            return {'healthy': False, 'lag_seconds': None, 'error': str(e).split('\n')[0]}
+        finally:
+            if conn is not None:
+                conn.close()
+
+        if lag is None:
+            return {'healthy': False, 'lag_seconds': None, 'error': 'Replica has not replayed any transaction yet'}
+        lag = float(lag)
+        if lag > self.max_lag_seconds:
+            logger.warning(f"Read replica {replica.address} lags {lag:.1f}s behind the primary")
+            return {'healthy': False, 'lag_seconds': lag, 'error': 'Replication lag too high'}
+        return {'healthy': True, 'lag_seconds': lag, 'error': None}
+
+    def _mark_unhealthy(self, replica: DBConnector, error: str):
+        """Take a replica out of rotation until its next health check"""
+        with self._lock:
+            index = self.replicas.index(replica)
+            self._health[index].update({
+                'healthy': False,
+                'error': error,
+                'checked_at': time.monotonic()
+            })
+        if replica.conn is not None and replica.conn.closed:
+            replica.conn = None
+
+    @staticmethod
+    def _is_replica_failure(replica: DBConnector, result: Any) -> bool:
+        """Check whether a failed execution was caused by the replica rather than the query"""
+        if replica.conn is None or replica.conn.closed:
+            return True
+        return isinstance(result, str) and (
+            'read-only transaction' in result or 'recovery is in progress' in result
+        )
@@ -0,0 +1,330 @@
+"""
+Result Cache Module
+Caches results of read-only queries until the tables they read change
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+import sqlparse
+from psycopg2 import sql
+from sqlparse import tokens as T
+from sqlparse.sql import Function
+
+from .db_connector import DBConnector
+from .result_encoding import dumps_json
+
+logger = logging.getLogger(__name__)
+
+# SQL value functions that are keywords rather than pg_proc entries
+VOLATILE_KEYWORDS = {
+    'CURRENT_DATE', 'CURRENT_TIME', 'CURRENT_TIMESTAMP', 'LOCALTIME',
+    'LOCALTIMESTAMP', 'CURRENT_USER', 'SESSION_USER', 'USER', 'CURRENT_ROLE'
+}
+
+# Change markers of the referenced tables. TRUNCATE and table rewrites
+# change relfilenode; row changes move the write counters.
+TABLE_MARKERS_SQL = """
+    SELECT
+        c.oid,
+        c.relfilenode,
+        COALESCE(s.n_tup_ins, 0),
+        COALESCE(s.n_tup_upd, 0),
+        COALESCE(s.n_tup_del, 0)
+    FROM unnest(%s::text[]) AS r(name)
+    JOIN pg_catalog.pg_class c ON c.oid = to_regclass(r.name)
+    LEFT JOIN pg_catalog.pg_stat_user_tables s ON s.relid = c.oid
+    ORDER BY c.oid;
+"""
+
+
+def normalize_sql(query: str) -> str:
+    """
+    Normalize a query for use as a cache key
+
+    Comments are removed, whitespace between tokens is collapsed and keywords
+    are upper-cased; string literals and quoted identifiers are kept as is.
+
+    Args:
+        query: SQL query
+
+    Returns:
+        Normalized query text
+    """
+    parts = []
+    tokens = (token for statement in sqlparse.parse(query) for token in statement.flatten())
+    for token in tokens:
+        if token.ttype in T.Comment:
+            continue
+        if token.is_whitespace:
+            if parts and parts[-1] != ' ':
+                parts.append(' ')
+            continue
+        parts.append(token.normalized if token.is_keyword else token.value)
+    return ''.join(parts).strip().rstrip(';').strip()
+
+
+def function_names(query: str) -> List[str]:
+    """
+    Collect the names of functions called by a query
+
+    Args:
+        query: SQL query
+
+    Returns:
+        Lower-case function names
+    """
+    names = set()
+
+    def walk(token_list):
+        for token in token_list.tokens:
+            if isinstance(token, Function):
+                name = token.get_name()
+                if name:
+                    names.add(name.lower())
+            if token.is_group:
+                walk(token)
+
+    for statement in sqlparse.parse(query):
+        walk(statement)
+    return sorted(names)
+
+
+def _plan_relations(plan: Dict[str, Any], relations: set):
+    """Collect schema-qualified relations scanned by a plan node and its children"""
+    if 'Relation Name' in plan:
+        relations.add((plan.get('Schema', 'public'), plan['Relation Name']))
+    for child in plan.get('Plans', []):
+        _plan_relations(child, relations)
+
+
+class ResultCache:
+    """
+    Opt-in cache for results of read-only queries.
+
+    Entries are keyed on the normalized SQL, the result format and the
+    schema version. Each entry remembers change markers of the tables the
+    query reads (found through its plan, so views resolve to their base
+    tables); an entry whose tables changed is treated as a miss. Queries
+    that call non-immutable functions or read foreign tables are not cached.
+
+    PostgreSQL publishes the write counters of other sessions with a delay
+    of up to several seconds, so entries also expire after a TTL; callers
+    should invalidate the cache after their own writes.
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None, ttl_seconds: Optional[float] = None):
+        """
+        Initialize the result cache
+
+        Args:
+            max_bytes: Memory cap for cached results
+                       (default: RESULT_CACHE_MAX_MB environment variable, or 64 MB)
+            ttl_seconds: Maximum age of an entry
+                         (default: RESULT_CACHE_TTL environment variable, or 30)
+        """
+        if max_bytes is None:
+            max_bytes = int(float(os.getenv('RESULT_CACHE_MAX_MB', '64')) * 1024 * 1024)
+        if ttl_seconds is None:
+            ttl_seconds = float(os.getenv('RESULT_CACHE_TTL', '30'))
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Tuple, Dict[str, Any]]" = OrderedDict()
+        self._shapes: Dict[Tuple, Dict[str, Any]] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._counters = {
+            'hits': 0,
+            'misses': 0,
+            'uncacheable': 0,
+            'stale': 0,
+            'expired': 0,
+            'evictions': 0,
+            'too_large': 0
+        }
+
+    def execute(self, connector: DBConnector, query: str, row_format: str = 'dict',
+                **kwargs) -> Tuple[bool, Any, bool]:
+        """
+        Execute a read-only query, serving it from the cache when possible
+
+        Args:
+            connector: Connector to read markers from and run misses on
+            query: Read-only SQL query
+            row_format: Result format passed to execute_query
+            **kwargs: Passed to DBConnector.execute_query
+
+        Returns:
+            A tuple containing (success, result, cache_hit)
+        """
+        if not connector.conn:
+            if not connector.connect():
+                return False, "Not connected to database", False
+
+        normalized = normalize_sql(query)
+        version = connector.schema_cache.version
+        try:
+            shape = self._shape(connector, query, normalized, version)
+            markers = self._markers(connector, shape['relations']) if shape['cacheable'] else None
+        except Exception as e:
+            # Let the query itself report errors (syntax, missing tables, ...)
+            connector.conn.rollback()
+            logger.debug(f"Result cache lookup skipped: {e}")
+            shape, markers = {'cacheable': False}, None
+
+        if not shape['cacheable']:
+            self._count('uncacheable')
+            success, result = connector.execute_query(query, row_format=row_format, **kwargs)
+            return success, result, False
+
+        key = (normalized, row_format, version)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry['markers'] == markers and now < entry['expires']:
+                    self._entries.move_to_end(key)
+                    self._counters['hits'] += 1
+                    entry['hits'] += 1
+                    return True, entry['result'], True
+                self._counters['stale' if entry['markers'] != markers else 'expired'] += 1
+                self._remove(key)
+            self._counters['misses'] += 1
+
+        success, result = connector.execute_query(query, row_format=row_format, **kwargs)
+        if success and not isinstance(result, str):
+            self._store(key, result, markers, now)
+        return success, result, False
+
+    def invalidate(self, reason: str = ''):
+        """
+        Drop all cached results
+
+        Args:
+            reason: Why the cache is invalidated, for logging
+        """
+        with self._lock:
+            if self._entries:
+                logger.debug(f"Result cache invalidated ({reason or 'requested'})")
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get cache statistics
+
+        Returns:
+            Dictionary with entry count, memory use and hit/miss counters
+        """
+        with self._lock:
+            lookups = self._counters['hits'] + self._counters['misses']
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'ttl_seconds': self.ttl_seconds,
+                'hit_rate': round(self._counters['hits'] / lookups, 3) if lookups else 0.0,
+                **self._counters
+            }
+
+    def _shape(self, connector: DBConnector, query: str, normalized: str, version: int) -> Dict[str, Any]:
+        """Find the relations a query reads and whether its result may be cached"""
+        shape_key = (normalized, version)
+        with self._lock:
+            shape = self._shapes.get(shape_key)
+        if shape is not None:
+            return shape
+
+        shape = {'cacheable': False, 'relations': []}
+        keywords = {
+            token.normalized
+            for statement in sqlparse.parse(query)
+            for token in statement.flatten()
+            if token.is_keyword
+        }
+        if keywords & VOLATILE_KEYWORDS:
+            return self._remember_shape(shape_key, shape)
+
+        with connector.conn.cursor() as cursor:
+            names = function_names(query)
+            if names:
+                cursor.execute(
+                    "SELECT 1 FROM pg_catalog.pg_proc WHERE lower(proname) = ANY(%s) AND provolatile <> 'i' LIMIT 1;",
+                    (names,)
+                )
+                if cursor.fetchone():
+                    connector.conn.commit()
+                    return self._remember_shape(shape_key, shape)
+
+            cursor.execute("EXPLAIN (VERBOSE, FORMAT JSON) " + query)
+            plan = cursor.fetchone()[0][0]['Plan']
+            relations = set()
+            _plan_relations(plan, relations)
+            qualified = sorted(
+                sql.SQL("{}.{}").format(sql.Identifier(schema), sql.Identifier(name)).as_string(connector.conn)
+                for schema, name in relations
+            )
+            cursor.execute(
+                "SELECT 1 FROM pg_catalog.pg_class WHERE oid = ANY(SELECT to_regclass(r) FROM unnest(%s::text[]) r) "
+                "AND relkind = 'f' LIMIT 1;",
+                (qualified,)
+            )
+            foreign = cursor.fetchone() is not None
+        connector.conn.commit()
+
+        shape = {'cacheable': not foreign, 'relations': qualified}
+        return self._remember_shape(shape_key, shape)
+
+    def _remember_shape(self, shape_key: Tuple, shape: Dict[str, Any]) -> Dict[str, Any]:
+        """Keep the analysis of a query shape, bounded like the result entries"""
+        with self._lock:
+            if len(self._shapes) >= 4096:
+                self._shapes.clear()
+            self._shapes[shape_key] = shape
+        return shape
+
+    @staticmethod
+    def _markers(connector: DBConnector, relations: List[str]) -> Tuple:
+        """Read the current change markers of the given relations"""
+        if not relations:
+            return ()
+        with connector.conn.cursor() as cursor:
+            cursor.execute(TABLE_MARKERS_SQL, (relations,))
+            markers = tuple(cursor.fetchall())
+        connector.conn.commit()
+        return markers
+
+    def _store(self, key: Tuple, result: Any, markers: Tuple, now: float):
+        """Add a result, evicting least recently used entries to stay under the cap"""
+        size = len(dumps_json(result))
+        with self._lock:
+            if size > self.max_bytes // 4:
+                self._counters['too_large'] += 1
+                return
+            self._remove(key)
+            self._entries[key] = {
+                'result': result,
+                'markers': markers,
+                'size': size,
+                'expires': now + self.ttl_seconds,
+                'hits': 0
+            }
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                evicted_key = next(iter(self._entries))
+                self._remove(evicted_key)
+                self._counters['evictions'] += 1
+
+    def _remove(self, key: Tuple):
+        """Remove an entry and release its size (lock must be held)"""
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry['size']
+
+    def _count(self, counter: str):
+        """Increment a statistics counter"""
+        with self._lock:
+            self._counters[counter] += 1
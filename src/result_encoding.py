@@ -0,0 +1,170 @@
+"""
+Result Encoding Module
+Compact columnar encodings for query results (JSON, MessagePack, Arrow IPC)
+"""
+
+import io
+import json
+import logging
+from decimal import Decimal
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# Response formats accepted by the API. 'rows' is the legacy list of dicts.
+RESULT_FORMATS = ('rows', 'columnar', 'msgpack', 'arrow')
+
+MIMETYPES = {
+    'columnar': 'application/json',
+    'msgpack': 'application/msgpack',
+    'arrow': 'application/vnd.apache.arrow.stream'
+}
+
+
+class EncodingError(Exception):
+    """Raised when a result cannot be encoded in the requested format"""
+
+
+def to_columnar(columns: List[Dict[str, str]], rows: Sequence[tuple]) -> Dict[str, Any]:
+    """
+    Turn tuple rows into a column-major result
+
+    Args:
+        columns: Column descriptions ({'name': ..., 'type': ...}) in result order
+        rows: Result rows as tuples
+
+    Returns:
+        Dictionary with 'columns', 'data' (one array per column) and 'row_count'
+    """
+    if rows:
+        data = [list(values) for values in zip(*rows)]
+    else:
+        data = [[] for _ in columns]
+    return {
+        'columns': columns,
+        'data': data,
+        'row_count': len(rows)
+    }
+
+
+def is_columnar(result: Any) -> bool:
+    """Check whether a result is in the columnar shape produced by to_columnar"""
+    return isinstance(result, dict) and 'columns' in result and 'data' in result
+
+
+def negotiate_format(requested: Optional[str], accept: str = '') -> str:
+    """
+    Pick the response format from an explicit request or the Accept header
+
+    Args:
+        requested: Format named by the client, if any
+        accept: Value of the Accept header
+
+    Returns:
+        One of RESULT_FORMATS
+    """
+    if requested:
+        requested = requested.lower()
+        if requested not in RESULT_FORMATS:
+            raise EncodingError(f"Unsupported result format: {requested}")
+        return requested
+    if MIMETYPES['arrow'] in accept:
+        return 'arrow'
+    if MIMETYPES['msgpack'] in accept:
+        return 'msgpack'
+    return 'rows'
+
+
+def encode(payload: Dict[str, Any], fmt: str) -> Tuple[bytes, str]:
+    """
+    Encode an API payload whose 'result' may be columnar
+
+    Args:
+        payload: Response dictionary
+        fmt: 'columnar', 'msgpack' or 'arrow'
+
+    Returns:
+        A tuple containing (body, mimetype)
+    """
+    if fmt == 'columnar':
+        return dumps_json(payload), MIMETYPES['columnar']
+    if fmt == 'msgpack':
+        try:
+            import msgpack
+        except ImportError:
+            raise EncodingError("MessagePack encoding requires the msgpack package")
+        return msgpack.packb(payload, default=_plain_value, use_bin_type=True), MIMETYPES['msgpack']
+    if fmt == 'arrow':
+        return _encode_arrow(payload), MIMETYPES['arrow']
+    raise EncodingError(f"Unsupported result format: {fmt}")
+
+
+def dumps_json(payload: Any) -> bytes:
+    """Serialize to JSON, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(payload, default=_plain_value, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(payload, default=_plain_value, separators=(',', ':')).encode('utf-8')
+
+
+def _plain_value(value: Any) -> Any:
+    """Convert values the encoders do not support natively"""
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, timedelta):
+        return str(value)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return bytes(value).hex()
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    return str(value)
+
+
+def _arrow_text(value: Any) -> Optional[str]:
+    """Render a value as text for Arrow columns with mixed or nested types"""
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (dict, list)):
+        return dumps_json(value).decode('utf-8')
+    return _plain_value(value)
+
+
+def _encode_arrow(payload: Dict[str, Any]) -> bytes:
+    """
+    Encode a columnar result as an Arrow IPC stream. The other payload fields
+    are stored as JSON in the schema metadata under 'sql_gpt'.
+    """
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise EncodingError("Arrow encoding requires the pyarrow package")
+
+    result = payload.get('result')
+    if not is_columnar(result):
+        raise EncodingError("Arrow encoding is only available for row-returning queries")
+
+    arrays = []
+    for column, values in zip(result['columns'], result['data']):
+        try:
+            arrays.append(pa.array(values))
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            arrays.append(pa.array([_arrow_text(value) for value in values], type=pa.string()))
+    names = [column['name'] for column in result['columns']]
+
+    envelope = {key: value for key, value in payload.items() if key != 'result'}
+    envelope['columns'] = result['columns']
+    envelope['row_count'] = result['row_count']
+    table = pa.Table.from_arrays(arrays, names=names)
+    table = table.replace_schema_metadata({'sql_gpt': dumps_json(envelope)})
+
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
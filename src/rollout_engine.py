@@ -0,0 +1,341 @@
+"""
+Rollout Engine Module
+Applies a migration to many databases in parallel, tracked in a local ledger
+"""
+
+import os
+import time
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Any, List, Optional, Callable
+
+from .db_connector import DBConnector
+from .connection_registry import ConnectionRegistry, DEFAULT_TARGET
+from .migration_executor import MigrationExecutor, MigrationError, migration_id_of
+
+logger = logging.getLogger(__name__)
+
+# Target states; only 'succeeded' is skipped when a rollout is re-run
+TARGET_STATES = ('pending', 'running', 'succeeded', 'failed', 'halted', 'skipped')
+
+LEDGER_DDL = """
+    CREATE TABLE IF NOT EXISTS rollout_targets (
+        migration_id TEXT NOT NULL,
+        target TEXT NOT NULL,
+        status TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        started_at REAL,
+        finished_at REAL,
+        duration_ms REAL,
+        failed_step INTEGER,
+        error TEXT,
+        PRIMARY KEY (migration_id, target)
+    );
+"""
+
+
+class RolloutError(Exception):
+    """Raised when a rollout cannot start"""
+
+
+class RolloutLedger:
+    """
+    Local SQLite record of which targets a migration has reached.
+
+    Every state change is committed immediately, so an interrupted rollout
+    can be re-run and will skip the targets that already succeeded.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Initialize the ledger
+
+        Args:
+            path: SQLite file (default: ROLLOUT_LEDGER_PATH environment
+                  variable, or rollout_ledger.sqlite3)
+        """
+        self.path = path or os.getenv('ROLLOUT_LEDGER_PATH', 'rollout_ledger.sqlite3')
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute(LEDGER_DDL)
+
+    def entries(self, migration_id: str) -> Dict[str, Dict[str, Any]]:
+        """
+        Get the recorded state of every target of a migration
+
+        Args:
+            migration_id: Migration ID
+
+        Returns:
+            Dictionary of target name to its ledger row
+        """
+        with self._lock, self._connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM rollout_targets WHERE migration_id = ? ORDER BY target;", (migration_id,)
+            ).fetchall()
+        return {row['target']: dict(row) for row in rows}
+
+    def start(self, migration_id: str, target: str):
+        """Mark a target as running"""
+        with self._lock, self._connect() as conn:
+            conn.execute("""
+                INSERT INTO rollout_targets (migration_id, target, status, attempts, started_at)
+                VALUES (?, ?, 'running', 1, ?)
+                ON CONFLICT (migration_id, target) DO UPDATE SET
+                    status = 'running', attempts = attempts + 1, started_at = excluded.started_at,
+                    finished_at = NULL, duration_ms = NULL, failed_step = NULL, error = NULL;
+            """, (migration_id, target, time.time()))
+
+    def finish(self, migration_id: str, target: str, status: str, duration_ms: Optional[float] = None,
+               failed_step: Optional[int] = None, error: Optional[str] = None):
+        """Record the outcome of a target"""
+        with self._lock, self._connect() as conn:
+            conn.execute("""
+                UPDATE rollout_targets
+                SET status = ?, finished_at = ?, duration_ms = ?, failed_step = ?, error = ?
+                WHERE migration_id = ? AND target = ?;
+            """, (status, time.time(), duration_ms, failed_step, error, migration_id, target))
+
+    @contextmanager
+    def _connect(self):
+        """Open the ledger for one transaction"""
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+
+class RolloutEngine:
+    """
+    Applies one migration to a list of connection registry targets.
+
+    Targets run in parallel up to a fixed limit, each through its own
+    MigrationExecutor, so every target keeps the step-level resume and lock
+    retry behavior of a single-database migration. Target-level progress is
+    kept in a RolloutLedger: re-running a rollout skips targets that
+    already succeeded and retries the rest.
+
+    With a canary count, the first targets are migrated on their own and
+    the rest only start once all of them succeeded. With halt_on_error, no
+    new target is started after a failure; targets already running finish.
+    """
+
+    def __init__(self, connection_registry: ConnectionRegistry, ledger: Optional[RolloutLedger] = None,
+                 parallelism: Optional[int] = None, canary: Optional[int] = None,
+                 executor_factory: Optional[Callable[[DBConnector], MigrationExecutor]] = None):
+        """
+        Initialize the rollout engine
+
+        Args:
+            connection_registry: Registry the targets are defined in
+            ledger: Ledger of target states (default: RolloutLedger())
+            parallelism: Targets migrated at once (default: ROLLOUT_PARALLELISM, or 4)
+            canary: Targets migrated first, before any other target starts
+                    (default: ROLLOUT_CANARY, or 1; 0 disables the canary phase)
+            executor_factory: Builds the migration executor of a target
+                              (default: MigrationExecutor)
+        """
+        self.connection_registry = connection_registry
+        self.ledger = ledger or RolloutLedger()
+        self.parallelism = parallelism if parallelism is not None else int(os.getenv('ROLLOUT_PARALLELISM', '4'))
+        self.canary = canary if canary is not None else int(os.getenv('ROLLOUT_CANARY', '1'))
+        self.executor_factory = executor_factory or MigrationExecutor
+        logger.debug("Rollout engine initialized")
+
+    def resolve_targets(self, targets: List[str]) -> List[str]:
+        """
+        Expand and check a target list
+
+        Args:
+            targets: Target names; 'all' stands for every registered target
+                     except the default database
+
+        Returns:
+            Target names in the given order, without duplicates
+
+        Raises:
+            RolloutError: If a target is unknown or the list is empty
+        """
+        names = []
+        for name in targets:
+            expanded = [n for n in self.connection_registry.names() if n != DEFAULT_TARGET] if name == 'all' else [name]
+            for target in expanded:
+                if target not in self.connection_registry.names():
+                    raise RolloutError(f"Unknown target '{target}'")
+                if target not in names:
+                    names.append(target)
+        if not names:
+            raise RolloutError("No targets to roll out to")
+        return names
+
+    def plan(self, script: str, targets: List[str], migration_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Show which targets a rollout would migrate
+
+        Args:
+            script: Deployment script
+            targets: Target names (or 'all')
+            migration_id: ID the rollout is tracked under (default: taken from the script)
+
+        Returns:
+            Dictionary with the 'migration_id', the 'canary' and remaining
+            targets 'to_run', and the targets 'done' according to the ledger
+        """
+        migration_id = migration_id or migration_id_of(script)
+        targets = self.resolve_targets(targets)
+        entries = self.ledger.entries(migration_id)
+        done = [t for t in targets if entries.get(t, {}).get('status') == 'succeeded']
+        to_run = [t for t in targets if t not in done]
+        return {
+            'migration_id': migration_id,
+            'canary': to_run[:self.canary],
+            'to_run': to_run[self.canary:],
+            'done': done
+        }
+
+    def run(self, script: str, targets: List[str], migration_id: Optional[str] = None,
+            halt_on_error: bool = True,
+            progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """
+        Apply a migration to every target that has not yet succeeded
+
+        Args:
+            script: Deployment script (plain SQL or Alembic) or migration SQL
+            targets: Target names (or 'all')
+            migration_id: ID the rollout is tracked under (default: taken from the script)
+            halt_on_error: Start no new targets once one has failed
+            progress_callback: Called with a progress summary after every
+                               target starts or finishes
+
+        Returns:
+            Report with the 'migration_id', overall 'success', whether the
+            rollout 'halted', per-target results and the final summary
+
+        Raises:
+            RolloutError: If a target is unknown
+        """
+        plan = self.plan(script, targets, migration_id)
+        migration_id = plan['migration_id']
+        order = plan['canary'] + plan['to_run']
+        results = {target: {'target': target, 'status': 'skipped', 'duration_ms': None,
+                            'failed_step': None, 'error': None} for target in plan['done']}
+        for target in order:
+            results[target] = {'target': target, 'status': 'pending', 'duration_ms': None,
+                               'failed_step': None, 'error': None, 'started': None}
+        lock = threading.Lock()
+        started = time.monotonic()
+
+        def report():
+            if progress_callback:
+                with lock:
+                    summary = self.summary(list(results.values()), started)
+                progress_callback(summary)
+
+        def migrate(target: str):
+            with lock:
+                results[target].update(status='running', started=time.monotonic())
+            self.ledger.start(migration_id, target)
+            report()
+            outcome = self._apply(script, target, migration_id)
+            self.ledger.finish(migration_id, target, outcome['status'], outcome['duration_ms'],
+                               outcome['failed_step'], outcome['error'])
+            with lock:
+                results[target].update(outcome)
+            logger.info(f"Rollout {migration_id} on {target}: {outcome['status']}"
+                        + (f" ({outcome['error']})" if outcome['error'] else ''))
+            report()
+
+        halted = False
+        with ThreadPoolExecutor(max_workers=max(1, self.parallelism)) as pool:
+            for phase in (plan['canary'], plan['to_run']):
+                if halted:
+                    break
+                queue = list(phase)
+                running = set()
+                while queue or running:
+                    while queue and len(running) < self.parallelism and not halted:
+                        running.add(pool.submit(migrate, queue.pop(0)))
+                    if not running:
+                        break
+                    finished, running = wait(running, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        future.result()
+                    failed = any(r['status'] == 'failed' for r in results.values())
+                    # A failed canary always stops the rollout
+                    if failed and (halt_on_error or phase is plan['canary']):
+                        halted = True
+
+        never_started = [r for r in results.values() if r['status'] == 'pending']
+        for result in results.values():
+            if result['status'] == 'pending':
+                result['status'] = 'halted'
+            result.pop('started', None)
+        summary = self.summary(list(results.values()), started)
+        if progress_callback and never_started:
+            progress_callback(summary)
+        return {
+            'migration_id': migration_id,
+            'success': all(r['status'] in ('succeeded', 'skipped') for r in results.values()),
+            'halted': halted,
+            'targets': [results[target] for target in plan['done'] + order],
+            'summary': summary
+        }
+
+    def summary(self, results: List[Dict[str, Any]], started: float) -> Dict[str, Any]:
+        """
+        Summarize rollout progress
+
+        Args:
+            results: Per-target results
+            started: time.monotonic() when the rollout started
+
+        Returns:
+            Dictionary with 'counts' per state, the 'running' targets,
+            'elapsed_seconds' and an 'eta_seconds' estimate from the mean
+            duration of finished targets
+        """
+        counts = {state: 0 for state in TARGET_STATES}
+        for result in results:
+            counts[result['status']] += 1
+        durations = [r['duration_ms'] for r in results if r['status'] in ('succeeded', 'failed') and r['duration_ms']]
+        remaining = counts['pending'] + counts['running']
+        eta = None
+        if durations and remaining:
+            mean = sum(durations) / len(durations) / 1000
+            eta = round(mean * remaining / max(1, min(self.parallelism, remaining)), 1)
+        return {
+            'counts': counts,
+            'total': len(results),
+            'running': sorted(r['target'] for r in results if r['status'] == 'running'),
+            'elapsed_seconds': round(time.monotonic() - started, 1),
+            'eta_seconds': eta
+        }
+
+    def _apply(self, script: str, target: str, migration_id: str) -> Dict[str, Any]:
+        """Run the migration on one target"""
+        started = time.perf_counter()
+        outcome = {'status': 'failed', 'duration_ms': None, 'failed_step': None, 'error': None}
+        try:
+            if target == DEFAULT_TARGET:
+                connector = self.connection_registry.default
+            else:
+                connector = DBConnector(self.connection_registry.resolve(target))
+            result = self.executor_factory(connector).apply(script, migration_id=migration_id)
+            if result['success']:
+                outcome['status'] = 'succeeded'
+            else:
+                step = result['steps'][result['failed_step']]
+                outcome.update(failed_step=step['index'], error=f"Step {step['index'] + 1}: {step['error']}")
+        except MigrationError as e:
+            outcome['error'] = str(e)
+        except Exception as e:
+            logger.error(f"Rollout {migration_id} on {target} crashed: {e}")
+            outcome['error'] = f"{type(e).__name__}: {e}"
+        outcome['duration_ms'] = round((time.perf_counter() - started) * 1000, 3)
+        return outcome
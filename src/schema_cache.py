@@ -0,0 +1,410 @@
+"""
+Schema Cache Module
+Caches database schema metadata and invalidates it only when DDL is detected
+"""
+
+import os
+import uuid
+import time
+import select
+import logging
+import threading
+from typing import Dict, Any, Optional, Callable, Hashable, Tuple
+import psycopg2
+import psycopg2.extensions
+
+from .shared_cache import get_shared_cache
+
+logger = logging.getLogger(__name__)
+
+# Channel used by the DDL event trigger to announce schema changes
+SCHEMA_CHANGE_CHANNEL = 'sql_gpt_schema_changed'
+DDL_EVENT_TRIGGER = 'sql_gpt_ddl_notify'
+
+# Cheap catalog fingerprint: row count and xmin checksum of the catalogs that
+# back the schema views. Any DDL rewrites at least one of these rows.
+FINGERPRINT_QUERY = """
+    WITH user_namespaces AS (
+        SELECT oid FROM pg_catalog.pg_namespace
+        WHERE nspname NOT LIKE 'pg\\_%' AND nspname <> 'information_schema'
+    ),
+    user_relations AS (
+        SELECT oid, xmin FROM pg_catalog.pg_class
+        WHERE relnamespace IN (SELECT oid FROM user_namespaces)
+    )
+    SELECT concat_ws('/',
+        (SELECT count(*) || ':' || coalesce(sum(xmin::text::bigint), 0) FROM pg_catalog.pg_namespace),
+        (SELECT count(*) || ':' || coalesce(sum(xmin::text::bigint), 0) FROM user_relations),
+        (SELECT count(*) || ':' || coalesce(sum(a.xmin::text::bigint), 0)
+           FROM pg_catalog.pg_attribute a WHERE a.attrelid IN (SELECT oid FROM user_relations)),
+        (SELECT count(*) || ':' || coalesce(sum(xmin::text::bigint), 0)
+           FROM pg_catalog.pg_constraint WHERE connamespace IN (SELECT oid FROM user_namespaces)),
+        (SELECT count(*) || ':' || coalesce(sum(xmin::text::bigint), 0)
+           FROM pg_catalog.pg_proc WHERE pronamespace IN (SELECT oid FROM user_namespaces))
+    );
+"""
+
+# DDL event trigger that notifies listeners about non-temporary schema changes
+INSTALL_TRIGGER_SQL = f"""
+    CREATE OR REPLACE FUNCTION sql_gpt_notify_ddl() RETURNS event_trigger
+    LANGUAGE plpgsql AS $$
+    DECLARE
+        relevant boolean;
+    BEGIN
+        SELECT coalesce(bool_or(schema_name IS NULL OR schema_name NOT LIKE 'pg\\_temp%'), true)
+        INTO relevant
+        FROM pg_event_trigger_ddl_commands();
+
+        IF relevant THEN
+            PERFORM pg_notify('{SCHEMA_CHANGE_CHANNEL}', tg_tag);
+        END IF;
+    END;
+    $$;
+
+    DROP EVENT TRIGGER IF EXISTS {DDL_EVENT_TRIGGER};
+    CREATE EVENT TRIGGER {DDL_EVENT_TRIGGER} ON ddl_command_end
+        EXECUTE FUNCTION sql_gpt_notify_ddl();
+"""
+
+
+class SchemaCache:
+    """
+    Process-wide cache of schema metadata for a single database.
+
+    Entries are kept until a schema change is detected, either through a
+    LISTEN/NOTIFY channel fed by a DDL event trigger or, as a fallback, by
+    periodically comparing a cheap catalog fingerprint. Every invalidation
+    bumps ``version``, which other layers can use as a cache key.
+
+    When SHARED_CACHE_PATH is set, loaded entries are also written to the
+    shared cache under the catalog fingerprint, so other worker processes
+    looking at the same schema can reuse them instead of querying again.
+    """
+
+    def __init__(self, connection_params: Dict[str, Any], poll_interval: Optional[float] = None,
+                 listen: Optional[bool] = None):
+        """
+        Initialize the schema cache
+
+        Args:
+            connection_params: Connection parameters of the database being cached
+            poll_interval: Seconds between fingerprint checks. Defaults to the
+                           SCHEMA_CACHE_POLL_INTERVAL environment variable (30).
+            listen: Whether to LISTEN for DDL notifications. Defaults to the
+                    SCHEMA_CACHE_LISTEN environment variable (true).
+        """
+        self.connection_params = dict(connection_params)
+        if poll_interval is None:
+            poll_interval = float(os.getenv('SCHEMA_CACHE_POLL_INTERVAL', '30'))
+        if listen is None:
+            listen = os.getenv('SCHEMA_CACHE_LISTEN', 'true').lower() in ('1', 'true', 'yes')
+        self.poll_interval = poll_interval
+        self.listen = listen
+
+        self._lock = threading.RLock()
+        self._version = 0
+        self._entries: Dict[Hashable, Any] = {}
+        self._fingerprint: Optional[str] = None
+        self._last_check = 0.0
+        self._trigger_installed = False
+        self.shared_cache = get_shared_cache()
+        self._database_key = _cache_key(self.connection_params)
+        # Version at which _fingerprint was last read, and entries not yet in the shared cache
+        self._fingerprint_version: Optional[int] = None
+        self._unshared: set = set()
+        self._instance = uuid.uuid4().hex[:8]
+
+        self._listener_thread: Optional[threading.Thread] = None
+        self._listener_ready = threading.Event()
+        self._stop_event = threading.Event()
+        logger.debug("Schema cache initialized")
+
+    @property
+    def version(self) -> int:
+        """Current schema version; incremented on every invalidation"""
+        with self._lock:
+            return self._version
+
+    def state_token(self) -> str:
+        """
+        Identify the schema state the cached entries belong to
+
+        Returns:
+            The catalog fingerprint when it was read since the last
+            invalidation, which is the same in every process; otherwise a
+            token of this cache instance and its version
+        """
+        with self._lock:
+            if self._fingerprint_version == self._version:
+                return self._fingerprint
+            return f"{self._instance}:{self._version}"
+
+    def get(self, key: Hashable, loader: Callable[[], Any], conn=None) -> Any:
+        """
+        Get a cached value, loading it on a miss
+
+        Args:
+            key: Cache key (e.g. ('table_structure', 'public', 'users'))
+            loader: Callable producing the value. Exceptions propagate and
+                    nothing is cached.
+            conn: Optional open connection used for the fallback fingerprint check.
+                  If it was idle, the transaction the loader opens on it is
+                  committed afterwards, so it does not block later checks.
+
+        Returns:
+            The cached or freshly loaded value
+        """
+        self._ensure_listener()
+        if conn is not None:
+            self.check(conn)
+
+        with self._lock:
+            version = self._version
+            # Fingerprints are the same in every process, unlike versions; only
+            # use one read since the last invalidation
+            shared_key = None
+            if self.shared_cache is not None and self._fingerprint_version == version:
+                shared_key = (self._database_key, self._fingerprint, key)
+            cached = key in self._entries
+            if cached:
+                value = self._entries[key]
+                # Publish entries loaded before the fingerprint was known
+                publish = shared_key is not None and key in self._unshared
+                if publish:
+                    self._unshared.discard(key)
+        if cached:
+            if publish:
+                self.shared_cache.set('schema', shared_key, value)
+            return value
+
+        if shared_key is not None:
+            found, value = self.shared_cache.lookup('schema', shared_key)
+            if found:
+                with self._lock:
+                    if self._version == version:
+                        self._entries[key] = value
+                return value
+
+        idle = conn is not None and conn.get_transaction_status() == psycopg2.extensions.TRANSACTION_STATUS_IDLE
+        value = loader()
+        if idle and conn.get_transaction_status() == psycopg2.extensions.TRANSACTION_STATUS_INTRANS:
+            conn.commit()
+
+        with self._lock:
+            # Only store the value if no invalidation happened while loading
+            current = self._version == version
+            if current:
+                self._entries[key] = value
+                if shared_key is None and self.shared_cache is not None:
+                    self._unshared.add(key)
+        if current and shared_key is not None:
+            self.shared_cache.set('schema', shared_key, value)
+        return value
+
+    def invalidate(self, reason: str = '') -> int:
+        """
+        Drop all cached entries and bump the schema version
+
+        Args:
+            reason: Optional description of the change, used for logging
+
+        Returns:
+            The new schema version
+        """
+        with self._lock:
+            self._version += 1
+            self._entries.clear()
+            self._unshared.clear()
+            # Re-read the fingerprint soon so the shared cache can be used again
+            self._last_check = 0.0
+            version = self._version
+        logger.info(f"Schema cache invalidated (version {version}){': ' + reason if reason else ''}")
+        return version
+
+    def check(self, conn, force: bool = False) -> bool:
+        """
+        Compare the catalog fingerprint and invalidate if it changed.
+
+        The check is skipped when it ran recently, or when a DDL event trigger
+        feeds an active listener (then it runs at a tenth of the usual rate).
+        It is also skipped while the connection is inside a transaction, so a
+        caller's open transaction is never committed or rolled back by it.
+
+        Args:
+            conn: Open database connection
+            force: Run the check regardless of the poll interval
+
+        Returns:
+            True if a change was detected, False otherwise
+        """
+        interval = self.poll_interval
+        if self._trigger_installed and self._listener_ready.is_set():
+            interval *= 10
+
+        if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            return False
+
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._last_check < interval:
+                return False
+            self._last_check = now
+            version = self._version
+
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(FINGERPRINT_QUERY)
+                fingerprint = cursor.fetchone()[0]
+            # End the transaction the query opened; the connection was idle before
+            if conn.get_transaction_status() == psycopg2.extensions.TRANSACTION_STATUS_INTRANS:
+                conn.commit()
+        except Exception as e:
+            logger.warning(f"Error computing schema fingerprint: {e}")
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            return False
+
+        with self._lock:
+            previous = self._fingerprint
+            self._fingerprint = fingerprint
+        changed = previous is not None and previous != fingerprint
+        if changed:
+            version = self.invalidate("catalog fingerprint changed")
+        with self._lock:
+            # An invalidation during the query means the fingerprint may already be stale
+            if self._version == version:
+                self._fingerprint_version = version
+        return changed
+
+    def install_ddl_trigger(self, conn) -> Tuple[bool, str]:
+        """
+        Install the DDL event trigger that feeds the notification channel.
+        Requires superuser privileges.
+
+        Args:
+            conn: Open database connection
+
+        Returns:
+            A tuple containing (success, message)
+        """
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(INSTALL_TRIGGER_SQL)
+            conn.commit()
+            self._trigger_installed = True
+            return True, f"Event trigger {DDL_EVENT_TRIGGER} installed"
+        except Exception as e:
+            conn.rollback()
+            logger.warning(f"Could not install DDL event trigger: {e}")
+            return False, f"Error: {e}"
+
+    def stop(self):
+        """Stop the notification listener"""
+        self._stop_event.set()
+        if self._listener_thread:
+            self._listener_thread.join(timeout=5)
+            self._listener_thread = None
+
+    def _ensure_listener(self):
+        """Start the notification listener thread if enabled and not running"""
+        if not self.listen:
+            return
+        with self._lock:
+            if self._listener_thread and self._listener_thread.is_alive():
+                return
+            self._stop_event.clear()
+            self._listener_thread = threading.Thread(
+                target=self._listen_loop, name='schema-cache-listener', daemon=True
+            )
+            self._listener_thread.start()
+
+    def _listen_loop(self):
+        """LISTEN for DDL notifications, reconnecting with backoff on errors"""
+        backoff = 1.0
+        while not self._stop_event.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(**self.connection_params)
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with conn.cursor() as cursor:
+                    cursor.execute(f"LISTEN {SCHEMA_CHANGE_CHANNEL};")
+                    cursor.execute(
+                        "SELECT EXISTS (SELECT 1 FROM pg_catalog.pg_event_trigger "
+                        "WHERE evtname = %s AND evtenabled <> 'D');",
+                        (DDL_EVENT_TRIGGER,)
+                    )
+                    self._trigger_installed = cursor.fetchone()[0]
+                self._listener_ready.set()
+                backoff = 1.0
+                # Changes may have happened while we were not listening
+                self.invalidate("listener (re)connected")
+
+                while not self._stop_event.is_set():
+                    if select.select([conn], [], [], 5.0) == ([], [], []):
+                        continue
+                    conn.poll()
+                    if conn.notifies:
+                        tags = {notify.payload for notify in conn.notifies}
+                        conn.notifies.clear()
+                        self.invalidate(', '.join(sorted(tags)))
+            except Exception as e:
+                logger.warning(f"Schema change listener error: {e}")
+            finally:
+                self._listener_ready.clear()
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+            self._stop_event.wait(backoff)
+            backoff = min(backoff * 2, 60.0)
+
+
+_caches: Dict[Tuple, SchemaCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_schema_cache(connection_params: Dict[str, Any]) -> SchemaCache:
+    """
+    Get the process-wide schema cache for a database
+
+    Args:
+        connection_params: Connection parameters identifying the database
+
+    Returns:
+        The shared SchemaCache instance for that database
+    """
+    key = _cache_key(connection_params)
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = SchemaCache(connection_params)
+            _caches[key] = cache
+        return cache
+
+
+def drop_schema_cache(connection_params: Dict[str, Any]) -> bool:
+    """
+    Stop and forget the process-wide schema cache of a database
+
+    Args:
+        connection_params: Connection parameters identifying the database
+
+    Returns:
+        True if a cache was dropped
+    """
+    with _caches_lock:
+        cache = _caches.pop(_cache_key(connection_params), None)
+    if cache is None:
+        return False
+    cache.stop()
+    return True
+
+
+def _cache_key(connection_params: Dict[str, Any]) -> Tuple:
+    """Key of a database's cache; the password does not identify the database"""
+    return tuple(sorted(
+        (name, str(value)) for name, value in connection_params.items() if name != 'password'
+    ))
@@ -0,0 +1,628 @@
+"""
+Shard Executor Module
+Runs read-only queries on every shard database and merges the results
+"""
+
+import os
+import json
+import time
+import heapq
+import uuid
+import logging
+from itertools import chain, islice
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple, Union, Iterator
+import psycopg2
+import sqlparse
+from sqlparse import tokens as T
+
+from .connection_registry import ConnectionRegistry, ConnectionRegistryError, DEFAULT_TARGET
+from .query_router import is_read_only
+
+logger = logging.getLogger(__name__)
+
+# Aggregates whose per-shard results can be combined, and how
+MERGEABLE_AGGREGATES = ('count', 'sum', 'min', 'max')
+
+# Aggregates that cannot be combined from per-shard results
+OTHER_AGGREGATES = (
+    'avg', 'array_agg', 'string_agg', 'json_agg', 'jsonb_agg', 'json_object_agg', 'jsonb_object_agg',
+    'bool_and', 'bool_or', 'every', 'bit_and', 'bit_or', 'stddev', 'stddev_pop', 'stddev_samp',
+    'variance', 'var_pop', 'var_samp', 'percentile_cont', 'percentile_disc', 'mode', 'corr',
+    'covar_pop', 'covar_samp', 'xmlagg'
+)
+
+CLAUSE_KEYWORDS = ('FROM', 'WHERE', 'GROUP BY', 'HAVING', 'WINDOW', 'ORDER BY', 'LIMIT', 'OFFSET', 'FETCH', 'FOR')
+
+# text, varchar, bpchar and name: sorted by the collation on the shards
+TEXT_TYPE_OIDS = (25, 1043, 1042, 19)
+
+# Types returned as strings that PostgreSQL sorts in the same order as their text (uuid)
+STRING_ORDERED_TYPE_OIDS = (2950,)
+
+# Collations (and the PostgreSQL 17 builtin provider) that sort text by code point, like Python
+CODE_POINT_COLLATIONS = ('c', 'posix', 'c.utf8', 'c.utf-8')
+
+# to_jsonb() keeps this working before PostgreSQL 15, which has no datlocprovider
+DATABASE_COLLATION_SQL = """
+    SELECT datcollate, to_jsonb(d) ->> 'datlocprovider'
+    FROM pg_catalog.pg_database d
+    WHERE datname = current_database();
+"""
+
+
+class ShardError(Exception):
+    """Raised when a query cannot be run across shards"""
+
+
+def _tokens(query: str) -> Tuple[List[Any], List[Tuple[Any, int]]]:
+    """
+    Tokenize a single statement
+
+    Returns:
+        All flattened tokens, and the significant ones (no whitespace or
+        comments) with their parenthesis depth
+    """
+    statements = [s for s in sqlparse.parse(query.strip().rstrip(';')) if s.token_first(skip_cm=True)]
+    if len(statements) != 1:
+        raise ShardError("Sharded queries take a single statement")
+    flat = list(statements[0].flatten())
+    result, depth = [], 0
+    for token in flat:
+        if token.is_whitespace or token.ttype in T.Comment:
+            continue
+        if token.ttype in T.Punctuation and token.value == ')':
+            depth -= 1
+        result.append((token, depth))
+        if token.ttype in T.Punctuation and token.value == '(':
+            depth += 1
+    return flat, result
+
+
+def _keyword(token) -> str:
+    """Normalized keyword text, e.g. 'ORDER BY', or '' for other tokens"""
+    if token.ttype in T.Keyword or token.ttype in T.Keyword.DML:
+        return ' '.join(token.value.upper().split())
+    return ''
+
+
+def _split(tokens: List[Tuple[Any, int]]) -> List[List[Any]]:
+    """Split a token run at top-level commas"""
+    items, current = [], []
+    for token, depth in tokens:
+        if depth == 0 and token.ttype in T.Punctuation and token.value == ',':
+            items.append(current)
+            current = []
+        else:
+            current.append(token)
+    if current:
+        items.append(current)
+    return items
+
+
+def _text(tokens: List[Any]) -> str:
+    """Canonical text of an expression, used to match ORDER BY items to select items"""
+    return ' '.join(token.value.lower() for token in tokens)
+
+
+def _strip_collate(tokens: List[Any]) -> Tuple[List[Any], Optional[str]]:
+    """Split a trailing COLLATE "name" off an expression"""
+    if len(tokens) > 2 and _keyword(tokens[-2]) == 'COLLATE':
+        name = tokens[-1].value
+        return tokens[:-2], name[1:-1] if name.startswith('"') else name.lower()
+    return tokens, None
+
+
+def _group_key_selected(group: List[Any], select_items: List[List[Any]], items: List[Dict[str, Any]]) -> bool:
+    """Check whether a GROUP BY item is one of the plain columns of the select list"""
+    if len(group) == 1 and group[0].ttype in T.Literal.Number.Integer:
+        position = int(group[0].value) - 1
+        return 0 <= position < len(items) and items[position]['kind'] == 'column'
+
+    text = _text(group)
+    for tokens, item in zip(select_items, items):
+        if item['kind'] != 'column':
+            continue
+        # The expression itself, or its alias
+        names = {_text(tokens)}
+        if len(tokens) > 2 and _keyword(tokens[-2]) == 'AS':
+            names.update((_text(tokens[:-2]), tokens[-1].value.lower()))
+        elif len(tokens) > 1 and tokens[-1].ttype in T.Name and tokens[-2].value != '.':
+            names.update((_text(tokens[:-1]), tokens[-1].value.lower()))
+        if text in names:
+            return True
+    return False
+
+
+def _select_item(tokens: List[Any]) -> Dict[str, Any]:
+    """
+    Classify a select-list item
+
+    Returns:
+        Dictionary with 'kind' ('column', 'aggregate', 'expression' for
+        expressions over aggregates, or 'window'), the aggregate 'function',
+        'distinct' for DISTINCT aggregates and the 'expression' text
+    """
+    names = [token.value.lower() for token in tokens]
+    item = {'kind': 'column', 'function': None, 'distinct': False, 'expression': _text(tokens)}
+    if any(_keyword(token) == 'OVER' for token in tokens):
+        item['kind'] = 'window'
+        return item
+
+    calls = [i for i, name in enumerate(names[:-1])
+             if name in MERGEABLE_AGGREGATES + OTHER_AGGREGATES and names[i + 1] == '(']
+    if not calls:
+        return item
+    item['kind'] = 'expression'
+    if calls[0] != 0 or names[0] not in MERGEABLE_AGGREGATES:
+        return item
+
+    # The item must be the call itself, optionally with FILTER (...) and an alias
+    depth, end = 0, None
+    for i, token in enumerate(tokens[1:], start=1):
+        if token.value == '(':
+            depth += 1
+        elif token.value == ')':
+            depth -= 1
+            if depth == 0:
+                end = i
+                break
+    if end is None:
+        return item
+    rest = names[end + 1:]
+    if rest[:2] == ['filter', '(']:
+        depth = 0
+        for i, name in enumerate(rest[1:], start=1):
+            depth += {'(': 1, ')': -1}.get(name, 0)
+            if depth == 0:
+                rest = rest[i + 1:]
+                break
+    if rest[:1] == ['as']:
+        rest = rest[1:]
+    if len(rest) > 1:
+        return item
+
+    item['kind'] = 'aggregate'
+    item['function'] = names[0]
+    item['distinct'] = names[2:3] == ['distinct']
+    item['expression'] = _text(tokens[:end + 1])
+    return item
+
+
+def plan_query(query: str) -> Dict[str, Any]:
+    """
+    Work out how the results of a query on several shards are combined
+
+    Args:
+        query: A single read-only SELECT
+
+    Returns:
+        Dictionary with the 'shard_query' sent to every shard, the 'merge'
+        strategy ('ordered', 'aggregate' or 'concat'), the parsed 'items'
+        of the select list, the raw 'order_by' items, 'limit', 'offset' and
+        whether the select list is 'distinct'
+
+    Raises:
+        ShardError: If the results could not be combined correctly
+    """
+    if not is_read_only(query):
+        raise ShardError("Only read-only SELECT queries can run across shards")
+    flat, tokens = _tokens(query)
+
+    top = [(i, _keyword(token)) for i, (token, depth) in enumerate(tokens) if depth == 0 and _keyword(token)]
+    if any(keyword.startswith(('UNION', 'INTERSECT', 'EXCEPT')) and keyword != 'UNION ALL' for _, keyword in top):
+        raise ShardError("UNION, INTERSECT and EXCEPT cannot be combined across shards; use UNION ALL")
+    select = next((i for i, keyword in top if keyword == 'SELECT'), None)
+    if select is None:
+        raise ShardError("Sharded queries must be SELECT queries")
+
+    def clause(name: str) -> Optional[int]:
+        return next((i for i, keyword in top if keyword == name and i > select), None)
+
+    if clause('FETCH') is not None:
+        raise ShardError("Use LIMIT instead of FETCH FIRST for sharded queries")
+    if clause('HAVING') is not None:
+        raise ShardError("HAVING cannot be applied to per-shard groups")
+
+    # Select list: from after SELECT [DISTINCT] up to the first clause
+    start = select + 1
+    distinct = _keyword(tokens[start][0]) == 'DISTINCT' if start < len(tokens) else False
+    if distinct or (start < len(tokens) and _keyword(tokens[start][0]) == 'ALL'):
+        start += 1
+    if distinct and start < len(tokens) and _keyword(tokens[start][0]) == 'ON':
+        raise ShardError("DISTINCT ON cannot be combined across shards")
+    end = next((i for i, keyword in top
+                if i >= start and (keyword in CLAUSE_KEYWORDS or keyword.startswith('UNION'))), len(tokens))
+    select_items = _split(tokens[start:end])
+    items = [_select_item(item) for item in select_items]
+
+    if any(item['kind'] == 'window' for item in items):
+        raise ShardError("Window functions are computed per shard and cannot be combined")
+    grouped = clause('GROUP BY') is not None or any(item['kind'] != 'column' for item in items)
+    if grouped:
+        if any(keyword == 'UNION ALL' for _, keyword in top):
+            raise ShardError("Aggregates over UNION ALL cannot be combined across shards")
+        for item in items:
+            if item['kind'] == 'expression':
+                raise ShardError(f"Only plain {', '.join(f.upper() for f in MERGEABLE_AGGREGATES)} "
+                                 f"can be combined across shards, not '{item['expression']}'")
+            if item['distinct']:
+                raise ShardError(f"{item['function'].upper()}(DISTINCT ...) cannot be combined across shards")
+            if item['expression'] == '*':
+                raise ShardError("SELECT * cannot be combined with aggregates across shards")
+        # Groups are combined on the selected columns, so every grouping key must be one of them
+        group_start = clause('GROUP BY')
+        if group_start is not None:
+            group_end = next((i for i, keyword in top if i > group_start and keyword in CLAUSE_KEYWORDS),
+                             len(tokens))
+            for group in _split(tokens[group_start + 1:group_end]):
+                if not _group_key_selected(group, select_items, items):
+                    raise ShardError(f"GROUP BY {_text(group)} must be a plain column of the select list "
+                                     f"to combine groups across shards")
+
+    # ORDER BY items and LIMIT / OFFSET, which are removed from the shard query
+    order_by, limit, offset, removed = [], None, 0, set()
+    order_start = clause('ORDER BY')
+    if order_start is not None:
+        order_end = next((i for i, keyword in top if i > order_start and keyword in ('LIMIT', 'OFFSET', 'FOR')),
+                         len(tokens))
+        order_by = _split(tokens[order_start + 1:order_end])
+    for i, keyword in top:
+        if i <= select or keyword not in ('LIMIT', 'OFFSET'):
+            continue
+        value = tokens[i + 1][0] if i + 1 < len(tokens) else None
+        removed.update((i, i + 1))
+        if value is not None and keyword == 'LIMIT' and _keyword(value) == 'ALL':
+            continue
+        if value is None or value.ttype not in T.Literal.Number.Integer:
+            raise ShardError(f"{keyword} must be an integer literal in sharded queries")
+        if keyword == 'LIMIT':
+            limit = int(value.value)
+        else:
+            offset = int(value.value)
+            if i + 2 < len(tokens) and tokens[i + 2][0].value.upper() in ('ROW', 'ROWS'):
+                removed.add(i + 2)
+
+    removed_tokens = {id(tokens[i][0]) for i in removed}
+    shard_query = ''.join(token.value for token in flat if id(token) not in removed_tokens).strip()
+    # Every shard must return enough rows for the global page, unless groups are combined afterwards
+    if limit is not None and not grouped:
+        shard_query += f"\nLIMIT {limit + offset}"
+
+    return {
+        'shard_query': shard_query,
+        'merge': 'aggregate' if grouped else 'ordered' if order_by else 'concat',
+        'items': items,
+        'order_by': order_by,
+        'limit': limit,
+        'offset': offset,
+        'distinct': distinct
+    }
+
+
+class _OrderKey:
+    """Sort key applying ORDER BY directions and PostgreSQL's NULL placement"""
+
+    __slots__ = ('row', 'order')
+
+    def __init__(self, row: tuple, order: List[Tuple[int, bool, bool]]):
+        self.row = row
+        self.order = order
+
+    def __lt__(self, other: '_OrderKey') -> bool:
+        for position, descending, nulls_first in self.order:
+            a, b = self.row[position], other.row[position]
+            if a is None and b is None or a == b:
+                continue
+            if a is None:
+                return nulls_first
+            if b is None:
+                return not nulls_first
+            return a > b if descending else a < b
+        return False
+
+
+def _hashable(value: Any) -> Any:
+    """Group key component for values such as JSON documents that cannot be hashed"""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, sort_keys=True, default=str)
+    return value
+
+
+class ShardExecutor:
+    """
+    Runs a read-only query on every shard and merges the results.
+
+    Shards are connection registry targets. The query is started on all of
+    them concurrently through server-side cursors; results are then read
+    in batches and combined:
+
+    - ORDER BY queries are merged with a streaming k-way merge, and each
+      shard is asked for at most LIMIT + OFFSET rows
+    - queries with GROUP BY or COUNT/SUM/MIN/MAX have their per-shard
+      groups re-aggregated, then sorted and paged
+    - other queries are concatenated in shard order
+
+    Subqueries, CTEs and joins run on each shard separately, so they only
+    see that shard's rows. Rows are merged in code point order, so ordered
+    merges on text columns need shards sorting text the same way: a "C"
+    database collation or COLLATE "C" on the ORDER BY item. Otherwise the
+    query is refused rather than returning rows out of order.
+    """
+
+    def __init__(self, connection_registry: ConnectionRegistry, shards: Optional[List[str]] = None,
+                 max_workers: Optional[int] = None, fetch_size: Optional[int] = None):
+        """
+        Initialize the shard executor
+
+        Args:
+            connection_registry: Registry the shard targets are defined in
+            shards: Default shard target names (default: SHARD_TARGETS
+                    environment variable, comma-separated)
+            max_workers: Shards queried at once (default: SHARD_MAX_WORKERS, or 8)
+            fetch_size: Rows fetched from a shard per round trip
+                        (default: SHARD_FETCH_SIZE, or 1000)
+        """
+        self.connection_registry = connection_registry
+        self.shards = shards if shards is not None else [
+            name.strip() for name in os.getenv('SHARD_TARGETS', '').split(',') if name.strip()
+        ]
+        self.max_workers = max_workers if max_workers is not None else int(os.getenv('SHARD_MAX_WORKERS', '8'))
+        self.fetch_size = fetch_size if fetch_size is not None else int(os.getenv('SHARD_FETCH_SIZE', '1000'))
+        logger.debug(f"Shard executor initialized with {len(self.shards)} shard(s)")
+
+    def execute(self, query: str, shards: Optional[List[str]] = None, row_format: str = 'dict',
+                statement_timeout_ms: Optional[int] = None,
+                allow_partial: bool = False) -> Tuple[bool, Union[List[Dict[str, Any]], Dict[str, Any], str], Dict[str, Any]]:
+        """
+        Run a read-only query on every shard and merge the results
+
+        Args:
+            query: A single read-only SELECT
+            shards: Shard target names (default: the configured shards)
+            row_format: 'dict' or 'columnar'
+            statement_timeout_ms: Statement timeout on each shard
+            allow_partial: Merge the shards that answered when others fail,
+                           instead of failing the query
+
+        Returns:
+            A tuple containing (success, result, report), where report has
+            the 'merge' strategy, whether the result is 'partial' and per
+            shard 'shards' entries with rows read, latency and error
+        """
+        shards = list(shards) if shards else list(self.shards)
+        report = {'merge': None, 'partial': False, 'shards': []}
+        try:
+            if not shards:
+                raise ShardError("No shards configured; set SHARD_TARGETS or pass shards")
+            if DEFAULT_TARGET in shards or len(set(shards)) != len(shards):
+                raise ShardError("Shards must be distinct registered targets")
+            plan = plan_query(query)
+        except ShardError as e:
+            return False, f"Error: {e}", report
+        report['merge'] = plan['merge']
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(shards)))) as pool:
+            opened = list(pool.map(lambda name: self._open(name, plan['shard_query'], statement_timeout_ms), shards))
+        try:
+            report['shards'] = [self._entry(shard) for shard in opened]
+            failed = [shard for shard in opened if shard['error']]
+            answered = [shard for shard in opened if not shard['error']]
+            if failed and (not allow_partial or not answered):
+                errors = '; '.join(f"{shard['name']}: {shard['error']}" for shard in failed)
+                return False, f"Error: {len(failed)} of {len(opened)} shard(s) failed: {errors}", report
+            report['partial'] = bool(failed)
+
+            columns = [column.name for column in answered[0]['description']]
+            for shard in answered[1:]:
+                if [column.name for column in shard['description']] != columns:
+                    return False, f"Error: Shard {shard['name']} returned different columns", report
+
+            if plan['merge'] == 'ordered':
+                self._check_order_collation(plan, answered, columns)
+            rows = self._merge(plan, answered, columns)
+            result = answered[0]['connector'].shape_rows(answered[0]['description'], rows, row_format)
+            for entry, shard in zip(report['shards'], opened):
+                entry['rows'] = shard['rows']
+            logger.info(f"Sharded query merged {len(rows)} rows from {len(answered)} shard(s) "
+                        f"in {(time.monotonic() - started) * 1000:.0f} ms ({plan['merge']})")
+            return True, result, report
+        except ShardError as e:
+            return False, f"Error: {e}", report
+        except psycopg2.Error as e:
+            logger.warning(f"Sharded query failed while merging: {e}")
+            return False, f"Error: {e}", report
+        finally:
+            for shard in opened:
+                self._close(shard)
+
+    def _open(self, name: str, query: str, statement_timeout_ms: Optional[int]) -> Dict[str, Any]:
+        """Start the query on one shard and read its first batch"""
+        shard = {'name': name, 'connector': None, 'cursor': None, 'first': [], 'description': None,
+                 'rows': 0, 'latency_ms': None, 'error': None}
+        started = time.monotonic()
+        try:
+            shard['connector'] = self.connection_registry.acquire(name)
+            conn = shard['connector'].conn
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT set_config('transaction_read_only', 'on', true);")
+                if statement_timeout_ms:
+                    cursor.execute("SELECT set_config('statement_timeout', %s, true);", (f"{statement_timeout_ms}ms",))
+            shard['cursor'] = conn.cursor(name=f"shard_{uuid.uuid4().hex}")
+            shard['cursor'].itersize = self.fetch_size
+            shard['cursor'].execute(query)
+            shard['first'] = shard['cursor'].fetchmany(self.fetch_size)
+            shard['description'] = shard['cursor'].description
+        except ConnectionRegistryError as e:
+            shard['error'] = str(e)
+        except psycopg2.Error as e:
+            shard['error'] = str(e).strip().splitlines()[0]
+        shard['latency_ms'] = round((time.monotonic() - started) * 1000, 1)
+        if shard['error']:
+            logger.warning(f"Shard {name} failed: {shard['error']}")
+        return shard
+
+    def _rows(self, shard: Dict[str, Any]) -> Iterator[tuple]:
+        """Stream a shard's rows, fetching further batches on demand"""
+        batch = shard['first']
+        while batch:
+            for row in batch:
+                shard['rows'] += 1
+                yield row
+            if len(batch) < self.fetch_size:
+                return
+            batch = shard['cursor'].fetchmany(self.fetch_size)
+
+    def _merge(self, plan: Dict[str, Any], shards: List[Dict[str, Any]], columns: List[str]) -> List[tuple]:
+        """Combine the shards' rows according to the plan"""
+        order = self._resolve_order(plan, columns)
+        streams = [self._rows(shard) for shard in shards]
+        stop = None if plan['limit'] is None else plan['offset'] + plan['limit']
+
+        if plan['merge'] == 'aggregate':
+            rows = self._aggregate(plan['items'], chain(*streams))
+            if order:
+                rows.sort(key=lambda row: _OrderKey(row, order))
+            if plan['distinct']:
+                rows = list(self._distinct(iter(rows)))
+            return rows[plan['offset']:stop]
+
+        if plan['merge'] == 'ordered':
+            merged = heapq.merge(*streams, key=lambda row: _OrderKey(row, order))
+        else:
+            merged = chain(*streams)
+        if plan['distinct']:
+            merged = self._distinct(merged)
+        return list(islice(merged, plan['offset'], stop))
+
+    def _check_order_collation(self, plan: Dict[str, Any], shards: List[Dict[str, Any]], columns: List[str]):
+        """
+        Make sure each shard sorted its rows the way the merge compares them
+
+        Raises:
+            ShardError: If a text ORDER BY key is sorted by a linguistic
+                        collation, or a key sorts by something other than its
+                        text (e.g. an enum)
+        """
+        description = shards[0]['description']
+        text_keys = []
+        for (position, _, _), tokens in zip(self._resolve_order(plan, columns), plan['order_by']):
+            if description[position].type_code in TEXT_TYPE_OIDS:
+                if self._order_collation(tokens) not in CODE_POINT_COLLATIONS:
+                    text_keys.append(columns[position])
+            elif description[position].type_code not in STRING_ORDERED_TYPE_OIDS and \
+                    any(isinstance(row[position], str) for shard in shards for row in shard['first']):
+                raise ShardError(f"ORDER BY {columns[position]} cannot be merged across shards: "
+                                 f"values of its type are not sorted as plain text")
+        if not text_keys:
+            return
+
+        for shard in shards:
+            with shard['connector'].conn.cursor() as cursor:
+                cursor.execute(DATABASE_COLLATION_SQL)
+                collation, provider = cursor.fetchone()
+            if provider != 'b' and (provider not in (None, 'c') or collation.lower() not in CODE_POINT_COLLATIONS):
+                raise ShardError(f"Shard {shard['name']} sorts text with the {collation} collation, which "
+                                 f"cannot be merged; add COLLATE \"C\" to ORDER BY {', '.join(text_keys)}")
+
+    @staticmethod
+    def _order_collation(tokens: List[Any]) -> Optional[str]:
+        """Collation named by COLLATE in an ORDER BY item, lower-cased, if any"""
+        while len(tokens) > 1 and _keyword(tokens[-1]) and \
+                set(_keyword(tokens[-1]).split()) <= {'ASC', 'DESC', 'NULLS', 'FIRST', 'LAST'}:
+            tokens = tokens[:-1]
+        collation = _strip_collate(tokens)[1]
+        return collation.lower() if collation else None
+
+    @staticmethod
+    def _resolve_order(plan: Dict[str, Any], columns: List[str]) -> List[Tuple[int, bool, bool]]:
+        """Map ORDER BY items to (column position, descending, nulls first)"""
+        names = [name.lower() for name in columns]
+        expressions = [item['expression'] for item in plan['items']]
+        order = []
+        for tokens in plan['order_by']:
+            # Trailing ASC / DESC / NULLS FIRST / NULLS LAST, possibly tokenized as one keyword
+            modifiers = []
+            while len(tokens) > 1 and _keyword(tokens[-1]) and \
+                    set(_keyword(tokens[-1]).split()) <= {'ASC', 'DESC', 'NULLS', 'FIRST', 'LAST'}:
+                modifiers = _keyword(tokens[-1]).split() + modifiers
+                tokens = tokens[:-1]
+            descending = 'DESC' in modifiers
+            nulls_first = 'FIRST' in modifiers if 'NULLS' in modifiers else descending
+            tokens = _strip_collate(tokens)[0]
+
+            text = _text(tokens)
+            if len(tokens) == 1 and tokens[0].ttype in T.Literal.Number.Integer:
+                position = int(tokens[0].value) - 1
+            elif len(tokens) == 1 and tokens[0].ttype in T.Literal.String.Symbol:
+                position = columns.index(tokens[0].value[1:-1]) if tokens[0].value[1:-1] in columns else -1
+            elif tokens[-1].ttype in T.Name and tokens[-1].value.lower() in names:
+                position = names.index(tokens[-1].value.lower())
+            elif text in expressions and len(expressions) == len(columns):
+                position = expressions.index(text)
+            else:
+                position = -1
+            if not 0 <= position < len(columns):
+                raise ShardError(f"ORDER BY {text} must name a column of the select list to merge shards")
+            order.append((position, descending, nulls_first))
+        return order
+
+    @staticmethod
+    def _aggregate(items: List[Dict[str, Any]], rows: Iterator[tuple]) -> List[tuple]:
+        """Re-aggregate per-shard groups: counts and sums add up, minimums and maximums combine"""
+        keys = [i for i, item in enumerate(items) if item['kind'] == 'column']
+        groups: Dict[tuple, list] = {}
+        for row in rows:
+            key = tuple(_hashable(row[i]) for i in keys)
+            merged = groups.get(key)
+            if merged is None:
+                groups[key] = list(row)
+                continue
+            for i, item in enumerate(items):
+                value, current = row[i], merged[i]
+                if item['kind'] != 'aggregate' or value is None:
+                    continue
+                if current is None:
+                    merged[i] = value
+                elif item['function'] in ('count', 'sum'):
+                    merged[i] = current + value
+                elif item['function'] == 'min':
+                    merged[i] = min(current, value)
+                else:
+                    merged[i] = max(current, value)
+        return [tuple(row) for row in groups.values()]
+
+    @staticmethod
+    def _distinct(rows: Iterator[tuple]) -> Iterator[tuple]:
+        """Drop rows already returned by another shard"""
+        seen = set()
+        for row in rows:
+            key = tuple(_hashable(value) for value in row)
+            if key not in seen:
+                seen.add(key)
+                yield row
+
+    @staticmethod
+    def _entry(shard: Dict[str, Any]) -> Dict[str, Any]:
+        """Report entry of a shard"""
+        return {
+            'shard': shard['name'],
+            'rows': shard['rows'],
+            'latency_ms': shard['latency_ms'],
+            'error': shard['error']
+        }
+
+    def _close(self, shard: Dict[str, Any]):
+        """Close a shard's cursor and return its connector"""
+        connector = shard['connector']
+        if connector is None:
+            return
+        try:
+            if shard['cursor'] is not None and not shard['cursor'].closed:
+                shard['cursor'].close()
+            if connector.conn is not None:
+                connector.conn.rollback()
+        except psycopg2.Error as e:
+            logger.warning(f"Could not close cursor on shard {shard['name']}: {e}")
+        self.connection_registry.release(shard['name'], connector)
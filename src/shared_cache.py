@@ -0,0 +1,382 @@
+"""
+Shared Cache Module
+On-disk key-value store shared by the worker processes of one host
+"""
+
+import os
+import json
+import time
+import stat
+import sqlite3
+import hashlib
+import logging
+import threading
+from decimal import Decimal
+from contextlib import contextmanager
+from datetime import date, datetime, time as time_of_day, timedelta
+from typing import Dict, Any, Optional, Callable, Hashable, Tuple
+
+logger = logging.getLogger(__name__)
+
+SHARED_CACHE_DDL = """
+    CREATE TABLE IF NOT EXISTS entries (
+        namespace TEXT NOT NULL,
+        key TEXT NOT NULL,
+        value BLOB NOT NULL,
+        expires_at REAL NOT NULL,
+        PRIMARY KEY (namespace, key)
+    );
+    CREATE TABLE IF NOT EXISTS claims (
+        namespace TEXT NOT NULL,
+        key TEXT NOT NULL,
+        expires_at REAL NOT NULL,
+        PRIMARY KEY (namespace, key)
+    );
+    CREATE INDEX IF NOT EXISTS entries_expires_at ON entries (expires_at);
+"""
+
+
+# Marks values that JSON has no type for, e.g. {"__shared_cache__": "decimal", "value": "1.5"}
+TYPE_TAG = '__shared_cache__'
+
+
+class SharedCacheError(Exception):
+    """Raised when the shared cache file could be written by another user"""
+
+
+class SharedCache:
+    """
+    Key-value store in a SQLite file, shared by every process that opens it.
+
+    Values are stored as JSON, with tuples, decimals, dates, times and bytes
+    tagged so they come back with their type; other objects are stored as
+    their text. The file and its directory must belong to the service user
+    and not be writable by anyone else, since every worker trusts what it
+    reads from them; the directory is created with mode 0700 and the file
+    with 0600 when missing. Each operation opens its own
+    connection, which keeps the store safe to use across fork() and from
+    any thread. get_or_set() lets one process compute a missing value while
+    the others wait for it, so a burst of identical requests spread over
+    several workers results in one computation.
+    """
+
+    def __init__(self, path: str, default_ttl: Optional[float] = None, max_entries: Optional[int] = None):
+        """
+        Initialize the shared cache
+
+        Args:
+            path: SQLite file, in a directory private to the service user
+            default_ttl: Seconds entries are kept (default: SHARED_CACHE_TTL, or 86400)
+            max_entries: Entries kept before the ones closest to expiry are
+                         removed (default: SHARED_CACHE_MAX_ENTRIES, or 10000)
+
+        Raises:
+            SharedCacheError: If the file or its directory belongs to another
+                              user or is writable by others
+        """
+        self.path = path
+        self.default_ttl = default_ttl if default_ttl is not None else float(os.getenv('SHARED_CACHE_TTL', '86400'))
+        self.max_entries = max_entries if max_entries is not None else int(os.getenv('SHARED_CACHE_MAX_ENTRIES', '10000'))
+        self._writes = 0
+        _make_private(path)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL;")
+            conn.executescript(SHARED_CACHE_DDL)
+        logger.debug(f"Shared cache initialized at {path}")
+
+    def lookup(self, namespace: str, key: Hashable) -> Tuple[bool, Any]:
+        """
+        Look up an entry
+
+        Args:
+            namespace: Kind of entry, e.g. 'llm'
+            key: Entry key; anything with a stable repr()
+
+        Returns:
+            A tuple containing (found, value)
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT value FROM entries WHERE namespace = ? AND key = ? AND expires_at > ?;",
+                (namespace, self._key(key), time.time())
+            ).fetchone()
+        if row is None:
+            return False, None
+        try:
+            return True, _decode(json.loads(row[0]))
+        except Exception as e:
+            logger.warning(f"Discarding unreadable shared cache entry: {e}")
+            return False, None
+
+    def set(self, namespace: str, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """
+        Store an entry
+
+        Args:
+            namespace: Kind of entry
+            key: Entry key
+            value: Value made of JSON types, tuples, decimals, dates, times and bytes
+            ttl: Seconds to keep the entry (default: the cache's default TTL)
+        """
+        expires_at = time.time() + (ttl if ttl is not None else self.default_ttl)
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (namespace, key, value, expires_at) VALUES (?, ?, ?, ?);",
+                (namespace, self._key(key), json.dumps(_encode(value)).encode('utf-8'), expires_at)
+            )
+            self._writes += 1
+            if self._writes % 100 == 0:
+                self._prune(conn)
+
+    def get_or_set(self, namespace: str, key: Hashable, compute: Callable[[], Any],
+                   ttl: Optional[float] = None, wait: float = 60.0) -> Any:
+        """
+        Get an entry, computing it once across processes on a miss
+
+        Args:
+            namespace: Kind of entry
+            key: Entry key
+            compute: Produces the value; exceptions propagate and nothing is stored
+            ttl: Seconds to keep the entry
+            wait: Longest time to wait for another process computing the same
+                  entry before computing it here as well
+
+        Returns:
+            The cached or computed value
+        """
+        found, value = self.lookup(namespace, key)
+        if found:
+            return value
+
+        deadline = time.monotonic() + wait
+        while not self._claim(namespace, key, wait):
+            if time.monotonic() >= deadline:
+                logger.warning(f"Gave up waiting for a shared {namespace} entry; computing it here")
+                return compute()
+            time.sleep(0.1)
+            found, value = self.lookup(namespace, key)
+            if found:
+                return value
+
+        try:
+            # Another process may have finished between our lookup and claim
+            found, value = self.lookup(namespace, key)
+            if found:
+                return value
+            value = compute()
+            self.set(namespace, key, value, ttl)
+            return value
+        finally:
+            with self._connect() as conn:
+                conn.execute("DELETE FROM claims WHERE namespace = ? AND key = ?;", (namespace, self._key(key)))
+
+    def clear(self, namespace: Optional[str] = None) -> int:
+        """
+        Remove entries
+
+        Args:
+            namespace: Only remove entries of this kind (default: all)
+
+        Returns:
+            Number of entries removed
+        """
+        with self._connect() as conn:
+            if namespace is None:
+                return conn.execute("DELETE FROM entries;").rowcount
+            return conn.execute("DELETE FROM entries WHERE namespace = ?;", (namespace,)).rowcount
+
+    def stats(self) -> Dict[str, Any]:
+        """Entry counts per namespace"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT namespace, count(*) FROM entries WHERE expires_at > ? GROUP BY namespace;", (time.time(),)
+            ).fetchall()
+        return {'path': self.path, 'entries': dict(rows)}
+
+    def _claim(self, namespace: str, key: Hashable, timeout: float) -> bool:
+        """Try to become the process computing an entry; stale claims are taken over"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("DELETE FROM claims WHERE namespace = ? AND key = ? AND expires_at <= ?;",
+                         (namespace, self._key(key), now))
+            cursor = conn.execute("INSERT OR IGNORE INTO claims (namespace, key, expires_at) VALUES (?, ?, ?);",
+                                  (namespace, self._key(key), now + timeout))
+            return cursor.rowcount == 1
+
+    def _prune(self, conn):
+        """Drop expired entries and the ones closest to expiry beyond max_entries"""
+        conn.execute("DELETE FROM entries WHERE expires_at <= ?;", (time.time(),))
+        conn.execute("""
+            DELETE FROM entries WHERE rowid IN (
+                SELECT rowid FROM entries ORDER BY expires_at DESC LIMIT -1 OFFSET ?
+            );
+        """, (self.max_entries,))
+
+    @staticmethod
+    def _key(key: Hashable) -> str:
+        """Fixed-length text form of a key"""
+        return hashlib.sha256(repr(key).encode('utf-8')).hexdigest()
+
+    @contextmanager
+    def _connect(self):
+        """Open the store for one transaction"""
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+
+def _make_private(path: str):
+    """Create the cache's directory and file for this user only, refusing ones others could write"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    uid = os.getuid()
+    info = os.stat(directory)
+    if info.st_uid != uid or info.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        raise SharedCacheError(f"Shared cache directory {directory} must belong to this user "
+                               f"and not be writable by others")
+    # SQLite creates the WAL and shared-memory files with the database's mode
+    os.close(os.open(path, os.O_RDWR | os.O_CREAT, 0o600))
+    for name in (path, path + '-wal', path + '-shm'):
+        try:
+            info = os.stat(name)
+        except FileNotFoundError:
+            continue
+        if info.st_uid != uid:
+            raise SharedCacheError(f"Shared cache file {name} belongs to another user")
+        if info.st_mode & 0o077:
+            os.chmod(name, 0o600)
+
+
+def _encode(value: Any) -> Any:
+    """Turn a value into JSON types, tagging the ones JSON would lose"""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, list):
+        return [_encode(item) for item in value]
+    if isinstance(value, dict):
+        if TYPE_TAG not in value and all(isinstance(name, str) for name in value):
+            return {name: _encode(item) for name, item in value.items()}
+        return {TYPE_TAG: 'dict', 'value': [[_encode(name), _encode(item)] for name, item in value.items()]}
+    if isinstance(value, tuple):
+        return {TYPE_TAG: 'tuple', 'value': [_encode(item) for item in value]}
+    if isinstance(value, (set, frozenset)):
+        return [_encode(item) for item in value]
+    if isinstance(value, Decimal):
+        return {TYPE_TAG: 'decimal', 'value': str(value)}
+    for name, kind in (('datetime', datetime), ('date', date), ('time', time_of_day)):
+        if isinstance(value, kind):
+            return {TYPE_TAG: name, 'value': value.isoformat()}
+    if isinstance(value, timedelta):
+        return {TYPE_TAG: 'timedelta', 'value': [value.days, value.seconds, value.microseconds]}
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return {TYPE_TAG: 'bytes', 'value': bytes(value).hex()}
+    return str(value)
+
+
+def _decode(value: Any) -> Any:
+    """Restore a value written by _encode"""
+    if isinstance(value, list):
+        return [_decode(item) for item in value]
+    if not isinstance(value, dict):
+        return value
+    kind = value.get(TYPE_TAG)
+    if kind is None:
+        return {name: _decode(item) for name, item in value.items()}
+    data = value['value']
+    if kind == 'dict':
+        return {_decode(name): _decode(item) for name, item in data}
+    if kind == 'tuple':
+        return tuple(_decode(item) for item in data)
+    if kind == 'decimal':
+        return Decimal(data)
+    if kind == 'datetime':
+        return datetime.fromisoformat(data)
+    if kind == 'date':
+        return date.fromisoformat(data)
+    if kind == 'time':
+        return time_of_day.fromisoformat(data)
+    if kind == 'timedelta':
+        return timedelta(*data)
+    if kind == 'bytes':
+        return bytes.fromhex(data)
+    raise ValueError(f"Unknown shared cache value type: {kind}")
+
+
+class LLMCache:
+    """
+    Serves repeated chat completion requests from the shared cache.
+
+    Requests are keyed by their full content (model, messages, response
+    format), so any change to the prompt, including the schema statistics
+    added to it, is a different entry.
+    """
+
+    def __init__(self, shared_cache: Optional[SharedCache] = None, ttl: Optional[float] = None):
+        """
+        Initialize the LLM cache
+
+        Args:
+            shared_cache: Store to use (default: the process's shared cache,
+                          if SHARED_CACHE_PATH is set)
+            ttl: Seconds responses are reused (default: LLM_CACHE_TTL, or 3600;
+                 0 disables the cache)
+        """
+        self.shared_cache = shared_cache if shared_cache is not None else get_shared_cache()
+        self.ttl = ttl if ttl is not None else float(os.getenv('LLM_CACHE_TTL', '3600'))
+
+    @property
+    def enabled(self) -> bool:
+        """Whether completions are cached"""
+        return self.shared_cache is not None and self.ttl > 0
+
+    def complete(self, client, **request) -> str:
+        """
+        Run a chat completion, or reuse the answer to an identical request
+
+        Args:
+            client: OpenAI client
+            **request: Arguments of chat.completions.create
+
+        Returns:
+            The content of the first choice
+        """
+        def call():
+            return client.chat.completions.create(**request).choices[0].message.content
+
+        if not self.enabled:
+            return call()
+        key = json.dumps(request, sort_keys=True, default=str)
+        return self.shared_cache.get_or_set('llm', key, call, self.ttl)
+
+
+_shared_caches: Dict[str, SharedCache] = {}
+_shared_caches_lock = threading.Lock()
+
+
+def get_shared_cache() -> Optional[SharedCache]:
+    """
+    Get the shared cache configured by SHARED_CACHE_PATH
+
+    Returns:
+        The process's SharedCache for that file, or None when sharing is not
+        configured or the file cannot be opened
+
+    Raises:
+        SharedCacheError: If the file could be written by another user
+    """
+    path = os.getenv('SHARED_CACHE_PATH', '')
+    if not path:
+        return None
+    with _shared_caches_lock:
+        cache = _shared_caches.get(path)
+        if cache is None:
+            try:
+                cache = SharedCache(path)
+            except sqlite3.Error as e:
+                logger.error(f"Could not open shared cache {path}: {e}")
+                return None
+            _shared_caches[path] = cache
+        return cache
@@ -10,6 +10,10 @@ from typing import Dict, Any, List, Optional
 import openai
 import sqlparse
 
+from .db_connector import DBConnector
+from .stats_collector import StatsCollector
+from .shared_cache import LLMCache
+
 logger = logging.getLogger(__name__)
 
 class SQLGenerator:
@@ -17,9 +21,20 @@ class SQLGenerator:
     Generates PostgreSQL queries from structured intents
     """
     
-    def __init__(self):
-        """Initialize the SQL generator with OpenAI client"""
+    def __init__(self, db_connector: Optional[DBConnector] = None):
+        """
+        Initialize the SQL generator with OpenAI client
+        
+        Args:
+            db_connector: Optional database connector; when given, size and
+                          distribution statistics of the referenced tables are
+                          added to generation prompts (disable with SQL_GENERATION_STATS=false)
+        """
         self.client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.llm_cache = LLMCache()
+        self.stats_collector = None
+        if db_connector is not None and os.getenv('SQL_GENERATION_STATS', 'true').lower() in ('1', 'true', 'yes'):
+            self.stats_collector = StatsCollector(db_connector)
         logger.debug("SQL Generator initialized")
     
     def generate(self, intent: Dict[str, Any]) -> str:
@@ -51,20 +66,18 @@ class SQLGenerator:
         """
         
         try:
-            # Convert intent to a string representation for the prompt
-            intent_str = json.dumps(intent, indent=2)
-            
             # Call the OpenAI API to generate the SQL
-            response = self.client.chat.completions.create(
+            content = self.llm_cache.complete(
+                self.client,
                 model="gpt-4-turbo",  # Use an appropriate model
                 messages=[
                     {"role": "system", "content": system_message},
-                    {"role": "user", "content": f"Generate PostgreSQL query for this intent:\n{intent_str}"}
+                    {"role": "user", "content": self._user_message(intent)}
                 ]
             )
             
             # Extract the SQL from the response
-            sql = response.choices[0].message.content.strip()
+            sql = content.strip()
             
             # Format the SQL for readability
             formatted_sql = self._format_sql(sql)
@@ -76,6 +89,102 @@ class SQLGenerator:
             logger.error(f"Error generating SQL: {e}")
             raise Exception(f"Failed to generate SQL from intent: {e}")
     
+    def generate_candidates(self, intent: Dict[str, Any], count: int) -> List[str]:
+        """
+        Generate alternative formulations of the same query in one request
+        
+        Args:
+            intent: A dictionary containing the structured intent
+            count: Number of formulations to ask for
+            
+        Returns:
+            Distinct candidate queries, the model's preferred one first
+        """
+        logger.info(f"Generating {count} SQL candidates for operation: {intent.get('operation_type', 'unknown')}")
+        
+        system_message = f"""
+        You are an expert PostgreSQL database engineer. Your task is to generate optimized PostgreSQL 
+        queries based on the structured intent provided.
+        
+        Write {count} alternative formulations that return exactly the same result but may
+        be planned differently, for example joins instead of correlated subqueries, EXISTS
+        instead of IN, CTEs, window functions or LATERAL joins. Put the one you expect to be
+        fastest first. Use PostgreSQL-specific syntax and format the SQL for readability.
+        
+        Return only a JSON object of the form {{"candidates": ["<sql>", ...]}}.
+        """
+        
+        try:
+            content = self.llm_cache.complete(
+                self.client,
+                model="gpt-4-turbo",  # Use an appropriate model
+                messages=[
+                    {"role": "system", "content": system_message},
+                    {"role": "user", "content": self._user_message(intent)}
+                ]
+            )
+            content = content.strip()
+            if content.startswith("```"):
+                content = content.strip("`").split("\n", 1)[-1]
+            candidates = json.loads(content)['candidates']
+        except Exception as e:
+            logger.error(f"Error generating SQL candidates: {e}")
+            raise Exception(f"Failed to generate SQL candidates from intent: {e}")
+        
+        result, seen = [], set()
+        for candidate in candidates:
+            if not isinstance(candidate, str) or not candidate.strip():
+                continue
+            formatted_sql = self._format_sql(candidate.strip())
+            key = ' '.join(formatted_sql.lower().split())
+            if key not in seen:
+                seen.add(key)
+                result.append(formatted_sql)
+        if not result:
+            raise Exception("Failed to generate SQL candidates from intent: the response contained no SQL")
+        return result[:count]
+    
+    def _user_message(self, intent: Dict[str, Any]) -> str:
+        """
+        Build the user message for an intent
+        
+        Args:
+            intent: A dictionary containing the structured intent
+            
+        Returns:
+            The intent as JSON, followed by table statistics when available
+        """
+        # Convert intent to a string representation for the prompt
+        intent_str = json.dumps(intent, indent=2)
+        user_message = f"Generate PostgreSQL query for this intent:\n{intent_str}"
+        
+        stats = self._table_statistics(intent)
+        if stats:
+            user_message += (
+                "\n\nStatistics of the existing tables (planner estimates). Size indexes, partitioning "
+                "and join strategies to them; skip indexes the listed ones already cover:\n" + stats
+            )
+        return user_message
+    
+    def _table_statistics(self, intent: Dict[str, Any]) -> str:
+        """
+        Summarize statistics of the tables an intent refers to
+        
+        Args:
+            intent: A dictionary containing the structured intent
+            
+        Returns:
+            Statistics text, or an empty string when unavailable
+        """
+        if self.stats_collector is None:
+            return ''
+        try:
+            return self.stats_collector.prompt_context(intent)
+        except Exception as e:
+            # Generation works without statistics
+            logger.warning(f"Could not collect table statistics: {e}")
+            return ''
+    
     def _format_sql(self, sql: str) -> str:
         """
         Format SQL query for readability
@@ -126,7 +235,8 @@ class SQLGenerator:
         
         try:
             # Call the OpenAI API to validate the SQL
-            response = self.client.chat.completions.create(
+            content = self.llm_cache.complete(
+                self.client,
                 model="gpt-4-turbo",  # Use an appropriate model
                 messages=[
                     {"role": "system", "content": system_message},
@@ -135,8 +245,7 @@ class SQLGenerator:
                 response_format={"type": "json_object"}
             )
             
-            # Extract and parse the JSON response
-            content = response.choices[0].message.content
+            # Parse the JSON response
             validation_result = json.loads(content)
             
             logger.debug(f"Validation result: {json.dumps(validation_result, indent=2)}")
@@ -0,0 +1,188 @@
+"""
+Statement Cache Module
+Per-connection LRU cache of server-side prepared statements
+"""
+
+import os
+import re
+import logging
+import itertools
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# psycopg2 placeholders, and escaped percent signs that must be unescaped
+_PLACEHOLDER = re.compile(r'%%|%s')
+
+# Statement names are unique per process, so caches sharing a session never collide
+_statement_ids = itertools.count(1)
+
+# PostgreSQL plans the first executions of a parameterized prepared statement
+# with custom plans before it considers reusing a generic plan
+CUSTOM_PLAN_EXECUTIONS = 5
+
+
+def to_prepared_sql(query: str) -> str:
+    """
+    Convert a query with psycopg2 placeholders into PREPARE syntax
+
+    Args:
+        query: Query using %s placeholders (and %% for a literal percent sign)
+
+    Returns:
+        The query using $1, $2, ... placeholders
+    """
+    position = 0
+
+    def replace(match):
+        nonlocal position
+        if match.group(0) == '%%':
+            return '%'
+        position += 1
+        return f"${position}"
+
+    return _PLACEHOLDER.sub(replace, query)
+
+
+class StatementCache:
+    """
+    Keeps fixed query shapes prepared on the server.
+
+    Statements are keyed by their SQL text and prepared on first use, so
+    later executions skip parsing, rewriting and (once PostgreSQL switches
+    to a generic plan) planning. The cache is bound to one connection and
+    one schema generation: a new connection or a schema change starts it
+    over. Least recently used statements are deallocated when the cache is
+    full.
+    """
+
+    def __init__(self, max_size: Optional[int] = None):
+        """
+        Initialize the statement cache
+
+        Args:
+            max_size: Maximum number of prepared statements
+                      (default: STATEMENT_CACHE_SIZE environment variable, or 64)
+        """
+        if max_size is None:
+            max_size = int(os.getenv('STATEMENT_CACHE_SIZE', '64'))
+        self.max_size = max(max_size, 1)
+        self._statements: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._stale: List[str] = []
+        self._conn = None
+        self._generation = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.planning_ms_saved = 0.0
+
+    def execute(self, cursor, query: str, params: Sequence = (), generation: Any = None):
+        """
+        Execute a query through a prepared statement
+
+        Args:
+            cursor: Cursor to execute on; its connection owns the statements
+            query: Query text with psycopg2 %s placeholders
+            params: Query parameters
+            generation: Schema generation; statements prepared under another
+                        generation are deallocated first
+        """
+        params = tuple(params)
+        with self._lock:
+            conn = cursor.connection
+            if conn is not self._conn or generation != self._generation:
+                self._reset(conn, generation)
+            self._deallocate_stale(cursor)
+
+            entry = self._statements.get(query)
+            if entry is None:
+                self.misses += 1
+                entry = self._prepare(cursor, query, params)
+            else:
+                self.hits += 1
+                entry['hits'] += 1
+                # Only generic plan executions skip planning (estimated)
+                if not params or entry['hits'] >= CUSTOM_PLAN_EXECUTIONS:
+                    self.planning_ms_saved += entry['planning_ms']
+                self._statements.move_to_end(query)
+            name = entry['name']
+
+        try:
+            if params:
+                placeholders = ', '.join(['%s'] * len(params))
+                cursor.execute(f"EXECUTE {name} ({placeholders});", params)
+            else:
+                cursor.execute(f"EXECUTE {name};")
+        except Exception:
+            # Prepared statements survive rollbacks; deallocate this one on
+            # the next call, when the transaction is usable again
+            with self._lock:
+                if self._statements.get(query) is entry:
+                    del self._statements[query]
+                    self._stale.append(name)
+            raise
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get cache statistics
+
+        Returns:
+            Dictionary with size, hit/miss counts and estimated planning time
+            saved (measured planning time times executions on a generic plan)
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._statements),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'planning_ms_saved': round(self.planning_ms_saved, 3)
+            }
+
+    def _prepare(self, cursor, query: str, params: tuple) -> Dict[str, Any]:
+        """Measure the planning time of a query and prepare it"""
+        planning_ms = 0.0
+        cursor.execute("EXPLAIN (SUMMARY true, FORMAT JSON) " + query, params or None)
+        plan = cursor.fetchone()
+        if plan:
+            plan = plan[0] if not isinstance(plan, dict) else next(iter(plan.values()))
+            planning_ms = float(plan[0].get('Planning Time', 0.0))
+
+        name = f"sql_gpt_stmt_{next(_statement_ids)}"
+        cursor.execute(f"PREPARE {name} AS {to_prepared_sql(query)}")
+
+        entry = {'name': name, 'planning_ms': planning_ms, 'hits': 0}
+        self._statements[query] = entry
+        logger.debug(f"Prepared {name} (planning {planning_ms:.3f} ms)")
+
+        while len(self._statements) > self.max_size:
+            _, evicted = self._statements.popitem(last=False)
+            self.evictions += 1
+            cursor.execute(f"DEALLOCATE {evicted['name']};")
+            logger.debug(f"Evicted prepared statement {evicted['name']}")
+        return entry
+
+    def _reset(self, conn, generation: Any):
+        """Start over for a new connection or schema generation"""
+        if conn is self._conn:
+            # Same session: the old statements still exist and must be dropped
+            self._stale.extend(entry['name'] for entry in self._statements.values())
+        else:
+            self._stale = []
+        if self._statements:
+            logger.debug("Resetting prepared statement cache")
+        self._statements.clear()
+        self._conn = conn
+        self._generation = generation
+
+    def _deallocate_stale(self, cursor):
+        """Deallocate statements that were dropped from the cache"""
+        while self._stale:
+            name = self._stale.pop()
+            cursor.execute(f"DEALLOCATE {name};")
@@ -0,0 +1,284 @@
+"""
+Stats Collector Module
+Summarizes table sizes, column statistics and indexes for SQL generation prompts
+"""
+
+import os
+import re
+import logging
+from typing import Dict, Any, List, Optional
+
+from .db_connector import DBConnector
+
+logger = logging.getLogger(__name__)
+
+# Table names the NLP processor may return; anything else is not looked up
+TABLE_NAME_PATTERN = re.compile(r'^[A-Za-z_][A-Za-z0-9_$]*(\.[A-Za-z_][A-Za-z0-9_$]*)?$')
+
+TABLE_SQL = """
+    SELECT
+        c.oid,
+        n.nspname,
+        c.relname,
+        c.relkind,
+        CASE WHEN c.relkind = 'p'
+            THEN (SELECT coalesce(sum(greatest(p.reltuples, 0)), 0)::bigint
+                  FROM pg_catalog.pg_partition_tree(c.oid) t
+                  JOIN pg_catalog.pg_class p ON p.oid = t.relid
+                  WHERE t.isleaf)
+            ELSE greatest(c.reltuples, 0)::bigint END,
+        pg_catalog.pg_size_pretty(CASE WHEN c.relkind = 'p'
+            THEN (SELECT coalesce(sum(pg_catalog.pg_total_relation_size(t.relid)), 0)::bigint
+                  FROM pg_catalog.pg_partition_tree(c.oid) t)
+            ELSE pg_catalog.pg_total_relation_size(c.oid) END),
+        CASE WHEN c.relkind = 'p' THEN pg_catalog.pg_get_partkeydef(c.oid) END,
+        (SELECT count(*) FROM pg_catalog.pg_inherits i WHERE i.inhparent = c.oid)
+    FROM pg_catalog.pg_class c
+    JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+    WHERE c.oid = to_regclass(%s) AND c.relkind IN ('r', 'p', 'm', 'f');
+"""
+
+# Statistics of partitioned tables are kept as inherited (whole-tree) rows
+COLUMN_STATS_SQL = """
+    SELECT
+        a.attname,
+        pg_catalog.format_type(a.atttypid, a.atttypmod),
+        s.n_distinct,
+        s.null_frac,
+        s.correlation
+    FROM pg_catalog.pg_attribute a
+    JOIN pg_catalog.pg_class c ON c.oid = a.attrelid
+    JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+    LEFT JOIN pg_catalog.pg_stats s
+        ON s.schemaname = n.nspname AND s.tablename = c.relname AND s.attname = a.attname
+        AND s.inherited = (c.relkind = 'p')
+    WHERE a.attrelid = %s AND a.attnum > 0 AND NOT a.attisdropped
+    ORDER BY a.attnum
+    LIMIT %s;
+"""
+
+INDEXES_SQL = """
+    SELECT
+        i.relname,
+        pg_catalog.pg_get_indexdef(x.indexrelid),
+        x.indisunique,
+        x.indisprimary,
+        x.indisvalid
+    FROM pg_catalog.pg_index x
+    JOIN pg_catalog.pg_class i ON i.oid = x.indexrelid
+    WHERE x.indrelid = %s
+    ORDER BY x.indisprimary DESC, i.relname;
+"""
+
+INDEX_METHOD_PATTERN = re.compile(r' USING (.+)$')
+
+
+def referenced_tables(intent: Dict[str, Any]) -> List[str]:
+    """
+    Collect the table names an intent refers to
+
+    Args:
+        intent: Structured intent from the NLP processor
+
+    Returns:
+        Table names in order of first mention, without duplicates
+    """
+    names = []
+    for entity in intent.get('entities') or []:
+        if isinstance(entity, dict) and entity.get('type', 'table') in ('table', 'view', 'materialized_view'):
+            names.append(entity.get('name'))
+    for relationship in intent.get('relationships') or []:
+        if isinstance(relationship, dict):
+            for end in (relationship.get('from'), relationship.get('to')):
+                # 'table.field' or 'schema.table.field'
+                if isinstance(end, str) and '.' in end:
+                    names.append(end.rsplit('.', 1)[0])
+
+    tables = []
+    for name in names:
+        if isinstance(name, str) and TABLE_NAME_PATTERN.match(name.strip()):
+            name = name.strip().lower()
+            if name not in tables:
+                tables.append(name)
+    return tables
+
+
+def _count(value: float) -> str:
+    """Format a row or distinct count compactly, e.g. 1.2M"""
+    for threshold, suffix in ((1e9, 'B'), (1e6, 'M'), (1e3, 'k')):
+        if value >= threshold:
+            return f"{value / threshold:.1f}{suffix}"
+    return str(int(value))
+
+
+class StatsCollector:
+    """
+    Reads planner statistics for the tables a generation request touches.
+
+    Row estimates and sizes come from pg_class, column statistics
+    (n_distinct, null_frac, correlation) from pg_stats and indexes from
+    pg_index. Results are cached in the schema cache, so they are read once
+    per schema version; run ANALYZE and change the schema, or wait for the
+    cache to be invalidated, to see newer estimates.
+    """
+
+    def __init__(self, db_connector: DBConnector, max_tables: Optional[int] = None,
+                 max_columns: Optional[int] = None):
+        """
+        Initialize the statistics collector
+
+        Args:
+            db_connector: Database connector instance
+            max_tables: Most tables summarized per prompt
+                        (default: STATS_MAX_TABLES environment variable, or 10)
+            max_columns: Most columns summarized per table
+                         (default: STATS_MAX_COLUMNS environment variable, or 30)
+        """
+        self.db_connector = db_connector
+        self.max_tables = max_tables if max_tables is not None else int(os.getenv('STATS_MAX_TABLES', '10'))
+        self.max_columns = max_columns if max_columns is not None else int(os.getenv('STATS_MAX_COLUMNS', '30'))
+        logger.debug("Stats collector initialized")
+
+    def collect(self, tables: List[str]) -> List[Dict[str, Any]]:
+        """
+        Get statistics for a list of tables
+
+        Args:
+            tables: Table names, optionally schema-qualified
+
+        Returns:
+            Statistics of the tables that exist; unknown names are skipped
+        """
+        if not self.db_connector.conn:
+            if not self.db_connector.connect():
+                return []
+
+        stats = []
+        for table in tables[:self.max_tables]:
+            try:
+                table_stats = self.db_connector.schema_cache.get(
+                    ('table_stats', table, self.max_columns),
+                    lambda: self._fetch(table),
+                    self.db_connector.conn
+                )
+            except Exception as e:
+                self.db_connector.conn.rollback()
+                logger.warning(f"Could not read statistics of {table}: {e}")
+                continue
+            if table_stats is not None:
+                stats.append(table_stats)
+        return stats
+
+    def prompt_context(self, intent: Dict[str, Any]) -> str:
+        """
+        Summarize the statistics of the tables an intent refers to
+
+        Args:
+            intent: Structured intent
+
+        Returns:
+            A compact text block for the generation prompt, or '' when none
+            of the tables exist or the database cannot be reached
+        """
+        tables = referenced_tables(intent)
+        if not tables:
+            return ''
+        return self.summarize(self.collect(tables))
+
+    def summarize(self, stats: List[Dict[str, Any]]) -> str:
+        """
+        Render statistics as compact text
+
+        Args:
+            stats: Result of collect()
+
+        Returns:
+            One block per table with its size, indexes and column statistics
+        """
+        lines = []
+        for table in stats:
+            header = f"{table['table']}: ~{_count(table['estimated_rows'])} rows, {table['size']}"
+            if table['partition_key']:
+                header += f", partitioned by {table['partition_key']} into {table['partitions']} partitions"
+            if table['kind'] == 'm':
+                header += ", materialized view"
+            elif table['kind'] == 'f':
+                header += ", foreign table"
+            if not table['analyzed']:
+                header += " (not analyzed; estimates may be off)"
+            lines.append(header)
+
+            if table['indexes']:
+                lines.append("  indexes: " + "; ".join(
+                    f"{index['name']} {index['definition']}"
+                    + (" PRIMARY KEY" if index['primary'] else " UNIQUE" if index['unique'] else "")
+                    + ("" if index['valid'] else " INVALID")
+                    for index in table['indexes']
+                ))
+            else:
+                lines.append("  indexes: none")
+
+            columns = []
+            for column in table['columns']:
+                text = f"{column['name']} {column['type']}"
+                if column['n_distinct'] is not None:
+                    text += f" distinct={self._distinct(column['n_distinct'], table['estimated_rows'])}"
+                    text += f" null={column['null_frac']:.0%}"
+                    if column['correlation'] is not None:
+                        text += f" corr={column['correlation']:.2f}"
+                columns.append(text)
+            lines.append("  columns: " + "; ".join(columns))
+        return "\n".join(lines)
+
+    def _fetch(self, table: str) -> Optional[Dict[str, Any]]:
+        """Read the statistics of one table from the catalog"""
+        with self.db_connector.conn.cursor() as cursor:
+            cursor.execute(TABLE_SQL, (table,))
+            row = cursor.fetchone()
+            if row is None:
+                self.db_connector.conn.commit()
+                return None
+            oid, schema, name, kind, rows, size, partition_key, partitions = row
+
+            cursor.execute(COLUMN_STATS_SQL, (oid, self.max_columns))
+            columns = [{
+                'name': column[0],
+                'type': column[1],
+                'n_distinct': column[2],
+                'null_frac': column[3],
+                'correlation': column[4]
+            } for column in cursor.fetchall()]
+
+            cursor.execute(INDEXES_SQL, (oid,))
+            indexes = []
+            for index_name, definition, unique, primary, valid in cursor.fetchall():
+                match = INDEX_METHOD_PATTERN.search(definition)
+                indexes.append({
+                    'name': index_name,
+                    'definition': match.group(1) if match else definition,
+                    'unique': unique,
+                    'primary': primary,
+                    'valid': valid
+                })
+        self.db_connector.conn.commit()
+
+        return {
+            'table': f"{schema}.{name}",
+            'kind': kind,
+            'estimated_rows': rows,
+            'size': size,
+            'partition_key': partition_key,
+            'partitions': partitions,
+            'analyzed': any(column['n_distinct'] is not None for column in columns),
+            'columns': columns,
+            'indexes': indexes
+        }
+
+    @staticmethod
+    def _distinct(n_distinct: float, rows: int) -> str:
+        """Describe pg_stats.n_distinct; negative values are a fraction of the row count"""
+        if n_distinct == -1:
+            return 'unique'
+        if n_distinct < 0:
+            return f"~{_count(-n_distinct * rows)}"
+        return _count(n_distinct)
@@ -0,0 +1,302 @@
+"""
+Table Sampler Module
+Previews tables with TABLESAMPLE and dry-runs queries against sampled copies
+"""
+
+import os
+import random
+import logging
+from typing import Dict, Any, List, Optional, Tuple, Union
+import psycopg2
+import sqlparse
+from psycopg2 import sql
+from sqlparse import tokens as T
+
+from .db_connector import DBConnector
+from .plan_analyzer import walk_plan
+from .query_router import is_read_only
+
+logger = logging.getLogger(__name__)
+
+# SYSTEM reads only the sampled pages; BERNOULLI reads every page but picks
+# rows independently, which avoids clustering effects
+SAMPLE_METHODS = ('SYSTEM', 'BERNOULLI')
+
+# Relation kinds that support TABLESAMPLE
+SAMPLEABLE_KINDS = ('r', 'p', 'm')
+
+RESOLVE_RELATIONS_SQL = """
+    SELECT DISTINCT n.nspname, c.relname, c.relkind, greatest(c.reltuples, 0)::bigint
+    FROM unnest(%s::text[]) AS candidate(name)
+    JOIN pg_catalog.pg_class c ON c.oid = to_regclass(candidate.name)
+    JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+    WHERE c.relkind IN ('r', 'p', 'm', 'v', 'f');
+"""
+
+
+class SampleError(Exception):
+    """Raised when a sample cannot be taken"""
+
+
+def tablesample_clause(percent: float, method: str = 'SYSTEM', seed: Optional[int] = None) -> sql.Composable:
+    """
+    Build a TABLESAMPLE clause
+
+    Args:
+        percent: Percentage of the table to sample (0-100)
+        method: 'SYSTEM' or 'BERNOULLI'
+        seed: Seed for REPEATABLE; the same seed returns the same sample
+              while the table is unchanged
+
+    Returns:
+        The clause, to be placed after a table reference
+
+    Raises:
+        SampleError: If the method or percentage is invalid
+    """
+    method = (method or 'SYSTEM').upper()
+    if method not in SAMPLE_METHODS:
+        raise SampleError(f"Sample method must be one of {', '.join(SAMPLE_METHODS)}")
+    percent = float(percent)
+    if not 0 < percent <= 100:
+        raise SampleError("Sample percentage must be greater than 0 and at most 100")
+    clause = sql.SQL("TABLESAMPLE {} ({})").format(sql.SQL(method), sql.Literal(percent))
+    if seed is not None:
+        clause = sql.SQL("{} REPEATABLE ({})").format(clause, sql.Literal(int(seed)))
+    return clause
+
+
+def new_seed() -> int:
+    """Random seed for REPEATABLE, returned to clients so they can reproduce a sample"""
+    return random.randint(1, 2 ** 31 - 1)
+
+
+def _identifier(token) -> Optional[str]:
+    """Identifier named by a token, case-folded like PostgreSQL does"""
+    if token.ttype in T.Name:
+        return token.value.lower()
+    if token.ttype in T.Literal.String.Symbol and token.value.startswith('"'):
+        return token.value[1:-1].replace('""', '"')
+    return None
+
+
+def _name_chains(query: str) -> List[List[Tuple[int, str]]]:
+    """
+    Find dotted identifier chains in a query
+
+    Returns:
+        Chains as lists of (token index, identifier), where the token index
+        refers to the flattened token list
+    """
+    tokens = [token for statement in sqlparse.parse(query) for token in statement.flatten()]
+    chains, current, expect_name = [], [], True
+    for index, token in enumerate(tokens):
+        name = _identifier(token)
+        if name is not None and expect_name:
+            current.append((index, name))
+            expect_name = False
+        elif token.ttype in T.Punctuation and token.value == '.' and current and not expect_name:
+            expect_name = True
+        else:
+            if current:
+                chains.append(current)
+            current, expect_name = [], True
+            if name is not None:
+                current, expect_name = [(index, name)], False
+    if current:
+        chains.append(current)
+    return chains
+
+
+class TableSampler:
+    """
+    Runs read-only queries against sampled copies of the tables they read.
+
+    Each referenced table is copied into a temporary table of the same name
+    with TABLESAMPLE ... REPEATABLE, capped at a maximum number of rows, and
+    the query runs against the copies on a dedicated connection that is
+    closed afterwards. Results are representative rather than exact: counts
+    and sums scale with the sample and joins between two sampled tables
+    match fewer rows than the full tables would.
+    """
+
+    def __init__(self, db_connector: DBConnector, percent: Optional[float] = None,
+                 max_rows: Optional[int] = None, method: Optional[str] = None):
+        """
+        Initialize the table sampler
+
+        Args:
+            db_connector: Connector whose connection parameters are used
+            percent: Default sample percentage (default: SAMPLE_PERCENT
+                     environment variable, or 1)
+            max_rows: Upper bound on the rows copied per table; the percentage
+                      is lowered for larger tables (default: SAMPLE_MAX_ROWS, or 100000)
+            method: Default sample method (default: SAMPLE_METHOD, or SYSTEM)
+        """
+        self.db_connector = db_connector
+        self.percent = percent if percent is not None else float(os.getenv('SAMPLE_PERCENT', '1'))
+        self.max_rows = max_rows if max_rows is not None else int(os.getenv('SAMPLE_MAX_ROWS', '100000'))
+        self.method = (method or os.getenv('SAMPLE_METHOD', 'SYSTEM')).upper()
+        logger.debug("Table sampler initialized")
+
+    def execute(self, query: str, percent: Optional[float] = None, method: Optional[str] = None,
+                seed: Optional[int] = None, row_format: str = 'dict',
+                statement_timeout_ms: Optional[int] = None) -> Tuple[bool, Union[List[Dict[str, Any]], Dict[str, Any], str], Dict[str, Any]]:
+        """
+        Run a read-only query against sampled copies of the tables it reads
+
+        Args:
+            query: A single read-only SELECT
+            percent: Sample percentage (default: the sampler's default)
+            method: 'SYSTEM' or 'BERNOULLI' (default: the sampler's default)
+            seed: Seed for REPEATABLE (default: a new random seed)
+            row_format: 'dict' or 'columnar'
+            statement_timeout_ms: Timeout for each statement of the dry run
+                                  (default: the connector's statement timeout)
+
+        Returns:
+            A tuple containing (success, result, sample), where sample
+            describes the method, seed and per-table sample sizes
+        """
+        percent = self.percent if percent is None else percent
+        method = (method or self.method).upper()
+        seed = new_seed() if seed is None else int(seed)
+        if statement_timeout_ms is None:
+            statement_timeout_ms = self.db_connector.statement_timeout_ms
+        sample = {'method': method, 'percent': percent, 'seed': seed, 'tables': []}
+
+        try:
+            tablesample_clause(percent, method, seed)
+            if len([s for s in sqlparse.parse(query) if s.token_first(skip_cm=True)]) != 1:
+                raise SampleError("Sampled dry runs take a single statement")
+            if not is_read_only(query):
+                raise SampleError("Only read-only SELECT queries can run against a sample")
+        except (SampleError, ValueError) as e:
+            return False, f"Error: {e}", sample
+
+        try:
+            conn = psycopg2.connect(**self.db_connector.connection_params)
+        except psycopg2.Error as e:
+            return False, f"Error: Could not connect to database: {e}", sample
+
+        try:
+            with conn.cursor() as cursor:
+                if statement_timeout_ms:
+                    cursor.execute("SELECT set_config('statement_timeout', %s, true);", (f"{statement_timeout_ms}ms",))
+                # Unqualified names must find the temporary copies first
+                cursor.execute("SELECT set_config('search_path', 'pg_temp, ' || current_setting('search_path'), true);")
+
+                chains = _name_chains(query)
+                relations = self._resolve(cursor, query, chains)
+                for relation in relations:
+                    sample['tables'].append(self._copy(cursor, relation, percent, method, seed))
+
+                statement = self._rewrite(query, chains, relations)
+                self._check_plan(cursor, statement)
+
+                cursor.execute(statement)
+                rows = cursor.fetchall()
+                description = cursor.description
+            if row_format == 'columnar' and not self.db_connector.conn:
+                # Column type names are looked up through the connector
+                self.db_connector.connect()
+            result = self.db_connector.shape_rows(description, rows, row_format)
+            logger.info(f"Sampled dry run read {sum(t['sampled_rows'] for t in sample['tables'])} sampled rows "
+                        f"from {len(sample['tables'])} table(s)")
+            return True, result, sample
+        except SampleError as e:
+            return False, f"Error: {e}", sample
+        except psycopg2.Error as e:
+            logger.warning(f"Sampled dry run failed: {e}")
+            return False, f"Error: {e}", sample
+        finally:
+            # Rolling back drops the temporary copies
+            conn.rollback()
+            conn.close()
+
+    def _resolve(self, cursor, query: str, chains: List[List[Tuple[int, str]]]) -> List[Dict[str, Any]]:
+        """
+        Find the tables a query reads
+
+        The tables come from the query's plan, since many table names (data,
+        events, ...) are keywords to the tokenizer. Identifier chains are
+        resolved as well, only to refuse views with a clear message.
+        """
+        cursor.execute("EXPLAIN (VERBOSE, FORMAT JSON) " + query)
+        plan = cursor.fetchone()[0][0]['Plan']
+        scanned = {
+            (node['Schema'], node['Relation Name']) for node in walk_plan(plan)
+            if 'Relation Name' in node and 'Schema' in node
+        }
+        candidates = {self._quote(list(relation)) for relation in scanned}
+        for chain in chains:
+            names = [name for _, name in chain]
+            candidates.add(self._quote(names[:1]))
+            if len(names) >= 2:
+                candidates.add(self._quote(names[:2]))
+        if not candidates:
+            return []
+
+        cursor.execute(RESOLVE_RELATIONS_SQL, (sorted(candidates),))
+        relations = [
+            {'schema': schema, 'name': name, 'kind': kind, 'estimated_rows': rows}
+            for schema, name, kind, rows in cursor.fetchall()
+        ]
+        unsupported = [f"{r['schema']}.{r['name']}" for r in relations if r['kind'] not in SAMPLEABLE_KINDS]
+        if unsupported:
+            raise SampleError(f"Views and foreign tables cannot be sampled: {', '.join(sorted(unsupported))}")
+        # Names that only look like tables (columns, aliases) are not read
+        relations = [r for r in relations if (r['schema'], r['name']) in scanned]
+        names = [r['name'] for r in relations]
+        duplicates = sorted({name for name in names if names.count(name) > 1})
+        if duplicates:
+            raise SampleError(f"Tables in different schemas share the name {', '.join(duplicates)}")
+        return sorted(relations, key=lambda r: (r['schema'], r['name']))
+
+    def _copy(self, cursor, relation: Dict[str, Any], percent: float, method: str, seed: int) -> Dict[str, Any]:
+        """Copy a sample of a table into a temporary table of the same name"""
+        if relation['estimated_rows'] > 0:
+            percent = min(percent, self.max_rows * 100.0 / relation['estimated_rows'])
+        percent = max(round(percent, 6), 0.000001)
+
+        source = sql.Identifier(relation['schema'], relation['name'])
+        cursor.execute(sql.SQL("CREATE TEMPORARY TABLE {} AS SELECT * FROM {} {};").format(
+            sql.Identifier(relation['name']), source, tablesample_clause(percent, method, seed)
+        ))
+        sampled_rows = cursor.rowcount
+        cursor.execute(sql.SQL("ANALYZE pg_temp.{};").format(sql.Identifier(relation['name'])))
+        return {
+            'table': f"{relation['schema']}.{relation['name']}",
+            'percent': percent,
+            'estimated_rows': relation['estimated_rows'],
+            'sampled_rows': sampled_rows
+        }
+
+    def _rewrite(self, query: str, chains: List[List[Tuple[int, str]]],
+                 relations: List[Dict[str, Any]]) -> str:
+        """Point schema-qualified references of sampled tables at their copies"""
+        sampled = {(r['schema'], r['name']) for r in relations}
+        tokens = [token for statement in sqlparse.parse(query) for token in statement.flatten()]
+        replacements = {}
+        for chain in chains:
+            if len(chain) >= 2 and (chain[0][1], chain[1][1]) in sampled:
+                replacements[chain[0][0]] = 'pg_temp'
+        return ''.join(replacements.get(index, token.value) for index, token in enumerate(tokens))
+
+    @staticmethod
+    def _check_plan(cursor, statement: str):
+        """Make sure the rewritten query reads nothing but the sampled copies"""
+        cursor.execute("EXPLAIN (VERBOSE, FORMAT JSON) " + statement)
+        plan = cursor.fetchone()[0][0]['Plan']
+        unsampled = sorted({
+            f"{node.get('Schema')}.{node['Relation Name']}"
+            for node in walk_plan(plan)
+            if 'Relation Name' in node and not str(node.get('Schema', '')).startswith('pg_temp')
+        })
+        if unsampled:
+            raise SampleError(f"The query would read full tables: {', '.join(unsampled)}")
+
+    @staticmethod
+    def _quote(names: List[str]) -> str:
+        """Quote identifier parts into a name to_regclass accepts"""
+        return '.'.join('"' + name.replace('"', '""') + '"' for name in names)
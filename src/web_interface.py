@@ -5,18 +5,52 @@ Provides a web interface for the SQL-GPT application
 
 import os
 import json
+import time
+import uuid
 import logging
-from typing import Dict, Any, List, Optional
-from flask import Flask, request, jsonify, render_template, send_from_directory
+import functools
+from typing import Dict, Any, List, Optional, Callable, Iterator
+from flask import Flask, Response, request, jsonify, render_template, abort, g, has_request_context
+from flask.json.provider import DefaultJSONProvider
 
 from .nlp_processor import NLPProcessor
 from .sql_generator import SQLGenerator
 from .deployment_manager import DeploymentManager
-from .db_connector import DBConnector
+from .db_connector import DBConnector, SCRIPT_MODES
 from .db_browser import DBBrowser
+from .query_router import QueryRouter, statement_kind, is_read_only
+from .result_cache import ResultCache
+from .plan_analyzer import PlanAnalyzer, PlanAnalysisError
+from .execution_guard import ExecutionGuard, AsyncQueryRunner, GUARD_ACTIONS
+from .table_sampler import TableSampler, SampleError, tablesample_clause, new_seed
+from .candidate_selector import CandidateSelector
+from .data_exporter import DataExporter, ExportError, normalize_options
+from .bulk_loader import BulkLoader, BulkLoadError
+from .connection_registry import ConnectionRegistry, ConnectionRegistryError, DEFAULT_TARGET
+from .shard_executor import ShardExecutor
+from .result_encoding import EncodingError, negotiate_format, encode, is_columnar
+from .logging_config import RequestLogger
+from .http_cache import ResponseCompressor, StaticAssets, schema_etag
+from .job_manager import JobManager, JobError, FINISHED_STATES
 
 logger = logging.getLogger(__name__)
 
+
+def _note_failure(payload: Any):
+    """Mark the request as failed for the request log when its response reports {"success": false}"""
+    if isinstance(payload, dict) and payload.get('success') is False and has_request_context():
+        g.request_failed = True
+
+
+class FailureNotingJSONProvider(DefaultJSONProvider):
+    """JSON provider whose jsonify() responses mark reported failures"""
+
+    def response(self, *args, **kwargs) -> Response:
+        if len(args) == 1 and not kwargs:
+            _note_failure(args[0])
+        return super().response(*args, **kwargs)
+
+
 class WebInterface:
     """
     Provides a web interface for the SQL-GPT application
@@ -37,10 +71,30 @@ class WebInterface:
         self.sql_generator = sql_generator
         self.deployment_manager = deployment_manager
         self.db_connector = db_connector
-        self.db_browser = DBBrowser(db_connector)
+        self.query_router = QueryRouter(db_connector)
+        self.db_browser = DBBrowser(db_connector, self.query_router)
+        self.result_cache = ResultCache()
+        self.plan_analyzer = PlanAnalyzer(db_connector)
+        self.execution_guard = ExecutionGuard()
+        self.job_manager = JobManager()
+        self.async_runner = AsyncQueryRunner(job_manager=self.job_manager)
+        self.job_keepalive_seconds = float(os.getenv('JOB_SSE_KEEPALIVE', '15'))
+        self.table_sampler = TableSampler(db_connector)
+        self.candidate_selector = CandidateSelector(db_connector, self.table_sampler)
+        self.default_candidates = int(os.getenv('SQL_CANDIDATES', '1'))
+        self.data_exporter = DataExporter(db_connector)
+        self.bulk_loader = BulkLoader(db_connector, self.db_browser)
+        self.connection_registry = ConnectionRegistry(db_connector)
+        self.shard_executor = ShardExecutor(self.connection_registry)
+        self.request_logger = RequestLogger()
+        self.response_compressor = ResponseCompressor()
+        # Static files are served by serve_static, with versioned URLs and compression
         self.app = Flask(__name__, 
-                         static_folder=os.path.join(os.path.dirname(__file__), '..', 'static'),
+                         static_folder=None,
                          template_folder=os.path.join(os.path.dirname(__file__), '..', 'templates'))
+        self.app.json = FailureNotingJSONProvider(self.app)
+        self.static_assets = StaticAssets(os.path.join(os.path.dirname(__file__), '..', 'static'),
+                                          self.response_compressor)
         
         self._setup_routes()
         logger.debug("Web interface initialized")
@@ -48,6 +102,57 @@ class WebInterface:
     def _setup_routes(self):
         """Set up the Flask routes"""
         
+        # Registered first so it runs last, after the request log has read the body
+        @self.app.after_request
+        def compress_response(response):
+            """Compress text responses the client accepts compressed"""
+            return self.response_compressor.compress(response, request.accept_encodings)
+        
+        @self.app.context_processor
+        def static_url():
+            """Make static_url() available to templates"""
+            return {'static_url': self.static_assets.url}
+        
+        @self.app.before_request
+        def start_request_timer():
+            """Remember when the request started"""
+            g.request_started = time.perf_counter()
+        
+        @self.app.after_request
+        def log_request(response):
+            """Write the sampled request log record"""
+            duration_ms = (time.perf_counter() - g.get('request_started', time.perf_counter())) * 1000
+            endpoint = request.url_rule.rule if request.url_rule else request.path
+            # Streamed bodies and uploads are never read just for logging
+            buffered = not response.is_streamed and not response.direct_passthrough
+            # Most failures are reported as 200 with {"success": false}; see _note_failure
+            failed = g.get('request_failed', False)
+            if self.request_logger.should_log(endpoint, response.status_code, duration_ms, failed):
+                self.request_logger.log_request(
+                    request.method, endpoint, request.path, response.status_code, duration_ms,
+                    request_body=request.get_data(cache=True) if request.is_json else b'',
+                    response_body=response.get_data() if buffered else None,
+                    response_bytes=response.content_length,
+                    failed=failed
+                )
+            return response
+        
+        @self.app.teardown_request
+        def release_target_connector(error=None):
+            """Return the connector of a request's database target to its pool"""
+            target = g.pop('target_connector', None)
+            if target is not None:
+                self.connection_registry.release(*target)
+        
+        @self.app.errorhandler(ConnectionRegistryError)
+        def target_error(e):
+            """Report unknown targets and exhausted pools"""
+            logger.warning(f"Connection target error: {e}")
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            })
+        
         @self.app.route('/')
         def index():
             """Render the index page"""
@@ -55,28 +160,22 @@ class WebInterface:
         
         @self.app.route('/static/<path:path>')
         def serve_static(path):
-            """Serve static files"""
-            return send_from_directory(self.app.static_folder, path)
+            """Serve static files; URLs from static_url() are cached for a long time"""
+            response = self.static_assets.response(path, request.args.get('v'), request.accept_encodings)
+            if response is None:
+                abort(404)
+            return response.make_conditional(request)
         
         @self.app.route('/api/process', methods=['POST'])
         def process_prompt():
             """Process a natural language prompt"""
-            logger.info("Received API request to /api/process")
-            print("\n[REQUEST /api/process] Received API request")
-            
-            # Log request headers for debugging
-            logger.info(f"Request headers: {dict(request.headers)}")
-            
             # Get and validate JSON data
             try:
                 data = request.get_json(force=True)  # force=True to handle potential content-type issues
-                logger.info(f"Received request data: {data}")
-                print(f"[REQUEST DATA] {json.dumps(data, indent=2)}")
             except Exception as json_error:
                 logger.error(f"Failed to parse JSON request: {json_error}")
                 try:
                     raw_data = request.data.decode('utf-8', errors='replace')
-                    logger.error(f"Raw request data: {raw_data}")
                 except:
                     raw_data = "<Could not decode request data>"
                     
@@ -102,115 +201,156 @@ class WebInterface:
                     'received_data': data
                 })
                 
-            logger.info(f"Processing prompt: '{prompt}'")
+            logger.info(f"Processing prompt ({len(prompt)} characters)")
             
-            try:
-                # Check if OpenAI API key is available
-                api_key = os.getenv("OPENAI_API_KEY")
-                if not api_key:
-                    logger.error("OPENAI_API_KEY environment variable not set")
-                    return jsonify({
-                        'success': False,
-                        'error': 'OpenAI API key not configured. Please set the OPENAI_API_KEY environment variable.'
-                    })
-                
-                # Process the prompt with detailed error handling
-                try:
-                    logger.info("Calling NLP processor")
-                    intent = self.nlp_processor.process(prompt)
-                    logger.info(f"NLP processing complete: {intent}")
-                except Exception as nlp_error:
-                    logger.error(f"Error in NLP processing: {nlp_error}")
-                    import traceback
-                    return jsonify({
-                        'success': False,
-                        'error': f'NLP processing error: {str(nlp_error)}',
-                        'error_details': traceback.format_exc()
-                    })
-                
-                # Generate SQL with detailed error handling
-                try:
-                    logger.info("Generating SQL query")
-                    sql_query = self.sql_generator.generate(intent)
-                    logger.info(f"SQL generation complete: {sql_query}")
-                except Exception as sql_error:
-                    logger.error(f"Error in SQL generation: {sql_error}")
-                    import traceback
-                    return jsonify({
-                        'success': False,
-                        'error': f'SQL generation error: {str(sql_error)}',
-                        'error_details': traceback.format_exc(),
-                        'intent': intent  # Return the intent even if SQL generation failed
-                    })
-                
-                # Validate SQL with detailed error handling
-                try:
-                    logger.info("Validating SQL query")
-                    validation = self.sql_generator.validate(sql_query)
-                    logger.info(f"SQL validation complete: {validation}")
-                except Exception as validation_error:
-                    logger.error(f"Error in SQL validation: {validation_error}")
-                    import traceback
-                    # Continue with a default validation result
-                    validation = {'valid': False, 'errors': [str(validation_error)]}
-                
-                # Create deployment script with detailed error handling
-                try:
-                    logger.info("Creating deployment script")
-                    script = self.deployment_manager.create_script(sql_query, intent)
-                    logger.info("Deployment script creation complete")
-                except Exception as script_error:
-                    logger.error(f"Error in deployment script creation: {script_error}")
-                    import traceback
-                    # Continue with an empty script
-                    script = "-- Error generating deployment script: " + str(script_error)
-                
-                # Prepare successful response
-                response_data = {
-                    'success': True,
-                    'intent': intent,
-                    'sql': sql_query,
-                    'validation': validation,
-                    'deployment_script': script
-                }
-                
-                logger.info(f"Returning successful response with data: {response_data}")
-                print(f"\n[RESPONSE /api/process] {json.dumps(response_data, indent=2)}\n")
-                return jsonify(response_data)
-                
-            except Exception as e:
-                import traceback
-                error_trace = traceback.format_exc()
-                logger.error(f"Unhandled error processing prompt: {e}")
-                logger.error(error_trace)
+            # Check if OpenAI API key is available
+            if not os.getenv("OPENAI_API_KEY"):
+                logger.error("OPENAI_API_KEY environment variable not set")
                 return jsonify({
                     'success': False,
-                    'error': str(e),
-                    'error_details': error_trace
+                    'error': 'OpenAI API key not configured. Please set the OPENAI_API_KEY environment variable.'
+                })
+            
+            # With async or an idempotency key the work runs as a job, so
+            # retries attach to it instead of calling the model again
+            if data.get('async') or self._idempotency_key(data):
+                def run(progress):
+                    response_data = self._process_prompt(prompt, data, progress)
+                    return response_data['success'], response_data
+                
+                return self._run_job('process', run, data, {
+                    'prompt': prompt,
+                    'candidates': data.get('candidates'),
+                    'analyze_plan': data.get('analyze_plan')
                 })
+            
+            return jsonify(self._process_prompt(prompt, data))
         
         @self.app.route('/api/execute', methods=['POST'])
         def execute_query():
             """Execute a SQL query"""
             data = request.json
-            print(f"\n[REQUEST /api/execute] Received data: {json.dumps(data, indent=2)}\n")
             
             query = data.get('query', '')
             
             if not query or not query.strip():
                 logger.warning("Empty query received")
-                print("[WARNING] Empty query received")
                 return jsonify({
                     'success': False,
                     'error': 'Empty query. Please provide a valid SQL query.'
                 })
+            
+            try:
+                result_format = negotiate_format(data.get('format'), request.headers.get('Accept', ''))
+            except EncodingError as e:
+                return jsonify({
+                    'success': False,
+                    'error': str(e)
+                })
+            
+            # The client may pick the query ID so it can cancel before the response arrives
+            query_id = str(data.get('query_id') or uuid.uuid4().hex)
+            try:
+                statement_timeout_ms = self._optional_int(data.get('statement_timeout_ms'))
+                lock_timeout_ms = self._optional_int(data.get('lock_timeout_ms'))
+            except ValueError:
+                return jsonify({
+                    'success': False,
+                    'error': 'Timeouts must be non-negative integers (milliseconds)',
+                    'query_id': query_id
+                })
+            
+            guard_action = data.get('guard_action')
+            if guard_action and guard_action not in GUARD_ACTIONS:
+                return jsonify({
+                    'success': False,
+                    'error': f"guard_action must be one of {', '.join(GUARD_ACTIONS)}",
+                    'query_id': query_id
+                })
                 
             logger.info(f"Executing query: {query[:100]}{'...' if len(query) > 100 else ''}")
-            print(f"[INFO] Executing query: {query}")
+            
+            if data.get('shards'):
+                return self._execute_sharded(query, data, result_format, query_id, statement_timeout_ms)
+            
+            target_connector = self._target_connector()
+            if data.get('sample'):
+                return self._execute_sampled(query, data, result_format, query_id, statement_timeout_ms,
+                                             target_connector)
             
             try:
                 # Execute the query
-                success, result = self.db_connector.execute_query(query)
+                row_format = 'dict' if result_format == 'rows' else 'columnar'
+                options = {
+                    'row_format': row_format,
+                    'statement_timeout_ms': statement_timeout_ms,
+                    'lock_timeout_ms': lock_timeout_ms,
+                    'query_id': query_id
+                }
+                
+                # Pre-flight cost check: refuse, limit or defer expensive queries
+                guard = None
+                if self.execution_guard.enabled:
+                    connector = target_connector or self.query_router.connector_for(query)
+                    guard = self.execution_guard.check(connector, query, guard_action)
+                    logger.info(f"Execution guard decision: {guard['action']} ({guard['reason']})")
+                    if guard['action'] == 'refuse':
+                        return jsonify({
+                            'success': False,
+                            'error': f"Query refused: {guard['reason']}",
+                            'query_id': query_id,
+                            'guard': guard
+                        })
+                    if guard['action'] == 'async':
+                        job_id = self.async_runner.submit(connector, query, **options)
+                        return jsonify({
+                            'success': True,
+                            'result': f"Query is running in the background as job {job_id}",
+                            'query_type': self._determine_query_type(query),
+                            'query_id': query_id,
+                            'job_id': job_id,
+                            'cached': False,
+                            'guard': guard
+                        })
+                    query = guard['query']
+                
+                read_only = is_read_only(query)
+                if data.get('async') or self._idempotency_key(data):
+                    # Jobs run on their own connection and return JSON results
+                    connector = target_connector or self.query_router.connector_for(query)
+                    task = self.async_runner.task(connector, query, options)
+                    
+                    def run(progress):
+                        success, result = task(progress)
+                        if success and not read_only and target_connector is None:
+                            self.result_cache.invalidate("write through an /api/execute job")
+                        return success, result
+                    
+                    query_type = self._determine_query_type(query)
+                    return self._run_job('execute', run, data, {
+                        'query': query,
+                        'target': self._target_name(),
+                        'row_format': row_format,
+                        'statement_timeout_ms': statement_timeout_ms,
+                        'lock_timeout_ms': lock_timeout_ms
+                    }, lambda job: {
+                        'success': job['success'],
+                        'result': job['result'],
+                        'query_type': query_type,
+                        'query_id': query_id,
+                        'cached': False
+                    })
+                cached = False
+                if target_connector is not None:
+                    # The replica router and the result cache serve the default database only
+                    success, result = target_connector.execute_query(query, **options)
+                elif data.get('cache') and read_only:
+                    # Cached reads run on the primary, where the change markers live
+                    success, result, cached = self.result_cache.execute(self.db_connector, query, **options)
+                else:
+                    success, result = self.query_router.execute_query(query, **options)
+                    if success and not read_only:
+                        self.result_cache.invalidate("write through /api/execute")
                 
                 # Log the result type and summary
                 if success:
@@ -218,6 +358,8 @@ class WebInterface:
                         logger.info(f"Query executed with message: {result[:100]}{'...' if len(str(result)) > 100 else ''}")
                     elif isinstance(result, list):
                         logger.info(f"Query returned {len(result)} rows")
+                    elif is_columnar(result):
+                        logger.info(f"Query returned {result['row_count']} rows")
                     else:
                         logger.info(f"Query executed successfully with result type: {type(result)}")
                 else:
@@ -230,10 +372,27 @@ class WebInterface:
                 response_data = {
                     'success': success,
                     'result': result,
-                    'query_type': self._determine_query_type(query)
+                    'query_type': self._determine_query_type(query),
+                    'query_id': query_id,
+                    'cached': cached
                 }
-                print(f"\n[RESPONSE /api/execute] {json.dumps(response_data, indent=2)}\n")
+                if guard is not None:
+                    response_data['guard'] = guard
+                
+                if result_format != 'rows':
+                    # Arrow can only carry a result set; messages and errors go out as JSON
+                    if result_format == 'arrow' and not is_columnar(result):
+                        result_format = 'columnar'
+                    _note_failure(response_data)
+                    body, mimetype = encode(response_data, result_format)
+                    return Response(body, mimetype=mimetype)
+                
                 return jsonify(response_data)
+            except EncodingError as e:
+                return jsonify({
+                    'success': False,
+                    'error': str(e)
+                })
             except Exception as e:
                 import traceback
                 error_trace = traceback.format_exc()
@@ -245,37 +404,247 @@ class WebInterface:
                     'error_details': error_trace
                 })
         
-    def _determine_query_type(self, query):
-        """Determine the type of SQL query"""
-        query = query.strip().upper()
-        
-        if query.startswith('SELECT'):
-            return 'SELECT'
-        elif query.startswith('INSERT'):
-            return 'INSERT'
-        elif query.startswith('UPDATE'):
-            return 'UPDATE'
-        elif query.startswith('DELETE'):
-            return 'DELETE'
-        elif query.startswith('CREATE TABLE'):
-            return 'CREATE_TABLE'
-        elif query.startswith('ALTER TABLE'):
-            return 'ALTER_TABLE'
-        elif query.startswith('DROP'):
-            return 'DROP'
-        else:
-            return 'OTHER'
+        @self.app.route('/api/execute/cancel', methods=['POST'])
+        def cancel_query():
+            """Cancel a running query by its query ID"""
+            data = request.get_json(silent=True) or {}
+            query_id = data.get('query_id', '')
+            
+            if not query_id:
+                return jsonify({
+                    'success': False,
+                    'error': 'Query ID is required'
+                })
+            
+            target = self._target_name()
+            if target == DEFAULT_TARGET:
+                success, message = self.query_router.cancel_query(str(query_id))
+            else:
+                success, message = self.connection_registry.cancel_query(target, str(query_id))
+            if success:
+                return jsonify({
+                    'success': True,
+                    'message': message,
+                    'query_id': query_id
+                })
+            return jsonify({
+                'success': False,
+                'error': message,
+                'query_id': query_id
+            })
+
+        @self.app.route('/api/execute-script', methods=['POST'])
+        def execute_script():
+            """Execute a multi-statement script with per-statement results and timings"""
+            data = request.get_json(silent=True) or {}
+            script = data.get('script', '')
+            mode = data.get('mode', 'transaction')
+            
+            if not script.strip():
+                return jsonify({
+                    'success': False,
+                    'error': 'No script provided'
+                })
+            if mode not in SCRIPT_MODES:
+                return jsonify({
+                    'success': False,
+                    'error': f"mode must be one of {', '.join(SCRIPT_MODES)}"
+                })
+            
+            query_id = str(data.get('query_id') or uuid.uuid4().hex)
+            try:
+                statement_timeout_ms = self._optional_int(data.get('statement_timeout_ms'))
+                lock_timeout_ms = self._optional_int(data.get('lock_timeout_ms'))
+            except ValueError:
+                return jsonify({
+                    'success': False,
+                    'error': 'Timeouts must be non-negative integers (milliseconds)',
+                    'query_id': query_id
+                })
+            
+            connector = self._target_connector() or self.db_connector
+            logger.info(f"Executing script in {mode} mode")
+            success, result = connector.execute_script(
+                script,
+                mode=mode,
+                statement_timeout_ms=statement_timeout_ms,
+                lock_timeout_ms=lock_timeout_ms,
+                query_id=query_id,
+                stop_on_error=bool(data.get('stop_on_error', True))
+            )
+            if isinstance(result, str):
+                return jsonify({
+                    'success': False,
+                    'error': result,
+                    'query_id': query_id
+                })
+            
+            if result['committed'] and not is_read_only(script) and connector is self.db_connector:
+                self.query_router.note_write()
+                self.result_cache.invalidate("script through /api/execute-script")
+            
+            response_data = {
+                'success': success,
+                'result': result,
+                'query_id': query_id
+            }
+            if not success:
+                failed = result['statements'][result['failed_statement']]
+                response_data['error'] = f"Statement {failed['index'] + 1} failed: {failed['error']}"
+            return jsonify(response_data)
+        
+        @self.app.route('/api/jobs', methods=['GET'])
+        def get_job_stats():
+            """Get background job counts"""
+            return jsonify({
+                'success': True,
+                'stats': self.job_manager.stats()
+            })
+
+        @self.app.route('/api/jobs/<job_id>', methods=['GET'])
+        @self.app.route('/api/execute/jobs/<job_id>', methods=['GET'])
+        def get_job(job_id):
+            """Get the state, stage events and result of a background job"""
+            job = self.job_manager.get(job_id)
+            if job is None:
+                return jsonify({
+                    'success': False,
+                    'error': f'Unknown or expired job: {job_id}'
+                })
+            return jsonify({
+                'success': True,
+                'job': job
+            })
+
+        @self.app.route('/api/jobs/<job_id>/events', methods=['GET'])
+        def get_job_events(job_id):
+            """Stream the stage events and final state of a job as server-sent events"""
+            if self.job_manager.get(job_id) is None:
+                return jsonify({
+                    'success': False,
+                    'error': f'Unknown or expired job: {job_id}'
+                })
+            try:
+                after = int(request.headers.get('Last-Event-ID') or request.args.get('after') or 0)
+            except ValueError:
+                after = 0
+            return Response(self._job_event_stream(job_id, after), mimetype='text/event-stream',
+                            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+        @self.app.route('/api/analyze-plan', methods=['POST'])
+        def analyze_plan():
+            """Capture the plan of a query, flag issues and suggest indexes"""
+            data = request.get_json(silent=True) or {}
+            query = data.get('query', '')
+
+            if not query:
+                return jsonify({
+                    'success': False,
+                    'error': 'No query provided'
+                })
+
+            connector = self._target_connector()
+            plan_analyzer = PlanAnalyzer(connector) if connector else self.plan_analyzer
+            try:
+                analysis = plan_analyzer.analyze(
+                    query,
+                    analyze=bool(data.get('analyze', False)),
+                    suggest_indexes=bool(data.get('suggest_indexes', True))
+                )
+            except PlanAnalysisError as e:
+                return jsonify({
+                    'success': False,
+                    'error': str(e)
+                })
+
+            return jsonify({
+                'success': True,
+                'analysis': analysis
+            })
+
+        @self.app.route('/api/export', methods=['POST'])
+        def export_query():
+            """Stream the result of a SELECT query as CSV or Parquet"""
+            data = request.get_json(silent=True) or request.form
+            query = data.get('query', '')
+            fmt = data.get('format', 'csv')
+            compression = data.get('compression')
+            
+            if not query or not query.strip():
+                return jsonify({
+                    'success': False,
+                    'error': 'Empty query. Please provide a valid SQL query.'
+                })
+            
+            logger.info(f"Exporting query as {fmt}: {query[:100]}{'...' if len(query) > 100 else ''}")
+            try:
+                fmt, compression = normalize_options(fmt, compression)
+                chunks = self._data_exporter().export_query(query, fmt, compression)
+                return self._export_response(chunks, 'query_results', fmt, compression)
+            except ExportError as e:
+                logger.warning(f"Export failed: {e}")
+                return jsonify({
+                    'success': False,
+                    'error': str(e)
+                })
+        
+        @self.app.route('/api/load', methods=['POST'])
+        def bulk_load():
+            """Bulk load an uploaded CSV or JSON Lines file into a table"""
+            upload = request.files.get('file')
+            table_name = request.form.get('table', '')
+            schema_name = request.form.get('schema', 'public')
+            
+            if upload is None or not table_name:
+                return jsonify({
+                    'success': False,
+                    'error': 'A file and a table name are required'
+                })
+            
+            fmt = request.form.get('format')
+            if not fmt:
+                fmt = 'jsonl' if (upload.filename or '').lower().endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+            
+            try:
+                column_map = json.loads(request.form['column_map']) if request.form.get('column_map') else None
+                batch_size = int(request.form['batch_size']) if request.form.get('batch_size') else None
+                
+                connector = self._target_connector()
+                bulk_loader = BulkLoader(connector, DBBrowser(connector)) if connector else self.bulk_loader
+                stats = bulk_loader.load(
+                    upload.stream, table_name, schema_name, fmt,
+                    column_map=column_map,
+                    batch_size=batch_size,
+                    single_transaction=request.form.get('single_transaction') == 'true',
+                    progress_callback=lambda progress: logger.info(
+                        f"Bulk load into {progress['table']}: {progress['rows']} rows "
+                        f"({progress['rows_per_second']:.0f} rows/s)"
+                    )
+                )
+                return jsonify({
+                    'success': True,
+                    'result': stats
+                })
+            except (BulkLoadError, ValueError) as e:
+                logger.warning(f"Bulk load failed: {e}")
+                return jsonify({
+                    'success': False,
+                    'error': str(e)
+                })
         
         @self.app.route('/api/schema', methods=['GET'])
+        @self._schema_conditional
         def get_schema():
             """Get the database schema"""
             try:
                 # Get the schema
-                success, schema_info = self.db_connector.get_schema_info()
+                connector = self._target_connector()
+                success, schema_info = (connector or self.query_router.read_connector()).get_schema_info()
                 
                 return jsonify({
                     'success': success,
                     'schema': schema_info if success else None,
+                    'schema_version': (connector or self.db_connector).schema_cache.version,
                     'error': schema_info if not success else None
                 })
             except Exception as e:
@@ -290,7 +659,7 @@ class WebInterface:
             """Test the database connection"""
             try:
                 # Test the connection
-                success, message = self.db_connector.test_connection()
+                success, message = (self._target_connector() or self.db_connector).test_connection()
                 
                 return jsonify({
                     'success': success,
@@ -303,11 +672,67 @@ class WebInterface:
                     'error': str(e)
                 })
         
+        @self.app.route('/api/cache/stats', methods=['GET'])
+        def get_cache_stats():
+            """Get result cache statistics"""
+            return jsonify({
+                'success': True,
+                'stats': self.result_cache.stats()
+            })
+
+        @self.app.route('/api/replicas', methods=['GET'])
+        def get_replicas():
+            """Get the health of the configured read replicas"""
+            return jsonify({
+                'success': True,
+                'replicas': self.query_router.status()
+            })
+
+        @self.app.route('/api/targets', methods=['GET'])
+        def get_targets():
+            """List the database targets and the state of their connection pools"""
+            return jsonify({
+                'success': True,
+                'targets': self.connection_registry.status()
+            })
+
+        @self.app.route('/api/logging', methods=['GET', 'POST'])
+        def logging_settings():
+            """Get or change log levels and request log sampling"""
+            if request.method == 'POST':
+                data = request.get_json(silent=True) or {}
+                try:
+                    levels = dict(data.get('loggers') or {})
+                    if data.get('level'):
+                        levels[''] = data['level']
+                    for name, level in levels.items():
+                        if not isinstance(logging.getLevelName(str(level).upper()), int):
+                            raise ValueError(f"Unknown log level '{level}'")
+                    self.request_logger.configure(
+                        sample_rates=data.get('sample_rates'),
+                        default_rate=data.get('default_rate'),
+                        max_payload_bytes=data.get('max_payload_bytes'),
+                        slow_ms=data.get('slow_ms')
+                    )
+                    for name, level in levels.items():
+                        logging.getLogger(name or None).setLevel(str(level).upper())
+                except (TypeError, ValueError) as e:
+                    return jsonify({
+                        'success': False,
+                        'error': str(e)
+                    })
+            return jsonify({
+                'success': True,
+                'level': logging.getLevelName(logging.getLogger().level),
+                'request_logging': self.request_logger.settings()
+            })
+
         @self.app.route('/api/browser/schemas', methods=['GET'])
+        @self._schema_conditional
         def get_schemas():
             """Get all schemas in the database"""
             try:
-                schemas = self.db_browser.get_schemas()
+                schemas = self._db_browser().get_schemas()
                 
                 return jsonify({
                     'success': True,
@@ -321,14 +746,28 @@ class WebInterface:
                 })
         
         @self.app.route('/api/browser/tables', methods=['GET'])
+        @self._schema_conditional
         def get_tables():
-            """Get all tables in the database"""
+            """Get one page of the tables in the database, optionally filtered"""
+            search = request.args.get('search', '').strip() or None
+            schema_name = request.args.get('schema', '').strip() or None
+            include_partitions = request.args.get('include_partitions', 'false').lower() in ('1', 'true', 'yes')
+            
+            try:
+                limit = min(max(int(request.args.get('limit', 100)), 1), 1000)
+                offset = max(int(request.args.get('offset', 0)), 0)
+            except ValueError:
+                return jsonify({
+                    'success': False,
+                    'error': 'limit and offset must be integers'
+                })
+            
             try:
-                tables = self.db_browser.get_tables()
+                page = self._db_browser().list_tables(search, schema_name, limit, offset, include_partitions)
                 
                 return jsonify({
                     'success': True,
-                    'tables': tables
+                    **page
                 })
             except Exception as e:
                 logger.error(f"Error getting tables: {e}")
@@ -337,7 +776,42 @@ class WebInterface:
                     'error': str(e)
                 })
         
+        @self.app.route('/api/browser/tables/stats', methods=['POST'])
+        def get_table_stats():
+            """Get column counts and sizes for the tables shown on a page"""
+            data = request.json or {}
+            tables = data.get('tables', [])
+            
+            if not isinstance(tables, list) or len(tables) > 1000:
+                return jsonify({
+                    'success': False,
+                    'error': 'tables must be a list of at most 1000 {schema, table} objects'
+                })
+            
+            try:
+                pairs = [(str(item.get('schema', 'public')), str(item['table'])) for item in tables]
+            except (AttributeError, KeyError):
+                return jsonify({
+                    'success': False,
+                    'error': 'Each table needs a table name'
+                })
+            
+            try:
+                stats = self._db_browser().get_table_stats(pairs)
+                
+                return jsonify({
+                    'success': True,
+                    'stats': stats
+                })
+            except Exception as e:
+                logger.error(f"Error getting table stats: {e}")
+                return jsonify({
+                    'success': False,
+                    'error': str(e)
+                })
+        
         @self.app.route('/api/browser/table/structure', methods=['GET'])
+        @self._schema_conditional
         def get_table_structure():
             """Get structure of a specific table"""
             table_name = request.args.get('table', '')
@@ -350,7 +824,7 @@ class WebInterface:
                 })
             
             try:
-                structure = self.db_browser.get_table_structure(table_name, schema_name)
+                structure = self._db_browser().get_table_structure(table_name, schema_name)
                 
                 return jsonify({
                     'success': True,
@@ -374,6 +848,7 @@ class WebInterface:
             offset = int(request.args.get('offset', 0))
             order_by = request.args.get('order_by', None)
             order_dir = request.args.get('order_dir', 'ASC')
+            result_format = request.args.get('format')
             
             if not table_name:
                 return jsonify({
@@ -381,13 +856,33 @@ class WebInterface:
                     'error': 'Table name is required'
                 })
             
+            # Optional TABLESAMPLE preview; the seed keeps pages of one sample consistent
+            sample = None
+            if request.args.get('sample'):
+                try:
+                    sample = {
+                        'sample_percent': float(request.args['sample']),
+                        'sample_method': request.args.get('sample_method', 'SYSTEM').upper(),
+                        'sample_seed': self._optional_int(request.args.get('seed')) or new_seed()
+                    }
+                    tablesample_clause(sample['sample_percent'], sample['sample_method'], sample['sample_seed'])
+                except (ValueError, SampleError) as e:
+                    return jsonify({
+                        'success': False,
+                        'error': f"Invalid sample: {e}"
+                    })
+            
             try:
-                data = self.db_browser.get_table_data(
-                    table_name, schema_name, limit, offset, order_by, order_dir
+                result_format = negotiate_format(result_format, request.headers.get('Accept', ''))
+                db_browser = self._db_browser()
+                data = db_browser.get_table_data(
+                    table_name, schema_name, limit, offset, order_by, order_dir,
+                    row_format='dict' if result_format == 'rows' else 'columnar',
+                    **(sample or {})
                 )
-                count = self.db_browser.get_table_count(table_name, schema_name)
+                count = db_browser.get_table_count(table_name, schema_name, **(sample or {}))
                 
-                return jsonify({
+                response_data = {
                     'success': True,
                     'data': data,
                     'table': table_name,
@@ -395,13 +890,483 @@ class WebInterface:
                     'total_count': count,
                     'limit': limit,
                     'offset': offset
-                })
+                }
+                if sample is not None:
+                    response_data['sample'] = {
+                        'percent': sample['sample_percent'],
+                        'method': sample['sample_method'],
+                        'seed': sample['sample_seed']
+                    }
+                if result_format == 'rows':
+                    return jsonify(response_data)
+                if result_format == 'arrow':
+                    # The Arrow encoder reads the result set from 'result'
+                    response_data['result'] = response_data.pop('data')
+                    if not is_columnar(response_data['result']):
+                        response_data['result'] = {'columns': [], 'data': [], 'row_count': 0}
+                _note_failure(response_data)
+                body, mimetype = encode(response_data, result_format)
+                return Response(body, mimetype=mimetype)
             except Exception as e:
                 logger.error(f"Error getting table data: {e}")
                 return jsonify({
                     'success': False,
                     'error': str(e)
                 })
+        
+        @self.app.route('/api/browser/statement-cache', methods=['GET'])
+        def get_statement_cache_stats():
+            """Get prepared statement cache statistics"""
+            return jsonify({
+                'success': True,
+                'stats': (self._target_connector() or self.db_connector).statement_cache.stats()
+            })
+
+        @self.app.route('/api/browser/table/export', methods=['GET'])
+        def export_table():
+            """Stream a whole table as CSV or Parquet"""
+            table_name = request.args.get('table', '')
+            schema_name = request.args.get('schema', 'public')
+            fmt = request.args.get('format', 'csv')
+            compression = request.args.get('compression')
+            
+            if not table_name:
+                return jsonify({
+                    'success': False,
+                    'error': 'Table name is required'
+                })
+            
+            try:
+                fmt, compression = normalize_options(fmt, compression)
+                chunks = self._data_exporter().export_table(table_name, schema_name, fmt, compression)
+                return self._export_response(chunks, f"{schema_name}.{table_name}", fmt, compression)
+            except ExportError as e:
+                logger.warning(f"Export failed: {e}")
+                return jsonify({
+                    'success': False,
+                    'error': str(e)
+                })
+    
+    def _export_response(self, chunks, basename: str, fmt: str, compression: Optional[str]) -> Response:
+        """
+        Wrap an export stream in a download response
+        
+        Args:
+            chunks: Iterator of encoded chunks
+            basename: File name without extension
+            fmt: Export format ('csv' or 'parquet'), as returned by normalize_options
+            compression: Compression used for the export, as returned by normalize_options
+            
+        Returns:
+            Streaming Flask response
+        """
+        if fmt == 'parquet':
+            filename, mimetype = f"{basename}.parquet", 'application/vnd.apache.parquet'
+        elif compression == 'gzip':
+            filename, mimetype = f"{basename}.csv.gz", 'application/gzip'
+        else:
+            filename, mimetype = f"{basename}.csv", 'text/csv'
+        
+        return Response(
+            chunks,
+            mimetype=mimetype,
+            headers={'Content-Disposition': f'attachment; filename="{filename}"'},
+            direct_passthrough=True
+        )
+
+    def _execute_sampled(self, query: str, data: Dict[str, Any], result_format: str, query_id: str,
+                         statement_timeout_ms: Optional[int], connector: Optional[DBConnector] = None) -> Response:
+        """
+        Dry-run a read-only query against sampled copies of the tables it reads
+        
+        Args:
+            query: SQL query
+            data: Request body; 'sample' is true or {'percent', 'method', 'seed'}
+            result_format: Negotiated result format
+            query_id: ID of the request
+            statement_timeout_ms: Optional statement timeout
+            connector: Connector of the request's target (default: the default database)
+            
+        Returns:
+            The response, with the sample description under 'sample'
+        """
+        options = data['sample'] if isinstance(data['sample'], dict) else {}
+        try:
+            percent = float(options['percent']) if options.get('percent') is not None else None
+            seed = self._optional_int(options.get('seed'))
+        except ValueError:
+            return jsonify({
+                'success': False,
+                'error': 'Sample percent must be a number and seed a non-negative integer',
+                'query_id': query_id
+            })
+        
+        table_sampler = self.table_sampler
+        if connector is not None:
+            table_sampler = TableSampler(connector, self.table_sampler.percent,
+                                         self.table_sampler.max_rows, self.table_sampler.method)
+        success, result, sample = table_sampler.execute(
+            query, percent=percent, method=options.get('method'), seed=seed,
+            row_format='dict' if result_format == 'rows' else 'columnar',
+            statement_timeout_ms=statement_timeout_ms
+        )
+        if success:
+            logger.info(f"Sampled dry run with seed {sample['seed']} finished")
+        else:
+            logger.warning(f"Sampled dry run failed: {result}")
+        
+        response_data = {
+            'success': success,
+            'result': result,
+            'query_type': self._determine_query_type(query),
+            'query_id': query_id,
+            'cached': False,
+            'sample': sample
+        }
+        if result_format != 'rows':
+            if result_format == 'arrow' and not is_columnar(result):
+                result_format = 'columnar'
+            _note_failure(response_data)
+            body, mimetype = encode(response_data, result_format)
+            return Response(body, mimetype=mimetype)
+        return jsonify(response_data)
+
+    def _target_name(self) -> str:
+        """Database target named by the 'target' query parameter, form field or JSON field"""
+        body = request.get_json(silent=True)
+        name = request.args.get('target') or request.form.get('target')
+        if not name and isinstance(body, dict):
+            name = body.get('target')
+        return str(name) if name else DEFAULT_TARGET
+
+    def _target_connector(self) -> Optional[DBConnector]:
+        """
+        Connector of the database target selected by the request
+        
+        The connector is checked out of the target's pool on first use and
+        returned to it when the request is torn down.
+        
+        Returns:
+            The target's connector, or None for the default database
+            
+        Raises:
+            ConnectionRegistryError: For unknown targets or exhausted pools
+        """
+        name = self._target_name()
+        if name == DEFAULT_TARGET:
+            return None
+        if 'target_connector' not in g:
+            g.target_connector = (name, self.connection_registry.acquire(name))
+        return g.target_connector[1]
+
+    def _idempotency_key(self, data: Dict[str, Any]) -> Optional[str]:
+        """Idempotency key from the Idempotency-Key header or the 'idempotency_key' field"""
+        key = request.headers.get('Idempotency-Key') or data.get('idempotency_key')
+        return str(key) if key else None
+
+    def _run_job(self, kind: str, func: Callable, data: Dict[str, Any], job_request: Dict[str, Any],
+                 respond: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None) -> Response:
+        """
+        Run work as a background job
+        
+        With 'async' in the request the job is returned at once; otherwise the
+        request waits for it. Either way a retry with the same idempotency key
+        attaches to the job that is already running or finished.
+        
+        Args:
+            kind: Kind of job
+            func: Job function for JobManager.submit
+            data: Request body
+            job_request: Parameters identifying the work, for idempotency checks
+            respond: Builds the response body from the finished job (default:
+                     the job's result when it is a dictionary)
+            
+        Returns:
+            The job, or the response of the finished work
+        """
+        try:
+            job, created = self.job_manager.submit(kind, func, request=job_request,
+                                                   idempotency_key=self._idempotency_key(data))
+        except JobError as e:
+            logger.warning(f"Job not submitted: {e}")
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            })
+        
+        job_id = job['job_id']
+        if data.get('async'):
+            return jsonify({
+                'success': True,
+                'job_id': job_id,
+                'status': job['status'],
+                'created': created,
+                'status_url': f"/api/jobs/{job_id}",
+                'events_url': f"/api/jobs/{job_id}/events"
+            })
+        
+        job = self.job_manager.join(job_id)
+        if job is None:
+            return jsonify({
+                'success': False,
+                'error': f'Job {job_id} expired before it could be read'
+            })
+        if respond is not None:
+            response_data = respond(job)
+        elif isinstance(job['result'], dict):
+            response_data = dict(job['result'])
+        else:
+            response_data = {'success': False, 'error': job['result']}
+        response_data['job_id'] = job_id
+        return jsonify(response_data)
+
+    def _job_event_stream(self, job_id: str, after: int) -> Iterator[str]:
+        """
+        Server-sent events of a job: one 'stage' event per recorded stage,
+        then a 'done' event with the final job state
+        
+        Args:
+            job_id: Job ID
+            after: Last event ID the client has seen
+            
+        Yields:
+            SSE messages, with keep-alive comments while nothing happens
+        """
+        while True:
+            update = self.job_manager.wait(job_id, after, timeout=self.job_keepalive_seconds)
+            if update is None:
+                yield f"event: error\ndata: {json.dumps({'error': f'Unknown or expired job: {job_id}'})}\n\n"
+                return
+            job, events = update
+            for event in events:
+                after = event['seq']
+                yield f"id: {after}\nevent: stage\ndata: {self.app.json.dumps(event)}\n\n"
+            if job['status'] in FINISHED_STATES:
+                yield f"event: done\ndata: {self.app.json.dumps(job)}\n\n"
+                return
+            if not events:
+                yield ": keep-alive\n\n"
+
+    def _process_prompt(self, prompt: str, data: Dict[str, Any],
+                        progress: Optional[Callable[..., None]] = None) -> Dict[str, Any]:
+        """
+        Turn a prompt into SQL, its validation and a deployment script
+        
+        Args:
+            prompt: Natural language prompt
+            data: Request body; 'candidates' and 'analyze_plan' are honored
+            progress: Called with the name of each stage as it starts
+            
+        Returns:
+            The /api/process response body
+        """
+        progress = progress or (lambda stage, **details: None)
+        try:
+            # Process the prompt with detailed error handling
+            progress('intent')
+            try:
+                logger.info("Calling NLP processor")
+                intent = self.nlp_processor.process(prompt)
+                logger.info(f"NLP processing complete: {intent.get('operation_type', 'unknown')} operation")
+            except Exception as nlp_error:
+                logger.error(f"Error in NLP processing: {nlp_error}")
+                import traceback
+                return {
+                    'success': False,
+                    'error': f'NLP processing error: {str(nlp_error)}',
+                    'error_details': traceback.format_exc()
+                }
+            
+            # Generate SQL with detailed error handling; with candidates > 1,
+            # alternative formulations are compared by plan cost
+            selection = None
+            progress('sql')
+            try:
+                candidate_count = min(max(int(data.get('candidates') or self.default_candidates), 1), 8)
+                if candidate_count > 1:
+                    logger.info(f"Generating {candidate_count} SQL candidates")
+                    candidates = self.sql_generator.generate_candidates(intent, candidate_count)
+                    selection = self.candidate_selector.select(candidates)
+                    sql_query = selection['sql']
+                else:
+                    logger.info("Generating SQL query")
+                    sql_query = self.sql_generator.generate(intent)
+                logger.info(f"SQL generation complete ({len(sql_query)} characters)")
+            except Exception as sql_error:
+                logger.error(f"Error in SQL generation: {sql_error}")
+                import traceback
+                return {
+                    'success': False,
+                    'error': f'SQL generation error: {str(sql_error)}',
+                    'error_details': traceback.format_exc(),
+                    'intent': intent  # Return the intent even if SQL generation failed
+                }
+            
+            # Validate SQL with detailed error handling
+            progress('validation')
+            try:
+                logger.info("Validating SQL query")
+                validation = self.sql_generator.validate(sql_query)
+                logger.info(f"SQL validation complete: {validation}")
+            except Exception as validation_error:
+                logger.error(f"Error in SQL validation: {validation_error}")
+                import traceback
+                # Continue with a default validation result
+                validation = {'valid': False, 'errors': [str(validation_error)]}
+            
+            # Analyze the plan against the real data when requested
+            # (analyze_plan: true for EXPLAIN, 'analyze' for EXPLAIN ANALYZE)
+            plan_analysis = None
+            analyze_plan = data.get('analyze_plan')
+            if analyze_plan and validation.get('valid'):
+                progress('plan_analysis')
+                try:
+                    logger.info("Analyzing query plan")
+                    plan_analysis = self.plan_analyzer.analyze(sql_query, analyze=analyze_plan == 'analyze')
+                    logger.info(f"Plan analysis complete: {len(plan_analysis['issues'])} issue(s)")
+                except PlanAnalysisError as plan_error:
+                    logger.warning(f"Plan analysis skipped: {plan_error}")
+                    plan_analysis = {'error': str(plan_error)}
+            
+            # Create deployment script with detailed error handling
+            progress('deployment_script')
+            try:
+                logger.info("Creating deployment script")
+                script = self.deployment_manager.create_script(sql_query, intent)
+                logger.info("Deployment script creation complete")
+            except Exception as script_error:
+                logger.error(f"Error in deployment script creation: {script_error}")
+                import traceback
+                # Continue with an empty script
+                script = "-- Error generating deployment script: " + str(script_error)
+            
+            # Prepare successful response
+            response_data = {
+                'success': True,
+                'intent': intent,
+                'sql': sql_query,
+                'validation': validation,
+                'deployment_script': script
+            }
+            if plan_analysis is not None:
+                response_data['plan_analysis'] = plan_analysis
+            if selection is not None:
+                response_data['candidates'] = selection
+            
+            return response_data
+            
+        except Exception as e:
+            import traceback
+            error_trace = traceback.format_exc()
+            logger.error(f"Unhandled error processing prompt: {e}")
+            logger.error(error_trace)
+            return {
+                'success': False,
+                'error': str(e),
+                'error_details': error_trace
+            }
+
+    def _schema_conditional(self, view):
+        """
+        Answer repeated metadata requests with 304 Not Modified
+        
+        The ETag covers the URL and the state of the schema cache of the
+        database the metadata is read from, so it changes with every DDL
+        change. It is checked before the view runs, so a match costs no
+        catalog queries. Only successful responses are tagged.
+        
+        Args:
+            view: Route function returning schema metadata
+            
+        Returns:
+            The wrapped route function
+        """
+        @functools.wraps(view)
+        def conditional(*args, **kwargs):
+            connector = self._target_connector() or self.query_router.read_connector()
+            if connector.conn is not None:
+                # Notice schema changes made elsewhere at the usual poll rate
+                connector.schema_cache.check(connector.conn)
+            etag = schema_etag(connector.schema_cache.state_token(), request.full_path, self._target_name())
+            
+            if request.if_none_match.contains_weak(etag):
+                response = Response(status=304)
+            else:
+                response = view(*args, **kwargs)
+                if not (response.status_code == 200 and (response.get_json(silent=True) or {}).get('success')):
+                    return response
+            response.set_etag(etag, weak=True)
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            return response
+        return conditional
+
+    def _db_browser(self) -> DBBrowser:
+        """Browser for the request's database target"""
+        connector = self._target_connector()
+        return DBBrowser(connector) if connector else self.db_browser
+
+    def _data_exporter(self) -> DataExporter:
+        """Exporter for the request's database target"""
+        connector = self._target_connector()
+        return DataExporter(connector) if connector else self.data_exporter
+
+    def _execute_sharded(self, query: str, data: Dict[str, Any], result_format: str, query_id: str,
+                         statement_timeout_ms: Optional[int]) -> Response:
+        """
+        Run a read-only query on every shard and merge the results
+        
+        Args:
+            query: SQL query
+            data: Request body; 'shards' is true for the configured shards or
+                  a list of target names, 'allow_partial' merges the shards
+                  that answered when others fail
+            result_format: Negotiated result format
+            query_id: ID of the request
+            statement_timeout_ms: Optional statement timeout per shard
+            
+        Returns:
+            The response, with per-shard rows, latency and errors under 'shards'
+        """
+        shards = data['shards'] if isinstance(data['shards'], list) else None
+        success, result, report = self.shard_executor.execute(
+            query, shards=[str(name) for name in shards] if shards else None,
+            row_format='dict' if result_format == 'rows' else 'columnar',
+            statement_timeout_ms=statement_timeout_ms,
+            allow_partial=bool(data.get('allow_partial', False))
+        )
+        if not success:
+            logger.warning(f"Sharded query failed: {result}")
+        
+        response_data = {
+            'success': success,
+            'result': result,
+            'query_type': self._determine_query_type(query),
+            'query_id': query_id,
+            'cached': False,
+            'shards': report
+        }
+        if result_format != 'rows':
+            if result_format == 'arrow' and not is_columnar(result):
+                result_format = 'columnar'
+            _note_failure(response_data)
+            body, mimetype = encode(response_data, result_format)
+            return Response(body, mimetype=mimetype)
+        return jsonify(response_data)
+
+    @staticmethod
+    def _optional_int(value) -> Optional[int]:
+        """Parse an optional non-negative integer request parameter"""
+        if value is None or value == '':
+            return None
+        number = int(value)
+        if number < 0:
+            raise ValueError(f"Negative value: {value}")
+        return number
+
+    def _determine_query_type(self, query):
+        """Determine the type of SQL query"""
+        return statement_kind(query)
     
     def run(self, host: str = '0.0.0.0', port: int = 5000, debug: bool = False):
         """
@@ -0,0 +1,43 @@
+"""
+WSGI Module
+Production entry point for serving the web interface with gunicorn
+"""
+
+import logging
+
+from dotenv import load_dotenv
+from flask import Flask
+
+from .nlp_processor import NLPProcessor
+from .sql_generator import SQLGenerator
+from .deployment_manager import DeploymentManager
+from .db_connector import DBConnector
+from .web_interface import WebInterface
+from .logging_config import configure_logging
+
+logger = logging.getLogger(__name__)
+
+
+def create_app() -> Flask:
+    """
+    Build the web interface application
+
+    Called once in every worker process (gunicorn 'src.wsgi:create_app()'),
+    so each worker opens its own database connections and OpenAI client.
+    LLM responses, schema metadata and jobs are shared between the workers when
+    SHARED_CACHE_PATH is set, which gunicorn.conf.py does by default.
+
+    Returns:
+        The Flask application
+    """
+    load_dotenv()
+    configure_logging()
+
+    nlp_processor = NLPProcessor()
+    db_connector = DBConnector()
+    sql_generator = SQLGenerator(db_connector)
+    deployment_manager = DeploymentManager(db_connector)
+
+    web = WebInterface(nlp_processor, sql_generator, deployment_manager, db_connector)
+    logger.info("Web interface application created")
+    return web.app
@@ -28,6 +28,10 @@ document.addEventListener('DOMContentLoaded', function() {
     // Database browser elements
     const dbBrowserContainer = document.getElementById('db-browser-container');
     const tablesList = document.getElementById('tables-list');
+    const tablesSearch = document.getElementById('tables-search');
+    const tablesPagination = document.getElementById('tables-pagination');
+    const tablesPrev = document.getElementById('tables-prev');
+    const tablesNext = document.getElementById('tables-next');
     const selectedTableName = document.getElementById('selected-table-name');
     const tableStructureBtn = document.getElementById('table-structure-btn');
     const tableDataBtn = document.getElementById('table-data-btn');
@@ -39,13 +43,19 @@ document.addEventListener('DOMContentLoaded', function() {
     const tableDataBody = document.getElementById('table-data-body');
     const tableDataPagination = document.getElementById('table-data-pagination');
     const tableDataLimit = document.getElementById('table-data-limit');
+    const tableDataSample = document.getElementById('table-data-sample');
     const tableDataPrev = document.getElementById('table-data-prev');
     const tableDataNext = document.getElementById('table-data-next');
+    const tableDataExport = document.getElementById('table-data-export');
     
     // Check if all required elements are found
     const missingElements = [];
     if (!dbBrowserContainer) missingElements.push('db-browser-container');
     if (!tablesList) missingElements.push('tables-list');
+    if (!tablesSearch) missingElements.push('tables-search');
+    if (!tablesPagination) missingElements.push('tables-pagination');
+    if (!tablesPrev) missingElements.push('tables-prev');
+    if (!tablesNext) missingElements.push('tables-next');
     if (!selectedTableName) missingElements.push('selected-table-name');
     if (!tableStructureBtn) missingElements.push('table-structure-btn');
     if (!tableDataBtn) missingElements.push('table-data-btn');
@@ -57,26 +67,41 @@ document.addEventListener('DOMContentLoaded', function() {
     if (!tableDataBody) missingElements.push('table-data-body');
     if (!tableDataPagination) missingElements.push('table-data-pagination');
     if (!tableDataLimit) missingElements.push('table-data-limit');
+    if (!tableDataSample) missingElements.push('table-data-sample');
     if (!tableDataPrev) missingElements.push('table-data-prev');
     if (!tableDataNext) missingElements.push('table-data-next');
+    if (!tableDataExport) missingElements.push('table-data-export');
     
     if (missingElements.length > 0) {
         console.error('Missing DOM elements:', missingElements);
     }
     
     // Button event listeners
-    document.getElementById('execute-sql-btn').addEventListener('click', executeSql);
+    document.getElementById('execute-sql-btn').addEventListener('click', () => executeSql());
+    document.getElementById('execute-sample-btn').addEventListener('click', () => executeSql(true));
     document.getElementById('copy-sql-btn').addEventListener('click', () => copyToClipboard(sqlContent.textContent));
     document.getElementById('copy-deployment-btn').addEventListener('click', () => copyToClipboard(deploymentContent.textContent));
     document.getElementById('test-connection-btn').addEventListener('click', testConnection);
     document.getElementById('view-schema-btn').addEventListener('click', viewSchema);
     document.getElementById('db-browser-btn').addEventListener('click', openDatabaseBrowser);
-    document.getElementById('refresh-tables-btn').addEventListener('click', loadTables);
+    document.getElementById('refresh-tables-btn').addEventListener('click', () => loadTables(tablesOffset));
+    tablesSearch.addEventListener('input', () => {
+        // Search on the server once typing pauses
+        clearTimeout(tablesSearchTimer);
+        tablesSearchTimer = setTimeout(() => loadTables(0), 300);
+    });
+    tablesPrev.addEventListener('click', () => loadTables(Math.max(0, tablesOffset - TABLES_PAGE_SIZE)));
+    tablesNext.addEventListener('click', () => loadTables(tablesOffset + TABLES_PAGE_SIZE));
     tableStructureBtn.addEventListener('click', showTableStructure);
     tableDataBtn.addEventListener('click', showTableData);
     tableDataLimit.addEventListener('change', () => loadTableData(currentTable, currentSchema, 0));
+    tableDataSample.addEventListener('change', () => {
+        tableDataSeed = null;
+        loadTableData(currentTable, currentSchema, 0);
+    });
     tableDataPrev.addEventListener('click', loadPreviousTableData);
     tableDataNext.addEventListener('click', loadNextTableData);
+    tableDataExport.addEventListener('click', () => exportCurrentTable('csv'));
     
     // Form submission
     promptForm.addEventListener('submit', function(e) {
@@ -108,7 +133,8 @@ document.addEventListener('DOMContentLoaded', function() {
             headers: {
                 'Content-Type': 'application/json'
             },
-            body: JSON.stringify({ prompt })
+            // Run as a background job so long model calls do not hold the request open
+            body: JSON.stringify({ prompt, async: true, idempotency_key: newQueryId() })
         })
         .then(response => {
             const requestEndTime = new Date().getTime();
@@ -132,6 +158,18 @@ document.addEventListener('DOMContentLoaded', function() {
                 return { status: response.status, data, rawText: text };
             });
         })
+        .then(result => {
+            if (!result.data || !result.data.success || !result.data.job_id) {
+                return result;
+            }
+            return followJob(result.data.job_id).then(job => ({
+                status: result.status,
+                data: typeof job.result === 'object' && job.result !== null
+                    ? job.result
+                    : { success: false, error: job.result || 'The background job failed.' },
+                rawText: ''
+            }));
+        })
         .then(result => {
             hideLoading();
             const { status, data, rawText, parseError } = result;
@@ -294,31 +332,50 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
     
-    // Execute SQL
-    function executeSql() {
+    // Last query sent to /api/execute, used for server-side exports
+    let lastExecutedQuery = '';
+    
+    // Execute SQL, or dry-run it against sampled copies of the tables it reads
+    function executeSql(sampleRun = false) {
         const sql = sqlContent.textContent;
         if (!sql) {
             showMessage('Error', 'No SQL query to execute.');
             return;
         }
         
-        showLoading();
+        const queryId = newQueryId();
+        showLoading(() => cancelQuery(queryId));
         console.log('Executing SQL query:', sql);
+        lastExecutedQuery = sql;
         
         fetch('/api/execute', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json'
             },
-            body: JSON.stringify({ query: sql })
+            body: JSON.stringify({ query: sql, format: 'columnar', query_id: queryId, sample: sampleRun })
         })
         .then(response => response.json())
         .then(data => {
             hideLoading();
             console.log('Query execution response:', data);
             
-            if (data.success) {
+            if (data.success && data.job_id) {
+                showMessage('Query Deferred', data.guard.reason);
+                pollExecutionJob(data.job_id, data.query_type);
+            } else if (data.success) {
                 displayExecutionResults(data.result, data.query_type);
+                if (data.sample) {
+                    const tables = data.sample.tables.map(
+                        table => `${table.table}: ${table.sampled_rows} of ~${table.estimated_rows} rows (${table.percent}%)`
+                    );
+                    showMessage('Sample Run',
+                        `Results come from a ${data.sample.method} sample (seed ${data.sample.seed}) and are not exact. ` +
+                        tables.join('; '));
+                }
+                if (data.guard && data.guard.action === 'limit') {
+                    showMessage('Query Limited', data.guard.reason);
+                }
             } else {
                 // Check if we have detailed error information
                 if (data.error_details) {
@@ -343,6 +400,126 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
     
+    // Follow a background job over server-sent events until it finishes,
+    // falling back to polling when the event stream is unavailable
+    function followJob(jobId) {
+        return new Promise((resolve, reject) => {
+            const poll = () => {
+                fetch(`/api/jobs/${encodeURIComponent(jobId)}`)
+                .then(response => response.json())
+                .then(data => {
+                    if (!data.success) {
+                        reject(new Error(data.error));
+                    } else if (data.job.status === 'queued' || data.job.status === 'running') {
+                        setTimeout(poll, 2000);
+                    } else {
+                        resolve(data.job);
+                    }
+                })
+                .catch(reject);
+            };
+            
+            if (!window.EventSource) {
+                poll();
+                return;
+            }
+            const events = new EventSource(`/api/jobs/${encodeURIComponent(jobId)}/events`);
+            events.addEventListener('stage', event => {
+                const stage = JSON.parse(event.data).stage;
+                console.log('Job stage:', stage);
+                const label = document.querySelector('.loading-overlay .visually-hidden');
+                if (label) {
+                    label.textContent = `Working: ${stage.replace('_', ' ')}`;
+                }
+            });
+            events.addEventListener('done', event => {
+                events.close();
+                resolve(JSON.parse(event.data));
+            });
+            events.onerror = () => {
+                events.close();
+                poll();
+            };
+        });
+    }
+    
+    // Poll a query the execution guard sent to the background until it finishes
+    function pollExecutionJob(jobId, queryType) {
+        fetch(`/api/execute/jobs/${encodeURIComponent(jobId)}`)
+        .then(response => response.json())
+        .then(data => {
+            if (!data.success) {
+                showMessage('Error', data.error);
+                return;
+            }
+            const job = data.job;
+            if (job.status === 'queued' || job.status === 'running') {
+                setTimeout(() => pollExecutionJob(jobId, queryType), 2000);
+            } else if (job.success) {
+                displayExecutionResults(job.result, queryType);
+            } else {
+                showMessage('Error', job.result || 'The background query failed.');
+            }
+        })
+        .catch(error => {
+            showMessage('Error', 'An error occurred while checking the background query.');
+            console.error('Error:', error);
+        });
+    }
+    
+    // Generate an ID for a query so it can be cancelled while it runs
+    function newQueryId() {
+        if (window.crypto && typeof window.crypto.randomUUID === 'function') {
+            return window.crypto.randomUUID();
+        }
+        return Date.now().toString(36) + '-' + Math.random().toString(36).slice(2);
+    }
+    
+    // Ask the server to cancel a running query
+    function cancelQuery(queryId) {
+        fetch('/api/execute/cancel', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({ query_id: queryId })
+        })
+        .then(response => response.json())
+        .then(data => {
+            console.log('Cancel response:', data);
+            if (!data.success) {
+                console.warn('Could not cancel query:', data.error);
+            }
+        })
+        .catch(error => {
+            console.error('Error cancelling query:', error);
+        });
+    }
+    
+    // Check whether a result uses the columnar format (column list plus one value array per column)
+    function isColumnar(result) {
+        return result !== null && typeof result === 'object' && Array.isArray(result.columns) && Array.isArray(result.data);
+    }
+    
+    // Normalize row objects or a columnar result into column names and row arrays
+    function toTabular(result) {
+        if (isColumnar(result)) {
+            const columns = result.columns.map(column => column.name);
+            const rows = [];
+            for (let i = 0; i < result.row_count; i++) {
+                rows.push(result.data.map(values => values[i]));
+            }
+            return { columns, rows };
+        }
+        if (!Array.isArray(result) || result.length === 0) {
+            return { columns: [], rows: [] };
+        }
+        return {
+            columns: Object.keys(result[0]),
+            rows: result.map(row => Object.values(row))
+        };
+    }
+    
     // Display execution results
     function displayExecutionResults(result, queryType) {
         executionContent.innerHTML = '';
@@ -411,9 +588,10 @@ document.addEventListener('DOMContentLoaded', function() {
                 alert.innerHTML = result;
                 executionContent.appendChild(alert);
             }
-        } else if (Array.isArray(result)) {
+        } else if (Array.isArray(result) || isColumnar(result)) {
             // Display table
-            if (result.length === 0) {
+            const tabular = toTabular(result);
+            if (tabular.rows.length === 0) {
                 const alert = document.createElement('div');
                 alert.className = 'alert alert-info';
                 alert.innerHTML = 'Query executed successfully. No results returned.';
@@ -422,7 +600,7 @@ document.addEventListener('DOMContentLoaded', function() {
                 // Add a success message before the table
                 const successAlert = document.createElement('div');
                 successAlert.className = 'alert alert-success mb-3';
-                successAlert.textContent = `Query executed successfully. ${result.length} row(s) returned.`;
+                successAlert.textContent = `Query executed successfully. ${tabular.rows.length} row(s) returned.`;
                 executionContent.appendChild(successAlert);
                 
                 const table = document.createElement('table');
@@ -432,7 +610,7 @@ document.addEventListener('DOMContentLoaded', function() {
                 const thead = document.createElement('thead');
                 const headerRow = document.createElement('tr');
                 
-                Object.keys(result[0]).forEach(key => {
+                tabular.columns.forEach(key => {
                     const th = document.createElement('th');
                     th.textContent = key;
                     headerRow.appendChild(th);
@@ -444,10 +622,10 @@ document.addEventListener('DOMContentLoaded', function() {
                 // Create table body
                 const tbody = document.createElement('tbody');
                 
-                result.forEach(row => {
+                tabular.rows.forEach(row => {
                     const tr = document.createElement('tr');
                     
-                    Object.values(row).forEach(value => {
+                    row.forEach(value => {
                         const td = document.createElement('td');
                         
                         // Handle different value types
@@ -476,16 +654,28 @@ document.addEventListener('DOMContentLoaded', function() {
                 executionContent.appendChild(tableResponsive);
                 
                 // Add export buttons if there are results
-                if (result.length > 0) {
+                if (tabular.rows.length > 0) {
                     const exportDiv = document.createElement('div');
                     exportDiv.className = 'mt-3';
                     
                     const exportCSVBtn = document.createElement('button');
                     exportCSVBtn.className = 'btn btn-sm btn-outline-secondary me-2';
                     exportCSVBtn.innerHTML = '<i class="bi bi-file-earmark-spreadsheet"></i> Export CSV';
-                    exportCSVBtn.onclick = () => exportTableToCSV(result);
+                    exportCSVBtn.onclick = () => exportQueryResults(lastExecutedQuery, 'csv');
+                    
+                    const exportCSVGzipBtn = document.createElement('button');
+                    exportCSVGzipBtn.className = 'btn btn-sm btn-outline-secondary me-2';
+                    exportCSVGzipBtn.innerHTML = '<i class="bi bi-file-earmark-zip"></i> Export CSV (gzip)';
+                    exportCSVGzipBtn.onclick = () => exportQueryResults(lastExecutedQuery, 'csv', 'gzip');
+                    
+                    const exportParquetBtn = document.createElement('button');
+                    exportParquetBtn.className = 'btn btn-sm btn-outline-secondary me-2';
+                    exportParquetBtn.innerHTML = '<i class="bi bi-file-earmark-binary"></i> Export Parquet';
+                    exportParquetBtn.onclick = () => exportQueryResults(lastExecutedQuery, 'parquet', 'snappy');
                     
                     exportDiv.appendChild(exportCSVBtn);
+                    exportDiv.appendChild(exportCSVGzipBtn);
+                    exportDiv.appendChild(exportParquetBtn);
                     executionContent.appendChild(exportDiv);
                 }
             }
@@ -500,40 +690,63 @@ document.addEventListener('DOMContentLoaded', function() {
         executionResults.style.display = 'block';
     }
     
-    // Export table data to CSV
-    function exportTableToCSV(data) {
-        if (!data || data.length === 0) return;
-        
-        // Get headers
-        const headers = Object.keys(data[0]);
-        
-        // Create CSV content
-        let csvContent = headers.join(',') + '\n';
-        
-        // Add rows
-        data.forEach(row => {
-            const values = headers.map(header => {
-                const value = row[header];
-                // Handle null values and escape commas
-                if (value === null) return '';
-                if (typeof value === 'string' && value.includes(',')) {
-                    return `"${value}"`;
+    // Get (or create) the hidden frame that receives export downloads
+    function getExportFrame() {
+        let frame = document.getElementById('export-frame');
+        
+        if (!frame) {
+            frame = document.createElement('iframe');
+            frame.id = 'export-frame';
+            frame.name = 'export-frame';
+            frame.style.display = 'none';
+            
+            // Downloads do not trigger a load event; an error response does
+            frame.addEventListener('load', () => {
+                try {
+                    const text = frame.contentDocument.body.textContent;
+                    const data = JSON.parse(text);
+                    if (!data.success) {
+                        showMessage('Export Failed', data.error || 'An error occurred while exporting.');
+                    }
+                } catch (e) {
+                    // Not a JSON error response
                 }
-                return value;
             });
-            csvContent += values.join(',') + '\n';
+            
+            document.body.appendChild(frame);
+        }
+        
+        return frame;
+    }
+    
+    // Export query results through the server-side streaming export
+    function exportQueryResults(query, format, compression) {
+        if (!query) return;
+        
+        const form = document.createElement('form');
+        form.method = 'POST';
+        form.action = '/api/export';
+        form.target = getExportFrame().name;
+        
+        const fields = { query: query, format: format, compression: compression || '' };
+        Object.keys(fields).forEach(name => {
+            const input = document.createElement('input');
+            input.type = 'hidden';
+            input.name = name;
+            input.value = fields[name];
+            form.appendChild(input);
         });
         
-        // Create download link
-        const blob = new Blob([csvContent], { type: 'text/csv;charset=utf-8;' });
-        const url = URL.createObjectURL(blob);
-        const link = document.createElement('a');
-        link.setAttribute('href', url);
-        link.setAttribute('download', 'sql_results.csv');
-        link.style.visibility = 'hidden';
-        document.body.appendChild(link);
-        link.click();
-        document.body.removeChild(link);
+        document.body.appendChild(form);
+        form.submit();
+        document.body.removeChild(form);
+    }
+    
+    // Export the selected table through the server-side streaming export
+    function exportCurrentTable(format) {
+        if (!currentTable) return;
+        
+        getExportFrame().src = `/api/browser/table/export?table=${encodeURIComponent(currentTable)}&schema=${encodeURIComponent(currentSchema)}&format=${format}`;
     }
     
     // Test database connection
@@ -711,8 +924,8 @@ document.addEventListener('DOMContentLoaded', function() {
         modal.show();
     }
     
-    // Show loading overlay
-    function showLoading() {
+    // Show loading overlay, with a cancel button when onCancel is given
+    function showLoading(onCancel) {
         let loadingOverlay = document.querySelector('.loading-overlay');
         
         if (!loadingOverlay) {
@@ -727,11 +940,24 @@ document.addEventListener('DOMContentLoaded', function() {
             span.className = 'visually-hidden';
             span.textContent = 'Loading...';
             
+            const cancelBtn = document.createElement('button');
+            cancelBtn.className = 'btn btn-sm btn-outline-light loading-cancel';
+            cancelBtn.textContent = 'Cancel query';
+            
             spinner.appendChild(span);
             loadingOverlay.appendChild(spinner);
+            loadingOverlay.appendChild(cancelBtn);
             document.body.appendChild(loadingOverlay);
         }
         
+        const cancelBtn = loadingOverlay.querySelector('.loading-cancel');
+        cancelBtn.disabled = false;
+        cancelBtn.style.display = onCancel ? 'inline-block' : 'none';
+        cancelBtn.onclick = onCancel ? () => {
+            cancelBtn.disabled = true;
+            onCancel();
+        } : null;
+        
         loadingOverlay.style.display = 'flex';
     }
     
@@ -748,6 +974,13 @@ document.addEventListener('DOMContentLoaded', function() {
     let currentSchema = 'public';
     let currentOffset = 0;
     let totalRows = 0;
+    let tableDataSeed = null;
+    
+    // Table list paging; column counts and sizes are fetched per page
+    const TABLES_PAGE_SIZE = 100;
+    let tablesOffset = 0;
+    let tablesSearchTimer = null;
+    let tablesRequest = 0;
     
     // Open Database Browser
     function openDatabaseBrowser() {
@@ -778,16 +1011,25 @@ document.addEventListener('DOMContentLoaded', function() {
     }
     
     // Load Tables
-    function loadTables() {
+    function loadTables(offset = 0) {
+        // Responses to earlier searches are ignored once a newer one is sent
+        const requestId = ++tablesRequest;
+        const params = new URLSearchParams({ limit: TABLES_PAGE_SIZE, offset: offset });
+        const search = tablesSearch.value.trim();
+        if (search) params.set('search', search);
+        
         showLoading();
         
-        fetch('/api/browser/tables')
+        fetch(`/api/browser/tables?${params}`)
             .then(response => response.json())
             .then(data => {
                 hideLoading();
+                if (requestId !== tablesRequest) return;
                 
                 if (data.success) {
-                    displayTables(data.tables);
+                    tablesOffset = data.offset;
+                    displayTables(data.tables, data.total);
+                    loadTableStats(data.tables, requestId);
                 } else {
                     showMessage('Error', data.error || 'Failed to load tables');
                 }
@@ -799,57 +1041,98 @@ document.addEventListener('DOMContentLoaded', function() {
             });
     }
     
+    // Load column counts and sizes for the tables on the current page
+    function loadTableStats(tables, requestId) {
+        if (tables.length === 0) return;
+        
+        fetch('/api/browser/tables/stats', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+                tables: tables.map(table => ({ schema: table.table_schema, table: table.table_name }))
+            })
+        })
+            .then(response => response.json())
+            .then(data => {
+                if (requestId !== tablesRequest || !data.success) return;
+                
+                data.stats.forEach(stat => {
+                    const item = Array.from(tablesList.querySelectorAll('.list-group-item-action')).find(
+                        element => element.dataset.table === stat.table_name && element.dataset.schema === stat.table_schema
+                    );
+                    if (!item) return;
+                    const badge = item.querySelector('.badge');
+                    badge.textContent = stat.column_count;
+                    badge.title = `${stat.column_count} columns, ${formatBytes(stat.table_size)}` +
+                        (stat.estimated_rows !== null ? `, ~${stat.estimated_rows.toLocaleString()} rows` : '');
+                });
+            })
+            .catch(error => console.error('Error loading table stats:', error));
+    }
+    
+    // Format a byte count for display
+    function formatBytes(bytes) {
+        const units = ['B', 'kB', 'MB', 'GB', 'TB'];
+        let value = bytes;
+        let unit = 0;
+        while (value >= 1024 && unit < units.length - 1) {
+            value /= 1024;
+            unit++;
+        }
+        return `${value.toFixed(unit === 0 ? 0 : 1)} ${units[unit]}`;
+    }
+    
     // Display Tables
-    function displayTables(tables) {
+    function displayTables(tables, total) {
         tablesList.innerHTML = '';
         
+        // Update pagination
+        const end = tablesOffset + tables.length;
+        tablesPagination.textContent = total > 0 ? `${tablesOffset + 1}-${end} of ${total}` : '';
+        tablesPrev.disabled = tablesOffset === 0;
+        tablesNext.disabled = end >= total;
+        
         if (tables.length === 0) {
             tablesList.innerHTML = '<div class="text-center p-3 text-muted">No tables found</div>';
             return;
         }
         
-        // Group tables by schema
-        const tablesBySchema = {};
+        // Tables arrive sorted by schema and name; add a header whenever the schema changes
+        let previousSchema = null;
         tables.forEach(table => {
-            const schema = table.table_schema;
-            if (!tablesBySchema[schema]) {
-                tablesBySchema[schema] = [];
+            if (table.table_schema !== previousSchema) {
+                const schemaHeader = document.createElement('div');
+                schemaHeader.className = 'list-group-item list-group-item-secondary';
+                schemaHeader.textContent = table.table_schema;
+                tablesList.appendChild(schemaHeader);
+                previousSchema = table.table_schema;
             }
-            tablesBySchema[schema].push(table);
-        });
-        
-        // Create list items for each table, grouped by schema
-        Object.keys(tablesBySchema).sort().forEach(schema => {
-            // Add schema header
-            const schemaHeader = document.createElement('div');
-            schemaHeader.className = 'list-group-item list-group-item-secondary';
-            schemaHeader.textContent = schema;
-            tablesList.appendChild(schemaHeader);
             
-            // Add tables in this schema
-            tablesBySchema[schema].sort((a, b) => a.table_name.localeCompare(b.table_name)).forEach(table => {
-                const listItem = document.createElement('a');
-                listItem.href = '#';
-                listItem.className = 'list-group-item list-group-item-action d-flex justify-content-between align-items-center';
-                listItem.dataset.table = table.table_name;
-                listItem.dataset.schema = table.table_schema;
-                
-                const nameSpan = document.createElement('span');
-                nameSpan.textContent = table.table_name;
-                listItem.appendChild(nameSpan);
-                
-                const badge = document.createElement('span');
-                badge.className = 'badge bg-secondary rounded-pill';
-                badge.textContent = table.column_count;
-                listItem.appendChild(badge);
-                
-                listItem.addEventListener('click', function(e) {
-                    e.preventDefault();
-                    selectTable(table.table_name, table.table_schema);
-                });
-                
-                tablesList.appendChild(listItem);
+            const listItem = document.createElement('a');
+            listItem.href = '#';
+            listItem.className = 'list-group-item list-group-item-action d-flex justify-content-between align-items-center';
+            listItem.dataset.table = table.table_name;
+            listItem.dataset.schema = table.table_schema;
+            if (table.table_schema === currentSchema && table.table_name === currentTable) {
+                listItem.classList.add('active');
+            }
+            
+            const nameSpan = document.createElement('span');
+            nameSpan.textContent = table.table_name;
+            listItem.appendChild(nameSpan);
+            
+            // Filled in by loadTableStats
+            const badge = document.createElement('span');
+            badge.className = 'badge bg-secondary rounded-pill';
+            badge.textContent = '…';
+            listItem.appendChild(badge);
+            
+            listItem.addEventListener('click', function(e) {
+                e.preventDefault();
+                selectTable(table.table_name, table.table_schema);
             });
+            
+            tablesList.appendChild(listItem);
         });
     }
     
@@ -859,6 +1142,7 @@ document.addEventListener('DOMContentLoaded', function() {
         currentTable = tableName;
         currentSchema = schemaName;
         currentOffset = 0;
+        tableDataSeed = null;
         
         // Update selected table name
         selectedTableName.textContent = `${schemaName}.${tableName}`;
@@ -993,14 +1277,24 @@ document.addEventListener('DOMContentLoaded', function() {
         const limit = tableDataLimit.value;
         currentOffset = offset;
         
-        fetch(`/api/browser/table/data?table=${encodeURIComponent(tableName)}&schema=${encodeURIComponent(schemaName)}&limit=${limit}&offset=${offset}`)
+        // Pages of a sample share its seed, so paging does not draw a new sample
+        let sampleParams = '';
+        if (tableDataSample.value) {
+            sampleParams = `&sample=${tableDataSample.value}` + (tableDataSeed ? `&seed=${tableDataSeed}` : '');
+        }
+        
+        fetch(`/api/browser/table/data?table=${encodeURIComponent(tableName)}&schema=${encodeURIComponent(schemaName)}&limit=${limit}&offset=${offset}&format=columnar${sampleParams}`)
             .then(response => response.json())
             .then(data => {
                 hideLoading();
                 
                 if (data.success) {
                     totalRows = data.total_count;
+                    tableDataSeed = data.sample ? data.sample.seed : null;
                     displayTableData(data.data, data.total_count, parseInt(data.limit), parseInt(data.offset));
+                    if (data.sample) {
+                        tableDataPagination.textContent += ` in a ${data.sample.percent}% sample (seed ${data.sample.seed})`;
+                    }
                 } else {
                     showMessage('Error', data.error || 'Failed to load table data');
                 }
@@ -1017,7 +1311,8 @@ document.addEventListener('DOMContentLoaded', function() {
         tableDataHeader.innerHTML = '';
         tableDataBody.innerHTML = '';
         
-        if (data.length === 0) {
+        const tabular = toTabular(data);
+        if (tabular.rows.length === 0) {
             tableDataHeader.innerHTML = '<tr><th>No data</th></tr>';
             tableDataBody.innerHTML = '<tr><td class="text-center">No data found</td></tr>';
             tableDataPagination.textContent = 'No data';
@@ -1028,7 +1323,7 @@ document.addEventListener('DOMContentLoaded', function() {
         
         // Create header row
         const headerRow = document.createElement('tr');
-        Object.keys(data[0]).forEach(key => {
+        tabular.columns.forEach(key => {
             const th = document.createElement('th');
             th.textContent = key;
             headerRow.appendChild(th);
@@ -1036,9 +1331,9 @@ document.addEventListener('DOMContentLoaded', function() {
         tableDataHeader.appendChild(headerRow);
         
         // Create data rows
-        data.forEach(row => {
+        tabular.rows.forEach(row => {
             const tr = document.createElement('tr');
-            Object.values(row).forEach(value => {
+            row.forEach(value => {
                 const td = document.createElement('td');
                 td.textContent = value !== null ? value : 'NULL';
                 if (value === null) {
@@ -1051,7 +1346,7 @@ document.addEventListener('DOMContentLoaded', function() {
         
         // Update pagination
         const start = offset + 1;
-        const end = Math.min(offset + data.length, totalCount);
+        const end = Math.min(offset + tabular.rows.length, totalCount);
         tableDataPagination.textContent = `Showing ${start} to ${end} of ${totalCount} rows`;
         
         // Update pagination buttons
@@ -0,0 +1,113 @@
+"""
+Tests for the bulk loader
+"""
+
+import io
+import os
+import sys
+import time
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+
+import psycopg2
+
+# Add the src directory to the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.bulk_loader import BulkLoader, BulkLoadError, JSONL_NULL
+
+STRUCTURE = [
+    {'column_name': 'id', 'is_nullable': 'NO', 'column_default': "nextval('users_id_seq'::regclass)"},
+    {'column_name': 'email', 'is_nullable': 'NO', 'column_default': None},
+    {'column_name': 'full_name', 'is_nullable': 'YES', 'column_default': None}
+]
+
+IDENTITY_STRUCTURE = [
+    {'column_name': 'id', 'is_nullable': 'NO', 'column_default': None, 'is_identity': 'YES', 'is_generated': 'NEVER'},
+    {'column_name': 'amount', 'is_nullable': 'NO', 'column_default': None, 'is_identity': 'NO', 'is_generated': 'NEVER'},
+    {'column_name': 'doubled', 'is_nullable': 'YES', 'column_default': None, 'is_identity': 'NO', 'is_generated': 'ALWAYS'}
+]
+
+class TestBulkLoader(unittest.TestCase):
+    """Test column mapping and batching of the bulk loader"""
+
+    def test_map_columns_case_insensitive(self):
+        """Fields are matched to columns ignoring case; unknown fields are ignored"""
+        indexes, columns, ignored = BulkLoader.map_columns(['EMAIL', 'extra', 'Full_Name'], STRUCTURE)
+
+        self.assertEqual(indexes, [0, 2])
+        self.assertEqual(columns, ['email', 'full_name'])
+        self.assertEqual(ignored, ['extra'])
+
+    def test_map_columns_explicit_mapping(self):
+        """An explicit column map takes precedence over name matching"""
+        _, columns, _ = BulkLoader.map_columns(['mail', 'name'], STRUCTURE, {'mail': 'email', 'name': 'full_name'})
+        self.assertEqual(columns, ['email', 'full_name'])
+
+    def test_map_columns_missing_required(self):
+        """Required columns without a default must be present in the input"""
+        with self.assertRaises(BulkLoadError):
+            BulkLoader.map_columns(['full_name'], STRUCTURE)
+
+    def test_map_columns_identity_and_generated(self):
+        """Identity columns are optional and generated columns are never written"""
+        indexes, columns, ignored = BulkLoader.map_columns(['amount', 'doubled'], IDENTITY_STRUCTURE)
+        self.assertEqual((indexes, columns, ignored), ([0], ['amount'], ['doubled']))
+
+        with self.assertRaises(BulkLoadError):
+            BulkLoader.map_columns(['amount', 'twice'], IDENTITY_STRUCTURE, {'twice': 'doubled'})
+
+    def test_connection_error(self):
+        """An unreachable database is reported as BulkLoadError"""
+        browser = MagicMock()
+        browser.get_table_structure.return_value = STRUCTURE
+        loader = BulkLoader(MagicMock(connection_params={}), browser)
+
+        with patch('src.bulk_loader.psycopg2.connect', side_effect=psycopg2.OperationalError("could not connect")):
+            with self.assertRaises(BulkLoadError):
+                loader.load(io.BytesIO(b'email\na@x\n'), 'users')
+
+    def test_prefetch_stops_after_consumer_aborts(self):
+        """The parser thread ends when the consumer stops early, even with the queue full"""
+        for finished in ('end', 'error'):
+            exhausted = threading.Event()
+
+            def batches():
+                yield 'first'
+                yield 'second'
+                exhausted.set()
+                if finished == 'error':
+                    raise ValueError("bad row")
+
+            stream = BulkLoader._prefetch(batches(), depth=1)
+            self.assertEqual(next(stream), 'first')
+            # The queue now holds 'second' and the end marker or error is waiting for room
+            self.assertTrue(exhausted.wait(5))
+            stream.close()
+
+        deadline = time.monotonic() + 5
+        while any(thread.name == 'bulk-load-parser' for thread in threading.enumerate()):
+            self.assertLess(time.monotonic(), deadline, "parser thread is still blocked")
+            time.sleep(0.05)
+
+    def test_batches(self):
+        """Rows are projected, padded and split into CSV batches"""
+        rows = iter([['a@x', 'skip', 'A'], ['b@x'], ['c@x', 'skip', 'C, Jr.']])
+        batches = list(BulkLoader._batches(rows, [0, 2], 2))
+
+        self.assertEqual([count for _, count in batches], [2, 1])
+        self.assertEqual(batches[0][0].getvalue(), 'a@x,A\nb@x,\n')
+        self.assertEqual(batches[1][0].getvalue(), 'c@x,"C, Jr."\n')
+
+    def test_jsonl_records(self):
+        """JSON values are converted for COPY, keeping nulls distinct from empty strings"""
+        first = {'email': 'a@x', 'full_name': None, 'tags': ['x']}
+        rows = list(BulkLoader._records_to_rows(first, iter([{'email': 'b@x', 'full_name': ''}]),
+                                                ['email', 'full_name', 'tags']))
+
+        self.assertEqual(rows[0], ['a@x', JSONL_NULL, '["x"]'])
+        self.assertEqual(rows[1], ['b@x', '', JSONL_NULL])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+"""
+Tests for multi-candidate generation and plan-cost selection
+"""
+
+import os
+import sys
+import json
+import unittest
+from decimal import Decimal
+from unittest.mock import MagicMock, patch
+
+# Add the src directory to the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.candidate_selector import CandidateSelector, result_fingerprint
+from src.sql_generator import SQLGenerator
+
+class TestCandidateSelector(unittest.TestCase):
+    """Test cost-based selection among equivalent candidates"""
+
+    def setUp(self):
+        self.connector = MagicMock()
+        self.sampler = MagicMock()
+        self.selector = CandidateSelector(self.connector, self.sampler)
+        self.costs = {}
+        self.selector._estimate = lambda query: self.costs[query]
+
+    def test_fingerprint_ignores_order_and_aliases(self):
+        """Row order, column names and numeric representation do not matter"""
+        self.assertEqual(
+            result_fingerprint([{'a': 1, 'n': Decimal('1.50')}, {'a': 2, 'n': Decimal('3')}]),
+            result_fingerprint([{'x': 2, 'total': 3}, {'x': 1, 'total': 1.5}])
+        )
+        self.assertNotEqual(result_fingerprint([{'a': 1}]), result_fingerprint([{'a': '1'}]))
+
+    def test_picks_cheapest_equivalent(self):
+        """The cheapest candidate agreeing with the majority wins; outliers are dropped"""
+        self.costs = {'SELECT q1': (900.0, 4, None), 'SELECT q2': (100.0, 4, None), 'SELECT q3': (50.0, 4, None)}
+        results = {'SELECT q1': [{'n': 1}], 'SELECT q2': [{'n': 1}], 'SELECT q3': [{'n': 2}]}
+        self.sampler.execute.side_effect = lambda query, seed: (True, results[query], {})
+
+        selection = self.selector.select(['SELECT q1', 'SELECT q2', 'SELECT q3'], seed=9)
+
+        self.assertEqual(selection['sql'], 'SELECT q2')
+        self.assertEqual(selection['equivalence'], 'checked')
+        self.assertEqual([c['equivalent'] for c in selection['candidates']], [True, True, False])
+        self.assertTrue(all(call.kwargs['seed'] == 9 for call in self.sampler.execute.call_args_list))
+
+    def test_unplannable_candidates_are_skipped(self):
+        """Candidates that fail EXPLAIN are reported but never chosen"""
+        self.costs = {'SELECT q1': (None, None, 'Could not plan: syntax error'), 'SELECT q2': (10.0, 1, None)}
+        self.sampler.execute.return_value = (True, [], {})
+
+        selection = self.selector.select(['SELECT q1', 'SELECT q2'])
+
+        self.assertEqual(selection['sql'], 'SELECT q2')
+        self.assertEqual(selection['equivalence'], 'inconclusive')
+        self.assertIsNone(selection['candidates'][0]['equivalent'])
+
+    def test_writes_keep_first_candidate(self):
+        """Write statements are not executed for comparison"""
+        self.costs = {'DELETE FROM a WHERE id IN (SELECT id FROM b)': (500.0, 1, None),
+                      'DELETE FROM a USING b WHERE a.id = b.id': (50.0, 1, None)}
+
+        selection = self.selector.select(list(self.costs))
+
+        self.assertEqual(selection['index'], 0)
+        self.assertEqual(selection['equivalence'], 'skipped')
+        self.sampler.execute.assert_not_called()
+
+    @patch('openai.OpenAI')
+    def test_generate_candidates(self, mock_openai):
+        """Candidates are parsed from one JSON response and deduplicated"""
+        mock_client = mock_openai.return_value
+        mock_client.chat.completions.create.return_value.choices[0].message.content = "```json\n" + json.dumps(
+            {'candidates': ['SELECT 1', 'select   1', 'SELECT 2']}) + "\n```"
+
+        candidates = SQLGenerator().generate_candidates({'operation_type': 'SELECT'}, 3)
+
+        self.assertEqual(candidates, ['SELECT 1', 'SELECT 2'])
+        self.assertEqual(mock_client.chat.completions.create.call_count, 1)
+
+if __name__ == "__main__":
+    unittest.main()
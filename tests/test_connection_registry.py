@@ -0,0 +1,128 @@
+"""
+Tests for the multi-database connection registry
+"""
+
+import os
+import sys
+import json
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+# Add the src directory to the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.connection_registry import ConnectionRegistry, ConnectionRegistryError, load_targets
+
+
+def fake_connector(connection_params):
+    """Connector double that connects without a database"""
+    connector = MagicMock()
+    connector.connection_params = connection_params
+    connector.conn = None
+
+    def connect():
+        connector.conn = MagicMock(closed=False)
+        connector.conn.get_transaction_status.return_value = 0
+        return True
+
+    def disconnect():
+        connector.conn = None
+
+    connector.connect.side_effect = connect
+    connector.disconnect.side_effect = disconnect
+    return connector
+
+
+class TestConnectionRegistry(unittest.TestCase):
+    """Test target resolution, pooling and eviction"""
+
+    def setUp(self):
+        patcher = patch('src.connection_registry.DBConnector', side_effect=fake_connector)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        drop = patch('src.connection_registry.drop_schema_cache')
+        self.drop_schema_cache = drop.start()
+        self.addCleanup(drop.stop)
+
+        self.default = MagicMock(connection_params={'host': 'localhost', 'database': 'sql_gpt'})
+        self.registry = ConnectionRegistry(
+            self.default,
+            targets={'a': 'host=a dbname=one', 'b': 'host=b dbname=two', 'c': 'host=c dbname=three'},
+            pool_size=2, max_pools=2, idle_seconds=300, acquire_timeout=0.05
+        )
+
+    def test_load_targets(self):
+        """Targets come from name=dsn pairs and a JSON file; bad names are rejected"""
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+            json.dump({'reports': 'host=r dbname=reports'}, f)
+        self.addCleanup(os.unlink, f.name)
+
+        targets = load_targets('sales=host=s dbname=sales, crm = postgresql://u@c/crm', f.name)
+        self.assertEqual(targets, {
+            'reports': 'host=r dbname=reports',
+            'sales': 'host=s dbname=sales',
+            'crm': 'postgresql://u@c/crm'
+        })
+        with self.assertRaises(ConnectionRegistryError):
+            load_targets('no-dsn', '')
+        with self.assertRaises(ConnectionRegistryError):
+            load_targets('default=host=x', '')
+
+    def test_default_and_unknown_targets(self):
+        """The default target is the application's connector; unknown names fail"""
+        self.assertIs(self.registry.acquire('default'), self.default)
+        with self.assertRaises(ConnectionRegistryError):
+            self.registry.acquire('missing')
+
+    def test_pool_reuses_and_bounds_connections(self):
+        """Released connections are reused and a full pool refuses after the timeout"""
+        first = self.registry.acquire('a')
+        self.assertEqual(first.connection_params, {'host': 'a', 'dbname': 'one'})
+        self.registry.release('a', first)
+        self.assertIs(self.registry.acquire('a'), first)
+
+        self.registry.acquire('a')
+        with self.assertRaises(ConnectionRegistryError):
+            self.registry.acquire('a')
+
+    def test_lru_idle_pool_is_evicted(self):
+        """At the pool limit the least recently used idle pool is closed"""
+        with self.registry.connection('a') as connector_a:
+            pass
+        busy = self.registry.acquire('b')
+        self.registry.acquire('c')
+
+        names = [entry['name'] for entry in self.registry.status() if entry['pool']]
+        self.assertEqual(names, ['b', 'c'])
+        connector_a.disconnect.assert_called()
+        self.drop_schema_cache.assert_called_once_with({'host': 'a', 'dbname': 'one'})
+
+        # Every remaining pool has a checked-out connection
+        self.registry.remove_target('a')
+        self.registry.add_target('d', 'host=d dbname=four')
+        with self.assertRaises(ConnectionRegistryError):
+            self.registry.acquire('d')
+        self.registry.release('b', busy)
+        self.assertEqual(self.registry.acquire('d').connection_params['host'], 'd')
+
+    def test_idle_connections_and_pools_expire(self):
+        """The sweep closes idle connections and drops pools nobody uses"""
+        self.registry.idle_seconds = 0
+        connector = self.registry.acquire('a')
+        self.registry.release('a', connector)
+
+        connector.disconnect.assert_called()
+        self.assertIsNone(self.registry.status()[1]['pool'])
+
+    def test_resolve_names_and_dsns(self):
+        """--db-connection accepts a target name or a connection string"""
+        self.assertEqual(self.registry.resolve('b'), {'host': 'b', 'dbname': 'two'})
+        self.assertEqual(self.registry.resolve('postgresql://u@h:5433/x'),
+                         {'user': 'u', 'host': 'h', 'port': '5433', 'dbname': 'x'})
+        with self.assertRaises(ConnectionRegistryError):
+            self.registry.resolve('unknown')
+
+
+if __name__ == '__main__':
+    unittest.main()
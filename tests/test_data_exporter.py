@@ -0,0 +1,153 @@
+"""
+Tests for the streaming data exporter
+"""
+
+import io
+import os
+import sys
+import gzip
+import time
+import datetime
+import unittest
+from unittest.mock import MagicMock, patch
+
+import psycopg2
+
+# Add the src directory to the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.data_exporter import DataExporter, ExportError, normalize_options, CHUNK_SIZE, QUEUE_DEPTH
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+
+def make_exporter():
+    """Exporter over a connector double"""
+    connector = MagicMock()
+    connector.connection_params = {'host': 'localhost', 'dbname': 'test'}
+    return DataExporter(connector)
+
+
+def copy_writing(*parts):
+    """copy_expert double writing the given parts to the output file"""
+    def copy_expert(statement, output):
+        for part in parts:
+            output.write(part)
+    return copy_expert
+
+
+class TestDataExporter(unittest.TestCase):
+    """Test option handling, CSV and Parquet streaming and the producer thread"""
+
+    def setUp(self):
+        patcher = patch('src.data_exporter.psycopg2.connect')
+        self.connect = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.conn = self.connect.return_value
+        self.cursor = self.conn.cursor.return_value.__enter__.return_value
+
+    def test_normalize_options(self):
+        """Format and compression are matched in any case; 'none' means no compression"""
+        self.assertEqual(normalize_options('CSV', 'GZIP'), ('csv', 'gzip'))
+        self.assertEqual(normalize_options(None, 'None'), ('csv', None))
+        self.assertEqual(normalize_options('Parquet', 'ZSTD'), ('parquet', 'zstd'))
+        with self.assertRaises(ExportError):
+            normalize_options('csv', 'zstd')
+        with self.assertRaises(ExportError):
+            normalize_options('xlsx', None)
+
+    def test_csv_stream(self):
+        """COPY output is streamed as it is written, wrapped around the SELECT"""
+        self.cursor.copy_expert.side_effect = copy_writing('id,name\n', '1,a\n', b'2,b\n')
+
+        body = b''.join(make_exporter().export_query('SELECT id, name FROM users -- all of them'))
+
+        self.assertEqual(body, b'id,name\n1,a\n2,b\n')
+        statement = self.cursor.copy_expert.call_args[0][0]
+        self.assertTrue(statement.startswith('COPY (\nSELECT id, name FROM users -- all of them\n) TO STDOUT'))
+        self.conn.set_session.assert_called_once_with(readonly=True)
+        self.conn.close.assert_called_once()
+
+    def test_gzip_csv_stream(self):
+        """Upper-case compression names produce gzip output"""
+        rows = ''.join(f"{i},name {i}\n" for i in range(50000))
+        self.cursor.copy_expert.side_effect = copy_writing('id,name\n', rows)
+
+        body = b''.join(make_exporter().export_query('SELECT id, name FROM users', 'csv', 'GZIP'))
+
+        self.assertEqual(gzip.decompress(body).decode('utf-8'), 'id,name\n' + rows)
+
+    def test_only_read_only_select(self):
+        """Statements that write or could close the COPY parentheses are refused"""
+        exporter = make_exporter()
+        for query in ("SELECT 1) TO PROGRAM 'touch /tmp/x' --",
+                      "SELECT 1; SELECT 2",
+                      "DELETE FROM users",
+                      "SELECT * INTO copy FROM users",
+                      "SELECT nextval('users_id_seq')"):
+            with self.assertRaises(ExportError, msg=query):
+                exporter.export_query(query)
+        self.connect.assert_not_called()
+
+    @unittest.skipIf(pq is None, "pyarrow is not installed")
+    def test_parquet_stream(self):
+        """Rows fetched through the server-side cursor are written as Parquet row groups"""
+        cursor = self.conn.cursor.return_value.__enter__.return_value
+        cursor.description = [MagicMock(type_code=23), MagicMock(type_code=25), MagicMock(type_code=1114)]
+        for column, name in zip(cursor.description, ('id', 'name', 'created_at')):
+            column.name = name
+        created = datetime.datetime(2024, 1, 1, 12, 0)
+        cursor.fetchmany.side_effect = [[(1, 'a', created), (2, None, created)], [(3, 'c', None)], []]
+
+        body = b''.join(make_exporter().export_query('SELECT id, name, created_at FROM users', 'PARQUET', 'Snappy'))
+
+        self.assertEqual(self.conn.cursor.call_args.kwargs, {'name': 'sql_gpt_export'})
+        table = pq.read_table(io.BytesIO(body))
+        self.assertEqual(table.column_names, ['id', 'name', 'created_at'])
+        self.assertEqual(table.column('id').to_pylist(), [1, 2, 3])
+        self.assertEqual(table.column('name').to_pylist(), ['a', None, 'c'])
+        self.assertEqual(pq.ParquetFile(io.BytesIO(body)).metadata.num_row_groups, 2)
+
+    def test_query_error_reaches_consumer(self):
+        """A database error in the producer thread is raised as ExportError"""
+        self.cursor.copy_expert.side_effect = psycopg2.errors.UndefinedTable('relation "nope" does not exist\nLINE 1')
+
+        with self.assertRaises(ExportError) as context:
+            make_exporter().export_query('SELECT * FROM nope')
+        self.assertEqual(str(context.exception), 'relation "nope" does not exist')
+        self.conn.close.assert_called_once()
+
+    def test_error_after_first_chunk(self):
+        """An error in the middle of the stream ends it with ExportError"""
+        def copy_expert(statement, output):
+            output.write(b'x' * CHUNK_SIZE)
+            raise psycopg2.OperationalError("server closed the connection unexpectedly")
+        self.cursor.copy_expert.side_effect = copy_expert
+
+        stream = make_exporter().export_query('SELECT 1')
+        self.assertEqual(len(next(stream)), CHUNK_SIZE)
+        with self.assertRaises(ExportError):
+            next(stream)
+
+    def test_abandoned_stream_stops_producer(self):
+        """Closing the stream early stops a producer blocked on the full queue"""
+        def copy_expert(statement, output):
+            for _ in range(QUEUE_DEPTH * 4):
+                output.write(b'x' * CHUNK_SIZE)
+        self.cursor.copy_expert.side_effect = copy_expert
+
+        stream = make_exporter().export_query('SELECT 1')
+        next(stream)
+        stream.close()
+
+        deadline = time.monotonic() + 10
+        while not self.conn.close.called and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.conn.close.assert_called_once()
+        self.conn.rollback.assert_not_called()
+
+if __name__ == "__main__":
+    unittest.main()
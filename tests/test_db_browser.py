@@ -0,0 +1,71 @@
+"""
+Tests for the database browser table listing
+"""
+
+import os
+import sys
+import unittest
+from unittest.mock import MagicMock
+
+# Add the src directory to the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.db_browser import DBBrowser
+
+class TestTableListing(unittest.TestCase):
+    """Test the paginated pg_class table list and per-page statistics"""
+
+    def setUp(self):
+        self.connector = MagicMock()
+        self.cursor = self.connector.conn.cursor.return_value.__enter__.return_value
+        self.browser = DBBrowser(self.connector)
+
+    def test_list_tables_page(self):
+        """The total and one page of tables are read from pg_class"""
+        self.cursor.fetchone.return_value = (250,)
+        self.cursor.fetchall.return_value = [('orders', 'public', None, False, False)]
+
+        page = self.browser.list_tables(limit=50, offset=100)
+
+        self.assertEqual(page['total'], 250)
+        self.assertEqual((page['limit'], page['offset']), (50, 100))
+        self.assertEqual(page['tables'][0]['table_name'], 'orders')
+        self.assertNotIn('estimated_rows', page['tables'][0])
+        count_call, page_call = self.connector.execute_prepared.call_args_list
+        self.assertIn('pg_catalog.pg_class', page_call.args[1])
+        self.assertNotIn('reltuples', page_call.args[1])
+        self.assertNotIn('information_schema', page_call.args[1].replace("'information_schema'", ''))
+        self.assertEqual(page_call.args[2][-2:], (50, 100))
+
+    def test_search_escapes_like_wildcards(self):
+        """Search terms match literally, not as LIKE patterns"""
+        self.cursor.fetchone.return_value = (0,)
+        self.cursor.fetchall.return_value = []
+
+        self.browser.list_tables(search='100%_x', schema_name='sales')
+
+        params = self.connector.execute_prepared.call_args_list[0].args[2]
+        self.assertEqual(params, ('sales', 'sales', '%100\\%\\_x%', '%100\\%\\_x%', False))
+
+    def test_table_stats_for_page(self):
+        """Column counts and sizes are fetched only for the requested tables"""
+        self.cursor.fetchall.return_value = [('public', 'orders', 5, 8192, 10)]
+
+        stats = self.browser.get_table_stats([('public', 'orders'), ('sales', 'missing')])
+
+        self.assertEqual(stats, [{'table_schema': 'public', 'table_name': 'orders',
+                                  'column_count': 5, 'table_size': 8192, 'estimated_rows': 10}])
+        params = self.connector.execute_prepared.call_args.args[2]
+        self.assertEqual(params, (['public', 'sales'], ['orders', 'missing']))
+
+    def test_list_tables_error_returns_empty_page(self):
+        """Database errors are logged and an empty page is returned"""
+        self.connector.execute_prepared.side_effect = Exception("boom")
+
+        page = self.browser.list_tables()
+
+        self.assertEqual(page['tables'], [])
+        self.connector.conn.rollback.assert_called_once()
+
+if __name__ == "__main__":
+    unittest.main()
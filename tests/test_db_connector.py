@@ -0,0 +1,119 @@
+"""
+Tests for the database connector
+"""
+
+import os
+import sys
+import unittest
+import psycopg2
+from unittest.mock import MagicMock
+
+# Add the src directory to the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.db_connector import DBConnector, split_sql_statements
+
+class TestDBConnector(unittest.TestCase):
+    """Test query limits and cancellation of the database connector"""
+
+    def setUp(self):
+        self.connector = DBConnector({'host': 'localhost', 'port': '5432', 'database': 'test'})
+        self.connector.conn = MagicMock()
+        self.connector.conn.closed = 0
+        self.cursor = self.connector.conn.cursor.return_value.__enter__.return_value
+
+    def test_timeouts_are_transaction_local(self):
+        """Timeouts are set with set_config(..., true) before the query runs"""
+        self.cursor.description = None
+        self.cursor.rowcount = 0
+
+        self.connector.execute_query("UPDATE users SET active = true", statement_timeout_ms=500, lock_timeout_ms=100)
+
+        calls = [call.args for call in self.cursor.execute.call_args_list]
+        self.assertEqual(calls[0], ("SELECT set_config(%s, %s, true);", ('statement_timeout', '500ms')))
+        self.assertEqual(calls[1], ("SELECT set_config(%s, %s, true);", ('lock_timeout', '100ms')))
+        self.assertEqual(calls[2], ("UPDATE users SET active = true", None))
+
+    def test_query_id_is_tagged_and_released(self):
+        """A query ID is tagged onto the SQL and can be reused after the query ends"""
+        self.cursor.description = None
+        self.cursor.rowcount = 1
+
+        success, _ = self.connector.execute_query("DELETE FROM users", query_id='abc-1')
+
+        self.assertTrue(success)
+        self.assertEqual(self.cursor.execute.call_args.args[0], "/* sql_gpt query_id=abc-1 */ DELETE FROM users")
+        self.assertEqual(self.connector._active_queries, {})
+
+    def test_cancel_running_query(self):
+        """A query running on this connector is cancelled through its connection"""
+        self.connector._active_queries['abc-1'] = {'cancelled': False}
+
+        success, _ = self.connector.cancel_query('abc-1')
+
+        self.assertTrue(success)
+        self.assertTrue(self.connector._active_queries['abc-1']['cancelled'])
+        self.connector.conn.cancel.assert_called_once()
+
+    def test_cancel_rejects_invalid_id(self):
+        """Query IDs are validated before they are used"""
+        success, _ = self.connector.cancel_query("x */ DROP TABLE users; --")
+        self.assertFalse(success)
+
+    def test_split_sql_statements(self):
+        """Scripts are split on statement boundaries only"""
+        statements = split_sql_statements(
+            "-- setup\nCREATE FUNCTION f() RETURNS int AS $$ SELECT 1; $$ LANGUAGE sql;\n"
+            "SELECT 'a;b';\n-- done\n"
+        )
+        self.assertEqual(len(statements), 2)
+        self.assertTrue(statements[0].endswith("LANGUAGE sql"))
+        self.assertEqual(statements[1], "SELECT 'a;b'")
+
+    def test_script_transaction_rolls_back_on_error(self):
+        """A failing statement rolls back the transaction and later statements are not run"""
+        self.cursor.description = None
+        self.cursor.rowcount = 1
+        self.cursor.execute.side_effect = [None, psycopg2.Error("boom"), None]
+
+        success, result = self.connector.execute_script(
+            "BEGIN; INSERT INTO t VALUES (1); INSERT INTO t VALUES (2); DELETE FROM t; COMMIT;"
+        )
+
+        self.assertFalse(success)
+        self.assertFalse(result['committed'])
+        self.assertEqual([entry['status'] for entry in result['statements']],
+                         ['skipped', 'rolled_back', 'failed', 'not_run', 'not_run'])
+        self.assertEqual(result['failed_statement'], 2)
+        self.connector.conn.commit.assert_not_called()
+
+    def test_script_autocommit_continues(self):
+        """In autocommit mode statements commit on their own and may continue past errors"""
+        self.cursor.description = None
+        self.cursor.rowcount = 0
+        self.cursor.execute.side_effect = [psycopg2.Error("boom"), None, None]
+
+        success, result = self.connector.execute_script(
+            "CREATE INDEX CONCURRENTLY i ON t (a); DROP INDEX j", mode='autocommit', stop_on_error=False
+        )
+
+        self.assertFalse(success)
+        self.assertTrue(result['committed'])
+        self.assertEqual([entry['status'] for entry in result['statements']], ['failed', 'succeeded'])
+        self.assertEqual(self.cursor.execute.call_args.args[0], "RESET statement_timeout; RESET lock_timeout;")
+        self.assertFalse(self.connector.conn.autocommit)
+
+    def test_script_autocommit_resets_timeouts_on_error(self):
+        """Session timeouts are reset even when shaping a result fails"""
+        self.cursor.description = [('a',)]
+        self.cursor.fetchall.return_value = [(1,)]
+        self.connector.shape_rows = MagicMock(side_effect=TypeError("bad row"))
+
+        success, _ = self.connector.execute_script("SELECT 1", mode='autocommit', statement_timeout_ms=500)
+
+        self.assertFalse(success)
+        self.assertEqual(self.cursor.execute.call_args.args[0], "RESET statement_timeout; RESET lock_timeout;")
+        self.assertFalse(self.connector.conn.autocommit)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+"""
+Tests for the batched UPDATE/DELETE rewriter
+"""
+
+import os
+import sys
+import unittest
+from unittest.mock import MagicMock, patch
+
+# Add the src directory to the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.dml_batcher import DMLBatcher, DMLBatchError, parse_target, chunk_statement
+
+class TestDMLBatcher(unittest.TestCase):
+    """Test statement parsing and batch rewriting"""
+
+    def test_parse_target(self):
+        """The target table and the qualifier for column references are found"""
+        target = parse_target("UPDATE public.orders AS o SET status = 'x' FROM customers c WHERE c.id = o.customer_id")
+        self.assertEqual((target['kind'], target['table'], target['qualifier']), ('UPDATE', 'public.orders', 'o'))
+        target = parse_target('DELETE FROM "Orders" WHERE id < 10')
+        self.assertEqual((target['table'], target['qualifier']), ('"Orders"', '"Orders"'))
+
+    def test_rejects_other_statements(self):
+        """Only single plain UPDATE/DELETE statements are batched"""
+        for query in ["SELECT 1", "DELETE FROM a; DELETE FROM b",
+                      "WITH x AS (SELECT 1) DELETE FROM a WHERE id IN (SELECT * FROM x)"]:
+            with self.assertRaises(DMLBatchError):
+                parse_target(query)
+
+    def test_chunk_statement(self):
+        """The range predicate is combined with the existing WHERE clause"""
+        target = parse_target("DELETE FROM orders o WHERE o.status = 'old' OR o.total = 0 RETURNING o.id;")
+        self.assertEqual(
+            chunk_statement(target, "o.id >= 1 AND o.id < 11"),
+            "DELETE FROM orders o WHERE (o.status = 'old' OR o.total = 0) AND o.id >= 1 AND o.id < 11 RETURNING o.id"
+        )
+        target = parse_target("UPDATE orders SET archived = true")
+        self.assertEqual(chunk_statement(target, "orders.id >= 1 AND orders.id < 11"),
+                         "UPDATE orders SET archived = true WHERE orders.id >= 1 AND orders.id < 11")
+
+    def test_ctid_predicates(self):
+        """ctid ranges use literals when running and variables in scripts"""
+        plan = {'strategy': 'ctid', 'column': 'orders.ctid'}
+        self.assertEqual(DMLBatcher._predicate(plan, '0', '50'),
+                         "orders.ctid >= '(0,0)'::tid AND orders.ctid < '(50,0)'::tid")
+        self.assertIn("format('(%s,0)', start + 50)::tid", DMLBatcher._predicate(plan, 'start', 'start + 50'))
+
+    def test_update_needs_integer_key(self):
+        """UPDATE is not batched by ctid, where updated rows move ahead of the loop; DELETE is"""
+        batcher = DMLBatcher(MagicMock(), batch_size=1000, large_table_rows=1000)
+        with patch('src.dml_batcher.psycopg2.connect') as connect:
+            cursor = connect.return_value.cursor.return_value.__enter__.return_value
+            cursor.fetchone.return_value = (16384, 5000000.0, 50000, 50000, None)
+
+            self.assertIsNone(batcher.should_batch("UPDATE page_views SET hits = hits + 1"))
+            with self.assertRaises(DMLBatchError):
+                batcher.plan("UPDATE page_views SET hits = hits + 1")
+            plan = batcher.should_batch("DELETE FROM page_views WHERE hits = 0")
+
+        self.assertEqual((plan['strategy'], plan['step'], plan['upper']), ('ctid', 10, 49999))
+
+    def test_script_is_resumable(self):
+        """The generated script registers its job and commits after each batch"""
+        batcher = DMLBatcher(MagicMock(), batch_size=1000, sleep_ms=50)
+        query = "DELETE FROM orders WHERE created < '2020-01-01'"
+        plan = {
+            'strategy': 'pk', 'key': 'id', 'column': 'orders."id"', 'lower': 1, 'upper': 5000, 'step': 1000,
+            'lower_sql': 'SELECT coalesce(min("id"), 0) FROM orders',
+            'upper_sql': 'SELECT coalesce(max("id"), -1) FROM orders',
+            'job_id': DMLBatcher.job_id(query, 'pk'), 'kind': 'DELETE', 'table': 'orders',
+            'estimated_rows': 5000, 'batches': 5, 'target': parse_target(query)
+        }
+        script = batcher.to_script(query, plan)
+        # An interrupted job resumes; a finished one starts over
+        self.assertIn("ON CONFLICT (job_id) DO UPDATE", script)
+        self.assertIn("WHERE sql_gpt_batch_progress.status = 'done'", script)
+        # The bounds are read when the script runs, not when it is generated
+        self.assertIn("(SELECT coalesce(max(\"id\"), -1) FROM orders)", script)
+        self.assertNotIn("5000", script.split('DO $sql_gpt_batch$')[1])
+        self.assertLess(script.index('DO $sql_gpt_batch$'), script.index('INSERT INTO sql_gpt_batch_progress'))
+        self.assertIn("AND orders.\"id\" >= sql_gpt_batch_start AND orders.\"id\" < sql_gpt_batch_start + 1000;",
+                      script)
+        self.assertIn("COMMIT;", script)
+        self.assertIn("pg_sleep(0.05)", script)
+        self.assertEqual(plan['job_id'], DMLBatcher.job_id(query + "\n", 'pk'))
+
+if __name__ == '__main__':
+    unittest.main()
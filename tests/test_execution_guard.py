@@ -0,0 +1,84 @@
+"""
+Tests for the pre-flight execution guard
+"""
+
+import os
+import sys
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+# Add the src directory to the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.execution_guard import ExecutionGuard, AsyncQueryRunner
+
+class TestExecutionGuard(unittest.TestCase):
+    """Test guard decisions with mocked plan estimates"""
+
+    def setUp(self):
+        self.guard = ExecutionGuard(max_cost=1000, max_rows=0, action='limit', limit_rows=100)
+        self.connector = MagicMock()
+
+    def estimates(self, *costs):
+        """Mock EXPLAIN to return the given costs in order"""
+        self.guard._estimate = MagicMock(side_effect=[[{'cost': cost, 'rows': 10}] for cost in costs])
+
+    def test_disabled_guard_allows_without_planning(self):
+        """Without thresholds nothing is planned"""
+        guard = ExecutionGuard(max_cost=0, max_rows=0)
+        guard._estimate = MagicMock()
+        decision = guard.check(self.connector, "SELECT * FROM orders")
+        self.assertEqual(decision['action'], 'allow')
+        guard._estimate.assert_not_called()
+
+    def test_cheap_query_is_allowed(self):
+        """Queries under the thresholds run unchanged"""
+        self.estimates(10)
+        decision = self.guard.check(self.connector, "SELECT * FROM orders")
+        self.assertEqual(decision['action'], 'allow')
+        self.assertEqual(decision['query'], "SELECT * FROM orders")
+
+    def test_expensive_select_is_limited(self):
+        """An expensive SELECT is wrapped in a LIMIT when that makes it cheap"""
+        self.estimates(5000, 20)
+        decision = self.guard.check(self.connector, "SELECT * FROM orders;")
+        self.assertEqual(decision['action'], 'limit')
+        self.assertTrue(decision['query'].endswith("LIMIT 100"))
+        self.assertIn("SELECT * FROM orders\n) AS guarded_query", decision['query'])
+
+    def test_refused_when_limit_does_not_help(self):
+        """Queries that stay expensive with a LIMIT, and non-SELECTs, are refused"""
+        self.estimates(5000, 4000)
+        self.assertEqual(self.guard.check(self.connector, "SELECT * FROM a ORDER BY x")['action'], 'refuse')
+        self.estimates(5000)
+        self.assertEqual(self.guard.check(self.connector, "DELETE FROM orders")['action'], 'refuse')
+
+    def test_async_action(self):
+        """The action can be overridden per query"""
+        self.estimates(5000)
+        decision = self.guard.check(self.connector, "SELECT * FROM orders", action='async')
+        self.assertEqual(decision['action'], 'async')
+        with self.assertRaises(ValueError):
+            self.guard.check(self.connector, "SELECT 1", action='skip')
+
+class TestAsyncQueryRunner(unittest.TestCase):
+    """Test the background runner"""
+
+    @patch('src.execution_guard.DBConnector')
+    def test_job_result(self, connector_class):
+        """Jobs run on their own connector and keep their result"""
+        connector_class.return_value.execute_query.return_value = (True, [{'count': 3}])
+        runner = AsyncQueryRunner(max_workers=1, retention_seconds=60)
+        job_id = runner.submit(MagicMock(), "SELECT count(*) FROM orders", query_id='q1')
+        for _ in range(50):
+            job = runner.get(job_id)
+            if job['status'] == 'succeeded':
+                break
+            time.sleep(0.01)
+        self.assertEqual(job['result'], [{'count': 3}])
+        connector_class.return_value.disconnect.assert_called_once()
+        self.assertIsNone(runner.get('missing'))
+
+if __name__ == '__main__':
+    unittest.main()
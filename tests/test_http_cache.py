@@ -0,0 +1,111 @@
+"""
+Tests for response compression, static asset versioning and schema ETags
+"""
+
+import os
+import sys
+import gzip
+import shutil
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+import psycopg2.extensions
+from flask import Flask, jsonify
+from werkzeug.http import parse_accept_header
+
+# Add the src directory to the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.http_cache import ResponseCompressor, StaticAssets, choose_encoding, schema_etag
+from src.schema_cache import SchemaCache
+
+
+def accept(header):
+    """Parsed Accept-Encoding header"""
+    return parse_accept_header(header)
+
+
+class TestHttpCache(unittest.TestCase):
+    """Test encoding negotiation, compression rules, static assets and ETags"""
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.compressor = ResponseCompressor(min_bytes=100)
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_choose_encoding(self):
+        """brotli wins ties when installed; q=0 and missing headers get no encoding"""
+        with patch('src.http_cache.brotli', None):
+            self.assertEqual(choose_encoding(accept('gzip, br')), 'gzip')
+        with patch('src.http_cache.brotli', object()):
+            self.assertEqual(choose_encoding(accept('gzip, br')), 'br')
+            self.assertEqual(choose_encoding(accept('gzip, br;q=0.5')), 'gzip')
+        self.assertIsNone(choose_encoding(accept('gzip;q=0')))
+        self.assertIsNone(choose_encoding(accept('')))
+
+    def test_compresses_large_json_only(self):
+        """Large JSON is gzipped with a weakened ETag; small and streamed responses are not"""
+        with patch('src.http_cache.brotli', None), self.app.test_request_context():
+            response = jsonify({'rows': list(range(200))})
+            response.set_etag('abc')
+            body = response.get_data()
+            self.compressor.compress(response, accept('gzip'))
+            self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+            self.assertEqual(gzip.decompress(response.get_data()), body)
+            self.assertEqual(response.get_etag(), ('abc', True))
+            self.assertIn('Accept-Encoding', response.vary)
+
+            small = self.compressor.compress(jsonify({'success': True}), accept('gzip'))
+            self.assertNotIn('Content-Encoding', small.headers)
+
+            streamed = self.app.response_class(iter([b'x' * 500]), mimetype='text/csv')
+            self.compressor.compress(streamed, accept('gzip'))
+            self.assertNotIn('Content-Encoding', streamed.headers)
+
+    def test_static_assets_versioned_and_cached(self):
+        """Versioned URLs are immutable; a changed file gets a new URL"""
+        path = os.path.join(self.directory, 'app.js')
+        with open(path, 'w') as f:
+            f.write('console.log("x");\n' * 50)
+        assets = StaticAssets(self.directory, self.compressor, max_age=3600)
+
+        url = assets.url('app.js')
+        version = url.split('?v=')[1]
+        with patch('src.http_cache.brotli', None):
+            response = assets.response('app.js', version, accept('gzip'))
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(response.get_etag(), (f"{version}-gzip", False))
+        self.assertTrue(response.cache_control.immutable)
+        self.assertEqual(response.cache_control.max_age, 3600)
+
+        self.assertTrue(assets.response('app.js', None, accept('')).cache_control.no_cache)
+        self.assertIsNone(assets.response('../app.js', None, accept('')))
+        self.assertEqual(assets.url('missing.js'), '/static/missing.js')
+
+        with open(path, 'a') as f:
+            f.write('console.log("y");\n')
+        os.utime(path, ns=(0, 10 ** 9))
+        self.assertNotEqual(assets.url('app.js'), url)
+
+    def test_schema_state_token(self):
+        """The token is the shared fingerprint once read, and changes with invalidations"""
+        cache = SchemaCache({'host': 'h'}, poll_interval=0, listen=False)
+        local = cache.state_token()
+        self.assertNotEqual(local, SchemaCache({'host': 'h'}, poll_interval=0, listen=False).state_token())
+
+        conn = MagicMock()
+        conn.cursor.return_value.__enter__.return_value.fetchone.return_value = ('1:10',)
+        conn.get_transaction_status.return_value = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+        cache.check(conn)
+        self.assertEqual(cache.state_token(), '1:10')
+
+        cache.invalidate("test")
+        self.assertNotIn(cache.state_token(), (local, '1:10'))
+        self.assertNotEqual(schema_etag('1:10', '/api/browser/tables?limit=5', 'default'),
+                            schema_etag('1:10', '/api/browser/tables?limit=6', 'default'))
+
+
+if __name__ == '__main__':
+    unittest.main()
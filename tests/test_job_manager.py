@@ -0,0 +1,218 @@
+"""
+Tests for background jobs, progress events and idempotent submission
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+# Add the src directory to the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.job_manager import JobManager, JobError
+from src.shared_cache import SharedCache
+
+
+class TestJobManager(unittest.TestCase):
+    """Test job execution, events, idempotency, limits and retention"""
+
+    def setUp(self):
+        self.manager = JobManager(max_workers=1, retention_seconds=60, max_pending=1)
+
+    def test_stage_events_and_result(self):
+        """Progress calls become events; the result is kept with the final state"""
+        def work(progress):
+            progress('intent')
+            progress('sql', candidates=2)
+            return True, {'sql': 'SELECT 1'}
+
+        job, created = self.manager.submit('process', work, request={'prompt': 'x'})
+        self.assertTrue(created)
+        job = self.manager.join(job['job_id'], timeout=5)
+
+        self.assertEqual(job['status'], 'succeeded')
+        self.assertEqual(job['result'], {'sql': 'SELECT 1'})
+        self.assertEqual([e['stage'] for e in job['events']], ['queued', 'running', 'intent', 'sql', 'succeeded'])
+        self.assertEqual(job['events'][3]['candidates'], 2)
+        self.assertNotIn('fingerprint', job)
+
+        _, events = self.manager.wait(job['job_id'], after=4)
+        self.assertEqual([e['stage'] for e in events], ['succeeded'])
+
+    def test_failures(self):
+        """Exceptions and unsuccessful results fail the job"""
+        def crash(progress):
+            raise RuntimeError("boom")
+
+        job, _ = self.manager.submit('execute', crash)
+        job = self.manager.join(job['job_id'], timeout=5)
+        self.assertEqual((job['status'], job['success'], job['result']), ('failed', False, 'boom'))
+
+        job, _ = self.manager.submit('execute', lambda progress: (False, 'syntax error'))
+        self.assertEqual(self.manager.join(job['job_id'], timeout=5)['status'], 'failed')
+
+    def test_idempotent_submission(self):
+        """A retried key returns the same job; a reused key with a different request is refused"""
+        calls = []
+        release = threading.Event()
+
+        def work(progress):
+            calls.append(1)
+            release.wait(5)
+            return True, 'done'
+
+        first, created = self.manager.submit('execute', work, request={'query': 'SELECT 1'}, idempotency_key='k')
+        retry, retried = self.manager.submit('execute', work, request={'query': 'SELECT 1'}, idempotency_key='k')
+        self.assertTrue(created)
+        self.assertFalse(retried)
+        self.assertEqual(retry['job_id'], first['job_id'])
+        with self.assertRaises(JobError):
+            self.manager.submit('execute', work, request={'query': 'SELECT 2'}, idempotency_key='k')
+
+        # Keys are scoped to the kind of job
+        other, created = self.manager.submit('process', lambda progress: (True, None), idempotency_key='k')
+        self.assertTrue(created)
+
+        release.set()
+        self.assertEqual(self.manager.join(first['job_id'], timeout=5)['result'], 'done')
+        self.assertEqual(len(calls), 1)
+
+    def test_pending_limit_and_wait_timeout(self):
+        """Submissions beyond the workers plus the pending limit are refused"""
+        release = threading.Event()
+        blocking = lambda progress: (release.wait(5), (True, None))[1]
+        running, _ = self.manager.submit('execute', blocking)
+        self.manager.submit('execute', blocking)
+        with self.assertRaises(JobError):
+            self.manager.submit('execute', blocking)
+
+        job, events = self.manager.wait(running['job_id'], after=10, timeout=0.05)
+        self.assertEqual(events, [])
+        self.assertEqual(self.manager.join(running['job_id'], timeout=0.05)['status'], 'running')
+        self.assertEqual(self.manager.stats()['counts']['queued'], 1)
+        release.set()
+
+    def test_retention(self):
+        """Finished jobs and their keys are forgotten after the retention period"""
+        manager = JobManager(max_workers=1, retention_seconds=0.05)
+        job, _ = manager.submit('execute', lambda progress: (True, 1), idempotency_key='k')
+        manager.join(job['job_id'], timeout=5)
+        time.sleep(0.1)
+
+        self.assertIsNone(manager.get(job['job_id']))
+        self.assertIsNone(manager.wait(job['job_id'], timeout=0))
+        _, created = manager.submit('execute', lambda progress: (True, 2), idempotency_key='k')
+        self.assertTrue(created)
+
+
+class TestSharedJobs(unittest.TestCase):
+    """Test jobs followed and retried through another worker's job manager"""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        cache = SharedCache(os.path.join(directory, 'shared.sqlite3'))
+        # Two managers over one file stand for two gunicorn workers
+        self.submitting = JobManager(max_workers=1, retention_seconds=60, shared_cache=cache, poll_interval=0.01)
+        self.reading = JobManager(max_workers=1, retention_seconds=60,
+                                  shared_cache=SharedCache(cache.path), poll_interval=0.01)
+        for manager in (self.submitting, self.reading):
+            self.addCleanup(manager._executor.shutdown)
+
+    def test_state_events_and_result_are_shared(self):
+        """Another manager sees the stage events as they happen and the final result"""
+        release = threading.Event()
+
+        def work(progress):
+            progress('intent')
+            release.wait(5)
+            return True, {'sql': 'SELECT 1'}
+
+        job, _ = self.submitting.submit('process', work, request={'prompt': 'x'})
+        job_id = job['job_id']
+
+        _, events = self.reading.wait(job_id, after=2, timeout=5)
+        self.assertEqual([e['stage'] for e in events], ['intent'])
+        self.assertEqual(self.reading.get(job_id)['status'], 'running')
+
+        release.set()
+        job = self.reading.join(job_id, timeout=5)
+        self.assertEqual((job['status'], job['result']), ('succeeded', {'sql': 'SELECT 1'}))
+        self.assertNotIn('fingerprint', job)
+        self.assertIsNone(self.reading.get('unknown'))
+
+    def test_idempotent_retry_on_another_manager(self):
+        """A retry reaching another worker attaches to the running job instead of running it again"""
+        calls = []
+        release = threading.Event()
+
+        def work(progress):
+            calls.append(1)
+            release.wait(5)
+            return True, 'done'
+
+        first, created = self.submitting.submit('execute', work, request={'query': 'SELECT 1'},
+                                                idempotency_key='k')
+        retry, retried = self.reading.submit('execute', work, request={'query': 'SELECT 1'}, idempotency_key='k')
+        self.assertTrue(created)
+        self.assertFalse(retried)
+        self.assertEqual(retry['job_id'], first['job_id'])
+        with self.assertRaises(JobError):
+            self.reading.submit('execute', work, request={'query': 'SELECT 2'}, idempotency_key='k')
+
+        release.set()
+        self.assertEqual(self.reading.join(first['job_id'], timeout=5)['result'], 'done')
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(self.reading.stats()['counts']['succeeded'], 0)
+
+    def test_progress_writes_are_throttled(self):
+        """Bursts of progress are written at most once per poll interval, the last one included"""
+        cache = self.submitting.shared_cache
+        manager = JobManager(max_workers=1, retention_seconds=60, shared_cache=cache, poll_interval=0.2)
+        self.addCleanup(manager._executor.shutdown)
+        release = threading.Event()
+
+        def work(progress):
+            for row in range(100):
+                progress('loading', rows=row + 1)
+            release.wait(5)
+            return True, None
+
+        with patch.object(cache, 'set', wraps=cache.set) as written:
+            job, _ = manager.submit('execute', work)
+            _, events = self.reading.wait(job['job_id'], after=101, timeout=5)
+            self.assertEqual(events[-1]['rows'], 100)
+            release.set()
+            manager.join(job['job_id'], timeout=5)
+        self.assertLess(written.call_count, 10)
+
+    def test_shared_writes_do_not_block_readers(self):
+        """Status requests are answered while the job's state is being written"""
+        cache = self.submitting.shared_cache
+        writing, release = threading.Event(), threading.Event()
+        set_entry = cache.set
+
+        def slow_set(namespace, key, value, ttl=None):
+            if namespace == 'job' and value['stage'] == 'intent':
+                writing.set()
+                release.wait(5)
+            set_entry(namespace, key, value, ttl)
+
+        with patch.object(cache, 'set', side_effect=slow_set):
+            job, _ = self.submitting.submit('process', lambda progress: (progress('intent'), release.wait(5),
+                                                                         (True, 1))[2])
+            self.assertTrue(writing.wait(5))
+            started = time.monotonic()
+            self.assertEqual(self.submitting.get(job['job_id'])['events'][2]['stage'], 'intent')
+            self.assertLess(time.monotonic() - started, 1)
+            release.set()
+            self.assertEqual(self.reading.join(job['job_id'], timeout=5)['status'], 'succeeded')
+
+
+if __name__ == '__main__':
+    unittest.main()
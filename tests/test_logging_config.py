@@ -0,0 +1,119 @@
+"""
+Tests for redaction, queue-based logging and sampled request logging
+"""
+
+import os
+import sys
+import json
+import logging
+import unittest
+from unittest.mock import patch
+
+from flask import Flask, g, jsonify
+
+# Add the src directory to the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.logging_config import RequestLogger, JsonFormatter, RedactingFormatter, TEXT_FORMAT, redact
+from src.web_interface import FailureNotingJSONProvider
+
+
+class TestLoggingConfig(unittest.TestCase):
+    """Test redaction, JSON records, sampling and payload capping"""
+
+    def setUp(self):
+        self.request_logger = RequestLogger(sample_rates={'/api/execute': 0.0}, default_rate=1.0,
+                                            max_payload_bytes=32, slow_ms=500)
+
+    def test_redact(self):
+        """API keys, URI passwords and secret fields are masked"""
+        line = ('key sk-abcdefghijklmnop dsn postgresql://app:hunter2@db/sql_gpt '
+                'password=hunter2 {"api_key": "xyz", "token":"t0k"} Authorization: Bearer abc.def')
+        redacted = redact(line)
+        for secret in ('abcdefghijklmnop', 'hunter2', 'xyz', 't0k', 'abc.def'):
+            self.assertNotIn(secret, redacted)
+        self.assertIn('postgresql://app:***@db/sql_gpt', redacted)
+        self.assertIn('"api_key": "***"', redacted)
+
+    def test_json_formatter_includes_extra_fields(self):
+        """Fields passed with extra= become top-level keys"""
+        record = logging.LogRecord('sql_gpt.requests', logging.INFO, __file__, 1, "GET /api/schema %s", (200,), None)
+        record.endpoint = '/api/schema'
+        record.request_payload = '{"password": "secret"}'
+        entry = json.loads(JsonFormatter().format(record))
+        self.assertEqual(entry['message'], 'GET /api/schema 200')
+        self.assertEqual(entry['endpoint'], '/api/schema')
+        self.assertEqual(entry['request_payload'], '{"password": "***"}')
+
+    def test_text_formatter_includes_extra_fields(self):
+        """Request fields and payloads are appended to text lines, redacted, before any traceback"""
+        record = logging.LogRecord('sql_gpt.requests', logging.INFO, __file__, 1, 'POST /api/connect 200', None, None)
+        record.status = 200
+        record.response_bytes = None
+        record.request_payload = '{"password": "hunter2", "host": "db"}'
+        line = RedactingFormatter(TEXT_FORMAT).format(record)
+        self.assertTrue(line.endswith('200 status=200 request_payload="{\\"password\\": \\"***\\", \\"host\\": \\"db\\"}"'))
+        self.assertNotIn('hunter2', line)
+        self.assertNotIn('response_bytes', line)
+
+        try:
+            raise RuntimeError("boom")
+        except RuntimeError:
+            record.exc_info = sys.exc_info()
+        self.assertIn('status=200', RedactingFormatter(TEXT_FORMAT).format(record).splitlines()[0])
+
+    def test_sampling(self):
+        """Endpoint rates apply to normal requests; failures and slow requests are always logged"""
+        self.assertFalse(self.request_logger.should_log('/api/execute', 200, 10))
+        self.assertTrue(self.request_logger.should_log('/api/execute', 500, 10))
+        self.assertTrue(self.request_logger.should_log('/api/execute', 200, 600))
+        self.assertTrue(self.request_logger.should_log('/api/schema', 200, 10))
+
+        with patch('src.logging_config.random.random', return_value=0.3):
+            self.request_logger.configure(sample_rates={'/api/execute': 0.5})
+            self.assertTrue(self.request_logger.should_log('/api/execute', 200, 10))
+            self.request_logger.configure(sample_rates={'/api/execute': 0.2})
+            self.assertFalse(self.request_logger.should_log('/api/execute', 200, 10))
+        self.request_logger.configure(sample_rates={'/api/execute': None})
+        self.assertEqual(self.request_logger.settings()['sample_rates'], {})
+
+        with self.assertRaises(ValueError):
+            self.request_logger.configure(default_rate=2)
+        self.assertEqual(RequestLogger.parse_rates('/api/execute=0.1, /api/schema=0'),
+                         {'/api/execute': 0.1, '/api/schema': 0.0})
+
+    def test_success_false_counts_as_failure(self):
+        """Failures reported as 200 with "success": false are always logged, as warnings"""
+        app = Flask(__name__)
+        app.json = FailureNotingJSONProvider(app)
+        with app.test_request_context():
+            jsonify({'success': True, 'result': [{'success': False}]})
+            self.assertFalse(g.get('request_failed', False))
+            jsonify({'success': False, 'error': 'relation "x" does not exist'})
+            self.assertTrue(g.request_failed)
+        self.assertTrue(self.request_logger.should_log('/api/execute', 200, 10, failed=True))
+
+        with self.assertLogs('sql_gpt.requests', level='INFO') as logs:
+            self.request_logger.log_request('POST', '/api/execute', '/api/execute', 200, 10,
+                                            response_body=b'{"success":false}', failed=True)
+        self.assertEqual(logs.records[0].levelname, 'WARNING')
+        self.assertTrue(logs.records[0].failed)
+
+    def test_payloads_are_capped(self):
+        """Bodies are cut before decoding and logged with their full size"""
+        body = json.dumps({'rows': list(range(1000))}).encode()
+        with self.assertLogs('sql_gpt.requests', level='INFO') as logs:
+            self.request_logger.log_request('POST', '/api/execute', '/api/execute', 200, 12.5,
+                                            request_body=b'{"query": "SELECT 1"}', response_body=body,
+                                            response_bytes=len(body))
+        record = logs.records[0]
+        self.assertEqual(record.request_payload, '{"query": "SELECT 1"}')
+        self.assertEqual(record.response_payload, body[:32].decode() + f"... ({len(body)} bytes)")
+        self.assertEqual(record.status, 200)
+
+        self.request_logger.configure(max_payload_bytes=0)
+        self.assertIsNone(self.request_logger.payload(body))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+"""
+Tests for the lock-aware migration executor
+"""
+
+import os
+import sys
+import unittest
+import psycopg2
+from unittest.mock import MagicMock
+
+# Add the src directory to the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.migration_executor import MigrationExecutor, plan_steps, extract_migration_sql, migration_id_of
+
+PLAIN_SCRIPT = """-- Migration: create_index_users
+-- Migration ID: 20240101120000
+
+-- Transaction to ensure the migration is atomic
+BEGIN;
+
+-- Forward migration
+ALTER TABLE users ADD COLUMN age integer;
+CREATE INDEX idx_users_age ON users (age);
+
+-- To roll back this migration, run the following SQL:
+/*
+-- Rollback migration
+DROP INDEX idx_users_age;
+*/
+
+COMMIT;
+"""
+
+class TestMigrationExecutor(unittest.TestCase):
+    """Test step planning and lock retries"""
+
+    def test_plan_steps(self):
+        """Transaction control is dropped and index builds run concurrently"""
+        steps = plan_steps(extract_migration_sql(PLAIN_SCRIPT))
+        self.assertEqual([step['sql'] for step in steps], [
+            "ALTER TABLE users ADD COLUMN age integer",
+            "CREATE INDEX CONCURRENTLY idx_users_age ON users (age)"
+        ])
+        self.assertEqual([step['transactional'] for step in steps], [True, False])
+        self.assertEqual(migration_id_of(PLAIN_SCRIPT), '20240101120000')
+
+    def test_drop_index_rewrite(self):
+        """Only single-index drops without CASCADE are made concurrent"""
+        self.assertEqual(plan_steps("DROP INDEX idx_a")[0]['sql'], "DROP INDEX CONCURRENTLY idx_a")
+        self.assertEqual(plan_steps("DROP INDEX idx_a, idx_b")[0]['sql'], "DROP INDEX idx_a, idx_b")
+        self.assertEqual(plan_steps("CREATE INDEX idx_a ON t (a)", concurrent_indexes=False)[0]['sql'],
+                         "CREATE INDEX idx_a ON t (a)")
+
+    def test_alembic_upgrade_is_extracted(self):
+        """Only the upgrade() SQL of an Alembic script is applied"""
+        script = (
+            "revision = '42'\n\ndef upgrade():\n    op.execute(\"\"\"\nCREATE TABLE a (id int);\n    \"\"\")\n\n\n"
+            "def downgrade():\n    op.execute(\"\"\"\nDROP TABLE a;\n    \"\"\")\n"
+        )
+        self.assertEqual(extract_migration_sql(script), "CREATE TABLE a (id int);")
+        self.assertEqual(migration_id_of(script), '42')
+
+    def test_lock_timeouts_are_retried(self):
+        """Lock timeouts back off and retry; other errors fail the step at once"""
+        executor = MigrationExecutor(MagicMock(), lock_timeout_ms=100, max_retries=3, base_delay=1, max_delay=4)
+        executor.sleep = MagicMock()
+        executor._run_transactional = MagicMock(
+            side_effect=[psycopg2.errors.LockNotAvailable("lock timeout"),
+                         psycopg2.errors.LockNotAvailable("lock timeout"), None]
+        )
+        step = {'index': 0, 'sql': "ALTER TABLE users ADD COLUMN age integer", 'transactional': True}
+        executor._run_step(None, step)
+        self.assertEqual((step['status'], step['attempts']), ('succeeded', 3))
+        delays = [call.args[0] for call in executor.sleep.call_args_list]
+        self.assertTrue(0.5 <= delays[0] <= 1 and 1 <= delays[1] <= 2)
+
+        executor._run_transactional = MagicMock(side_effect=psycopg2.errors.UndefinedTable("missing"))
+        executor._run_step(None, step)
+        self.assertEqual((step['status'], step['attempts']), ('failed', 1))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+"""
+Tests for the partition manager
+"""
+
+import os
+import sys
+import unittest
+from datetime import date
+from unittest.mock import MagicMock
+
+# Add the src directory to the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.partition_manager import (
+    PartitionManager, PartitionError, add_interval, truncate_to_interval, infer_interval
+)
+
+def _table(partitions, default=None, key_type='date', server_version=160000):
+    """Inspected table as returned by PartitionManager.inspect"""
+    return {
+        'table': '"public"."events"',
+        'schema': 'public',
+        'name': 'events',
+        'key': 'created_on',
+        'key_type': key_type,
+        'default_partition': default,
+        'partitions': partitions,
+        'max_key': None,
+        'server_version': server_version,
+        'now': MagicMock(date=MagicMock(return_value=date(2024, 6, 15)))
+    }
+
+class TestPartitionManager(unittest.TestCase):
+    """Test interval arithmetic, planning and script rendering"""
+
+    def setUp(self):
+        self.manager = PartitionManager(MagicMock(), premake=2, retention='3 months', retention_action='detach')
+        self.partitions = [
+            {'name': f'"public"."events_p2024_{m:02d}"', 'lower': date(2024, m, 1),
+             'upper': date(2024, m + 1, 1), 'estimated_rows': 0}
+            for m in range(1, 7)
+        ]
+
+    def test_interval_arithmetic(self):
+        """Intervals are added and truncated on calendar boundaries"""
+        self.assertEqual(add_interval(date(2024, 1, 31), 'month'), date(2024, 2, 29))
+        self.assertEqual(add_interval(date(2024, 12, 1), 'month', 2), date(2025, 2, 1))
+        self.assertEqual(add_interval(100, 50, 3), 250)
+        self.assertEqual(truncate_to_interval(date(2024, 6, 15), 'month'), date(2024, 6, 1))
+        self.assertEqual(truncate_to_interval(date(2024, 6, 15), 'week'), date(2024, 6, 10))
+        self.assertEqual(infer_interval(date(2024, 5, 1), date(2024, 6, 1)), 'month')
+        self.assertEqual(infer_interval(1000, 2000), 1000)
+
+    def test_plan_creates_ahead_and_retires_expired(self):
+        """Partitions are created `premake` intervals ahead and expired ones retired"""
+        self.manager.inspect = MagicMock(return_value=_table(self.partitions))
+
+        plan = self.manager.plan('events')
+
+        self.assertEqual(plan['interval'], 'month')
+        self.assertEqual([p['lower'] for p in plan['create']], [date(2024, 7, 1), date(2024, 8, 1)])
+        self.assertEqual(plan['create'][0]['name'], '"public"."events_p2024_07"')
+        self.assertEqual([p['upper'] for p in plan['retire']], [date(2024, 2, 1), date(2024, 3, 1)])
+        self.assertEqual(plan['notes'], [])
+
+    def test_plan_does_not_backfill_gaps(self):
+        """A table whose partitions ended long ago continues at the current interval"""
+        self.manager.inspect = MagicMock(return_value=_table(self.partitions[:2]))
+
+        plan = self.manager.plan('events')
+
+        self.assertEqual(plan['create'][0]['lower'], date(2024, 6, 1))
+        self.assertEqual(len(plan['notes']), 1)
+        self.assertIn('rejected', plan['notes'][0])
+
+    def test_script_detaches_concurrently_without_default(self):
+        """Expired partitions are detached concurrently when no default partition exists"""
+        self.manager.inspect = MagicMock(return_value=_table(self.partitions))
+
+        script = self.manager.to_script(self.manager.plan('events'))
+
+        self.assertIn('CREATE TABLE IF NOT EXISTS "public"."events_p2024_07" PARTITION OF "public"."events"', script)
+        self.assertIn("FOR VALUES FROM ('2024-07-01') TO ('2024-08-01');", script)
+        self.assertIn('DETACH PARTITION "public"."events_p2024_01" CONCURRENTLY;', script)
+        self.assertNotIn('DROP TABLE', script)
+
+    def test_script_moves_rows_out_of_default_partition(self):
+        """With a default partition, spilled rows move into the new partition before it is attached"""
+        manager = PartitionManager(MagicMock(), premake=1, retention='3 months', retention_action='drop')
+        manager.inspect = MagicMock(return_value=_table(self.partitions, default='"public"."events_default"'))
+
+        script = manager.to_script(manager.plan('events'))
+
+        self.assertIn('DELETE FROM "public"."events_default" WHERE "created_on" >= \'2024-07-01\'', script)
+        self.assertIn('ATTACH PARTITION "public"."events_p2024_07"', script)
+        self.assertIn('DETACH PARTITION "public"."events_p2024_01";', script)
+        self.assertIn('DROP TABLE IF EXISTS "public"."events_p2024_01";', script)
+
+    def test_rejects_invalid_settings(self):
+        """Retention and retention action are validated"""
+        with self.assertRaises(PartitionError):
+            PartitionManager(MagicMock(), retention='soon')
+        with self.assertRaises(PartitionError):
+            PartitionManager(MagicMock(), retention_action='archive')
+
+if __name__ == "__main__":
+    unittest.main()
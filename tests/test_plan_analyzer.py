@@ -0,0 +1,104 @@
+"""
+Tests for the plan analyzer and index advisor
+"""
+
+import os
+import sys
+import unittest
+from unittest.mock import MagicMock, patch
+
+import psycopg2
+
+# Add the src directory to the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.plan_analyzer import PlanAnalyzer, PlanAnalysisError
+
+TABLES = {
+    ('public', 'orders'): {'rows': 200000, 'columns': ['id', 'customer_id', 'status', 'created']},
+    ('public', 'customers'): {'rows': 5000, 'columns': ['id', 'name']}
+}
+
+def seq_scan(relation, alias, condition, rows=100):
+    """Build a sequential scan plan node"""
+    return {
+        'Node Type': 'Seq Scan',
+        'Schema': 'public',
+        'Relation Name': relation,
+        'Alias': alias,
+        'Filter': condition,
+        'Plan Rows': rows
+    }
+
+class TestPlanAnalyzer(unittest.TestCase):
+    """Test issue detection and index candidates on synthetic plans"""
+
+    def setUp(self):
+        self.analyzer = PlanAnalyzer(MagicMock(), large_table_rows=10000, misestimate_factor=10)
+
+    def test_seq_scan_on_large_table(self):
+        """Sequential scans are flagged on large tables only"""
+        plan = {
+            'Node Type': 'Hash Join',
+            'Hash Cond': '(o.customer_id = c.id)',
+            'Plans': [
+                seq_scan('orders', 'o', "(o.status = 'new'::text)"),
+                {'Node Type': 'Hash', 'Plans': [seq_scan('customers', 'c', None)]}
+            ]
+        }
+        issues = self.analyzer.find_issues(plan, TABLES, analyzed=False)
+        self.assertEqual([issue['type'] for issue in issues], ['seq_scan'])
+        self.assertEqual(issues[0]['relation'], 'public.orders')
+
+    def test_misestimate_and_spills(self):
+        """Bad row estimates, disk sorts and hash batches are reported"""
+        plan = {
+            'Node Type': 'Sort',
+            'Sort Key': ['o.created'],
+            'Sort Method': 'external merge',
+            'Sort Space Type': 'Disk',
+            'Sort Space Used': 4096,
+            'Plan Rows': 50,
+            'Actual Rows': 90000,
+            'Actual Loops': 1,
+            'Plans': [{'Node Type': 'Hash', 'Hash Batches': 4, 'Plan Rows': 10,
+                       'Actual Rows': 12, 'Actual Loops': 1}]
+        }
+        types = [issue['type'] for issue in self.analyzer.find_issues(plan, {}, analyzed=True)]
+        self.assertEqual(types, ['misestimate', 'disk_sort', 'hash_spill'])
+        # Without ANALYZE there are no actual rows to compare
+        types = [issue['type'] for issue in self.analyzer.find_issues(plan, {}, analyzed=False)]
+        self.assertNotIn('misestimate', types)
+
+    def test_candidate_indexes(self):
+        """Equality columns lead the composite candidate, followed by a range column"""
+        plan = seq_scan('orders', 'o', "((o.created > '2024-06-01'::date) AND (o.customer_id = 42))")
+        candidates = self.analyzer.candidate_indexes(plan, TABLES)
+        self.assertEqual(candidates[0], (('public', 'orders'), ['customer_id', 'created']))
+        self.assertIn((('public', 'orders'), ['customer_id']), candidates)
+
+    def test_join_columns_are_candidates(self):
+        """Join columns of a scanned large table are proposed"""
+        plan = {
+            'Node Type': 'Hash Join',
+            'Hash Cond': '(o.customer_id = c.id)',
+            'Plans': [seq_scan('orders', 'o', None), seq_scan('customers', 'c', None)]
+        }
+        candidates = self.analyzer.candidate_indexes(plan, TABLES)
+        self.assertEqual(candidates, [(('public', 'orders'), ['customer_id'])])
+
+    def test_rejects_other_statements(self):
+        """Only a single SELECT, UPDATE or DELETE can be analyzed"""
+        with self.assertRaises(PlanAnalysisError):
+            self.analyzer.analyze("DROP TABLE orders")
+        with self.assertRaises(PlanAnalysisError):
+            self.analyzer.analyze("SELECT 1; SELECT 2")
+
+    def test_connection_error(self):
+        """An unreachable database is reported as PlanAnalysisError"""
+        with patch('src.plan_analyzer.psycopg2.connect', side_effect=psycopg2.OperationalError("could not connect")):
+            with self.assertRaises(PlanAnalysisError):
+                self.analyzer.analyze("SELECT * FROM orders")
+
+if __name__ == '__main__':
+    unittest.main()
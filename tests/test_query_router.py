@@ -0,0 +1,90 @@
+"""
+Tests for read replica routing
+"""
+
+import os
+import sys
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+
+# Add the src directory to the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.query_router import QueryRouter, statement_kind, is_read_only
+
+class TestQueryRouter(unittest.TestCase):
+    """Test statement classification and replica selection"""
+
+    def setUp(self):
+        self.primary = MagicMock()
+        self.router = QueryRouter(self.primary, ['host=replica1 dbname=test'], max_lag_seconds=5, health_interval=60)
+        self.replica = MagicMock()
+        self.router.replicas = [self.replica]
+        self.router._check_replica = MagicMock(return_value={'healthy': True, 'lag_seconds': 0.0, 'error': None})
+
+    def test_statement_kind(self):
+        """Statements are labelled by their first statement, ignoring comments"""
+        self.assertEqual(statement_kind("/* report */ select 1"), 'SELECT')
+        self.assertEqual(statement_kind("CREATE TABLE t (id int)"), 'CREATE_TABLE')
+        self.assertEqual(statement_kind("create index i on t (id)"), 'OTHER')
+
+    def test_is_read_only(self):
+        """Only plain SELECTs are read-only"""
+        self.assertTrue(is_read_only("WITH a AS (SELECT 1) SELECT * FROM a"))
+        self.assertFalse(is_read_only("WITH a AS (DELETE FROM t RETURNING *) SELECT * FROM a"))
+        self.assertFalse(is_read_only("SELECT * FROM t FOR UPDATE"))
+        self.assertFalse(is_read_only("SELECT nextval('t_id_seq')"))
+        self.assertFalse(is_read_only("SELECT 1; DROP TABLE t"))
+
+    def test_reads_go_to_healthy_replica(self):
+        """Reads use a healthy replica and writes use the primary"""
+        self.assertIs(self.router.connector_for("SELECT * FROM users"), self.replica)
+        self.assertIs(self.router.connector_for("UPDATE users SET active = false"), self.primary)
+
+    def test_lagging_replica_falls_back_to_primary(self):
+        """A replica behind by more than the allowed lag is skipped"""
+        self.router._check_replica.return_value = {'healthy': False, 'lag_seconds': 30.0, 'error': 'lag'}
+        self.assertIs(self.router.read_connector(), self.primary)
+
+    def test_reads_after_write_use_primary(self):
+        """Reads right after a write go to the primary"""
+        self.primary.execute_query.return_value = (True, "Query executed successfully. Rows affected: 1")
+        self.router.execute_query("INSERT INTO users (email) VALUES ('a@x')")
+        self.assertIs(self.router.connector_for("SELECT * FROM users"), self.primary)
+
+    def test_check_keeps_dsn_connect_timeout(self):
+        """A connect_timeout in the replica DSN is used instead of the default"""
+        router = QueryRouter(self.primary, ['host=replica1 dbname=test connect_timeout=10'])
+        with patch('src.query_router.psycopg2.connect') as connect:
+            connect.return_value.cursor.return_value.__enter__.return_value.fetchone.return_value = (0,)
+            self.assertTrue(router._check_replica(router.replicas[0])['healthy'])
+        self.assertEqual(connect.call_args.kwargs['connect_timeout'], '10')
+
+        router = QueryRouter(self.primary, ['host=replica1 dbname=test'])
+        with patch('src.query_router.psycopg2.connect') as connect:
+            router._check_replica(router.replicas[0])
+        self.assertEqual(connect.call_args.kwargs['connect_timeout'], 3)
+
+    def test_check_runs_outside_lock(self):
+        """A slow health check does not block other callers of the router"""
+        started, release = threading.Event(), threading.Event()
+
+        def slow_check(replica):
+            started.set()
+            release.wait(5)
+            return {'healthy': True, 'lag_seconds': 0.0, 'error': None}
+        self.router._check_replica = slow_check
+
+        reader = threading.Thread(target=self.router.read_connector)
+        reader.start()
+        self.assertTrue(started.wait(5))
+        # The replica is being checked and not known to be healthy yet
+        self.assertIs(self.router.read_connector(), self.primary)
+        self.router.note_write()
+        release.set()
+        reader.join(5)
+        self.assertTrue(self.router.status()[0]['healthy'])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+"""
+Tests for the read-only query result cache
+"""
+
+import os
+import sys
+import unittest
+from unittest.mock import MagicMock
+
+# Add the src directory to the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.result_cache import ResultCache, normalize_sql, function_names
+
+def make_connector():
+    """Create a mock connector returning one row per execution"""
+    connector = MagicMock()
+    connector.schema_cache.version = 1
+    connector.execute_query.return_value = (True, [{'id': 1}])
+    return connector
+
+class TestResultCache(unittest.TestCase):
+    """Test keys, invalidation and limits of the result cache"""
+
+    def setUp(self):
+        self.cache = ResultCache(max_bytes=1024, ttl_seconds=60)
+        self.cache._shape = MagicMock(return_value={'cacheable': True, 'relations': ['"public"."users"']})
+        self.markers = [((16384, 16384, 10, 0, 0),)]
+        self.cache._markers = MagicMock(side_effect=lambda connector, relations: self.markers[0])
+
+    def test_normalize_sql(self):
+        """Comments, whitespace and keyword case are normalized; literals are not"""
+        self.assertEqual(
+            normalize_sql("select  id -- note\nfrom users where name = 'a  b';"),
+            normalize_sql("SELECT id FROM users WHERE name = 'a  b'")
+        )
+        self.assertNotEqual(normalize_sql("SELECT 'a  b'"), normalize_sql("SELECT 'a b'"))
+
+    def test_function_names(self):
+        """Function calls are collected for the volatility check"""
+        self.assertEqual(function_names("SELECT count(*), now() FROM users"), ['count', 'now'])
+
+    def test_hit_until_table_changes(self):
+        """Results are served from the cache until the table markers change"""
+        connector = make_connector()
+
+        self.assertFalse(self.cache.execute(connector, "SELECT * FROM users")[2])
+        self.assertTrue(self.cache.execute(connector, "select * from users")[2])
+
+        self.markers[0] = ((16384, 16384, 11, 0, 0),)
+        self.assertFalse(self.cache.execute(connector, "SELECT * FROM users")[2])
+        self.assertEqual(connector.execute_query.call_count, 2)
+        self.assertEqual(self.cache.stats()['stale'], 1)
+
+    def test_uncacheable_queries_run_every_time(self):
+        """Queries with non-immutable functions bypass the cache"""
+        connector = make_connector()
+        self.cache._shape.return_value = {'cacheable': False, 'relations': []}
+
+        self.cache.execute(connector, "SELECT now()")
+        self.cache.execute(connector, "SELECT now()")
+
+        self.assertEqual(connector.execute_query.call_count, 2)
+        self.assertEqual(self.cache.stats()['uncacheable'], 2)
+
+    def test_memory_cap_evicts_oldest(self):
+        """The least recently used entries are evicted to stay under the cap"""
+        connector = make_connector()
+        connector.execute_query.return_value = (True, [{'name': 'x' * 200}])
+
+        for number in range(6):
+            self.cache.execute(connector, f"SELECT {number} FROM users")
+
+        stats = self.cache.stats()
+        self.assertLessEqual(stats['bytes'], 1024)
+        self.assertGreater(stats['evictions'], 0)
+
+if __name__ == "__main__":
+    unittest.main()
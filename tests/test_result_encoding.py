@@ -0,0 +1,55 @@
+"""
+Tests for the columnar result encoding
+"""
+
+import os
+import sys
+import json
+import unittest
+from decimal import Decimal
+from datetime import date
+
+# Add the src directory to the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.result_encoding import EncodingError, to_columnar, negotiate_format, encode
+
+COLUMNS = [{'name': 'id', 'type': 'integer'}, {'name': 'price', 'type': 'numeric'}]
+
+class TestResultEncoding(unittest.TestCase):
+    """Test columnar shaping, format negotiation and encoding"""
+
+    def test_to_columnar(self):
+        """Rows are transposed into one value array per column"""
+        result = to_columnar(COLUMNS, [(1, Decimal('9.50')), (2, None)])
+
+        self.assertEqual(result['data'], [[1, 2], [Decimal('9.50'), None]])
+        self.assertEqual(result['row_count'], 2)
+
+    def test_to_columnar_empty(self):
+        """An empty result keeps one empty array per column"""
+        self.assertEqual(to_columnar(COLUMNS, [])['data'], [[], []])
+
+    def test_negotiate_format(self):
+        """Explicit formats win over the Accept header; unknown formats are rejected"""
+        self.assertEqual(negotiate_format('Columnar'), 'columnar')
+        self.assertEqual(negotiate_format(None, 'application/vnd.apache.arrow.stream'), 'arrow')
+        self.assertEqual(negotiate_format(None, 'application/json'), 'rows')
+        with self.assertRaises(EncodingError):
+            negotiate_format('xml')
+
+    def test_encode_columnar_json(self):
+        """Values JSON cannot represent natively are converted to strings"""
+        result = to_columnar(COLUMNS + [{'name': 'day', 'type': 'date'}], [(1, Decimal('9.50'), date(2024, 1, 2))])
+        body, mimetype = encode({'success': True, 'result': result}, 'columnar')
+
+        self.assertEqual(mimetype, 'application/json')
+        self.assertEqual(json.loads(body)['result']['data'], [[1], ['9.50'], ['2024-01-02']])
+
+    def test_encode_arrow_requires_result_set(self):
+        """Arrow encoding is refused for results without rows"""
+        with self.assertRaises(EncodingError):
+            encode({'success': True, 'result': 'Query executed successfully'}, 'arrow')
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+"""
+Tests for the parallel multi-database rollout engine
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+
+# Add the src directory to the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.rollout_engine import RolloutEngine, RolloutLedger, RolloutError
+
+SCRIPT = "-- Migration ID: add_column\nALTER TABLE t ADD COLUMN c int;\n"
+
+
+class FakeExecutor:
+    """Migration executor double that fails on chosen databases"""
+
+    def __init__(self, calls, failing, lock, delay=0.0):
+        self.calls = calls
+        self.failing = failing
+        self.lock = lock
+        self.delay = delay
+        self.active = 0
+        self.peak = 0
+
+    def __call__(self, connector):
+        executor = MagicMock()
+        executor.apply.side_effect = lambda script, migration_id: self._apply(connector.target)
+        return executor
+
+    def _apply(self, target):
+        with self.lock:
+            self.calls.append(target)
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(self.delay)
+        with self.lock:
+            self.active -= 1
+        if target in self.failing:
+            return {'success': False, 'failed_step': 0,
+                    'steps': [{'index': 0, 'error': 'column "c" already exists'}]}
+        return {'success': True, 'failed_step': None, 'steps': []}
+
+
+class TestRolloutEngine(unittest.TestCase):
+    """Test parallelism, canaries, halting and ledger-based reruns"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.ledger = RolloutLedger(os.path.join(self.directory, 'ledger.sqlite3'))
+
+        self.registry = MagicMock()
+        self.registry.names.return_value = ['default'] + [f"t{i}" for i in range(1, 9)]
+        self.registry.resolve.side_effect = lambda name: {'dbname': name}
+        patcher = patch('src.rollout_engine.DBConnector',
+                        side_effect=lambda params: MagicMock(target=params['dbname']))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.calls = []
+        self.executor = FakeExecutor(self.calls, set(), threading.Lock())
+
+    def engine(self, parallelism=3, canary=1):
+        return RolloutEngine(self.registry, self.ledger, parallelism=parallelism, canary=canary,
+                             executor_factory=self.executor)
+
+    def test_bounded_parallelism_with_canary_first(self):
+        """The canary runs alone first; the rest never exceed the parallelism"""
+        self.executor.delay = 0.05
+        summaries = []
+        result = self.engine().run(SCRIPT, ['all'], progress_callback=summaries.append)
+
+        self.assertTrue(result['success'])
+        self.assertEqual(self.calls[0], 't1')
+        self.assertEqual(sorted(self.calls), [f"t{i}" for i in range(1, 9)])
+        self.assertEqual(self.executor.peak, 3)
+        self.assertEqual(result['summary']['counts']['succeeded'], 8)
+        self.assertEqual(summaries[0]['running'], ['t1'])
+        self.assertEqual(summaries[1]['counts']['succeeded'], 1)
+
+    def test_failed_canary_stops_rollout(self):
+        """Nothing else starts when the canary fails, even without halt_on_error"""
+        self.executor.failing.add('t1')
+        result = self.engine().run(SCRIPT, ['t1', 't2', 't3'], halt_on_error=False)
+
+        self.assertFalse(result['success'])
+        self.assertTrue(result['halted'])
+        self.assertEqual(self.calls, ['t1'])
+        self.assertEqual([t['status'] for t in result['targets']], ['failed', 'halted', 'halted'])
+        self.assertEqual(result['targets'][0]['error'], 'Step 1: column "c" already exists')
+
+    def test_halt_on_error_and_continue(self):
+        """halt_on_error stops scheduling; otherwise every target is attempted"""
+        self.executor.failing.add('t2')
+        result = self.engine(parallelism=1, canary=0).run(SCRIPT, ['t1', 't2', 't3', 't4'])
+        self.assertEqual(self.calls, ['t1', 't2'])
+        self.assertEqual([t['status'] for t in result['targets']], ['succeeded', 'failed', 'halted', 'halted'])
+
+        result = self.engine(parallelism=1, canary=0).run(SCRIPT, ['t1', 't2', 't3', 't4'], halt_on_error=False)
+        self.assertEqual(self.calls, ['t1', 't2', 't2', 't3', 't4'])
+        self.assertFalse(result['halted'])
+        self.assertEqual(result['summary']['counts'], {
+            'pending': 0, 'running': 0, 'succeeded': 2, 'failed': 1, 'halted': 0, 'skipped': 1
+        })
+
+    def test_rerun_skips_succeeded_targets(self):
+        """The ledger survives between runs, so finished targets are skipped"""
+        self.executor.failing.add('t3')
+        self.engine(canary=0).run(SCRIPT, ['t1', 't2', 't3'], halt_on_error=False)
+        entries = RolloutLedger(self.ledger.path).entries('add_column')
+        self.assertEqual({t: e['status'] for t, e in entries.items()},
+                         {'t1': 'succeeded', 't2': 'succeeded', 't3': 'failed'})
+
+        self.executor.failing.clear()
+        del self.calls[:]
+        plan = self.engine(canary=1).plan(SCRIPT, ['t1', 't2', 't3'])
+        self.assertEqual((plan['canary'], plan['to_run'], plan['done']), (['t3'], [], ['t1', 't2']))
+        result = self.engine().run(SCRIPT, ['t1', 't2', 't3'])
+        self.assertTrue(result['success'])
+        self.assertEqual(self.calls, ['t3'])
+        self.assertEqual(self.ledger.entries('add_column')['t3']['attempts'], 2)
+
+    def test_unknown_target(self):
+        """Targets must be registered"""
+        with self.assertRaises(RolloutError):
+            self.engine().run(SCRIPT, ['t1', 'nope'])
+
+
+if __name__ == '__main__':
+    unittest.main()
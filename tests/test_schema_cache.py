@@ -0,0 +1,90 @@
+"""
+Tests for the schema metadata cache
+"""
+
+import os
+import sys
+import unittest
+from unittest.mock import MagicMock
+
+import psycopg2.extensions
+
+# Add the src directory to the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.schema_cache import SchemaCache
+
+def make_connection(fingerprints):
+    """Create a mock connection whose fingerprint query returns the given values"""
+    conn = MagicMock()
+    cursor = conn.cursor.return_value.__enter__.return_value
+    cursor.fetchone.side_effect = [(fingerprint,) for fingerprint in fingerprints]
+    conn.get_transaction_status.return_value = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+    return conn
+
+class TestSchemaCache(unittest.TestCase):
+    """Test the versioned schema cache"""
+
+    def setUp(self):
+        self.cache = SchemaCache({'host': 'localhost'}, poll_interval=0, listen=False)
+
+    def test_hit_after_load(self):
+        """Values are loaded once and served from the cache afterwards"""
+        loader = MagicMock(return_value=['users'])
+
+        self.assertEqual(self.cache.get(('tables',), loader), ['users'])
+        self.assertEqual(self.cache.get(('tables',), loader), ['users'])
+        self.assertEqual(loader.call_count, 1)
+
+    def test_invalidate_bumps_version(self):
+        """Invalidation drops entries and increments the version"""
+        loader = MagicMock(return_value=['users'])
+        self.cache.get(('tables',), loader)
+        version = self.cache.version
+
+        self.cache.invalidate("test")
+        self.cache.get(('tables',), loader)
+
+        self.assertEqual(self.cache.version, version + 1)
+        self.assertEqual(loader.call_count, 2)
+
+    def test_loader_errors_are_not_cached(self):
+        """A failing loader leaves the cache empty"""
+        failing = MagicMock(side_effect=RuntimeError("boom"))
+        with self.assertRaises(RuntimeError):
+            self.cache.get(('tables',), failing)
+
+        loader = MagicMock(return_value=[])
+        self.cache.get(('tables',), loader)
+        self.assertEqual(loader.call_count, 1)
+
+    def test_fingerprint_change_invalidates(self):
+        """A changed catalog fingerprint invalidates the cache"""
+        conn = make_connection(['1:10', '1:10', '2:15'])
+        loader = MagicMock(return_value=['users'])
+
+        self.cache.get(('tables',), loader, conn)
+        self.cache.get(('tables',), loader, conn)
+        self.assertEqual(loader.call_count, 1)
+
+        version = self.cache.version
+        self.cache.get(('tables',), loader, conn)
+        self.assertEqual(loader.call_count, 2)
+        self.assertEqual(self.cache.version, version + 1)
+
+    def test_open_transaction_is_left_alone(self):
+        """The check neither queries nor ends a transaction someone else opened"""
+        conn = make_connection(['1:10'])
+        conn.get_transaction_status.return_value = psycopg2.extensions.TRANSACTION_STATUS_INTRANS
+
+        self.assertFalse(self.cache.check(conn, force=True))
+        conn.cursor.assert_not_called()
+        conn.commit.assert_not_called()
+        conn.rollback.assert_not_called()
+
+        conn.get_transaction_status.return_value = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+        self.cache.check(conn, force=True)
+        self.assertEqual(self.cache.state_token(), '1:10')
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,158 @@
+"""
+Tests for scatter-gather execution across shards
+"""
+
+import os
+import sys
+import unittest
+from collections import namedtuple
+from unittest.mock import MagicMock
+
+# Add the src directory to the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.connection_registry import ConnectionRegistryError
+from src.shard_executor import ShardExecutor, ShardError, plan_query
+
+Column = namedtuple('Column', 'name type_code')
+
+TEXT_OID, INTEGER_OID = 25, 23
+
+
+def fake_shard(columns, rows, collation=('en_US.UTF-8', 'c')):
+    """Connector double whose server-side cursor returns fixed rows"""
+    connector = MagicMock()
+    types = [TEXT_OID if any(isinstance(row[i], str) for row in rows) else INTEGER_OID
+             for i in range(len(columns))]
+    cursor = MagicMock(closed=False, description=[Column(name, oid) for name, oid in zip(columns, types)])
+    remaining = list(rows)
+
+    def fetchmany(size):
+        batch = remaining[:size]
+        del remaining[:size]
+        return batch
+
+    cursor.fetchmany.side_effect = fetchmany
+    plain = MagicMock()
+    plain.__enter__.return_value.fetchone.return_value = collation
+    connector.conn.cursor.side_effect = lambda name=None: cursor if name else plain
+    connector.shape_rows.side_effect = lambda description, rows, row_format: [
+        dict(zip(columns, row)) for row in rows
+    ]
+    connector.cursor = cursor
+    return connector
+
+
+class TestShardExecutor(unittest.TestCase):
+    """Test query planning and result merging"""
+
+    def setUp(self):
+        self.shards = {}
+        self.registry = MagicMock()
+        self.registry.acquire.side_effect = self._acquire
+        self.executor = ShardExecutor(self.registry, ['s1', 's2', 's3'], max_workers=3, fetch_size=2)
+
+    def _acquire(self, name):
+        if name not in self.shards:
+            raise ConnectionRegistryError(f"Unknown target '{name}'")
+        return self.shards[name]
+
+    def test_plan_pushes_limit_and_rejects_unmergeable(self):
+        """LIMIT + OFFSET is pushed to ordered shards; unsupported shapes are refused"""
+        plan = plan_query("SELECT id FROM t ORDER BY id DESC LIMIT 5 OFFSET 10;")
+        self.assertEqual(plan['merge'], 'ordered')
+        self.assertEqual(plan['shard_query'], "SELECT id FROM t ORDER BY id DESC\nLIMIT 15")
+
+        plan = plan_query("SELECT a, count(*) FROM t GROUP BY a LIMIT 3")
+        self.assertEqual(plan['merge'], 'aggregate')
+        self.assertEqual(plan['shard_query'], "SELECT a, count(*) FROM t GROUP BY a")
+
+        for query in ("SELECT avg(x) FROM t", "SELECT count(DISTINCT a) FROM t",
+                      "SELECT a, count(*) FROM t GROUP BY a, b", "SELECT a, count(*) FROM t GROUP BY ROLLUP (a)",
+                      "SELECT sum(x) / count(*) FROM t", "SELECT a FROM t UNION SELECT a FROM u",
+                      "SELECT a, row_number() OVER () FROM t", "DELETE FROM t"):
+            with self.assertRaises(ShardError, msg=query):
+                plan_query(query)
+
+    def test_ordered_merge_streams_limit(self):
+        """Sorted shard results are k-way merged with PostgreSQL NULL ordering"""
+        self.shards = {
+            's1': fake_shard(['id'], [(9,), (6,), (1,)]),
+            's2': fake_shard(['id'], [(None,), (8,), (2,)]),
+            's3': fake_shard(['id'], [(7,), (5,), (4,), (3,)])
+        }
+        success, result, report = self.executor.execute("SELECT id FROM t ORDER BY id DESC LIMIT 3 OFFSET 1")
+        self.assertTrue(success, result)
+        self.assertEqual([row['id'] for row in result], [9, 8, 7])
+        self.assertEqual(report['merge'], 'ordered')
+        # Shards are read lazily in batches, not drained
+        self.assertLess(sum(entry['rows'] for entry in report['shards']), 10)
+        for name in self.shards:
+            self.registry.release.assert_any_call(name, self.shards[name])
+
+    def test_reaggregates_groups(self):
+        """Counts and sums add up and minimums and maximums combine across shards"""
+        self.shards = {
+            's1': fake_shard(['g', 'n', 's', 'lo', 'hi'], [('a', 2, 10, 1, 5), ('b', 1, None, 3, 3)]),
+            's2': fake_shard(['g', 'n', 's', 'lo', 'hi'], [('a', 3, 5, 0, 4)]),
+            's3': fake_shard(['g', 'n', 's', 'lo', 'hi'], [('b', 4, 7, 2, 9), ('c', 1, 1, 1, 1)])
+        }
+        success, result, report = self.executor.execute(
+            "SELECT g, count(*) AS n, sum(x) s, min(x) lo, max(x) AS hi FROM t GROUP BY g ORDER BY n DESC LIMIT 2"
+        )
+        self.assertTrue(success, result)
+        self.assertEqual(result, [
+            {'g': 'a', 'n': 5, 's': 15, 'lo': 0, 'hi': 5},
+            {'g': 'b', 'n': 5, 's': 7, 'lo': 2, 'hi': 9}
+        ])
+        self.assertEqual(report['merge'], 'aggregate')
+
+    def test_group_keys_by_alias_and_position(self):
+        """GROUP BY may name selected columns by expression, alias or position"""
+        for query in ("SELECT lower(a) AS k, count(*) FROM t GROUP BY k",
+                      "SELECT t.a, b, sum(x) FROM t GROUP BY t.a, 2",
+                      "SELECT lower(a) k, max(x) FROM t GROUP BY lower(a)"):
+            self.assertEqual(plan_query(query)['merge'], 'aggregate', query)
+
+    def test_text_order_needs_code_point_collation(self):
+        """Ordered merges on text are refused unless the shards sort text by code point"""
+        rows = [('B',), ('a',)]
+        self.shards = {name: fake_shard(['name'], rows) for name in ('s1', 's2', 's3')}
+        success, result, _ = self.executor.execute("SELECT name FROM t ORDER BY name LIMIT 2")
+        self.assertFalse(success)
+        self.assertIn('COLLATE "C"', result)
+
+        self.shards = {name: fake_shard(['name'], rows) for name in ('s1', 's2', 's3')}
+        success, result, _ = self.executor.execute('SELECT name FROM t ORDER BY name COLLATE "C" LIMIT 2')
+        self.assertTrue(success, result)
+        self.assertEqual(result, [{'name': 'B'}, {'name': 'B'}])
+
+        self.shards = {name: fake_shard(['name'], rows, ('C', 'c')) for name in ('s1', 's2', 's3')}
+        success, result, _ = self.executor.execute("SELECT name FROM t ORDER BY name")
+        self.assertTrue(success, result)
+
+    def test_shard_failures(self):
+        """A failing shard fails the query unless partial results are allowed"""
+        self.shards = {'s1': fake_shard(['id'], [(1,)]), 's2': fake_shard(['id'], [(2,)])}
+        success, result, report = self.executor.execute("SELECT id FROM t")
+        self.assertFalse(success)
+        self.assertIn("s3: Unknown target 's3'", result)
+
+        self.shards = {'s1': fake_shard(['id'], [(1,)]), 's2': fake_shard(['id'], [(2,)])}
+        success, result, report = self.executor.execute("SELECT id FROM t", allow_partial=True)
+        self.assertTrue(success)
+        self.assertEqual(result, [{'id': 1}, {'id': 2}])
+        self.assertTrue(report['partial'])
+        self.assertEqual([entry['error'] is None for entry in report['shards']], [True, True, False])
+        self.assertTrue(all(entry['latency_ms'] is not None for entry in report['shards']))
+
+    def test_order_by_must_name_output_column(self):
+        """Merging needs the ORDER BY values in the result"""
+        self.shards = {name: fake_shard(['id'], [(1,)]) for name in ('s1', 's2', 's3')}
+        success, result, _ = self.executor.execute("SELECT id FROM t ORDER BY created_at")
+        self.assertFalse(success)
+        self.assertIn("ORDER BY created_at", result)
+
+
+if __name__ == '__main__':
+    unittest.main()
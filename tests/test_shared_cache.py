@@ -0,0 +1,170 @@
+"""
+Tests for the cache shared by web worker processes
+"""
+
+import os
+import sys
+import time
+import shutil
+import sqlite3
+import tempfile
+import datetime
+import threading
+import unittest
+from decimal import Decimal
+from unittest.mock import MagicMock, patch
+
+import psycopg2.extensions
+
+# Add the src directory to the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.shared_cache import SharedCache, SharedCacheError, LLMCache, get_shared_cache
+from src.schema_cache import SchemaCache
+
+
+def make_client(content):
+    """OpenAI client double answering every completion with the same content"""
+    client = MagicMock()
+    client.chat.completions.create.return_value.choices = [MagicMock(message=MagicMock(content=content))]
+    return client
+
+
+def make_connection(fingerprint):
+    """Connection double whose fingerprint query returns the given value"""
+    conn = MagicMock()
+    conn.cursor.return_value.__enter__.return_value.fetchone.return_value = (fingerprint,)
+    conn.get_transaction_status.return_value = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+    return conn
+
+
+class TestSharedCache(unittest.TestCase):
+    """Test the SQLite-backed cache and its LLM and schema users"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, 'shared.sqlite3')
+        self.cache = SharedCache(self.path, default_ttl=60)
+
+    def test_entries_visible_to_other_instances(self):
+        """Entries written through one instance are read through another until they expire"""
+        self.cache.set('schema', ('db', 'fp', 'tables'), ['users'])
+        self.cache.set('schema', 'short', 1, ttl=-1)
+
+        other = SharedCache(self.path)
+        self.assertEqual(other.lookup('schema', ('db', 'fp', 'tables')), (True, ['users']))
+        self.assertEqual(other.lookup('schema', 'short'), (False, None))
+        self.assertEqual(other.lookup('llm', ('db', 'fp', 'tables')), (False, None))
+        self.assertEqual(other.stats()['entries'], {'schema': 1})
+
+    def test_values_are_stored_as_json(self):
+        """Values round-trip with their types without being unpickled"""
+        value = {
+            'rows': [{'id': 1, 'total': Decimal('9.90'), 'paid': datetime.datetime(2024, 1, 2, 3, 4, 5),
+                      'due': datetime.date(2024, 2, 1), 'took': datetime.timedelta(seconds=90),
+                      'raw': b'\x00\xff', 'flags': None}],
+            'key': ('public', 'orders'),
+            'by_oid': {16384: 'orders'},
+            '__shared_cache__': 'not a tag'
+        }
+        self.cache.set('job', 'j', value)
+        self.assertEqual(SharedCache(self.path).lookup('job', 'j'), (True, value))
+
+        with sqlite3.connect(self.path) as conn:
+            stored = conn.execute("SELECT value FROM entries WHERE namespace = 'job';").fetchone()[0]
+            conn.execute("UPDATE entries SET value = ?;", (b'\x80\x04\x95',))
+        self.assertIn(b'"9.90"', stored)
+        self.assertEqual(self.cache.lookup('job', 'j'), (False, None))
+
+    @unittest.skipIf(os.name != 'posix', "file modes are POSIX only")
+    def test_cache_must_be_private(self):
+        """The directory and file are created private; ones others can write to are refused"""
+        path = os.path.join(self.directory, 'private', 'shared.sqlite3')
+        SharedCache(path)
+        self.assertEqual(os.stat(os.path.dirname(path)).st_mode & 0o777, 0o700)
+        self.assertEqual(os.stat(path).st_mode & 0o777, 0o600)
+
+        open_directory = os.path.join(self.directory, 'open')
+        os.mkdir(open_directory)
+        os.chmod(open_directory, 0o777)
+        with self.assertRaises(SharedCacheError):
+            SharedCache(os.path.join(open_directory, 'shared.sqlite3'))
+
+        with patch('src.shared_cache.os.getuid', return_value=os.getuid() + 1):
+            with self.assertRaises(SharedCacheError):
+                SharedCache(self.path)
+            with patch.dict(os.environ, {'SHARED_CACHE_PATH': path}):
+                with self.assertRaises(SharedCacheError):
+                    get_shared_cache()
+
+    def test_get_or_set_computes_once(self):
+        """Concurrent misses for one key run the computation once"""
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return 'value'
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(SharedCache(self.path).get_or_set('llm', 'k', compute)))
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, ['value'] * 4)
+        self.assertEqual(len(calls), 1)
+
+    def test_failed_computation_is_not_stored(self):
+        """Exceptions propagate, release the claim and leave nothing behind"""
+        with self.assertRaises(RuntimeError):
+            self.cache.get_or_set('llm', 'k', MagicMock(side_effect=RuntimeError("boom")))
+        self.assertEqual(self.cache.get_or_set('llm', 'k', lambda: 'ok', wait=0.5), 'ok')
+
+    def test_llm_cache(self):
+        """Identical requests reuse the answer; different or uncached requests call the API"""
+        client = make_client('{"sql": "SELECT 1"}')
+        llm_cache = LLMCache(self.cache, ttl=60)
+        request = {'model': 'gpt-4', 'messages': [{'role': 'user', 'content': 'one'}]}
+
+        self.assertEqual(llm_cache.complete(client, **request), '{"sql": "SELECT 1"}')
+        self.assertEqual(LLMCache(SharedCache(self.path), ttl=60).complete(client, **request), '{"sql": "SELECT 1"}')
+        self.assertEqual(client.chat.completions.create.call_count, 1)
+
+        llm_cache.complete(client, model='gpt-4', messages=[{'role': 'user', 'content': 'two'}])
+        self.assertEqual(client.chat.completions.create.call_count, 2)
+
+        disabled = LLMCache(self.cache, ttl=0)
+        self.assertFalse(disabled.enabled)
+        disabled.complete(client, **request)
+        self.assertEqual(client.chat.completions.create.call_count, 3)
+
+        with patch.dict(os.environ, {'SHARED_CACHE_PATH': ''}):
+            self.assertIsNone(get_shared_cache())
+            self.assertFalse(LLMCache().enabled)
+
+    def test_schema_cache_shares_entries_by_fingerprint(self):
+        """A second worker reuses metadata loaded for the same catalog fingerprint"""
+        with patch.dict(os.environ, {'SHARED_CACHE_PATH': self.path}):
+            first = SchemaCache({'host': 'h', 'dbname': 'd', 'password': 'a'}, poll_interval=0, listen=False)
+            second = SchemaCache({'host': 'h', 'dbname': 'd', 'password': 'b'}, poll_interval=0, listen=False)
+        loader = MagicMock(return_value=['users'])
+
+        first.get(('tables',), loader, make_connection('1:10'))
+        self.assertEqual(second.get(('tables',), loader, make_connection('1:10')), ['users'])
+        self.assertEqual(loader.call_count, 1)
+
+        # A different catalog is a different entry
+        third_loader = MagicMock(return_value=['users', 'orders'])
+        second.invalidate("test")
+        self.assertEqual(second.get(('tables',), third_loader, make_connection('2:12')), ['users', 'orders'])
+        self.assertEqual(third_loader.call_count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
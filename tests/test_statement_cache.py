@@ -0,0 +1,71 @@
+"""
+Tests for the prepared statement cache
+"""
+
+import os
+import sys
+import unittest
+from unittest.mock import MagicMock
+
+# Add the src directory to the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.statement_cache import StatementCache, to_prepared_sql
+
+def make_cursor():
+    """Create a mock cursor whose EXPLAIN reports 2 ms of planning"""
+    cursor = MagicMock()
+    cursor.fetchone.return_value = ([{'Plan': {}, 'Planning Time': 2.0}],)
+    return cursor
+
+def statements(cursor, prefix):
+    """SQL sent through the cursor that starts with the given prefix"""
+    return [call.args[0] for call in cursor.execute.call_args_list if call.args[0].startswith(prefix)]
+
+class TestStatementCache(unittest.TestCase):
+    """Test preparation, reuse and eviction of prepared statements"""
+
+    def test_to_prepared_sql(self):
+        """psycopg2 placeholders become positional parameters and %% is unescaped"""
+        self.assertEqual(
+            to_prepared_sql("SELECT format('%%I', name) FROM t WHERE a = %s AND b = %s"),
+            "SELECT format('%I', name) FROM t WHERE a = $1 AND b = $2"
+        )
+
+    def test_prepare_once(self):
+        """A query shape is prepared once and executed by name afterwards"""
+        cache = StatementCache(4)
+        cursor = make_cursor()
+
+        for _ in range(3):
+            cache.execute(cursor, "SELECT COUNT(*) FROM t")
+
+        self.assertEqual(len(statements(cursor, "PREPARE")), 1)
+        self.assertEqual(len(statements(cursor, "EXECUTE")), 3)
+        self.assertEqual(cache.stats()['hits'], 2)
+        self.assertEqual(cache.stats()['planning_ms_saved'], 4.0)
+
+    def test_eviction_deallocates(self):
+        """The least recently used statement is deallocated when the cache is full"""
+        cache = StatementCache(1)
+        cursor = make_cursor()
+
+        cache.execute(cursor, "SELECT 1")
+        cache.execute(cursor, "SELECT 2")
+
+        self.assertEqual(len(statements(cursor, "DEALLOCATE")), 1)
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_generation_change_resets(self):
+        """A new schema generation deallocates the old statements"""
+        cache = StatementCache(4)
+        cursor = make_cursor()
+
+        cache.execute(cursor, "SELECT 1", generation=1)
+        cache.execute(cursor, "SELECT 1", generation=2)
+
+        self.assertEqual(len(statements(cursor, "PREPARE")), 2)
+        self.assertEqual(len(statements(cursor, "DEALLOCATE")), 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+"""
+Tests for statistics-aware SQL generation
+"""
+
+import os
+import sys
+import unittest
+from unittest.mock import MagicMock, patch
+
+# Add the src directory to the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.stats_collector import StatsCollector, referenced_tables
+from src.sql_generator import SQLGenerator
+
+ORDERS_STATS = {
+    'table': 'public.orders',
+    'kind': 'p',
+    'estimated_rows': 1200000,
+    'size': '180 MB',
+    'partition_key': 'RANGE (created_at)',
+    'partitions': 12,
+    'analyzed': True,
+    'columns': [
+        {'name': 'id', 'type': 'bigint', 'n_distinct': -1.0, 'null_frac': 0.0, 'correlation': 0.98},
+        {'name': 'status', 'type': 'text', 'n_distinct': 4.0, 'null_frac': 0.1, 'correlation': 0.12},
+        {'name': 'customer_id', 'type': 'bigint', 'n_distinct': -0.05, 'null_frac': 0.0, 'correlation': None}
+    ],
+    'indexes': [{'name': 'orders_pkey', 'definition': 'btree (id, created_at)',
+                 'unique': True, 'primary': True, 'valid': True}]
+}
+
+class TestStatsCollector(unittest.TestCase):
+    """Test table discovery, summaries and prompt injection"""
+
+    def test_referenced_tables(self):
+        """Tables come from entities and relationship ends, without duplicates"""
+        intent = {
+            'entities': [{'name': 'Orders', 'type': 'table'}, {'name': 'orders_idx', 'type': 'index'},
+                         {'name': 'bad name; --', 'type': 'table'}],
+            'relationships': [{'from': 'orders.customer_id', 'to': 'sales.customers.id'}]
+        }
+        self.assertEqual(referenced_tables(intent), ['orders', 'sales.customers'])
+
+    def test_summary(self):
+        """The summary is compact and interprets n_distinct"""
+        summary = StatsCollector(MagicMock()).summarize([ORDERS_STATS])
+        lines = summary.split('\n')
+        self.assertEqual(lines[0], 'public.orders: ~1.2M rows, 180 MB, partitioned by RANGE (created_at) into 12 partitions')
+        self.assertEqual(lines[1], '  indexes: orders_pkey btree (id, created_at) PRIMARY KEY')
+        self.assertIn('id bigint distinct=unique null=0% corr=0.98', lines[2])
+        self.assertIn('status text distinct=4 null=10% corr=0.12', lines[2])
+        self.assertIn('customer_id bigint distinct=~60.0k null=0%;', lines[2] + ';')
+
+    def test_collect_uses_schema_cache(self):
+        """Statistics are cached per table in the schema cache and unknown tables are skipped"""
+        connector = MagicMock()
+        connector.schema_cache.get.side_effect = [ORDERS_STATS, None]
+
+        stats = StatsCollector(connector, max_columns=5).collect(['orders', 'missing'])
+
+        self.assertEqual(stats, [ORDERS_STATS])
+        self.assertEqual(connector.schema_cache.get.call_args_list[0].args[0], ('table_stats', 'orders', 5))
+
+    @patch('openai.OpenAI')
+    def test_generator_adds_statistics_to_prompt(self, mock_openai):
+        """The generator sends the statistics summary along with the intent"""
+        mock_client = mock_openai.return_value
+        mock_client.chat.completions.create.return_value.choices[0].message.content = "SELECT 1;"
+        generator = SQLGenerator(MagicMock())
+        generator.stats_collector.prompt_context = MagicMock(return_value='public.orders: ~1.2M rows, 180 MB')
+
+        generator.generate({'operation_type': 'SELECT', 'entities': [{'name': 'orders', 'type': 'table'}]})
+
+        user_message = mock_client.chat.completions.create.call_args.kwargs['messages'][1]['content']
+        self.assertIn('public.orders: ~1.2M rows, 180 MB', user_message)
+
+    @patch('openai.OpenAI')
+    def test_generator_works_without_statistics(self, mock_openai):
+        """Statistics errors do not break generation"""
+        mock_client = mock_openai.return_value
+        mock_client.chat.completions.create.return_value.choices[0].message.content = "SELECT 1;"
+        generator = SQLGenerator(MagicMock())
+        generator.stats_collector.prompt_context = MagicMock(side_effect=Exception("no database"))
+
+        self.assertEqual(generator.generate({'operation_type': 'SELECT'}), "SELECT 1;")
+
+if __name__ == "__main__":
+    unittest.main()
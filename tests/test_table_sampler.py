@@ -0,0 +1,111 @@
+"""
+Tests for TABLESAMPLE previews and sampled dry runs
+"""
+
+import os
+import sys
+import unittest
+from unittest.mock import MagicMock, patch
+
+# Add the src directory to the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.table_sampler import TableSampler, SampleError, tablesample_clause, _name_chains
+
+class TestTableSampler(unittest.TestCase):
+    """Test sample clauses, reference rewriting and the dry run flow"""
+
+    def setUp(self):
+        self.connector = MagicMock()
+        self.connector.statement_timeout_ms = 0
+        self.sampler = TableSampler(self.connector, percent=1, max_rows=1000, method='SYSTEM')
+
+    def test_tablesample_clause(self):
+        """Method and percentage are validated and the seed makes the sample repeatable"""
+        clause = repr(tablesample_clause(2.5, 'bernoulli', 42))
+        self.assertIn("SQL('BERNOULLI'), SQL(' ('), Literal(2.5)", clause)
+        self.assertIn("SQL(' REPEATABLE ('), Literal(42)", clause)
+        self.assertNotIn('REPEATABLE', repr(tablesample_clause(1)))
+        for percent, method in ((0, 'SYSTEM'), (101, 'SYSTEM'), (1, 'RANDOM')):
+            with self.assertRaises(SampleError):
+                tablesample_clause(percent, method)
+
+    def test_name_chains(self):
+        """Dotted identifiers are grouped and quoted names keep their case"""
+        chains = _name_chains('SELECT o.id FROM public.orders o JOIN "Sales"."Items" i ON i.id = o.id')
+        names = [[name for _, name in chain] for chain in chains]
+        self.assertIn(['public', 'orders'], names)
+        self.assertIn(['Sales', 'Items'], names)
+        self.assertIn(['o', 'id'], names)
+
+    def test_rewrite_points_qualified_names_at_copies(self):
+        """Schema-qualified references of sampled tables are redirected to pg_temp"""
+        query = 'SELECT count(*) FROM public.orders o JOIN customers c ON c.id = o.customer_id'
+        relations = [{'schema': 'public', 'name': 'orders'}, {'schema': 'public', 'name': 'customers'}]
+
+        statement = self.sampler._rewrite(query, _name_chains(query), relations)
+
+        self.assertEqual(statement, 'SELECT count(*) FROM pg_temp.orders o JOIN customers c ON c.id = o.customer_id')
+
+    def test_refuses_writes(self):
+        """Only read-only queries run against a sample"""
+        with patch('src.table_sampler.psycopg2.connect') as connect:
+            success, result, _ = self.sampler.execute("DELETE FROM orders")
+        self.assertFalse(success)
+        self.assertIn('read-only', result)
+        connect.assert_not_called()
+
+    def test_dry_run_copies_capped_samples(self):
+        """Large tables get a lower percentage so at most max_rows rows are copied"""
+        conn = MagicMock()
+        cursor = conn.cursor.return_value.__enter__.return_value
+        cursor.fetchall.side_effect = [[('public', 'orders', 'r', 1000000)], [(5,)]]
+        cursor.fetchone.side_effect = [
+            [[{'Plan': {'Relation Name': 'orders', 'Schema': 'public'}}]],
+            [[{'Plan': {'Relation Name': 'orders', 'Schema': 'pg_temp_3'}}]]
+        ]
+        cursor.rowcount = 950
+        self.connector.shape_rows.return_value = [{'count': 5}]
+
+        with patch('src.table_sampler.psycopg2.connect', return_value=conn):
+            success, result, sample = self.sampler.execute("SELECT count(*) FROM orders", seed=7)
+
+        self.assertTrue(success)
+        self.assertEqual(result, [{'count': 5}])
+        self.assertEqual(sample['seed'], 7)
+        self.assertEqual(sample['tables'], [{'table': 'public.orders', 'percent': 0.1,
+                                             'estimated_rows': 1000000, 'sampled_rows': 950}])
+        conn.rollback.assert_called_once()
+        conn.close.assert_called_once()
+
+    def test_tables_come_from_the_plan(self):
+        """Tables whose names the tokenizer reads as keywords are found through the plan"""
+        cursor = MagicMock()
+        cursor.fetchone.return_value = [[{'Plan': {'Node Type': 'Hash Join', 'Plans': [
+            {'Relation Name': 'data', 'Schema': 'public'},
+            {'Relation Name': 'events', 'Schema': 'audit'}
+        ]}}]]
+        cursor.fetchall.return_value = [('audit', 'events', 'r', 10), ('public', 'data', 'r', 20),
+                                        ('public', 'customers', 'r', 5)]
+        query = 'SELECT d.customers FROM data d JOIN audit.events e ON e.id = d.id'
+
+        relations = self.sampler._resolve(cursor, query, _name_chains(query))
+
+        self.assertEqual([(r['schema'], r['name']) for r in relations], [('audit', 'events'), ('public', 'data')])
+        self.assertIn('"public"."data"', cursor.execute.call_args.args[1][0])
+
+    def test_refuses_plans_reading_full_tables(self):
+        """A query that still reads a real table (e.g. through a function) is refused"""
+        conn = MagicMock()
+        cursor = conn.cursor.return_value.__enter__.return_value
+        cursor.fetchall.return_value = []
+        cursor.fetchone.return_value = [[{'Plan': {'Relation Name': 'orders', 'Schema': 'public'}}]]
+
+        with patch('src.table_sampler.psycopg2.connect', return_value=conn):
+            success, result, _ = self.sampler.execute("SELECT * FROM recent_orders()")
+
+        self.assertFalse(success)
+        self.assertIn('public.orders', result)
+
+if __name__ == "__main__":
+    unittest.main()